@@ -21,6 +21,7 @@
  *
  *-----------------------------------------------------------------------*/
 
+#include <string.h>
 #include "Kasumi.h"
 
 /*--------- 16 bit rotate left ------------------------------------------*/
@@ -29,9 +30,9 @@
 
 /*-------- globals: The subkey arrays -----------------------------------*/
 
-static u16 KLi1[8], KLi2[8];
-static u16 KOi1[8], KOi2[8], KOi3[8];
-static u16 KIi1[8], KIi2[8], KIi3[8];
+/* the subkey arrays are held in a Kasumi_Key structure (see Kasumi.h),
+ * the global one being only used by KeySchedule() and Kasumi() */
+static Kasumi_Key Kasumi_global;
 
 
 /*---------------------------------------------------------------------
@@ -114,7 +115,7 @@ static u16 FI( u16 in, u16 subkey )
  *		Transforms a 32-bit value.  Uses <index> to identify the
  *		appropriate subkeys to use.
  *---------------------------------------------------------------------*/
-static u32 FO( u32 in, int index )
+static u32 FO( const Kasumi_Key *ks, u32 in, int index )
 {
 	u16 left, right;
 
@@ -125,16 +126,16 @@ static u32 FO( u32 in, int index )
 
 	/* Now apply the same basic transformation three times         */
 
-	left ^= KOi1[index];
-	left  = FI( left, KIi1[index] );
+	left ^= ks->KOi1[index];
+	left  = FI( left, ks->KIi1[index] );
 	left ^= right;
 
-	right ^= KOi2[index];
-	right  = FI( right, KIi2[index] );
+	right ^= ks->KOi2[index];
+	right  = FI( right, ks->KIi2[index] );
 	right ^= left;
 
-	left ^= KOi3[index];
-	left  = FI( left, KIi3[index] );
+	left ^= ks->KOi3[index];
+	left  = FI( left, ks->KIi3[index] );
 	left ^= right;
 
 	in = (((u32)right)<<16)+left;
@@ -148,7 +149,7 @@ static u32 FO( u32 in, int index )
  *		Transforms a 32-bit value.  Uses <index> to identify the
  *		appropriate subkeys to use.
  *---------------------------------------------------------------------*/
-static u32 FL( u32 in, int index )
+static u32 FL( const Kasumi_Key *ks, u32 in, int index )
 {
 	u16 l, r, a, b;
 
@@ -159,10 +160,10 @@ static u32 FL( u32 in, int index )
 
 	/* do the FL() operations			*/
 
-	a  = (u16) (l & KLi1[index]);
+	a  = (u16) (l & ks->KLi1[index]);
 	r ^= ROL16(a,1);
 
-	b  = (u16)(r | KLi2[index]);
+	b  = (u16)(r | ks->KLi2[index]);
 	l ^= ROL16(b,1);
 
 	/* put the two halves back together */
@@ -174,11 +175,12 @@ static u32 FL( u32 in, int index )
 
 
 /*---------------------------------------------------------------------
- * Kasumi()
+ * Kasumi_Encrypt()
  *		the Main algorithm (fig 1).  Apply the same pair of operations
- *		four times.  Transforms the 64-bit input.
+ *		four times.  Transforms the 64-bit input, with the given key
+ *		schedule.
  *---------------------------------------------------------------------*/
-EXPORTIT void Kasumi( u8 *data )
+EXPORTIT void Kasumi_Encrypt( const Kasumi_Key *ks, u8 *data )
 {
 	u32 left, right, temp;
 	REGISTER32 *d;
@@ -193,11 +195,11 @@ EXPORTIT void Kasumi( u8 *data )
             +(d[1].b8[2]<<8)+(d[1].b8[3]);
 	n = 0;
 	do { 	
-	    temp = FL( left, n   );
-		temp = FO( temp,  n++ );
+	    temp = FL( ks, left, n   );
+		temp = FO( ks, temp,  n++ );
 		right ^= temp;
-		temp = FO( right, n   );
-		temp = FL( temp,   n++ );
+		temp = FO( ks, right, n   );
+		temp = FL( ks, temp,   n++ );
 		left ^= temp;
 	} while( n<=7 );
 
@@ -214,11 +216,20 @@ EXPORTIT void Kasumi( u8 *data )
 }
 
 /*---------------------------------------------------------------------
- * KeySchedule()
+ * Kasumi()
+ *		the Main algorithm, with the global key schedule.
+ *---------------------------------------------------------------------*/
+EXPORTIT void Kasumi( u8 *data )
+{
+	Kasumi_Encrypt( &Kasumi_global, data );
+}
+
+/*---------------------------------------------------------------------
+ * Kasumi_KeySchedule()
  *		Build the key schedule.  Most "key" operations use 16-bit
  *		subkeys so we build u16-sized arrays that are "endian" correct.
  *---------------------------------------------------------------------*/
-EXPORTIT void KeySchedule( u8 *k )
+EXPORTIT void Kasumi_KeySchedule( Kasumi_Key *ks, u8 *k )
 {
 	static u16 C[] = {
 		0x0123,0x4567,0x89AB,0xCDEF, 0xFEDC,0xBA98,0x7654,0x3210 };
@@ -241,16 +252,25 @@ EXPORTIT void KeySchedule( u8 *k )
 
 	for( n=0; n<8; ++n )
 	{
-		KLi1[n] = ROL16(key[n],1);
-		KLi2[n] = Kprime[(n+2)&0x7];
-		KOi1[n] = ROL16(key[(n+1)&0x7],5);
-		KOi2[n] = ROL16(key[(n+5)&0x7],8);
-		KOi3[n] = ROL16(key[(n+6)&0x7],13);
-		KIi1[n] = Kprime[(n+4)&0x7];
-		KIi2[n] = Kprime[(n+3)&0x7];
-		KIi3[n] = Kprime[(n+7)&0x7];
+		ks->KLi1[n] = ROL16(key[n],1);
+		ks->KLi2[n] = Kprime[(n+2)&0x7];
+		ks->KOi1[n] = ROL16(key[(n+1)&0x7],5);
+		ks->KOi2[n] = ROL16(key[(n+5)&0x7],8);
+		ks->KOi3[n] = ROL16(key[(n+6)&0x7],13);
+		ks->KIi1[n] = Kprime[(n+4)&0x7];
+		ks->KIi2[n] = Kprime[(n+3)&0x7];
+		ks->KIi3[n] = Kprime[(n+7)&0x7];
 	}
 }
+
+/*---------------------------------------------------------------------
+ * KeySchedule()
+ *		Build the global key schedule.
+ *---------------------------------------------------------------------*/
+EXPORTIT void KeySchedule( u8 *k )
+{
+	Kasumi_KeySchedule( &Kasumi_global, k );
+}
 /*---------------------------------------------------------------------
  *				e n d    o f    k a s u m i . c
  *---------------------------------------------------------------------*/
@@ -276,12 +296,33 @@ EXPORTIT void KeySchedule( u8 *k )
  *		and bit length  encrypt the bit stream
  *---------------------------------------------------------*/
 EXPORTIT void f8(u8 *key, u32 count, u32 bearer, u32 dir, u8 *data, int length)
+{
+	u8  ModKey[16];		/* Modified key		*/
+	Kasumi_Key ks;		/* The key schedule	*/
+	Kasumi_Key ks_mod;	/* The modified key schedule */
+	int n;
+
+	/* Construct the modified key */
+	for( n=0; n<16; ++n )
+		ModKey[n] = (u8)(key[n] ^ 0x55);
+	Kasumi_KeySchedule( &ks_mod, ModKey );
+	Kasumi_KeySchedule( &ks, key );
+
+	Kasumi_f8_ks( &ks, &ks_mod, count, bearer, dir, data, length );
+}
+
+/*---------------------------------------------------------
+ * Kasumi_f8_ks()
+ *		Same as f8(), with the key schedules of key
+ *		and of key ^ 0x5555... already computed
+ *---------------------------------------------------------*/
+EXPORTIT void Kasumi_f8_ks(const Kasumi_Key *ks, const Kasumi_Key *ks_mod, 
+                           u32 count, u32 bearer, u32 dir, u8 *data, int length)
 {
 	REGISTER64 A;		/* the modifier			*/
 	REGISTER64 temp;	/* The working register	*/
 	int i, n;
 	int lastbits = (8-(length%8)) % 8;
-	u8  ModKey[16];		/* Modified key		*/
 	u16 blkcnt;			/* The block counter */
 
 	/* Start by building our global modifier */
@@ -296,16 +337,11 @@ EXPORTIT void f8(u8 *key, u32 count, u32 bearer, u32 dir, u8 *data, int length)
 	A.b8[4]  = (u8) (bearer<<3);
 	A.b8[4] |= (u8) (dir<<2);
 
-	/* Construct the modified key and then "kasumi" A */
-	for( n=0; n<16; ++n )
-		ModKey[n] = (u8)(key[n] ^ 0x55);
-	KeySchedule( ModKey );
-
-	Kasumi( A.b8 );	/* First encryption to create modifier */
+	/* "kasumi" A with the modified key */
+	Kasumi_Encrypt( ks_mod, A.b8 );	/* First encryption to create modifier */
 
 	/* Final initialisation steps */
 	blkcnt = 0;
-	KeySchedule( key );
 
 	/* Now run the block cipher */
 	while( length > 0 )
@@ -319,7 +355,7 @@ EXPORTIT void f8(u8 *key, u32 count, u32 bearer, u32 dir, u8 *data, int length)
 		temp.b8[6] ^= (u8) (blkcnt>>8);
 		
 		/* KASUMI it to produce the next block of keystream */
-		Kasumi( temp.b8 );
+		Kasumi_Encrypt( ks, temp.b8 );
 		
 		/* Set <n> to the number of bytes of input data	*
 		 * we have to modify.  (=8 if length <= 64)		*/
@@ -346,6 +382,44 @@ EXPORTIT void f8(u8 *key, u32 count, u32 bearer, u32 dir, u8 *data, int length)
 	}
 }
 
+/*---------------------------------------------------------
+ * Kasumi_f8_modifier(), Kasumi_f8_keystream()
+ *		Same keystream as Kasumi_f8_ks(), generated by
+ *		blocks of 64 bits over successive calls
+ *---------------------------------------------------------*/
+EXPORTIT void Kasumi_f8_modifier(const Kasumi_Key *ks_mod, 
+                                 u32 count, u32 bearer, u32 dir, u8 A[8])
+{
+	memset(A, 0, 8);
+	A[0]  = (u8) (count>>24);
+	A[1]  = (u8) (count>>16);
+	A[2]  = (u8) (count>>8);
+	A[3]  = (u8) (count);
+	A[4]  = (u8) (bearer<<3);
+	A[4] |= (u8) (dir<<2);
+	Kasumi_Encrypt( ks_mod, A );
+}
+
+EXPORTIT void Kasumi_f8_keystream(const Kasumi_Key *ks, const u8 A[8], 
+                                  u8 KSB[8], u32 *blkcnt, u8 *out, u32 nblocks)
+{
+	u32 n;
+	int i;
+
+	for( n=0; n<nblocks; ++n )
+	{
+		/* XOR in A and BLKCNT (16 bits, as in Kasumi_f8_ks()) to last value */
+		for( i=0; i<8; ++i )
+			KSB[i] ^= A[i];
+		KSB[7] ^= (u8)  *blkcnt;
+		KSB[6] ^= (u8) (*blkcnt>>8);
+		Kasumi_Encrypt( ks, KSB );
+		memcpy(out, KSB, 8);
+		out += 8;
+		++*blkcnt;
+	}
+}
+
 /*-----------------------------------------------------------
  *			e n d    o f    f 8 . c
  *-----------------------------------------------------------*/
@@ -366,41 +440,46 @@ EXPORTIT void f8(u8 *key, u32 count, u32 bearer, u32 dir, u8 *data, int length)
  *-------------------------------------------------------------------*/
 
 /*---------------------------------------------------------
- * f9()
+ * Kasumi_f9()
  *		Given key, count, fresh, direction, data,
  *		and message length, calculate the hash value
+ *		into the 4 bytes mac_i buffer
  *---------------------------------------------------------*/
-EXPORTIT u8 *f9(u8 *key, u32 count, u32 fresh, u32 dir, u8 *data, int length)
+EXPORTIT void Kasumi_f9(u8 *key, u32 count, u32 fresh, u32 dir, u8 *data, int length, u8 *mac_i)
 {
-	REGISTER64 A;	/* Holds the CBC chained data			*/
-	REGISTER64 B;	/* Holds the XOR of all KASUMI outputs	*/
-	u8  FinalBit[8] = {0x80, 0x40, 0x20, 0x10, 8,4,2,1};
 	u8  ModKey[16];
-	static u8 mac_i[4];	/* static memory for the result */
-	int i, n;
+	Kasumi_Key ks;		/* The key schedule	*/
+	Kasumi_Key ks_mod;	/* The modified key schedule */
+	int n;
 
-	/* Start by initialising the block cipher */
-	KeySchedule( key );
+	Kasumi_KeySchedule( &ks, key );
+	for( n=0; n<16; ++n )
+		ModKey[n] = (u8)(key[n] ^ 0xAA);
+	Kasumi_KeySchedule( &ks_mod, ModKey );
 
-	/* Next initialise the MAC chain.  Make sure we	*
-	 * have the data in the right byte order.			*
-	 * <A> holds our chaining value...				*
-	 * <B> is the running XOR of all KASUMI o/ps		*/
-	for( n=0; n<4; ++n )
-	{
-		A.b8[n]   = (u8)(count>>(24-(n*8)));
-		A.b8[n+4] = (u8)(fresh>>(24-(n*8)));
-	}
-	Kasumi( A.b8 );
-	B.b32[0] = A.b32[0];
-	B.b32[1] = A.b32[1];
+	Kasumi_f9_ks( &ks, &ks_mod, count, fresh, dir, data, length, mac_i );
+}
+
+/*---------------------------------------------------------
+ * f9_blocks()
+ *		Runs the f9 MAC chain from A, B over data of
+ *		length bits, adds the direction and final bits,
+ *		and writes the MAC into mac_i
+ *		(the second part of Kasumi_f9_ks(), shared with
+ *		the incremental Kasumi_f9_Final())
+ *---------------------------------------------------------*/
+static void f9_blocks(const Kasumi_Key *ks, const Kasumi_Key *ks_mod, 
+                      REGISTER64 A, REGISTER64 B, u32 dir, const u8 *data, int length, u8 *mac_i)
+{
+	u8  FinalBit[8] = {0x80, 0x40, 0x20, 0x10, 8,4,2,1};
+	int i, n;
 
 	/* Now run the blocks until we reach the last block */
 	while( length >= 64 )
 	{
 		for( n=0; n<8; ++n )
 			A.b8[n] ^= *data++;
-		Kasumi( A.b8 );
+		Kasumi_Encrypt( ks, A.b8 );
 		length -= 64;
 		B.b32[0] ^= A.b32[0];	/* running XOR across */
 		B.b32[1] ^= A.b32[1];	/* the block outputs */
@@ -435,7 +514,7 @@ EXPORTIT u8 *f9(u8 *key, u32 count, u32 fresh, u32 dir, u8 *data, int length)
 	 * create a new input block of 0x8000000000000000.	*/
 	if( (length==7) && (n==8) )	/* then we've filled the block */
 	{
-		Kasumi( A.b8 );
+		Kasumi_Encrypt( ks, A.b8 );
 		B.b32[0] ^= A.b32[0];	/* running XOR across	*/
 		B.b32[1] ^= A.b32[1];	/* the block outputs	*/
 
@@ -451,22 +530,138 @@ EXPORTIT u8 *f9(u8 *key, u32 count, u32 fresh, u32 dir, u8 *data, int length)
 			A.b8[n-1] ^= FinalBit[length+1];
 	}
 
-	Kasumi( A.b8 );
+	Kasumi_Encrypt( ks, A.b8 );
 	B.b32[0] ^= A.b32[0];	/* running XOR across	*/
 	B.b32[1] ^= A.b32[1];	/* the block outputs		*/
 
 	/* Final step is to KASUMI what we have using the	*
 	 * key XORd with 0xAAAA.....						*/
-	for( n=0; n<16; ++n )
-		ModKey[n] = (u8)*key++ ^ 0xAA;
-	KeySchedule( ModKey );
-	Kasumi( B.b8 );
+	Kasumi_Encrypt( ks_mod, B.b8 );
 
 	/* We return the left-most 32-bits of the result */
 
 	for( n=0; n<4; ++n )
 		mac_i[n] = B.b8[n];
+}
 
+/*---------------------------------------------------------
+ * f9_chain_init()
+ *		Initialises the f9 MAC chain A, B from count
+ *		and fresh
+ *---------------------------------------------------------*/
+static void f9_chain_init(const Kasumi_Key *ks, u32 count, u32 fresh, 
+                          REGISTER64 *A, REGISTER64 *B)
+{
+	int n;
+
+	/* Next initialise the MAC chain.  Make sure we	*
+	 * have the data in the right byte order.			*
+	 * <A> holds our chaining value...				*
+	 * <B> is the running XOR of all KASUMI o/ps		*/
+	for( n=0; n<4; ++n )
+	{
+		A->b8[n]   = (u8)(count>>(24-(n*8)));
+		A->b8[n+4] = (u8)(fresh>>(24-(n*8)));
+	}
+	Kasumi_Encrypt( ks, A->b8 );
+	B->b32[0] = A->b32[0];
+	B->b32[1] = A->b32[1];
+}
+
+/*---------------------------------------------------------
+ * Kasumi_f9_ks()
+ *		Same as Kasumi_f9(), with the key schedules of key
+ *		and of key ^ 0xAAAA... already computed
+ *---------------------------------------------------------*/
+EXPORTIT void Kasumi_f9_ks(const Kasumi_Key *ks, const Kasumi_Key *ks_mod, 
+                           u32 count, u32 fresh, u32 dir, u8 *data, int length, u8 *mac_i)
+{
+	REGISTER64 A;	/* Holds the CBC chained data			*/
+	REGISTER64 B;	/* Holds the XOR of all KASUMI outputs	*/
+
+	f9_chain_init( ks, count, fresh, &A, &B );
+	f9_blocks( ks, ks_mod, A, B, dir, data, length, mac_i );
+}
+
+/*---------------------------------------------------------
+ * Kasumi_f9_Init(), Kasumi_f9_Update(), Kasumi_f9_Final()
+ *		Same as Kasumi_f9(), over a message provided by
+ *		successive parts
+ *---------------------------------------------------------*/
+EXPORTIT void Kasumi_f9_Init(Kasumi_f9_State *st, u8 *key, u32 count, u32 fresh, u32 dir)
+{
+	u8 ModKey[16];
+	int n;
+
+	for( n=0; n<16; ++n )
+		ModKey[n] = (u8)(key[n] ^ 0xAA);
+	Kasumi_KeySchedule( &st->ks_mod, ModKey );
+	Kasumi_KeySchedule( &st->ks, key );
+	f9_chain_init( &st->ks, count, fresh, &st->A, &st->B );
+	st->dir = dir;
+	st->nbytes = 0;
+	st->nbuf = 0;
+}
+
+static void f9_block_next(Kasumi_f9_State *st, const u8 *data)
+{
+	int n;
+
+	for( n=0; n<8; ++n )
+		st->A.b8[n] ^= data[n];
+	Kasumi_Encrypt( &st->ks, st->A.b8 );
+	st->B.b32[0] ^= st->A.b32[0];
+	st->B.b32[1] ^= st->A.b32[1];
+}
+
+EXPORTIT void Kasumi_f9_Update(Kasumi_f9_State *st, const u8 *data, u64 len)
+{
+	u64 n;
+
+	while( len > 0 )
+	{
+		if( st->nbuf == 8 )
+		{
+			/* the pending block is followed by more data */
+			f9_block_next( st, st->buf );
+			st->nbuf = 0;
+		}
+		if( st->nbuf == 0 )
+		{
+			/* whole blocks followed by more data, processed in place */
+			for( ; len > 8; data += 8, len -= 8, st->nbytes += 8 )
+				f9_block_next( st, data );
+		}
+		n = 8 - st->nbuf;
+		if( n > len )
+			n = len;
+		memcpy( st->buf + st->nbuf, data, n );
+		st->nbuf += (u32)n;
+		st->nbytes += n;
+		data += n;
+		len -= n;
+	}
+}
+
+EXPORTIT int Kasumi_f9_Final(const Kasumi_f9_State *st, u64 length, u8 *mac_i)
+{
+	if( (length > 8*st->nbytes) || (st->nbytes > 0 && length <= 8*(st->nbytes-1)) )
+		return -1;
+	f9_blocks( &st->ks, &st->ks_mod, st->A, st->B, st->dir, st->buf, 
+	           (int)(length - 8*(st->nbytes - st->nbuf)), mac_i );
+	return 0;
+}
+
+/*---------------------------------------------------------
+ * f9()
+ *		Given key, count, fresh, direction, data,
+ *		and message length, calculate the hash value
+ *		into a static buffer (not thread-safe)
+ *---------------------------------------------------------*/
+EXPORTIT u8 *f9(u8 *key, u32 count, u32 fresh, u32 dir, u8 *data, int length)
+{
+	static u8 mac_i[4];	/* static memory for the result */
+	Kasumi_f9( key, count, fresh, dir, data, length, mac_i );
 	return( mac_i );
 }
 
@@ -28,6 +28,7 @@ typedef unsigned short  u16;
 typedef unsigned  long  u32;
 */
 typedef unsigned   int  u32;
+typedef unsigned long long u64;
 
 
 /*------- unions: used to remove "endian" issues ------------------------*/
@@ -51,20 +52,81 @@ typedef union {
 	u8  b8[8];
 } REGISTER64;
 
+/*----- the subkey arrays of a key schedule -----*/
+
+typedef struct {
+	u16 KLi1[8], KLi2[8];
+	u16 KOi1[8], KOi2[8], KOi3[8];
+	u16 KIi1[8], KIi2[8], KIi3[8];
+} Kasumi_Key;
+
+/*----- the state of an incremental f9 computation -----*/
+
+typedef struct {
+	Kasumi_Key ks, ks_mod;	/* key schedules of ik and of ik ^ 0xAAAA... */
+	REGISTER64 A, B;		/* MAC chain */
+	u32 dir;
+	u64 nbytes;				/* number of bytes provided */
+	u8  buf[8];				/* last block provided, not processed yet */
+	u32 nbuf;
+} Kasumi_f9_State;
+
 /*------------- prototypes --------------------------------
  * take care: length (in f8 and f9) is always in bits
  *---------------------------------------------------------*/
 
-/* initialize the 128 bits key into the cipher */
+/* initialize the 128 bits key into the cipher
+ * (global key schedule: not thread-safe) */
 EXPORTIT void KeySchedule( u8 *key );
 
-/* cipher a block of 64 bits */
+/* cipher a block of 64 bits
+ * (global key schedule: not thread-safe) */
 EXPORTIT void Kasumi( u8 *data );
 
+/* initialize the 128 bits key into the given key schedule */
+EXPORTIT void Kasumi_KeySchedule( Kasumi_Key *ks, u8 *key );
+
+/* cipher a block of 64 bits with the given key schedule */
+EXPORTIT void Kasumi_Encrypt( const Kasumi_Key *ks, u8 *data );
+
 /* cipher a whole message in 3GPP -counter- mode */
 EXPORTIT void f8( u8 *key, u32 count, u32 bearer, u32 dir, \
                   u8 *data, int length );
 
-/* compute a 3GPP MAC on a message */
+/* compute a 3GPP MAC on a message
+ * (returned in a static buffer: not thread-safe) */
 EXPORTIT u8 * f9( u8 *key, u32 count, u32 fresh, u32 dir, \
                   u8 *data, int length );
+
+/* compute a 3GPP MAC on a message into the 4 bytes mac_i buffer */
+EXPORTIT void Kasumi_f9( u8 *key, u32 count, u32 fresh, u32 dir, \
+                         u8 *data, int length, u8 *mac_i );
+
+/* same as f8, with the key schedules of ck and of ck ^ 0x5555... */
+EXPORTIT void Kasumi_f8_ks( const Kasumi_Key *ks, const Kasumi_Key *ks_mod, \
+                            u32 count, u32 bearer, u32 dir, u8 *data, int length );
+
+/* f8 keystream generation by blocks, for streaming f8:
+ * Kasumi_f8_modifier() computes the modifier A from count, bearer and dir,
+ * with the key schedule of ck ^ 0x5555...
+ * Kasumi_f8_keystream() generates nblocks blocks of keystream into out, KSB
+ * (the last keystream block, zero at start) and blkcnt (its counter, zero at
+ * start) being updated, so that successive calls continue the keystream */
+EXPORTIT void Kasumi_f8_modifier( const Kasumi_Key *ks_mod, \
+                                  u32 count, u32 bearer, u32 dir, u8 A[8] );
+EXPORTIT void Kasumi_f8_keystream( const Kasumi_Key *ks, const u8 A[8], \
+                                   u8 KSB[8], u32 *blkcnt, u8 *out, u32 nblocks );
+
+/* same as Kasumi_f9, with the key schedules of ik and of ik ^ 0xAAAA... */
+EXPORTIT void Kasumi_f9_ks( const Kasumi_Key *ks, const Kasumi_Key *ks_mod, \
+                            u32 count, u32 fresh, u32 dir, u8 *data, int length, u8 *mac_i );
+
+/* incremental f9: the message is provided by bytes over successive 
+ * Kasumi_f9_Update() calls, the last block being kept until more data is
+ * provided; Kasumi_f9_Final() then writes the MAC of the message of length bits
+ * into mac_i, without modifying the state: only the last bits of the last byte
+ * provided can be left out by length; it returns 0 on success, -1 on invalid 
+ * length */
+EXPORTIT void Kasumi_f9_Init( Kasumi_f9_State *st, u8 *key, u32 count, u32 fresh, u32 dir );
+EXPORTIT void Kasumi_f9_Update( Kasumi_f9_State *st, const u8 *data, u64 len );
+EXPORTIT int  Kasumi_f9_Final( const Kasumi_f9_State *st, u64 length, u8 *mac_i );
@@ -14,6 +14,7 @@
 #endif
 
 #include <stdint.h>
+#include <stddef.h>
 
 /*------------------------------------------------------------------------
  * KeccakP-1600-3gpp.h
@@ -23,3 +24,10 @@ EXPORTIT void Keccak_f_8 (uint8_t s[200]);
 EXPORTIT void Keccak_f_32(uint32_t s[50]);
 EXPORTIT void Keccak_f_64(uint64_t s[25]);
 
+/* unrolled version of Keccak_f_64, see KeccakP-1600-fast.c */
+EXPORTIT void Keccak_f_64_fast(uint64_t s[25]);
+
+/* permutes in place n consecutive 200 bytes states of buf, iterations times
+ * each, with Keccak_f_64_fast */
+EXPORTIT void Keccak_f_64_many(uint8_t *buf, size_t n, int iterations);
+
@@ -0,0 +1,122 @@
+/* -----------------------------------------------------------------------
+ * Unrolled 64-bit Keccak-p[1600, 24] permutation, computing the same output
+ * as Keccak_f_64() of KeccakP-1600-3gpp.c, with:
+ * - theta, rho, pi and chi steps written lane by lane, without the Rho, Pi
+ *   and Iota tables lookups and loops of the reference code,
+ * - 64-bit round constants,
+ * - a batch function, permuting many consecutive 200 bytes states.
+ * States are handled in the same byte order as for Keccak_f_64() (i.e. each
+ * 200 bytes state is loaded as 25 native uint64).
+ *-----------------------------------------------------------------------*/
+
+/*------------------------------------------------------------------------
+ * KeccakP-1600-fast.c
+ *------------------------------------------------------------------------*/
+
+#include <string.h>
+#include "KeccakP-1600-3gpp.h"
+
+#define ROL64(value, n)	\
+((((uint64_t)(value))<<(n)) | (((uint64_t)(value))>>(64-(n))))
+
+static const uint64_t KeccakP1600_RC[24] = {
+    0x0000000000000001ULL, 0x0000000000008082ULL, 0x800000000000808AULL,
+    0x8000000080008000ULL, 0x000000000000808BULL, 0x0000000080000001ULL,
+    0x8000000080008081ULL, 0x8000000000008009ULL, 0x000000000000008AULL,
+    0x0000000000000088ULL, 0x0000000080008009ULL, 0x000000008000000AULL,
+    0x000000008000808BULL, 0x800000000000008BULL, 0x8000000000008089ULL,
+    0x8000000000008003ULL, 0x8000000000008002ULL, 0x8000000000000080ULL,
+    0x000000000000800AULL, 0x800000008000000AULL, 0x8000000080008081ULL,
+    0x8000000000008080ULL, 0x0000000080000001ULL, 0x8000000080008008ULL
+};
+
+void Keccak_f_64_fast(uint64_t A[25])
+{
+    uint64_t B[25];
+    uint64_t C0, C1, C2, C3, C4, D0, D1, D2, D3, D4;
+    int round;
+    
+    for (round=0; round<24; round++)
+    {
+        /* theta */
+        C0 = A[0] ^ A[5] ^ A[10] ^ A[15] ^ A[20];
+        C1 = A[1] ^ A[6] ^ A[11] ^ A[16] ^ A[21];
+        C2 = A[2] ^ A[7] ^ A[12] ^ A[17] ^ A[22];
+        C3 = A[3] ^ A[8] ^ A[13] ^ A[18] ^ A[23];
+        C4 = A[4] ^ A[9] ^ A[14] ^ A[19] ^ A[24];
+        D0 = C4 ^ ROL64(C1, 1);
+        D1 = C0 ^ ROL64(C2, 1);
+        D2 = C1 ^ ROL64(C3, 1);
+        D3 = C2 ^ ROL64(C4, 1);
+        D4 = C3 ^ ROL64(C0, 1);
+        /* rho and pi */
+        B[ 0] = A[ 0] ^ D0;
+        B[10] = ROL64(A[ 1] ^ D1,  1);
+        B[20] = ROL64(A[ 2] ^ D2, 62);
+        B[ 5] = ROL64(A[ 3] ^ D3, 28);
+        B[15] = ROL64(A[ 4] ^ D4, 27);
+        B[16] = ROL64(A[ 5] ^ D0, 36);
+        B[ 1] = ROL64(A[ 6] ^ D1, 44);
+        B[11] = ROL64(A[ 7] ^ D2,  6);
+        B[21] = ROL64(A[ 8] ^ D3, 55);
+        B[ 6] = ROL64(A[ 9] ^ D4, 20);
+        B[ 7] = ROL64(A[10] ^ D0,  3);
+        B[17] = ROL64(A[11] ^ D1, 10);
+        B[ 2] = ROL64(A[12] ^ D2, 43);
+        B[12] = ROL64(A[13] ^ D3, 25);
+        B[22] = ROL64(A[14] ^ D4, 39);
+        B[23] = ROL64(A[15] ^ D0, 41);
+        B[ 8] = ROL64(A[16] ^ D1, 45);
+        B[18] = ROL64(A[17] ^ D2, 15);
+        B[ 3] = ROL64(A[18] ^ D3, 21);
+        B[13] = ROL64(A[19] ^ D4,  8);
+        B[14] = ROL64(A[20] ^ D0, 18);
+        B[24] = ROL64(A[21] ^ D1,  2);
+        B[ 9] = ROL64(A[22] ^ D2, 61);
+        B[19] = ROL64(A[23] ^ D3, 56);
+        B[ 4] = ROL64(A[24] ^ D4, 14);
+        /* chi */
+        A[ 0] = B[ 0] ^ (~B[ 1] & B[ 2]);
+        A[ 1] = B[ 1] ^ (~B[ 2] & B[ 3]);
+        A[ 2] = B[ 2] ^ (~B[ 3] & B[ 4]);
+        A[ 3] = B[ 3] ^ (~B[ 4] & B[ 0]);
+        A[ 4] = B[ 4] ^ (~B[ 0] & B[ 1]);
+        A[ 5] = B[ 5] ^ (~B[ 6] & B[ 7]);
+        A[ 6] = B[ 6] ^ (~B[ 7] & B[ 8]);
+        A[ 7] = B[ 7] ^ (~B[ 8] & B[ 9]);
+        A[ 8] = B[ 8] ^ (~B[ 9] & B[ 5]);
+        A[ 9] = B[ 9] ^ (~B[ 5] & B[ 6]);
+        A[10] = B[10] ^ (~B[11] & B[12]);
+        A[11] = B[11] ^ (~B[12] & B[13]);
+        A[12] = B[12] ^ (~B[13] & B[14]);
+        A[13] = B[13] ^ (~B[14] & B[10]);
+        A[14] = B[14] ^ (~B[10] & B[11]);
+        A[15] = B[15] ^ (~B[16] & B[17]);
+        A[16] = B[16] ^ (~B[17] & B[18]);
+        A[17] = B[17] ^ (~B[18] & B[19]);
+        A[18] = B[18] ^ (~B[19] & B[15]);
+        A[19] = B[19] ^ (~B[15] & B[16]);
+        A[20] = B[20] ^ (~B[21] & B[22]);
+        A[21] = B[21] ^ (~B[22] & B[23]);
+        A[22] = B[22] ^ (~B[23] & B[24]);
+        A[23] = B[23] ^ (~B[24] & B[20]);
+        A[24] = B[24] ^ (~B[20] & B[21]);
+        /* iota */
+        A[0] ^= KeccakP1600_RC[round];
+    }
+}
+
+void Keccak_f_64_many(uint8_t *buf, size_t n, int iterations)
+{
+    uint64_t state[25];
+    size_t i;
+    int j;
+    
+    for (i=0; i<n; i++, buf+=200)
+    {
+        memcpy(state, buf, 200);
+        for (j=0; j<iterations; j++)
+            Keccak_f_64_fast(state);
+        memcpy(buf, state, 200);
+    }
+}
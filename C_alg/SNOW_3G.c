@@ -16,30 +16,9 @@
 
 #include "SNOW_3G.h"
 
-/* LFSR */
-
-u32 LFSR_S0 = 0x00;
-u32 LFSR_S1 = 0x00;
-u32 LFSR_S2 = 0x00;
-u32 LFSR_S3 = 0x00;
-u32 LFSR_S4 = 0x00;
-u32 LFSR_S5 = 0x00;
-u32 LFSR_S6 = 0x00;
-u32 LFSR_S7 = 0x00;
-u32 LFSR_S8 = 0x00;
-u32 LFSR_S9 = 0x00;
-u32 LFSR_S10 = 0x00;
-u32 LFSR_S11 = 0x00;
-u32 LFSR_S12 = 0x00;
-u32 LFSR_S13 = 0x00;
-u32 LFSR_S14 = 0x00;
-u32 LFSR_S15 = 0x00;
-
-/* FSM */
-
-u32 FSM_R1 = 0x00;
-u32 FSM_R2 = 0x00;
-u32 FSM_R3 = 0x00;
+/* the state of the generator is held in a SNOW3G_State structure (see SNOW_3G.h),
+ * the global one being only used by Initialize() and GenerateKeystream() */
+static SNOW3G_State SNOW3G_global;
 
 /* Rijndael S-box SR */
 
@@ -223,31 +202,31 @@ u32 S2(u32 w)
  * See section 3.4.4.
  */
 
-void ClockLFSRInitializationMode(u32 F)
+static void ClockLFSRInitializationMode(SNOW3G_State* st, u32 F)
 {
-	u32 v = ( ( (LFSR_S0 << 8) & 0xffffff00 ) ^
-		( MULalpha( (u8)((LFSR_S0>>24) & 0xff) ) ) ^
-		( LFSR_S2 ) ^
-		( (LFSR_S11 >> 8) & 0x00ffffff ) ^
-		( DIValpha( (u8)( ( LFSR_S11) & 0xff ) ) ) ^
+	u32 v = ( ( (st->LFSR_S0 << 8) & 0xffffff00 ) ^
+		( MULalpha( (u8)((st->LFSR_S0>>24) & 0xff) ) ) ^
+		( st->LFSR_S2 ) ^
+		( (st->LFSR_S11 >> 8) & 0x00ffffff ) ^
+		( DIValpha( (u8)( ( st->LFSR_S11) & 0xff ) ) ) ^
 		( F )
 	);
-	LFSR_S0 = LFSR_S1;
-	LFSR_S1 = LFSR_S2;
-	LFSR_S2 = LFSR_S3;
-	LFSR_S3 = LFSR_S4;
-	LFSR_S4 = LFSR_S5;
-	LFSR_S5 = LFSR_S6;
-	LFSR_S6 = LFSR_S7;
-	LFSR_S7 = LFSR_S8;
-	LFSR_S8 = LFSR_S9;
-	LFSR_S9 = LFSR_S10;
-	LFSR_S10 = LFSR_S11;
-	LFSR_S11 = LFSR_S12;
-	LFSR_S12 = LFSR_S13;
-	LFSR_S13 = LFSR_S14;
-	LFSR_S14 = LFSR_S15;
-	LFSR_S15 = v;
+	st->LFSR_S0 = st->LFSR_S1;
+	st->LFSR_S1 = st->LFSR_S2;
+	st->LFSR_S2 = st->LFSR_S3;
+	st->LFSR_S3 = st->LFSR_S4;
+	st->LFSR_S4 = st->LFSR_S5;
+	st->LFSR_S5 = st->LFSR_S6;
+	st->LFSR_S6 = st->LFSR_S7;
+	st->LFSR_S7 = st->LFSR_S8;
+	st->LFSR_S8 = st->LFSR_S9;
+	st->LFSR_S9 = st->LFSR_S10;
+	st->LFSR_S10 = st->LFSR_S11;
+	st->LFSR_S11 = st->LFSR_S12;
+	st->LFSR_S12 = st->LFSR_S13;
+	st->LFSR_S13 = st->LFSR_S14;
+	st->LFSR_S14 = st->LFSR_S15;
+	st->LFSR_S15 = v;
 }
 
 /* Clocking LFSR in keystream mode.
@@ -255,30 +234,30 @@ void ClockLFSRInitializationMode(u32 F)
  * See section 3.4.5.
  */
 
-void ClockLFSRKeyStreamMode(void)
+static void ClockLFSRKeyStreamMode(SNOW3G_State* st)
 {
-	u32 v = ( ( (LFSR_S0 << 8) & 0xffffff00 ) ^
-		( MULalpha( (u8)((LFSR_S0>>24) & 0xff) ) ) ^
-		( LFSR_S2 ) ^
-		( (LFSR_S11 >> 8) & 0x00ffffff ) ^
-		( DIValpha( (u8)( ( LFSR_S11) & 0xff ) ) )
+	u32 v = ( ( (st->LFSR_S0 << 8) & 0xffffff00 ) ^
+		( MULalpha( (u8)((st->LFSR_S0>>24) & 0xff) ) ) ^
+		( st->LFSR_S2 ) ^
+		( (st->LFSR_S11 >> 8) & 0x00ffffff ) ^
+		( DIValpha( (u8)( ( st->LFSR_S11) & 0xff ) ) )
 	);
-	LFSR_S0 = LFSR_S1;
-	LFSR_S1 = LFSR_S2;
-	LFSR_S2 = LFSR_S3;
-	LFSR_S3 = LFSR_S4;
-	LFSR_S4 = LFSR_S5;
-	LFSR_S5 = LFSR_S6;
-	LFSR_S6 = LFSR_S7;
-	LFSR_S7 = LFSR_S8;
-	LFSR_S8 = LFSR_S9;
-	LFSR_S9 = LFSR_S10;
-	LFSR_S10 = LFSR_S11;
-	LFSR_S11 = LFSR_S12;
-	LFSR_S12 = LFSR_S13;
-	LFSR_S13 = LFSR_S14;
-	LFSR_S14 = LFSR_S15;
-	LFSR_S15 = v;
+	st->LFSR_S0 = st->LFSR_S1;
+	st->LFSR_S1 = st->LFSR_S2;
+	st->LFSR_S2 = st->LFSR_S3;
+	st->LFSR_S3 = st->LFSR_S4;
+	st->LFSR_S4 = st->LFSR_S5;
+	st->LFSR_S5 = st->LFSR_S6;
+	st->LFSR_S6 = st->LFSR_S7;
+	st->LFSR_S7 = st->LFSR_S8;
+	st->LFSR_S8 = st->LFSR_S9;
+	st->LFSR_S9 = st->LFSR_S10;
+	st->LFSR_S10 = st->LFSR_S11;
+	st->LFSR_S11 = st->LFSR_S12;
+	st->LFSR_S12 = st->LFSR_S13;
+	st->LFSR_S13 = st->LFSR_S14;
+	st->LFSR_S14 = st->LFSR_S15;
+	st->LFSR_S15 = v;
 }
 
 /* Clocking FSM.
@@ -287,77 +266,130 @@ void ClockLFSRKeyStreamMode(void)
  * See Section 3.4.6.
  */
 
-u32 ClockFSM(void)
+static u32 ClockFSM(SNOW3G_State* st)
 {
-	u32 F = ( ( LFSR_S15 + FSM_R1 ) & 0xffffffff ) ^ FSM_R2 ;
-	u32 r = ( FSM_R2 + ( FSM_R3 ^ LFSR_S5 ) ) & 0xffffffff ;
-	FSM_R3 = S2(FSM_R2);
-	FSM_R2 = S1(FSM_R1);
-	FSM_R1 = r;
+	u32 F = ( ( st->LFSR_S15 + st->FSM_R1 ) & 0xffffffff ) ^ st->FSM_R2 ;
+	u32 r = ( st->FSM_R2 + ( st->FSM_R3 ^ st->LFSR_S5 ) ) & 0xffffffff ;
+	st->FSM_R3 = S2(st->FSM_R2);
+	st->FSM_R2 = S1(st->FSM_R1);
+	st->FSM_R1 = r;
 	return F;
 }
 
-/* Initialization.
+/* Initialization of a given state.
+ * Input st: the generator state to be initialized.
  * Input k[4]: Four 32-bit words making up 128-bit key.
  * Input IV[4]: Four 32-bit words making 128-bit initialization variable.
  * Output: All the LFSRs and FSM are initialized for key generation.
  * See Section 4.1.
  */
 
-EXPORTIT void Initialize(u32 k[4], u32 IV[4])
+static void InitializeState(SNOW3G_State* st, u32 k[4], u32 IV[4])
 {
 	u8 i=0;
 	u32 F = 0x0;
-	LFSR_S15 = k[3] ^ IV[0];
-	LFSR_S14 = k[2];
-	LFSR_S13 = k[1];
-	LFSR_S12 = k[0] ^ IV[1];
-	LFSR_S11 = k[3] ^ 0xffffffff;
-	LFSR_S10 = k[2] ^ 0xffffffff ^ IV[2];
-	LFSR_S9 = k[1] ^ 0xffffffff ^ IV[3];
-	LFSR_S8 = k[0] ^ 0xffffffff;
-	LFSR_S7 = k[3];
-	LFSR_S6 = k[2];
-	LFSR_S5 = k[1];
-	LFSR_S4 = k[0];
-	LFSR_S3 = k[3] ^ 0xffffffff;
-	LFSR_S2 = k[2] ^ 0xffffffff;
-	LFSR_S1 = k[1] ^ 0xffffffff;
-	LFSR_S0 = k[0] ^ 0xffffffff;
-	FSM_R1 = 0x0;
-	FSM_R2 = 0x0;
-	FSM_R3 = 0x0;
+	st->LFSR_S15 = k[3] ^ IV[0];
+	st->LFSR_S14 = k[2];
+	st->LFSR_S13 = k[1];
+	st->LFSR_S12 = k[0] ^ IV[1];
+	st->LFSR_S11 = k[3] ^ 0xffffffff;
+	st->LFSR_S10 = k[2] ^ 0xffffffff ^ IV[2];
+	st->LFSR_S9 = k[1] ^ 0xffffffff ^ IV[3];
+	st->LFSR_S8 = k[0] ^ 0xffffffff;
+	st->LFSR_S7 = k[3];
+	st->LFSR_S6 = k[2];
+	st->LFSR_S5 = k[1];
+	st->LFSR_S4 = k[0];
+	st->LFSR_S3 = k[3] ^ 0xffffffff;
+	st->LFSR_S2 = k[2] ^ 0xffffffff;
+	st->LFSR_S1 = k[1] ^ 0xffffffff;
+	st->LFSR_S0 = k[0] ^ 0xffffffff;
+	st->FSM_R1 = 0x0;
+	st->FSM_R2 = 0x0;
+	st->FSM_R3 = 0x0;
 	for(i=0;i<32;i++)
 	{
-		F = ClockFSM();
-		ClockLFSRInitializationMode(F);
+		F = ClockFSM(st);
+		ClockLFSRInitializationMode(st, F);
 	}
 }
 
-/* Generation of Keystream.
+/* First step of the keystream mode, run once after the initialization.
+ * See section 4.2.
+ */
+
+static void KeystreamModeStart(SNOW3G_State* st)
+{
+	ClockFSM(st); /* Clock FSM once. Discard the output. */
+	ClockLFSRKeyStreamMode(st); /* Clock LFSR in keystream mode once. */
+}
+
+/* Generation of Keystream from a given state.
  * input n: number of 32-bit words of keystream.
  * input z: space for the generated keystream, assumes
  * memory is allocated already.
- * output: generated keystream which is filled in z
  * See section 4.2.
  */
 
-EXPORTIT void GenerateKeystream(u32 n, u32 *ks)
+static void KeystreamState(SNOW3G_State* st, u32 n, u32 *ks)
 {
 	u32 t = 0;
 	u32 F = 0x0;
-	ClockFSM(); /* Clock FSM once. Discard the output. */
-	ClockLFSRKeyStreamMode(); /* Clock LFSR in keystream mode once. */
 	for ( t=0; t<n; t++)
 	{
-		F = ClockFSM(); /* STEP 1 */
-		ks[t] = F ^ LFSR_S0; /* STEP 2 */
+		F = ClockFSM(st); /* STEP 1 */
+		ks[t] = F ^ st->LFSR_S0; /* STEP 2 */
 		/* Note that ks[t] corresponds to z_{t+1} in section 4.2
 		*/
-		ClockLFSRKeyStreamMode(); /* STEP 3 */
+		ClockLFSRKeyStreamMode(st); /* STEP 3 */
 	}
 }
 
+/* Initialization.
+ * Input k[4]: Four 32-bit words making up 128-bit key.
+ * Input IV[4]: Four 32-bit words making 128-bit initialization variable.
+ * Output: All the LFSRs and FSM are initialized for key generation.
+ * See Section 4.1.
+ */
+
+EXPORTIT void Initialize(u32 k[4], u32 IV[4])
+{
+	InitializeState(&SNOW3G_global, k, IV);
+}
+
+/* Generation of Keystream.
+ * input n: number of 32-bit words of keystream.
+ * input z: space for the generated keystream, assumes
+ * memory is allocated already.
+ * output: generated keystream which is filled in z
+ * See section 4.2.
+ */
+
+EXPORTIT void GenerateKeystream(u32 n, u32 *ks)
+{
+	KeystreamModeStart(&SNOW3G_global);
+	KeystreamState(&SNOW3G_global, n, ks);
+}
+
+/* Reentrant API: initialization of a SNOW3G_State,
+ * including the first (discarded) clocking of the keystream mode.
+ */
+
+EXPORTIT void SNOW3G_Initialize(SNOW3G_State* st, u32 k[4], u32 IV[4])
+{
+	InitializeState(st, k, IV);
+	KeystreamModeStart(st);
+}
+
+/* Reentrant API: generation of n 32-bit words of keystream from a SNOW3G_State,
+ * successive calls continue the keystream.
+ */
+
+EXPORTIT void SNOW3G_GenerateKeystream(SNOW3G_State* st, u32 n, u32 *ks)
+{
+	KeystreamState(st, n, ks);
+}
+
 /*-----------------------------------------------------------------------
  * end of SNOW_3G.c
  *-----------------------------------------------------------------------*/
@@ -389,11 +421,12 @@ EXPORTIT void GenerateKeystream(u32 n, u32 *ks)
 
 EXPORTIT void f8(u8 *key, u32 count, u32 bearer, u32 dir, u8 *data, u32 length)
 {
+	SNOW3G_State st;
 	u32 K[4],IV[4];
-	int n = ( length + 31 ) / 32;
-	int i=0;
+	u32 nbytes = ( length + 7 ) / 8;
+	u32 i=0, j=0, n;
 	int lastbits = (8-(length%8)) % 8;
-	u32 *KS;
+	u32 KS[16];
 	
 	/*Initialisation*/
 	/* Load the confidentiality key for SNOW 3G initialization as in section
@@ -409,23 +442,25 @@ EXPORTIT void f8(u8 *key, u32 count, u32 bearer, u32 dir, u8 *data, u32 length)
 	IV[1] = IV[3];
 	IV[0] = IV[2];
 	
-	/* Run SNOW 3G algorithm to generate sequence of key stream bits KS*/
-	Initialize(K,IV);
-	KS = (u32 *)malloc(4*n);
-	GenerateKeystream(n,(u32*)KS);
+	/* Run SNOW 3G algorithm on a local state, with the table-driven core of
+	SNOW_3G_fast.c */
+	SNOW3G_Fast_Initialize(&st, K, IV);
 	
 	/* Exclusive-OR the input data with keystream to generate the output bit
-	stream */
-	for (i=0; i<n; i++)
+	stream, 16 keystream words at a time: 
+	   this is a modification to the reference C code, which allocated the whole
+	   keystream and wrote up to 3 bytes after the end of data */
+	for (i=0; i<nbytes; i+=4)
 	{
-		data[4*i+0] ^= (u8) (KS[i] >> 24) & 0xff;
-		data[4*i+1] ^= (u8) (KS[i] >> 16) & 0xff;
-		data[4*i+2] ^= (u8) (KS[i] >> 8) & 0xff;
-		data[4*i+3] ^= (u8) (KS[i] ) & 0xff;
+		if ((i & 63) == 0)
+		{
+			n = (nbytes - i + 3) / 4;
+			SNOW3G_Fast_GenerateKeystream(&st, n < 16 ? n : 16, KS);
+		}
+		for (j=0; j<4 && i+j<nbytes; j++)
+			data[i+j] ^= (u8) (KS[(i>>2) & 15] >> (24-8*j)) & 0xff;
 	}
 	
-	free(KS);
-	
 	/* zero last bits of data in case its length is not byte-aligned 
 	   this is an addition to the C reference code, which did not handle it */
 	if (lastbits)
@@ -491,6 +526,138 @@ u64 MUL64(u64 V, u64 P, u64 c)
 	return result;
 }
 
+/* GF(2^64) multiplication engines for f9, in addition to the reference MUL64:
+ * - SNOW3G_F9_ENGINE_TABLE: 4 bits at a time, with a 16 entries table of
+ *   multiples of P, computed for each MAC
+ * - SNOW3G_F9_ENGINE_CLMUL: carry-less multiplication instruction (x86 PCLMULQDQ),
+ *   when supported by the compiler and the CPU
+ * this is an addition to the C reference code
+ */
+
+/* MUL64_R4[t] = t(x) * x^64 mod (x^64 + x^4 + x^3 + x + 1), for t of degree < 4 */
+static const u64 MUL64_R4[16] = {
+	0x00, 0x1b, 0x36, 0x2d, 0x6c, 0x77, 0x5a, 0x41,
+	0xd8, 0xc3, 0xee, 0xf5, 0xb4, 0xaf, 0x82, 0x99
+};
+
+/* MUL64_TableInit.
+ * Output T[16]: T[n] = n(x) * P, for n of degree < 4.
+ */
+static void MUL64_TableInit(u64 T[16], u64 P)
+{
+	int i;
+	
+	T[0] = 0;
+	T[1] = P;
+	for (i=2; i<16; i+=2)
+	{
+		T[i]   = MUL64x(T[i>>1], 0x1b);
+		T[i+1] = T[i] ^ P;
+	}
+}
+
+/* MUL64_Table.
+ * Returns V * P, with T prepared by MUL64_TableInit for P.
+ */
+static u64 MUL64_Table(u64 V, const u64 T[16])
+{
+	u64 Z = 0;
+	int i;
+	
+	for (i=60; i>=0; i-=4)
+		Z = (Z << 4) ^ MUL64_R4[Z >> 60] ^ T[(V >> i) & 0xF];
+	return Z;
+}
+
+#if (defined(__GNUC__) || defined(__clang__)) && (defined(__x86_64__) || defined(__i386__))
+#	define SNOW3G_WITH_CLMUL
+#	include <wmmintrin.h>
+
+/* MUL64_Clmul.
+ * Returns V * P, using the PCLMULQDQ instruction: must only be called when
+ * the CPU supports it.
+ */
+__attribute__((target("pclmul,sse2")))
+static u64 MUL64_Clmul(u64 V, u64 P)
+{
+	u64 res;
+	__m128i c = _mm_set_epi64x(0, 0x1b);
+	/* 128-bit product H * x^64 + L */
+	__m128i r = _mm_clmulepi64_si128(_mm_set_epi64x(0, V), _mm_set_epi64x(0, P), 0x00);
+	/* H * c, of degree < 68 */
+	__m128i h = _mm_clmulepi64_si128(r, c, 0x01);
+	/* the 4 upper bits of H * c, times c, of degree < 8 */
+	__m128i h2 = _mm_clmulepi64_si128(h, c, 0x01);
+	_mm_storel_epi64((__m128i *)&res, _mm_xor_si128(_mm_xor_si128(r, h), h2));
+	return res;
+}
+
+static int MUL64_HasClmul(void)
+{
+	__builtin_cpu_init();
+	return __builtin_cpu_supports("pclmul");
+}
+#endif
+
+/* engine used by f9(), set with SNOW3G_f9_set_engine() */
+static int SNOW3G_f9_engine = SNOW3G_F9_ENGINE_TABLE;
+
+EXPORTIT int SNOW3G_f9_engine_available(int engine)
+{
+	switch (engine)
+	{
+		case SNOW3G_F9_ENGINE_REF:
+		case SNOW3G_F9_ENGINE_TABLE:
+			return 1;
+#ifdef SNOW3G_WITH_CLMUL
+		case SNOW3G_F9_ENGINE_CLMUL:
+			return MUL64_HasClmul();
+#endif
+		default:
+			return 0;
+	}
+}
+
+EXPORTIT int SNOW3G_f9_set_engine(int engine)
+{
+	if (!SNOW3G_f9_engine_available(engine))
+		return -1;
+	SNOW3G_f9_engine = engine;
+	return 0;
+}
+
+EXPORTIT int SNOW3G_f9_get_engine(void)
+{
+	return SNOW3G_f9_engine;
+}
+
+EXPORTIT int SNOW3G_f9_best_engine(void)
+{
+	if (SNOW3G_f9_engine_available(SNOW3G_F9_ENGINE_CLMUL))
+		return SNOW3G_F9_ENGINE_CLMUL;
+	else
+		return SNOW3G_F9_ENGINE_TABLE;
+}
+
+/* MUL64_Engine.
+ * Returns V * P with the given engine, T being prepared by MUL64_TableInit
+ * for P when the table engine is used.
+ */
+static u64 MUL64_Engine(int engine, u64 V, u64 P, const u64 T[16])
+{
+	switch (engine)
+	{
+#ifdef SNOW3G_WITH_CLMUL
+		case SNOW3G_F9_ENGINE_CLMUL:
+			return MUL64_Clmul(V, P);
+#endif
+		case SNOW3G_F9_ENGINE_TABLE:
+			return MUL64_Table(V, T);
+		default:
+			return MUL64(V, P, 0x1b);
+	}
+}
+
 /* mask8bit.
  * Input n: an integer in 1-7.
  * Output : an 8 bit mask.
@@ -508,23 +675,24 @@ u8 mask8bit(int n)
  * Input dir:1 bit, direction of transmission (in the LSB).
  * Input data: length number of bits, input bit stream.
  * Input length: 64 bit Length, i.e., the number of bits to be MAC'd.
- * Output  : 32 bit block used as MAC 
+ * Output MAC_I: 32 bit block used as MAC 
  * Generates 32-bit MAC using UIA2 algorithm as defined in Section 4.
  */
-u8* f9( u8* key, u32 count, u32 fresh, u32 dir, u8 *data, u64 length)
+EXPORTIT void SNOW3G_f9( u8* key, u32 count, u32 fresh, u32 dir, u8 *data, u64 length, u8 *MAC_I,
+                         int engine)
 {
+	SNOW3G_State st;
 	u32 K[4],IV[4], z[5];
 	u32 i=0;
-	static u8 MAC_I[4] = {0,0,0,0}; /* static memory for the result */
 	u64 D;
     u64 EVAL;
 	u64 V;
 	u64 P;
 	u64 Q;
-	u64 c;
 	
 	u64 M_D_2;
 	int rem_bits = 0;
+	u64 TP[16], TQ[16];
 	
 	/* Load the Integrity Key for SNOW3G initialization as in section 4.4. */
 	for (i=0; i<4; i++)
@@ -541,54 +709,64 @@ u8* f9( u8* key, u32 count, u32 fresh, u32 dir, u8 *data, u64 length)
 	z[0] = z[1] = z[2] = z[3] = z[4] = 0;
 	
 	/* Run SNOW 3G to produce 5 keystream words z_1, z_2, z_3, z_4 and z_5. */
-	Initialize(K, IV);
-	GenerateKeystream(5, z);
+	SNOW3G_Fast_Initialize(&st, K, IV);
+	SNOW3G_Fast_GenerateKeystream(&st, 5, z);
 	
 	P = (u64)z[0] << 32 | (u64)z[1];
 	Q = (u64)z[2] << 32 | (u64)z[3];
 	
+	if (engine == SNOW3G_F9_ENGINE_TABLE)
+	{
+		MUL64_TableInit(TP, P);
+		MUL64_TableInit(TQ, Q);
+	}
+	
 	/* Calculation */
 	if ((length % 64) == 0)
 		D = (length>>6) + 1;
 	else
 		D = (length>>6) + 2;
 	EVAL = 0;
-	c = 0x1b;
 	
-	/* for 0 <= i <= D-3 */
-	for (i=0; i<D-2; i++)
+	/* for 0 <= i <= D-3 
+	   (written i+2<D, as D-2 underflows when length is 0) */
+	for (i=0; i+2<D; i++)
 	{
 		V = EVAL ^ ( (u64)data[8*i  ]<<56 | (u64)data[8*i+1]<<48 | 
 				     (u64)data[8*i+2]<<40 | (u64)data[8*i+3]<<32 | 
                      (u64)data[8*i+4]<<24 | (u64)data[8*i+5]<<16 | 
 				     (u64)data[8*i+6]<< 8 | (u64)data[8*i+7] )   ;
-		EVAL = MUL64(V,P,c);
+		EVAL = MUL64_Engine(engine,V,P,TP);
 	}
 	
-	/* for D-2 */
-	rem_bits = length % 64;
-	if (rem_bits == 0)
-		rem_bits = 64;
-	
-	M_D_2 = 0;
-	i = 0;
-	while (rem_bits > 7)
+	/* for D-2: there is no message block when length is 0,
+	   this is a modification to the reference C code */
+	if (length > 0)
 	{
-		M_D_2 |= (u64)data[8*(D-2)+i] << (8*(7-i));
-		rem_bits -= 8;
-		i++;
+		rem_bits = length % 64;
+		if (rem_bits == 0)
+			rem_bits = 64;
+		
+		M_D_2 = 0;
+		i = 0;
+		while (rem_bits > 7)
+		{
+			M_D_2 |= (u64)data[8*(D-2)+i] << (8*(7-i));
+			rem_bits -= 8;
+			i++;
+		}
+		if (rem_bits > 0)
+			M_D_2 |= (u64)(data[8*(D-2)+i] & mask8bit(rem_bits)) << (8*(7-i));
+		
+		V = EVAL ^ M_D_2;
+		EVAL = MUL64_Engine(engine,V,P,TP);
 	}
-	if (rem_bits > 0)
-		M_D_2 |= (u64)(data[8*(D-2)+i] & mask8bit(rem_bits)) << (8*(7-i));
-	
-	V = EVAL ^ M_D_2;
-	EVAL = MUL64(V,P,c);
 	
 	/* for D-1 */
 	EVAL ^= length;
 	
 	/* Multiply by Q */
-	EVAL = MUL64(EVAL,Q,c);
+	EVAL = MUL64_Engine(engine,EVAL,Q,TQ);
 	
 	/* XOR with z_5: this is a modification to the reference C code, 
 	   which forgot to XOR z[5] */
@@ -597,7 +775,112 @@ u8* f9( u8* key, u32 count, u32 fresh, u32 dir, u8 *data, u64 length)
 		MAC_I[i] = (mac32 >> (8*(3-i))) & 0xff;
 		*/
 		MAC_I[i] = ((EVAL >> (56-(i*8))) ^ (z[4] >> (24-(i*8)))) & 0xff;
+}
+
+/* SNOW3G_f9_Init, SNOW3G_f9_Update, SNOW3G_f9_Final.
+ * Same computation as SNOW3G_f9, over a message provided by successive parts.
+ */
+static u64 load64(const u8 *b)
+{
+	return (u64)b[0]<<56 | (u64)b[1]<<48 | (u64)b[2]<<40 | (u64)b[3]<<32 |
+	       (u64)b[4]<<24 | (u64)b[5]<<16 | (u64)b[6]<< 8 | (u64)b[7];
+}
+
+EXPORTIT void SNOW3G_f9_Init( SNOW3G_f9_State* st, u8* key, u32 count, u32 fresh, u32 dir,
+                              int engine)
+{
+	SNOW3G_State gen;
+	u32 K[4], IV[4], z[5];
+	u32 i;
+	
+	for (i=0; i<4; i++)
+		K[3-i] = (key[4*i] << 24) ^ (key[4*i+1] << 16) ^
+				 (key[4*i+2] << 8) ^ (key[4*i+3]);
+	IV[3] = count;
+	IV[2] = fresh;
+	IV[1] = count ^ ( dir << 31 ) ;
+	IV[0] = fresh ^ (dir << 15);
+	
+	SNOW3G_Fast_Initialize(&gen, K, IV);
+	SNOW3G_Fast_GenerateKeystream(&gen, 5, z);
+	
+	st->P = (u64)z[0] << 32 | (u64)z[1];
+	st->Q = (u64)z[2] << 32 | (u64)z[3];
+	st->z5 = z[4];
+	st->engine = engine;
+	if (st->engine == SNOW3G_F9_ENGINE_TABLE)
+	{
+		MUL64_TableInit(st->TP, st->P);
+		MUL64_TableInit(st->TQ, st->Q);
+	}
+	st->EVAL = 0;
+	st->nbytes = 0;
+	st->nbuf = 0;
+}
+
+EXPORTIT void SNOW3G_f9_Update( SNOW3G_f9_State* st, const u8 *data, u64 len)
+{
+	u64 n;
+	
+	while (len > 0)
+	{
+		if (st->nbuf == 8)
+		{
+			/* the pending block is followed by more data */
+			st->EVAL = MUL64_Engine(st->engine, st->EVAL ^ load64(st->buf), st->P, st->TP);
+			st->nbuf = 0;
+		}
+		if (st->nbuf == 0)
+		{
+			/* whole blocks followed by more data, processed in place */
+			for (; len > 8; data += 8, len -= 8, st->nbytes += 8)
+				st->EVAL = MUL64_Engine(st->engine, st->EVAL ^ load64(data), st->P, st->TP);
+		}
+		n = 8 - st->nbuf;
+		if (n > len)
+			n = len;
+		memcpy(st->buf + st->nbuf, data, n);
+		st->nbuf += (u32)n;
+		st->nbytes += n;
+		data += n;
+		len -= n;
+	}
+}
+
+EXPORTIT int SNOW3G_f9_Final( const SNOW3G_f9_State* st, u64 length, u8 *MAC_I)
+{
+	u64 EVAL = st->EVAL;
+	u64 M = 0;
+	u32 i, rem_bits;
+	
+	if ((length > 8*st->nbytes) || (st->nbytes > 0 && length <= 8*(st->nbytes-1)))
+		return -1;
+	
+	/* last message block, from the pending one */
+	if (length > 0)
+	{
+		rem_bits = (u32)(length - 8*(st->nbytes - st->nbuf));
+		for (i=0; 8*i<rem_bits; i++)
+			M |= (u64)st->buf[i] << (56-8*i);
+		if (rem_bits < 64)
+			M &= ~(u64)0 << (64-rem_bits);
+		EVAL = MUL64_Engine(st->engine, EVAL ^ M, st->P, st->TP);
+	}
 	
+	EVAL ^= length;
+	EVAL = MUL64_Engine(st->engine, EVAL, st->Q, st->TQ);
+	for (i=0; i<4; i++)
+		MAC_I[i] = ((EVAL >> (56-(i*8))) ^ (st->z5 >> (24-(i*8)))) & 0xff;
+	return 0;
+}
+
+/* f9.
+ * Same as SNOW3G_f9, but returning the MAC in a static buffer: not thread-safe.
+ */
+EXPORTIT u8* f9( u8* key, u32 count, u32 fresh, u32 dir, u8 *data, u64 length)
+{
+	static u8 MAC_I[4] = {0,0,0,0}; /* static memory for the result */
+	SNOW3G_f9(key, count, fresh, dir, data, length, MAC_I, SNOW3G_f9_engine);
 	return MAC_I;
 }
 
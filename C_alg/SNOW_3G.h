@@ -33,7 +33,18 @@ typedef unsigned char u8;
 typedef unsigned int u32;
 typedef unsigned long long u64;
 
+/* SNOW 3G generator state: the LFSR and FSM registers.
+ * Each SNOW3G_State can be used independently of the others.
+ */
+
+typedef struct {
+	u32 LFSR_S0, LFSR_S1, LFSR_S2, LFSR_S3, LFSR_S4, LFSR_S5, LFSR_S6, LFSR_S7;
+	u32 LFSR_S8, LFSR_S9, LFSR_S10, LFSR_S11, LFSR_S12, LFSR_S13, LFSR_S14, LFSR_S15;
+	u32 FSM_R1, FSM_R2, FSM_R3;
+} SNOW3G_State;
+
 /* Initialization.
+ * Reference API, working on a single global state: not thread-safe.
  * Input k[4]: Four 32-bit words making up 128-bit key.
  * Input IV[4]: Four 32-bit words making 128-bit initialization variable.
  * Output: All the LFSRs and FSM are initialized for key generation.
@@ -43,6 +54,7 @@ typedef unsigned long long u64;
 EXPORTIT void Initialize(u32 k[4], u32 IV[4]);
 
 /* Generation of Keystream.
+ * Reference API, working on a single global state: not thread-safe.
  * input n: number of 32-bit words of keystream.
  * input z: space for the generated keystream, assumes
  * memory is allocated already.
@@ -52,6 +64,35 @@ EXPORTIT void Initialize(u32 k[4], u32 IV[4]);
 
 EXPORTIT void GenerateKeystream(u32 n, u32 *z);
 
+/* SNOW3G_Initialize.
+ * Input st: the generator state to be initialized.
+ * Input k[4]: Four 32-bit words making up 128-bit key.
+ * Input IV[4]: Four 32-bit words making 128-bit initialization variable.
+ * Output: the state is initialized and ready to produce the first keystream
+ * word (the discarded clocking of section 4.2 is done here).
+ */
+
+EXPORTIT void SNOW3G_Initialize(SNOW3G_State* st, u32 k[4], u32 IV[4]);
+
+/* SNOW3G_GenerateKeystream.
+ * Input st: an initialized generator state.
+ * input n: number of 32-bit words of keystream.
+ * input z: space for the generated keystream, assumes
+ * memory is allocated already.
+ * Successive calls on the same state continue the keystream.
+ */
+
+EXPORTIT void SNOW3G_GenerateKeystream(SNOW3G_State* st, u32 n, u32 *z);
+
+/* SNOW3G_Fast_Initialize, SNOW3G_Fast_GenerateKeystream.
+ * Same as SNOW3G_Initialize and SNOW3G_GenerateKeystream, with the table-driven
+ * core of SNOW_3G_fast.c, which is used by f8 and f9.
+ */
+
+EXPORTIT void SNOW3G_Fast_Initialize(SNOW3G_State* st, u32 k[4], u32 IV[4]);
+
+EXPORTIT void SNOW3G_Fast_GenerateKeystream(SNOW3G_State* st, u32 n, u32 *z);
+
 /* f8.
  * Input key: 128 bit Confidentiality Key.
  * Input count:32-bit Count, Frame dependent input.
@@ -76,9 +117,70 @@ EXPORTIT void f8( u8 *key, u32 count, u32 bearer, u32 dir, \
  * Input dir:1 bit, direction of transmission (in the LSB).
  * Input data: length number of bits, input bit stream.
  * Input length: 64 bit Length, i.e., the number of bits to be MAC'd.
- * Output : 32 bit block used as MAC
+ * Output : 32 bit block used as MAC, in a static buffer (not thread-safe)
  * Generates 32-bit MAC using UIA2 algorithm as defined in Section 4.
  */
 
 EXPORTIT u8* f9( u8* key, u32 count, u32 fresh, u32 dir, \
                  u8 *data, u64 length);
+
+/* SNOW3G_f9.
+ * Same as f9, with the 32 bit MAC written into the 4 bytes MAC_I buffer
+ * provided by the caller, and the GF(2^64) multiplications done with the given
+ * engine (see below).
+ */
+
+EXPORTIT void SNOW3G_f9( u8* key, u32 count, u32 fresh, u32 dir, \
+                         u8 *data, u64 length, u8 *MAC_I, int engine);
+
+/* GF(2^64) multiplication engines used by f9 / SNOW3G_f9:
+ * - SNOW3G_F9_ENGINE_REF: reference bit by bit multiplication
+ * - SNOW3G_F9_ENGINE_TABLE: 4 bits at a time with precomputed tables, portable
+ * - SNOW3G_F9_ENGINE_CLMUL: x86 carry-less multiplication instruction
+ * SNOW3G_f9 and SNOW3G_f9_Init take the engine as argument. f9 uses the one set
+ * with SNOW3G_f9_set_engine(), the TABLE one by default: it is a global setting,
+ * which must not be changed while other threads call f9.
+ * SNOW3G_f9_best_engine() returns the CLMUL engine when available, the TABLE
+ * one otherwise.
+ */
+
+#define SNOW3G_F9_ENGINE_REF	0
+#define SNOW3G_F9_ENGINE_TABLE	1
+#define SNOW3G_F9_ENGINE_CLMUL	2
+
+/* returns 1 if the engine is supported by the build and the CPU, 0 otherwise */
+EXPORTIT int SNOW3G_f9_engine_available(int engine);
+
+/* returns 0 if the engine is selected, -1 if it is not available */
+EXPORTIT int SNOW3G_f9_set_engine(int engine);
+
+EXPORTIT int SNOW3G_f9_get_engine(void);
+
+EXPORTIT int SNOW3G_f9_best_engine(void);
+
+/* SNOW3G_f9_Init, SNOW3G_f9_Update, SNOW3G_f9_Final.
+ * Incremental f9: the message is provided by bytes over successive
+ * SNOW3G_f9_Update() calls, the last block being kept until more data is 
+ * provided. SNOW3G_f9_Final() then writes the MAC of the message of length bits
+ * into MAC_I, without modifying the state: only the last bits of the last byte
+ * provided can be left out by length. It returns 0 on success, -1 on invalid 
+ * length.
+ * The GF(2^64) multiplication engine is the one given to SNOW3G_f9_Init().
+ */
+
+typedef struct {
+	u64 P, Q, EVAL;
+	u64 TP[16], TQ[16];
+	u32 z5;
+	int engine;
+	u64 nbytes;	/* number of bytes provided */
+	u8 buf[8];	/* last block provided, not processed yet */
+	u32 nbuf;
+} SNOW3G_f9_State;
+
+EXPORTIT void SNOW3G_f9_Init( SNOW3G_f9_State* st, u8* key, u32 count, u32 fresh, u32 dir, \
+                              int engine);
+
+EXPORTIT void SNOW3G_f9_Update( SNOW3G_f9_State* st, const u8 *data, u64 len);
+
+EXPORTIT int SNOW3G_f9_Final( const SNOW3G_f9_State* st, u64 length, u8 *MAC_I);
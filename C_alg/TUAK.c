@@ -0,0 +1,142 @@
+/* -----------------------------------------------------------------------
+ * TUAK functions, as specified in 3GPP TS 35.231, section 6, built over the
+ * unrolled Keccak core function of KeccakP-1600-fast.c
+ *-----------------------------------------------------------------------*/
+
+/*------------------------------------------------------------------------
+ * TUAK.c
+ *------------------------------------------------------------------------*/
+
+#include <string.h>
+#include "KeccakP-1600-3gpp.h"
+#include "TUAK.h"
+
+/* copy n bytes from in, reversed, into out */
+static void push_rev(uint8_t *out, const uint8_t *in, int n)
+{
+    int i;
+    for (i=0; i<n; i++)
+        out[i] = in[n-1-i];
+}
+
+/* INOUT state assembly:
+ * [0:32]    TOP or TOPc
+ * [32]      INSTANCE
+ * [33:40]   ALGONAME
+ * [40:56]   RAND (or zeros for TOPc)
+ * [56:58]   AMF (or zeros)
+ * [58:64]   SQN (or zeros)
+ * [64:96]   K (zero-padded if 16 bytes)
+ * [96:136]  padding 0x1f ... 0x80
+ * [136:200] zeros
+ * each field being reversed
+ */
+static void TUAK_Load(uint8_t INOUT[200], const uint8_t TOP[32], uint8_t INSTANCE,
+                      const uint8_t ALGONAME[7], const uint8_t *RAND, const uint8_t *SQN,
+                      const uint8_t *AMF, const uint8_t *K, int klen)
+{
+    memset(INOUT, 0, 200);
+    push_rev(INOUT, TOP, 32);
+    INOUT[32] = INSTANCE;
+    push_rev(INOUT+33, ALGONAME, 7);
+    if (RAND)
+        push_rev(INOUT+40, RAND, 16);
+    if (AMF)
+        push_rev(INOUT+56, AMF, 2);
+    if (SQN)
+        push_rev(INOUT+58, SQN, 6);
+    push_rev(INOUT+64, K, klen);
+    INOUT[96]  = 0x1f;
+    INOUT[135] = 0x80;
+}
+
+/* run the Keccak permutation iterations times over INOUT */
+static void TUAK_Permute(uint8_t INOUT[200], int iterations)
+{
+    Keccak_f_64_many(INOUT, 1, iterations);
+}
+
+int TUAK_TOPc(const uint8_t *K, int klen, const uint8_t TOP[32],
+              const uint8_t ALGONAME[7], int iterations, uint8_t TOPc[32])
+{
+    uint8_t INOUT[200];
+    if (klen != 16 && klen != 32)
+        return -1;
+    TUAK_Load(INOUT, TOP, (klen == 32) ? 0x01 : 0x00, ALGONAME, 0, 0, 0, K, klen);
+    TUAK_Permute(INOUT, iterations);
+    push_rev(TOPc, INOUT, 32);
+    return 0;
+}
+
+int TUAK_f1(const uint8_t *K, int klen, const uint8_t TOPc[32],
+            const uint8_t RAND[16], const uint8_t SQN[6], const uint8_t AMF[2],
+            const uint8_t ALGONAME[7], int iterations, int len_mac, int star,
+            uint8_t *MAC)
+{
+    uint8_t INOUT[200];
+    uint8_t INSTANCE;
+    switch (len_mac) {
+        case 64:  INSTANCE = 0x08; break;
+        case 128: INSTANCE = 0x10; break;
+        case 256: INSTANCE = 0x20; break;
+        default:  return -1;
+    }
+    if (klen == 32)
+        INSTANCE += 1;
+    else if (klen != 16)
+        return -1;
+    if (star)
+        INSTANCE += 0x80;
+    TUAK_Load(INOUT, TOPc, INSTANCE, ALGONAME, RAND, SQN, AMF, K, klen);
+    TUAK_Permute(INOUT, iterations);
+    push_rev(MAC, INOUT, len_mac>>3);
+    return 0;
+}
+
+int TUAK_f2345(const uint8_t *K, int klen, const uint8_t TOPc[32],
+               const uint8_t RAND[16], const uint8_t ALGONAME[7], int iterations,
+               int len_res, int len_ck, int len_ik,
+               uint8_t *RES, uint8_t *CK, uint8_t *IK, uint8_t AK[6])
+{
+    uint8_t INOUT[200];
+    uint8_t INSTANCE;
+    switch (len_res) {
+        case 32:  INSTANCE = 0x40; break;
+        case 64:  INSTANCE = 0x48; break;
+        case 128: INSTANCE = 0x50; break;
+        case 256: INSTANCE = 0x60; break;
+        default:  return -1;
+    }
+    if (len_ck == 256)
+        INSTANCE += 4;
+    else if (len_ck != 128)
+        return -1;
+    if (len_ik == 256)
+        INSTANCE += 2;
+    else if (len_ik != 128)
+        return -1;
+    if (klen == 32)
+        INSTANCE += 1;
+    else if (klen != 16)
+        return -1;
+    TUAK_Load(INOUT, TOPc, INSTANCE, ALGONAME, RAND, 0, 0, K, klen);
+    TUAK_Permute(INOUT, iterations);
+    push_rev(RES, INOUT, len_res>>3);
+    push_rev(CK, INOUT+32, len_ck>>3);
+    push_rev(IK, INOUT+64, len_ik>>3);
+    push_rev(AK, INOUT+96, 6);
+    return 0;
+}
+
+int TUAK_f5star(const uint8_t *K, int klen, const uint8_t TOPc[32],
+                const uint8_t RAND[16], const uint8_t ALGONAME[7], int iterations,
+                uint8_t AK[6])
+{
+    uint8_t INOUT[200];
+    if (klen != 16 && klen != 32)
+        return -1;
+    TUAK_Load(INOUT, TOPc, (klen == 32) ? 0xc1 : 0xc0, ALGONAME, RAND, 0, 0, K, klen);
+    TUAK_Permute(INOUT, iterations);
+    push_rev(AK, INOUT+96, 6);
+    return 0;
+}
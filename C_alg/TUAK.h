@@ -0,0 +1,49 @@
+/* -----------------------------------------------------------------------
+ * TUAK functions, as specified in 3GPP TS 35.231, section 6, built over the
+ * unrolled Keccak core function of KeccakP-1600-fast.c
+ * the whole INOUT state assembly, Keccak iterations and output extraction
+ * are done natively
+ *-----------------------------------------------------------------------*/
+
+/* this is the trick to make the code cross-platform
+ * at least, Win32 / Linux */
+
+#if defined(_WIN32) || defined(__WIN32__)
+#	include <windows.h>
+#	define EXPORTIT __declspec(dllexport)
+#else
+#	define EXPORTIT
+#endif
+
+#include <stdint.h>
+
+/*------------------------------------------------------------------------
+ * TUAK.h
+ *------------------------------------------------------------------------*/
+
+/* all byte buffers are in the 3GPP TS 35.231 order (i.e. not reversed)
+ * klen is the length of K in bytes: 16 or 32
+ * ALGONAME is 7 bytes long
+ * lengths of outputs are in bits, as the TUAK operator settings:
+ * len_mac: 64, 128 or 256
+ * len_res: 32, 64, 128 or 256
+ * len_ck, len_ik: 128 or 256
+ * functions return 0 on success, -1 on invalid lengths
+ */
+
+EXPORTIT int TUAK_TOPc(const uint8_t *K, int klen, const uint8_t TOP[32],
+                       const uint8_t ALGONAME[7], int iterations, uint8_t TOPc[32]);
+
+EXPORTIT int TUAK_f1(const uint8_t *K, int klen, const uint8_t TOPc[32],
+                     const uint8_t RAND[16], const uint8_t SQN[6], const uint8_t AMF[2],
+                     const uint8_t ALGONAME[7], int iterations, int len_mac, int star,
+                     uint8_t *MAC);
+
+EXPORTIT int TUAK_f2345(const uint8_t *K, int klen, const uint8_t TOPc[32],
+                        const uint8_t RAND[16], const uint8_t ALGONAME[7], int iterations,
+                        int len_res, int len_ck, int len_ik,
+                        uint8_t *RES, uint8_t *CK, uint8_t *IK, uint8_t AK[6]);
+
+EXPORTIT int TUAK_f5star(const uint8_t *K, int klen, const uint8_t TOPc[32],
+                         const uint8_t RAND[16], const uint8_t ALGONAME[7], int iterations,
+                         uint8_t AK[6]);
@@ -15,39 +15,16 @@
  * ZUC / EEA3 / EIA3 : LTE security algorithm
  *--------------------------------------------*/
 
+#include <string.h>
 #include "ZUC.h"
 
 /*--------------------------------------------
  * ZUC keystream generator algorithm
  *------------------------------------------*/
 
-/* the state registers of LFSR */ 
-u32 LFSR_S0;
-u32 LFSR_S1;
-u32 LFSR_S2;
-u32 LFSR_S3;
-u32 LFSR_S4;
-u32 LFSR_S5;
-u32 LFSR_S6;
-u32 LFSR_S7;
-u32 LFSR_S8;
-u32 LFSR_S9;
-u32 LFSR_S10;
-u32 LFSR_S11;
-u32 LFSR_S12;
-u32 LFSR_S13;
-u32 LFSR_S14;
-u32 LFSR_S15;
-
-/* the registers of F */
-u32 F_R1;
-u32 F_R2;
-
-/* the outputs of BitReorganization */
-u32 BRC_X0;
-u32 BRC_X1;
-u32 BRC_X2;
-u32 BRC_X3;
+/* the state of the generator is held in a ZUC_State structure (see ZUC.h),
+ * the global one being only used by Initialization() and GenerateKeystream() */
+static ZUC_State ZUC_global;
 
 /* the s-boxes */ 
 u8 S0[256] = {
@@ -105,86 +82,86 @@ u32 AddM(u32 a, u32 b)
 
 #define MulByPow2(x, k) ((((x) << k) | ((x) >> (31 - k))) & 0x7FFFFFFF)
 
-void LFSRWithInitialisationMode(u32 u)
+static void LFSRWithInitialisationMode(ZUC_State* st, u32 u)
 {
 	u32 f, v;
-	f = LFSR_S0;
+	f = st->LFSR_S0;
 	
-	v = MulByPow2(LFSR_S0, 8);
+	v = MulByPow2(st->LFSR_S0, 8);
 	f = AddM(f, v);
-	v = MulByPow2(LFSR_S4, 20);
+	v = MulByPow2(st->LFSR_S4, 20);
 	f = AddM(f, v);
-	v = MulByPow2(LFSR_S10, 21);
+	v = MulByPow2(st->LFSR_S10, 21);
 	f = AddM(f, v);
-	v = MulByPow2(LFSR_S13, 17);
+	v = MulByPow2(st->LFSR_S13, 17);
 	f = AddM(f, v);
-	v = MulByPow2(LFSR_S15, 15);
+	v = MulByPow2(st->LFSR_S15, 15);
 	f = AddM(f, v);
 	
 	f = AddM(f, u);
 	
 	/* update the state */
-	LFSR_S0 = LFSR_S1;
-	LFSR_S1 = LFSR_S2;
-	LFSR_S2 = LFSR_S3;
-	LFSR_S3 = LFSR_S4;
-	LFSR_S4 = LFSR_S5;
-	LFSR_S5 = LFSR_S6;
-	LFSR_S6 = LFSR_S7;
-	LFSR_S7 = LFSR_S8;
-	LFSR_S8 = LFSR_S9;
-	LFSR_S9 = LFSR_S10;
-	LFSR_S10 = LFSR_S11;
-	LFSR_S11 = LFSR_S12;
-	LFSR_S12 = LFSR_S13;
-	LFSR_S13 = LFSR_S14;
-	LFSR_S14 = LFSR_S15;
-	LFSR_S15 = f;
+	st->LFSR_S0 = st->LFSR_S1;
+	st->LFSR_S1 = st->LFSR_S2;
+	st->LFSR_S2 = st->LFSR_S3;
+	st->LFSR_S3 = st->LFSR_S4;
+	st->LFSR_S4 = st->LFSR_S5;
+	st->LFSR_S5 = st->LFSR_S6;
+	st->LFSR_S6 = st->LFSR_S7;
+	st->LFSR_S7 = st->LFSR_S8;
+	st->LFSR_S8 = st->LFSR_S9;
+	st->LFSR_S9 = st->LFSR_S10;
+	st->LFSR_S10 = st->LFSR_S11;
+	st->LFSR_S11 = st->LFSR_S12;
+	st->LFSR_S12 = st->LFSR_S13;
+	st->LFSR_S13 = st->LFSR_S14;
+	st->LFSR_S14 = st->LFSR_S15;
+	st->LFSR_S15 = f;
 }
 
 /* LFSR with work mode */
-void LFSRWithWorkMode(void)
+static void LFSRWithWorkMode(ZUC_State* st)
 {
 	u32 f, v;
-	f = LFSR_S0;
+	f = st->LFSR_S0;
 	
-	v = MulByPow2(LFSR_S0, 8);
+	v = MulByPow2(st->LFSR_S0, 8);
 	f = AddM(f, v);
-	v = MulByPow2(LFSR_S4, 20);
+	v = MulByPow2(st->LFSR_S4, 20);
 	f = AddM(f, v);
-	v = MulByPow2(LFSR_S10, 21);
+	v = MulByPow2(st->LFSR_S10, 21);
 	f = AddM(f, v);
-	v = MulByPow2(LFSR_S13, 17);
+	v = MulByPow2(st->LFSR_S13, 17);
 	f = AddM(f, v);
-	v = MulByPow2(LFSR_S15, 15);
+	v = MulByPow2(st->LFSR_S15, 15);
 	f = AddM(f, v);
 	
 	/* update the state */
-	LFSR_S0 = LFSR_S1;
-	LFSR_S1 = LFSR_S2;
-	LFSR_S2 = LFSR_S3;
-	LFSR_S3 = LFSR_S4;
-	LFSR_S4 = LFSR_S5;
-	LFSR_S5 = LFSR_S6;
-	LFSR_S6 = LFSR_S7;
-	LFSR_S7 = LFSR_S8;
-	LFSR_S8 = LFSR_S9;
-	LFSR_S9 = LFSR_S10;
-	LFSR_S10 = LFSR_S11;
-	LFSR_S11 = LFSR_S12;
-	LFSR_S12 = LFSR_S13;
-	LFSR_S13 = LFSR_S14;
-	LFSR_S14 = LFSR_S15;
-	LFSR_S15 = f;
+	st->LFSR_S0 = st->LFSR_S1;
+	st->LFSR_S1 = st->LFSR_S2;
+	st->LFSR_S2 = st->LFSR_S3;
+	st->LFSR_S3 = st->LFSR_S4;
+	st->LFSR_S4 = st->LFSR_S5;
+	st->LFSR_S5 = st->LFSR_S6;
+	st->LFSR_S6 = st->LFSR_S7;
+	st->LFSR_S7 = st->LFSR_S8;
+	st->LFSR_S8 = st->LFSR_S9;
+	st->LFSR_S9 = st->LFSR_S10;
+	st->LFSR_S10 = st->LFSR_S11;
+	st->LFSR_S11 = st->LFSR_S12;
+	st->LFSR_S12 = st->LFSR_S13;
+	st->LFSR_S13 = st->LFSR_S14;
+	st->LFSR_S14 = st->LFSR_S15;
+	st->LFSR_S15 = f;
 }
 
 /* BitReorganization */
-void BitReorganization(void)
+static void BitReorganization(ZUC_State* st)
 {
-	BRC_X0 = ((LFSR_S15 & 0x7FFF8000) << 1) | (LFSR_S14 & 0xFFFF);
-	BRC_X1 = ((LFSR_S11 & 0xFFFF) << 16) | (LFSR_S9 >> 15);
-	BRC_X2 = ((LFSR_S7 & 0xFFFF) << 16) | (LFSR_S5 >> 15);
-	BRC_X3 = ((LFSR_S2 & 0xFFFF) << 16) | (LFSR_S0 >> 15);
+	st->BRC_X0 = ((st->LFSR_S15 & 0x7FFF8000) << 1) | (st->LFSR_S14 & 0xFFFF);
+	st->BRC_X1 = ((st->LFSR_S11 & 0xFFFF) << 16) | (st->LFSR_S9 >> 15);
+	st->BRC_X2 = ((st->LFSR_S7 & 0xFFFF) << 16) | (st->LFSR_S5 >> 15);
+	st->BRC_X3 = ((st->LFSR_S2 & 0xFFFF) << 16) | (st->LFSR_S0 >> 15);
 }
 
 #define ROT(a, k) (((a) << k) | ((a) >> (32 - k)))
@@ -204,20 +181,20 @@ u32 L2(u32 X)
 #define MAKEU32(a, b, c, d) (((u32)(a) << 24) | ((u32)(b) << 16) | ((u32)(c) << 8) | ((u32)(d)))
 
 /* F */
-u32 F(void)
+static u32 F(ZUC_State* st)
 {
 	u32 W, W1, W2, u, v;
 	
-	W  = (BRC_X0 ^ F_R1) + F_R2;
-	W1 = F_R1 + BRC_X1;
-	W2 = F_R2 ^ BRC_X2;
+	W  = (st->BRC_X0 ^ st->F_R1) + st->F_R2;
+	W1 = st->F_R1 + st->BRC_X1;
+	W2 = st->F_R2 ^ st->BRC_X2;
 	
 	u = L1((W1 << 16) | (W2 >> 16));
 	v = L2((W2 << 16) | (W1 >> 16));
 	
-	F_R1 = MAKEU32(S0[u >> 24], S1[(u >> 16) & 0xFF],
+	st->F_R1 = MAKEU32(S0[u >> 24], S1[(u >> 16) & 0xFF],
 	S0[(u >> 8) & 0xFF], S1[u & 0xFF]);
-	F_R2 = MAKEU32(S0[v >> 24], S1[(v >> 16) & 0xFF],
+	st->F_R2 = MAKEU32(S0[v >> 24], S1[(v >> 16) & 0xFF],
 	S0[(v >> 8) & 0xFF], S1[v & 0xFF]);
 	
 	return W;
@@ -226,63 +203,94 @@ u32 F(void)
 #define MAKEU31(a, b, c) (((u32)(a) << 23) | ((u32)(b) << 8) | (u32)(c))
 
 /* initialize */
-EXPORTIT void Initialization(u8* k, u8* iv)
+static void InitializationState(ZUC_State* st, u8* k, u8* iv)
 {
 	u32 w, nCount;
 
 	/* expand key */
-	LFSR_S0 = MAKEU31(k[0], EK_d[0], iv[0]);
-	LFSR_S1 = MAKEU31(k[1], EK_d[1], iv[1]);
-	LFSR_S2 = MAKEU31(k[2], EK_d[2], iv[2]);
-	LFSR_S3 = MAKEU31(k[3], EK_d[3], iv[3]);
-	LFSR_S4 = MAKEU31(k[4], EK_d[4], iv[4]);
-	LFSR_S5 = MAKEU31(k[5], EK_d[5], iv[5]);
-	LFSR_S6 = MAKEU31(k[6], EK_d[6], iv[6]);
-	LFSR_S7 = MAKEU31(k[7], EK_d[7], iv[7]);
-	LFSR_S8 = MAKEU31(k[8], EK_d[8], iv[8]);
-	LFSR_S9 = MAKEU31(k[9], EK_d[9], iv[9]);
-	LFSR_S10 = MAKEU31(k[10], EK_d[10], iv[10]);
-	LFSR_S11 = MAKEU31(k[11], EK_d[11], iv[11]);
-	LFSR_S12 = MAKEU31(k[12], EK_d[12], iv[12]);
-	LFSR_S13 = MAKEU31(k[13], EK_d[13], iv[13]);
-	LFSR_S14 = MAKEU31(k[14], EK_d[14], iv[14]);
-	LFSR_S15 = MAKEU31(k[15], EK_d[15], iv[15]);
+	st->LFSR_S0 = MAKEU31(k[0], EK_d[0], iv[0]);
+	st->LFSR_S1 = MAKEU31(k[1], EK_d[1], iv[1]);
+	st->LFSR_S2 = MAKEU31(k[2], EK_d[2], iv[2]);
+	st->LFSR_S3 = MAKEU31(k[3], EK_d[3], iv[3]);
+	st->LFSR_S4 = MAKEU31(k[4], EK_d[4], iv[4]);
+	st->LFSR_S5 = MAKEU31(k[5], EK_d[5], iv[5]);
+	st->LFSR_S6 = MAKEU31(k[6], EK_d[6], iv[6]);
+	st->LFSR_S7 = MAKEU31(k[7], EK_d[7], iv[7]);
+	st->LFSR_S8 = MAKEU31(k[8], EK_d[8], iv[8]);
+	st->LFSR_S9 = MAKEU31(k[9], EK_d[9], iv[9]);
+	st->LFSR_S10 = MAKEU31(k[10], EK_d[10], iv[10]);
+	st->LFSR_S11 = MAKEU31(k[11], EK_d[11], iv[11]);
+	st->LFSR_S12 = MAKEU31(k[12], EK_d[12], iv[12]);
+	st->LFSR_S13 = MAKEU31(k[13], EK_d[13], iv[13]);
+	st->LFSR_S14 = MAKEU31(k[14], EK_d[14], iv[14]);
+	st->LFSR_S15 = MAKEU31(k[15], EK_d[15], iv[15]);
 
 	/* set F_R1 and F_R2 to zero */
-	F_R1 = 0;
-	F_R2 = 0;
+	st->F_R1 = 0;
+	st->F_R2 = 0;
 	nCount = 32;
 	while (nCount > 0)
 	{
-		BitReorganization();
-		w = F();
-		LFSRWithInitialisationMode(w >> 1);
+		BitReorganization(st);
+		w = F(st);
+		LFSRWithInitialisationMode(st, w >> 1);
 		nCount --;
 	}
 }
 
-EXPORTIT void GenerateKeystream(u32* pKeystream, u32 KeystreamLen)
+/* first step of the working stage: the output of F is discarded */
+static void WorkModeStart(ZUC_State* st)
+{
+	BitReorganization(st);
+	F(st); 			/* discard the output of F */
+	LFSRWithWorkMode(st);
+}
+
+static void KeystreamState(ZUC_State* st, u32* pKeystream, u32 KeystreamLen)
 {
 	u32 i;
-	BitReorganization();
-	F(); 			/* discard the output of F */
-	LFSRWithWorkMode();
-	
 	for (i = 0; i < KeystreamLen; i ++)
 	{
-		BitReorganization();
-		pKeystream[i] = F() ^ BRC_X3;
-		LFSRWithWorkMode();
+		BitReorganization(st);
+		pKeystream[i] = F(st) ^ st->BRC_X3;
+		LFSRWithWorkMode(st);
 	}
 }
 
+/* reference API, working on the global state */
+EXPORTIT void Initialization(u8* k, u8* iv)
+{
+	InitializationState(&ZUC_global, k, iv);
+}
+
+EXPORTIT void GenerateKeystream(u32* pKeystream, u32 KeystreamLen)
+{
+	WorkModeStart(&ZUC_global);
+	KeystreamState(&ZUC_global, pKeystream, KeystreamLen);
+}
+
+/* reentrant API, working on a state provided by the caller */
+EXPORTIT void ZUC_Initialization(ZUC_State* st, u8* k, u8* iv)
+{
+	InitializationState(st, k, iv);
+	WorkModeStart(st);
+}
+
+EXPORTIT void ZUC_GenerateKeystream(ZUC_State* st, u32* pKeystream, u32 KeystreamLen)
+{
+	KeystreamState(st, pKeystream, KeystreamLen);
+}
+
 /* The ZUC algorithm, see ref. [3]*/
 void ZUC(u8* k, u8* iv, u32* ks, u32 len)
 {
+	/* local state, this is an addition to the C reference code, 
+	   which used the global one */
+	ZUC_State st;
 	/* The initialization of ZUC, see page 17 of ref. [3]*/
-	Initialization(k, iv);
+	ZUC_Initialization(&st, k, iv);
 	/*  The procedure of generating keystream of ZUC, see page 18 of ref. [3]*/
-	GenerateKeystream(ks, len);
+	ZUC_GenerateKeystream(&st, ks, len);
 }
 /* end of ZUC.c */
 
@@ -332,11 +340,71 @@ EXPORTIT void EEA3(u8* CK, u32 COUNT, u32 BEARER, u32 DIRECTION,
 	/* zero last bits of data in case its length is not word-aligned (32 bits)
 	   this is an addition to the C reference code, which did not handle it */
 	if (lastbits)
-        i--;
+	{
+		i--;
 		C[i] &= 0x100000000 - (u32)(1<<lastbits);
+	}
 	
 	free(z);
 }
+
+/*
+ * EEA3 working on bytes buffers, without allocation nor byte swapping,
+ * M and C can be the same buffer for in-place processing
+ * this is an addition to the C reference code
+ */
+EXPORTIT void EEA3_Bytes(u8* CK, u32 COUNT, u32 BEARER, u32 DIRECTION, 
+				         u32 LENGTH, u8* M, u8* C)
+{
+	ZUC_State st;
+	u32 z, i, j;
+	u32 nbytes = (LENGTH+7)/8;
+	u32 lastbits = (8-(LENGTH%8))%8;
+	u8 	IV[16];
+	
+	IV[0]	= (COUNT>>24) & 0xFF;
+	IV[1]	= (COUNT>>16) & 0xFF;
+	IV[2]	= (COUNT>>8)  & 0xFF;
+	IV[3]	=  COUNT      & 0xFF;
+	
+	IV[4]	= ((BEARER << 3) | ((DIRECTION&1)<<2)) & 0xFC;
+	IV[5]	= 0;
+	IV[6]	= 0;
+	IV[7]	= 0;
+	
+	IV[8]	= IV[0];
+	IV[9]	= IV[1];
+	IV[10]	= IV[2];
+	IV[11]	= IV[3];
+	
+	IV[12]	= IV[4];
+	IV[13]	= IV[5];
+	IV[14]	= IV[6];
+	IV[15]	= IV[7];
+	
+	ZUC_Initialization(&st, CK, IV);
+	
+	/* process whole keystream words */
+	for (i=0; i+4<=nbytes; i+=4)
+	{
+		ZUC_GenerateKeystream(&st, &z, 1);
+		C[i]   = M[i]   ^ (u8)(z >> 24);
+		C[i+1] = M[i+1] ^ (u8)(z >> 16);
+		C[i+2] = M[i+2] ^ (u8)(z >> 8);
+		C[i+3] = M[i+3] ^ (u8)z;
+	}
+	/* process the last bytes */
+	if (i < nbytes)
+	{
+		ZUC_GenerateKeystream(&st, &z, 1);
+		for (j=0; i<nbytes; i++, j++)
+			C[i] = M[i] ^ (u8)(z >> (24-8*j));
+	}
+	
+	/* zero last bits of data in case its length is not byte-aligned */
+	if (lastbits)
+		C[nbytes-1] &= 0x100 - (1<<lastbits);
+}
 /* end of EEA3.c */
 
 /*-----------------------------------------------------
@@ -403,4 +471,212 @@ EXPORTIT void EIA3(u8* IK, u32 COUNT, u32 BEARER, u32 DIRECTION,
 	*MAC = T ^ z[L-1];
 	free(z);
 }
+
+/*
+ * EIA3 processing the message a word at a time, with a sliding 64-bit window
+ * over the keystream: the 32-bit keystream word starting at bit k of the window
+ * is selected for each bit k set in the message word
+ * bit i of m (from the LSB) selects (u32)(W >> (i+1)): the selections are
+ * accumulated a nibble at a time, from a table of the 16 combinations of the
+ * window shifted by 0 to 3 bits, built for each window
+ * this is an addition to the C reference code
+ */
+static u32 EIA3_Word(u64 W, u32 m)
+{
+	u64 tab[16], s;
+	u32 T = 0;
+	int i, j;
+	
+	if (m == 0)
+		return 0;
+	W >>= 1;
+	tab[0] = 0;
+	for (i=0; i<4; i++)
+	{
+		s = W >> i;
+		for (j=0; j<(1<<i); j++)
+			tab[(1<<i) + j] = tab[j] ^ s;
+	}
+	for (i=0; i<32; i+=4)
+		T ^= (u32)(tab[(m >> i) & 0xF] >> i);
+	return T;
+}
+
+EXPORTIT void EIA3_Fast(u8* IK, u32 COUNT, u32 BEARER, u32 DIRECTION,
+				        u32 LENGTH, u8* M, u32* MAC)
+{
+	ZUC_State st;
+	u32 z[2], T, m, w, i;
+	u32 nw = LENGTH / 32;
+	u32 r  = LENGTH % 32;
+	u64 W;
+	u8 IV[16];
+	
+	IV[0]	= (COUNT>>24) & 0xFF;
+	IV[1]	= (COUNT>>16) & 0xFF;
+	IV[2]	= (COUNT>>8) & 0xFF;
+	IV[3]	= COUNT & 0xFF;
+	
+	IV[4]	= (BEARER << 3) & 0xF8;
+	IV[5]	= IV[6] = IV[7] = 0;
+	
+	IV[8]	= ((COUNT>>24) & 0xFF) ^ ((DIRECTION&1)<<7);
+	IV[9]	= (COUNT>>16) & 0xFF;
+	IV[10]	= (COUNT>>8) & 0xFF;
+	IV[11]	= COUNT & 0xFF;
+	
+	IV[12]	= IV[4];
+	IV[13]	= IV[5];
+	IV[14]	= IV[6] ^ ((DIRECTION&1)<<7);
+	IV[15]	= IV[7];
+	
+	ZUC_Initialization(&st, IK, IV);
+	ZUC_GenerateKeystream(&st, z, 2);
+	W = ((u64)z[0] << 32) | z[1];
+	T = 0;
+	
+	/* whole message words */
+	for (w=0; w<nw; w++, M+=4)
+	{
+		m = ((u32)M[0] << 24) | ((u32)M[1] << 16) | ((u32)M[2] << 8) | (u32)M[3];
+		T ^= EIA3_Word(W, m);
+		ZUC_GenerateKeystream(&st, z, 1);
+		W = (W << 32) | z[0];
+	}
+	
+	/* last bits of the message, without reading past its end */
+	if (r)
+	{
+		m = 0;
+		for (i=0; 8*i<r; i++)
+			m |= (u32)M[i] << (24-8*i);
+		m &= 0xFFFFFFFF << (32-r);
+		T ^= EIA3_Word(W, m);
+	}
+	
+	/* keystream word starting at bit LENGTH */
+	T ^= (u32)(W >> (32-r));
+	
+	/* last keystream word z[L-1] */
+	if (r)
+	{
+		ZUC_GenerateKeystream(&st, z, 1);
+		*MAC = T ^ z[0];
+	}
+	else
+		*MAC = T ^ (u32)W;
+}
+
+/*
+ * Incremental EIA3, with the same sliding keystream window as EIA3_Fast
+ * this is an addition to the C reference code
+ */
+static void EIA3_Word_Next(EIA3_State* st, const u8* M)
+{
+	u32 z;
+	
+	st->T ^= EIA3_Word(st->W, ((u32)M[0] << 24) | ((u32)M[1] << 16) | ((u32)M[2] << 8) | (u32)M[3]);
+	ZUC_GenerateKeystream(&st->gen, &z, 1);
+	st->W = (st->W << 32) | z;
+}
+
+EXPORTIT void EIA3_Init(EIA3_State* st, u8* IK, u32 COUNT, u32 BEARER, u32 DIRECTION)
+{
+	u32 z[2];
+	u8 IV[16];
+	
+	IV[0]	= (COUNT>>24) & 0xFF;
+	IV[1]	= (COUNT>>16) & 0xFF;
+	IV[2]	= (COUNT>>8) & 0xFF;
+	IV[3]	= COUNT & 0xFF;
+	
+	IV[4]	= (BEARER << 3) & 0xF8;
+	IV[5]	= IV[6] = IV[7] = 0;
+	
+	IV[8]	= ((COUNT>>24) & 0xFF) ^ ((DIRECTION&1)<<7);
+	IV[9]	= (COUNT>>16) & 0xFF;
+	IV[10]	= (COUNT>>8) & 0xFF;
+	IV[11]	= COUNT & 0xFF;
+	
+	IV[12]	= IV[4];
+	IV[13]	= IV[5];
+	IV[14]	= IV[6] ^ ((DIRECTION&1)<<7);
+	IV[15]	= IV[7];
+	
+	ZUC_Initialization(&st->gen, IK, IV);
+	ZUC_GenerateKeystream(&st->gen, z, 2);
+	st->W = ((u64)z[0] << 32) | z[1];
+	st->T = 0;
+	st->nbytes = 0;
+	st->nbuf = 0;
+}
+
+EXPORTIT void EIA3_Update(EIA3_State* st, const u8* M, u64 len)
+{
+	u64 n;
+	
+	while (len > 0)
+	{
+		if (st->nbuf == 4)
+		{
+			/* the pending word is followed by more data */
+			EIA3_Word_Next(st, st->buf);
+			st->nbuf = 0;
+		}
+		if (st->nbuf == 0)
+		{
+			/* whole words followed by more data, processed in place */
+			for (; len > 4; M += 4, len -= 4, st->nbytes += 4)
+				EIA3_Word_Next(st, M);
+		}
+		n = 4 - st->nbuf;
+		if (n > len)
+			n = len;
+		memcpy(st->buf + st->nbuf, M, n);
+		st->nbuf += (u32)n;
+		st->nbytes += n;
+		M += n;
+		len -= n;
+	}
+}
+
+EXPORTIT int EIA3_Final(const EIA3_State* st, u64 LENGTH, u32* MAC)
+{
+	EIA3_State fin;
+	u32 z, m, r, i;
+	
+	if ((LENGTH > 8*st->nbytes) || (st->nbytes > 0 && LENGTH <= 8*(st->nbytes-1)))
+		return -1;
+	
+	/* work on a copy, as the generator runs for the last keystream word */
+	memcpy(&fin, st, sizeof(EIA3_State));
+	r = (u32)(LENGTH - 8*(st->nbytes - st->nbuf));
+	if (r == 32)
+	{
+		EIA3_Word_Next(&fin, fin.buf);
+		r = 0;
+	}
+	else if (r)
+	{
+		m = 0;
+		for (i=0; 8*i<r; i++)
+			m |= (u32)fin.buf[i] << (24-8*i);
+		m &= 0xFFFFFFFF << (32-r);
+		fin.T ^= EIA3_Word(fin.W, m);
+	}
+	
+	/* keystream word starting at bit LENGTH */
+	fin.T ^= (u32)(fin.W >> (32-r));
+	
+	/* last keystream word z[L-1] */
+	if (r)
+	{
+		ZUC_GenerateKeystream(&fin.gen, &z, 1);
+		*MAC = fin.T ^ z;
+	}
+	else
+		*MAC = fin.T ^ (u32)fin.W;
+	return 0;
+}
+
 /* end of EIA3.c */
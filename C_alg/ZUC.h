@@ -32,9 +32,42 @@
 /* type definition from */
 typedef unsigned char u8;
 typedef unsigned int u32;
+typedef unsigned long long u64;
 
 /*
- * ZUC keystream generator
+ * ZUC generator state
+ * this is an addition to the C reference code, which stores it in global variables
+ */
+typedef struct {
+	/* the state registers of LFSR */
+	u32 LFSR_S0;
+	u32 LFSR_S1;
+	u32 LFSR_S2;
+	u32 LFSR_S3;
+	u32 LFSR_S4;
+	u32 LFSR_S5;
+	u32 LFSR_S6;
+	u32 LFSR_S7;
+	u32 LFSR_S8;
+	u32 LFSR_S9;
+	u32 LFSR_S10;
+	u32 LFSR_S11;
+	u32 LFSR_S12;
+	u32 LFSR_S13;
+	u32 LFSR_S14;
+	u32 LFSR_S15;
+	/* the registers of F */
+	u32 F_R1;
+	u32 F_R2;
+	/* the outputs of BitReorganization */
+	u32 BRC_X0;
+	u32 BRC_X1;
+	u32 BRC_X2;
+	u32 BRC_X3;
+} ZUC_State;
+
+/*
+ * ZUC keystream generator (reference API, not thread-safe)
  * k: secret key (input, 16 bytes)
  * iv: initialization vector (input, 16 bytes)
  * Keystream: produced keystream (output, variable length)
@@ -43,6 +76,16 @@ typedef unsigned int u32;
 EXPORTIT void Initialization(u8* k, u8* iv);
 EXPORTIT void GenerateKeystream(u32* pKeystream, u32 KeystreamLen);
 
+/*
+ * ZUC keystream generator working on a state provided by the caller
+ * st: generator state (input / output)
+ * ZUC_Initialization() also runs the first working step (discarding the output of F),
+ * then each ZUC_GenerateKeystream() call continues the keystream 
+ * where the previous one stopped
+ */
+EXPORTIT void ZUC_Initialization(ZUC_State* st, u8* k, u8* iv);
+EXPORTIT void ZUC_GenerateKeystream(ZUC_State* st, u32* pKeystream, u32 KeystreamLen);
+
 /*
  * CK: ciphering key
  * COUNT: frame counter
@@ -55,6 +98,13 @@ EXPORTIT void GenerateKeystream(u32* pKeystream, u32 KeystreamLen);
 EXPORTIT void EEA3(u8* CK, u32 COUNT, u32 BEARER, u32 DIRECTION, 
 		           u32 LENGTH, u32* M, u32* C);
 
+/*
+ * Same as EEA3, with M and C being bytes buffers,
+ * and without memory allocation: M and C can be the same buffer
+ */
+EXPORTIT void EEA3_Bytes(u8* CK, u32 COUNT, u32 BEARER, u32 DIRECTION, 
+                         u32 LENGTH, u8* M, u8* C);
+
 /*
  * IK: integrity key
  * COUNT: frame counter
@@ -66,3 +116,31 @@ EXPORTIT void EEA3(u8* CK, u32 COUNT, u32 BEARER, u32 DIRECTION,
  */
 EXPORTIT void EIA3(u8* IK, u32 COUNT, u32 BEARER, u32 DIRECTION,
 		           u32 LENGTH, u32* M, u32* MAC);
+
+/*
+ * Same as EIA3, with M being a bytes buffer, processed a word at a time
+ * without memory allocation
+ */
+EXPORTIT void EIA3_Fast(u8* IK, u32 COUNT, u32 BEARER, u32 DIRECTION,
+                        u32 LENGTH, u8* M, u32* MAC);
+
+/*
+ * Incremental EIA3: the message is provided by bytes over successive 
+ * EIA3_Update() calls, the last word being kept until more data is provided;
+ * EIA3_Final() then computes the MAC of the message of LENGTH bits, without 
+ * modifying the state: only the last bits of the last byte provided can be 
+ * left out by LENGTH
+ * EIA3_Final() returns 0 on success, -1 on invalid LENGTH
+ */
+typedef struct {
+	ZUC_State gen;
+	u64 W;		/* keystream window, starting at the first bit of the pending word */
+	u32 T;
+	u64 nbytes;	/* number of bytes provided */
+	u8 buf[4];	/* last word provided, not processed yet */
+	u32 nbuf;
+} EIA3_State;
+
+EXPORTIT void EIA3_Init(EIA3_State* st, u8* IK, u32 COUNT, u32 BEARER, u32 DIRECTION);
+EXPORTIT void EIA3_Update(EIA3_State* st, const u8* M, u64 len);
+EXPORTIT int EIA3_Final(const EIA3_State* st, u64 LENGTH, u32* MAC);
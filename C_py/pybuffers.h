@@ -0,0 +1,126 @@
+/**
+ * Software Name : CryptoMobile 
+ * Version : 0.2.0
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License version 2 as published
+ * by the Free Software Foundation. 
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+ * GNU General Public License for more details. 
+ *
+ * You will find a copy of the terms and conditions of the GNU General Public
+ * License version 2 in the "license.txt" file or
+ * see http://www.gnu.org/licenses/ or write to the Free Software Foundation,
+ * Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+ *
+ *--------------------------------------------------------
+ * File Name : CryptoMobile/pybuffers.h
+ * Created : 2026-10-17
+ *--------------------------------------------------------
+*/
+
+/* buffers and records handling shared by the *_into and *_records functions of
+   pykasumi, pysnow and pyzuc: to be included after Python.h and the algorithm
+   header defining u32 */
+
+#ifndef PYBUFFERS_H
+#define PYBUFFERS_H
+
+#include <stdlib.h>
+#include <string.h>
+
+
+// get the input and output buffers of the *_into functions:
+// data is processed in place when out is not provided (or None),
+// in_buf is then only a copy of out_buf's pointer and length, holding no reference
+static inline int into_buffers(PyObject* data, PyObject* out, Py_buffer* in_buf, Py_buffer* out_buf)
+{
+    if (out == NULL || out == Py_None)
+    {
+        if (PyObject_GetBuffer(data, out_buf, PyBUF_WRITABLE) < 0)
+            return -1;
+        memcpy(in_buf, out_buf, sizeof(Py_buffer));
+        in_buf->obj = NULL;
+        return 0;
+    };
+    if (PyObject_GetBuffer(data, in_buf, PyBUF_SIMPLE) < 0)
+        return -1;
+    if (PyObject_GetBuffer(out, out_buf, PyBUF_WRITABLE) < 0)
+    {
+        PyBuffer_Release(in_buf);
+        return -1;
+    };
+    return 0;
+};
+
+
+/* records of a buffer, processed by the *_records functions */
+
+typedef struct {
+    Py_ssize_t offset;  // offset in the buffer
+    Py_ssize_t len;     // length in bytes
+    u32 count, bearer, dir;
+} buf_record;
+
+// parse a sequence of (offset, length, count, bearer, dir) tuples, each record
+// being checked to fit in a buffer of size buf_len, and to be at most max_len long
+static inline buf_record* records_parse(PyObject* seq, Py_ssize_t buf_len, Py_ssize_t max_len, Py_ssize_t* n)
+{
+    PyObject* fast;
+    PyObject* item;
+    buf_record* recs;
+    buf_record* r;
+    Py_ssize_t i;
+    long long count, bearer, dir;
+    
+    fast = PySequence_Fast(seq, "invalid args");
+    if (fast == NULL)
+        return NULL;
+    *n = PySequence_Fast_GET_SIZE(fast);
+    
+    recs = (buf_record *)malloc((*n ? *n : 1) * sizeof(buf_record));
+    if (recs == NULL)
+    {
+        Py_DECREF(fast);
+        PyErr_SetString(PyExc_RuntimeError, "malloc failed");
+        return NULL;
+    };
+    
+    for (i=0; i<*n; i++)
+    {
+        r = &recs[i];
+        item = PySequence_Fast_GET_ITEM(fast, i);
+        if (! PyTuple_Check(item))
+        {
+            PyErr_SetString(PyExc_ValueError, "invalid args");
+            goto error;
+        };
+        // count, bearer and dir are range-checked here, "I" silently wrapping them
+        if (! PyArg_ParseTuple(item, "nnLLL", &r->offset, &r->len, &count, &bearer, &dir))
+            goto error;
+        if ((r->offset < 0) || (r->len < 0) || (r->len > max_len) || (r->offset > buf_len - r->len) ||
+            (count < 0) || (count > 0xffffffffLL) || (bearer < 0) || (bearer > 31) ||
+            (dir < 0) || (dir > 1))
+        {
+            PyErr_SetString(PyExc_ValueError, "invalid args");
+            goto error;
+        };
+        r->count  = (u32)count;
+        r->bearer = (u32)bearer;
+        r->dir    = (u32)dir;
+    };
+    
+    Py_DECREF(fast);
+    return recs;
+    
+error:
+    Py_DECREF(fast);
+    free(recs);
+    return NULL;
+};
+
+
+#endif /* PYBUFFERS_H */
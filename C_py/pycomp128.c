@@ -55,6 +55,9 @@ static PyObject * error_out(PyObject *m) {
 static PyObject* pycomp128v1(PyObject* dummy, PyObject* args);
 static PyObject* pycomp128v2(PyObject* dummy, PyObject* args);
 static PyObject* pycomp128v3(PyObject* dummy, PyObject* args);
+static PyObject* pycomp128v1_batch(PyObject* dummy, PyObject* args);
+static PyObject* pycomp128v2_batch(PyObject* dummy, PyObject* args);
+static PyObject* pycomp128v3_batch(PyObject* dummy, PyObject* args);
 
 static char pycomp128v1_doc[] =
     "comp128v1(ki [16 bytes], rand [16 bytes]) -> (sres [4 bytes], kc [8 bytes])";
@@ -63,6 +66,17 @@ static char pycomp128v2_doc[] =
 static char pycomp128v3_doc[] =
     "comp128v3(ki [16 bytes], rand [16 bytes]) -> (sres [4 bytes], kc [8 bytes])";
 
+#define COMP128_BATCH_DOC(v) \
+    "comp128" v "_batch(kis [16*n or 16 bytes], rands [16*n bytes]) -> (sres [4*n bytes], kc [8*n bytes])\n" \
+    "comp128" v "_batch(pairs [sequence of n (ki [16 bytes], rand [16 bytes])]) -> (sres [4*n bytes], kc [8*n bytes])\n\n" \
+    "computes comp128" v " for n (ki, rand) pairs, given as packed buffers (a single ki\n" \
+    "being used for all rands when kis is 16 bytes long) or as a sequence of pairs,\n" \
+    "and returns the packed sres and kc"
+
+static char pycomp128v1_batch_doc[] = COMP128_BATCH_DOC("v1");
+static char pycomp128v2_batch_doc[] = COMP128_BATCH_DOC("v2");
+static char pycomp128v3_batch_doc[] = COMP128_BATCH_DOC("v3");
+
 static PyMethodDef pycomp128_methods[] = 
 {
     //{exported name, function, args handling, doc string}
@@ -70,6 +84,9 @@ static PyMethodDef pycomp128_methods[] =
     {"comp128v1", pycomp128v1, METH_VARARGS, pycomp128v1_doc},
     {"comp128v2", pycomp128v2, METH_VARARGS, pycomp128v2_doc},
     {"comp128v3", pycomp128v3, METH_VARARGS, pycomp128v3_doc},
+    {"comp128v1_batch", pycomp128v1_batch, METH_VARARGS, pycomp128v1_batch_doc},
+    {"comp128v2_batch", pycomp128v2_batch, METH_VARARGS, pycomp128v2_batch_doc},
+    {"comp128v3_batch", pycomp128v3_batch, METH_VARARGS, pycomp128v3_batch_doc},
     { NULL, NULL, 0, NULL }
 };
 
@@ -161,12 +178,19 @@ static PyObject* pycomp128v1(PyObject* dummy, PyObject* args)
         return NULL;
     
     if ( (ki.len != 16) || (rand.len != 16) ) {
+        PyBuffer_Release(&ki);
+        PyBuffer_Release(&rand);
         PyErr_SetString(PyExc_ValueError, "invalid args");
         return NULL;
     }
     
     //void comp128v1(uint8_t *sres, uint8_t *kc, const uint8_t *ki, const uint8_t *rand);
+    Py_BEGIN_ALLOW_THREADS
     comp128v1(sres, kc, (const uint8_t *)ki.buf, (const uint8_t *)rand.buf);
+    Py_END_ALLOW_THREADS
+    
+    PyBuffer_Release(&ki);
+    PyBuffer_Release(&rand);
     
     ret = PyTuple_New(2);
     PyTuple_SetItem(ret, 0, PyBytes_FromStringAndSize((char *)sres, 4));
@@ -190,12 +214,19 @@ static PyObject* pycomp128v2(PyObject* dummy, PyObject* args)
         return NULL;
     
     if ( (ki.len != 16) || (rand.len != 16) ) {
+        PyBuffer_Release(&ki);
+        PyBuffer_Release(&rand);
         PyErr_SetString(PyExc_ValueError, "invalid args");
         return NULL;
     }
     
     //void comp128v23(uint8_t *sres, uint8_t *kc, uint8_t const *ki, uint8_t const *rand, bool v2);
+    Py_BEGIN_ALLOW_THREADS
     comp128v23(sres, kc, (const uint8_t *)ki.buf, (const uint8_t *)rand.buf, true);
+    Py_END_ALLOW_THREADS
+    
+    PyBuffer_Release(&ki);
+    PyBuffer_Release(&rand);
     
     ret = PyTuple_New(2);
     PyTuple_SetItem(ret, 0, PyBytes_FromStringAndSize((char *)sres, 4));
@@ -219,15 +250,161 @@ static PyObject* pycomp128v3(PyObject* dummy, PyObject* args)
         return NULL;
     
     if ( (ki.len != 16) || (rand.len != 16) ) {
+        PyBuffer_Release(&ki);
+        PyBuffer_Release(&rand);
         PyErr_SetString(PyExc_ValueError, "invalid args");
         return NULL;
     }
     
     //void comp128v23(uint8_t *sres, uint8_t *kc, uint8_t const *ki, uint8_t const *rand, bool v2);
+    Py_BEGIN_ALLOW_THREADS
     comp128v23(sres, kc, (const uint8_t *)ki.buf, (const uint8_t *)rand.buf, false);
+    Py_END_ALLOW_THREADS
+    
+    PyBuffer_Release(&ki);
+    PyBuffer_Release(&rand);
     
     ret = PyTuple_New(2);
     PyTuple_SetItem(ret, 0, PyBytes_FromStringAndSize((char *)sres, 4));
     PyTuple_SetItem(ret, 1, PyBytes_FromStringAndSize((char *)kc, 8));
     return ret;
 };
+
+
+/* batch versions: the loop over all (ki, rand) pairs runs without the GIL */
+
+/* packs a sequence of (ki, rand) pairs into kis and rands, 
+   returns the number of pairs, or -1 with an exception set */
+static Py_ssize_t comp128_pack_pairs(PyObject* pairs, uint8_t **kis, uint8_t **rands)
+{
+    PyObject *seq, *pair;
+    Py_buffer ki, rand;
+    Py_ssize_t n, i;
+    
+    seq = PySequence_Fast(pairs, "invalid args");
+    if (seq == NULL)
+        return -1;
+    n = PySequence_Fast_GET_SIZE(seq);
+    *kis   = (uint8_t *)PyMem_Malloc(16*n + 1);
+    *rands = (uint8_t *)PyMem_Malloc(16*n + 1);
+    if (*kis == NULL || *rands == NULL) {
+        PyErr_NoMemory();
+        goto error;
+    }
+    for (i=0; i<n; i++) {
+        pair = PySequence_Fast_GET_ITEM(seq, i);
+        if (! PyArg_ParseTuple(pair, "z*z*", &ki, &rand)) {
+            PyErr_Clear();
+            PyErr_SetString(PyExc_ValueError, "invalid args");
+            goto error;
+        }
+        if ( (ki.len != 16) || (rand.len != 16) ) {
+            PyBuffer_Release(&ki);
+            PyBuffer_Release(&rand);
+            PyErr_SetString(PyExc_ValueError, "invalid args");
+            goto error;
+        }
+        memcpy(*kis + 16*i, ki.buf, 16);
+        memcpy(*rands + 16*i, rand.buf, 16);
+        PyBuffer_Release(&ki);
+        PyBuffer_Release(&rand);
+    }
+    Py_DECREF(seq);
+    return n;
+    
+error:
+    Py_DECREF(seq);
+    PyMem_Free(*kis);
+    PyMem_Free(*rands);
+    *kis = *rands = NULL;
+    return -1;
+}
+
+static PyObject* comp128_batch(PyObject* args, int version)
+{
+    PyObject *ret = 0, *sres_py = 0, *kc_py = 0;
+    PyObject *arg0, *arg1 = NULL;
+    // input: ki, rand, either packed or from a sequence of pairs
+    Py_buffer kis_py, rands_py;
+    uint8_t *kis, *rands, *mkis = NULL, *mrands = NULL;
+    Py_ssize_t n, i, kistep;
+    // output: sres, kc
+    uint8_t *sres, *kc;
+    
+    if (! PyArg_ParseTuple(args, "O|O", &arg0, &arg1))
+        return NULL;
+    
+    if (arg1 == NULL) {
+        n = comp128_pack_pairs(arg0, &mkis, &mrands);
+        if (n < 0)
+            return NULL;
+        kis    = mkis;
+        rands  = mrands;
+        kistep = 16;
+    } else {
+        if (! PyArg_ParseTuple(args, "z*z*", &kis_py, &rands_py))
+            return NULL;
+        n = rands_py.len / 16;
+        if ( (rands_py.len % 16) || (kis_py.len != 16 && kis_py.len != rands_py.len) ) {
+            PyBuffer_Release(&kis_py);
+            PyBuffer_Release(&rands_py);
+            PyErr_SetString(PyExc_ValueError, "invalid args");
+            return NULL;
+        }
+        kis    = (uint8_t *)kis_py.buf;
+        rands  = (uint8_t *)rands_py.buf;
+        kistep = (kis_py.len == 16) ? 0 : 16;
+    }
+    
+    sres_py = PyBytes_FromStringAndSize(NULL, 4*n);
+    kc_py   = PyBytes_FromStringAndSize(NULL, 8*n);
+    if (sres_py != NULL && kc_py != NULL) {
+        sres = (uint8_t *)PyBytes_AS_STRING(sres_py);
+        kc   = (uint8_t *)PyBytes_AS_STRING(kc_py);
+        
+        Py_BEGIN_ALLOW_THREADS
+        for (i=0; i<n; i++) {
+            if (version == 1)
+                comp128v1(sres + 4*i, kc + 8*i, kis + kistep*i, rands + 16*i);
+            else
+                comp128v23(sres + 4*i, kc + 8*i, kis + kistep*i, rands + 16*i, version == 2);
+        }
+        Py_END_ALLOW_THREADS
+        
+        ret = PyTuple_New(2);
+        if (ret != NULL) {
+            PyTuple_SET_ITEM(ret, 0, sres_py);
+            PyTuple_SET_ITEM(ret, 1, kc_py);
+            sres_py = kc_py = NULL;
+        }
+    }
+    Py_XDECREF(sres_py);
+    Py_XDECREF(kc_py);
+    
+    if (arg1 == NULL) {
+        PyMem_Free(mkis);
+        PyMem_Free(mrands);
+    } else {
+        PyBuffer_Release(&kis_py);
+        PyBuffer_Release(&rands_py);
+    }
+    return ret;
+};
+
+
+static PyObject* pycomp128v1_batch(PyObject* dummy, PyObject* args)
+{
+    return comp128_batch(args, 1);
+};
+
+
+static PyObject* pycomp128v2_batch(PyObject* dummy, PyObject* args)
+{
+    return comp128_batch(args, 2);
+};
+
+
+static PyObject* pycomp128v3_batch(PyObject* dummy, PyObject* args)
+{
+    return comp128_batch(args, 3);
+};
@@ -26,6 +26,7 @@
 
 #include <Python.h>
 #include "../C_alg/Kasumi.h"
+#include "pybuffers.h"
 
 
 /* Python 2 and 3 initialization mess */
@@ -56,6 +57,8 @@ static PyObject* pykasumi_keyschedule(PyObject* dummy, PyObject* args);
 static PyObject* pykasumi_kasumi(PyObject* dummy, PyObject* args);
 static PyObject* pykasumi_f8(PyObject* dummy, PyObject* args);
 static PyObject* pykasumi_f9(PyObject* dummy, PyObject* args);
+static PyObject* pykasumi_f8_into(PyObject* dummy, PyObject* args);
+static PyObject* pykasumi_f8_records(PyObject* dummy, PyObject* args);
 
 static char pykasumi_keyschedule_doc[] =
     "kasumi_keyschedule(key [16 bytes]) -> None";
@@ -67,6 +70,129 @@ static char pykasumi_f8_doc[] =
 static char pykasumi_f9_doc[] =
     "kasumi_f9(ik [16 bytes], count [uint32], bearer [uint32], dir [0 or 1], "\
               "data_in [bytes], length [int, length in bits]) -> mac [4 bytes]";
+static char pykasumi_f8_into_doc[] =
+    "kasumi_f8_into(ck [16 bytes], count [uint32], bearer [uint32], dir [0 or 1], "\
+                   "data_in [buffer], length [int, length in bits], data_out [writable buffer, optional]) "\
+                   "-> data_out\n\n"\
+    "data_in is processed in place when data_out is not provided";
+static char pykasumi_f8_records_doc[] =
+    "kasumi_f8_records(ck [16 bytes], data_in [buffer], records [sequence of (offset [int], "\
+                      "length [int, length in bytes], count [uint32], bearer [uint5], dir [0 or 1])], "\
+                      "data_out [writable buffer, optional]) -> data_out\n\n"\
+    "ciphers each record of data_in, located at the same offset in data_out, with\n"\
+    "a single call for all the records of a key; data_in is processed in place when\n"\
+    "data_out is not provided";
+
+
+/* KasumiKey object, holding the key schedules of a given key */
+
+typedef struct {
+    PyObject_HEAD
+    Kasumi_Key ks;      // key schedule of key
+    Kasumi_Key ks55;    // key schedule of key ^ 0x5555..., for f8
+    Kasumi_Key ksAA;    // key schedule of key ^ 0xAAAA..., for f9
+    int initialized;
+} KasumiKeyObject;
+
+static int KasumiKey_init(KasumiKeyObject* self, PyObject* args, PyObject* kwds);
+static PyObject* KasumiKey_f8(KasumiKeyObject* self, PyObject* args);
+static PyObject* KasumiKey_f9(KasumiKeyObject* self, PyObject* args);
+
+static char KasumiKey_doc[] =
+    "KasumiKey(key [16 bytes]) -> Kasumi key object\n\n"\
+    "The key schedules required by f8 and f9 are computed once, when the object\n"\
+    "is created, and reused for each message processed with this key";
+static char KasumiKey_f8_doc[] =
+    "f8(count [uint32], bearer [uint32], dir [0 or 1], data_in [bytes], "\
+       "length [int, length in bits, optional]) -> data_out [bytes]";
+static char KasumiKey_f9_doc[] =
+    "f9(count [uint32], fresh [uint32], dir [0 or 1], data_in [bytes], "\
+       "length [int, length in bits, optional]) -> mac [4 bytes]";
+
+static PyMethodDef KasumiKey_methods[] =
+{
+    {"f8", (PyCFunction)KasumiKey_f8, METH_VARARGS, KasumiKey_f8_doc},
+    {"f9", (PyCFunction)KasumiKey_f9, METH_VARARGS, KasumiKey_f9_doc},
+    { NULL, NULL, 0, NULL }
+};
+
+static PyTypeObject KasumiKeyType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "pykasumi.KasumiKey",       /* tp_name */
+    sizeof(KasumiKeyObject),    /* tp_basicsize */
+};
+
+/* KasumiF8State object, holding the state of a f8 keystream */
+
+typedef struct {
+    PyObject_HEAD
+    Kasumi_Key ks;      // key schedule of key
+    u8 A[8];            // modifier, from count, bearer and dir
+    u8 KSB[8];          // last keystream block
+    u32 blkcnt;         // block counter
+    int initialized;
+} KasumiF8StateObject;
+
+static int KasumiF8State_init(KasumiF8StateObject* self, PyObject* args, PyObject* kwds);
+static PyObject* KasumiF8State_keystream_into(KasumiF8StateObject* self, PyObject* args);
+
+static char KasumiF8State_doc[] =
+    "KasumiF8State(ck [16 bytes], count [uint32], bearer [uint32], dir [0 or 1]) "\
+    "-> Kasumi f8 keystream generator object\n\n"\
+    "each call to keystream_into() continues the f8 keystream where the previous\n"\
+    "one stopped";
+static char KasumiF8State_keystream_into_doc[] =
+    "keystream_into(buf [writable buffer, length multiple of 8]) -> buf\n\n"\
+    "fills buf with the next len(buf)/8 64-bit blocks of f8 keystream";
+
+static PyMethodDef KasumiF8State_methods[] =
+{
+    {"keystream_into", (PyCFunction)KasumiF8State_keystream_into, METH_VARARGS, KasumiF8State_keystream_into_doc},
+    { NULL, NULL, 0, NULL }
+};
+
+static PyTypeObject KasumiF8StateType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "pykasumi.KasumiF8State",   /* tp_name */
+    sizeof(KasumiF8StateObject),/* tp_basicsize */
+};
+
+/* KasumiF9State object, holding the state of an incremental f9 computation */
+
+typedef struct {
+    PyObject_HEAD
+    Kasumi_f9_State st;
+    int initialized;
+} KasumiF9StateObject;
+
+static int KasumiF9State_init(KasumiF9StateObject* self, PyObject* args, PyObject* kwds);
+static PyObject* KasumiF9State_update(KasumiF9StateObject* self, PyObject* args);
+static PyObject* KasumiF9State_mac(KasumiF9StateObject* self, PyObject* args);
+
+static char KasumiF9State_doc[] =
+    "KasumiF9State(ik [16 bytes], count [uint32], fresh [uint32], dir [0 or 1]) "\
+    "-> incremental f9 object\n\n"\
+    "the message is provided by parts with update(), mac() returning the MAC\n"\
+    "of the message provided so far";
+static char KasumiF9State_update_doc[] =
+    "update(data_in [buffer]) -> None";
+static char KasumiF9State_mac_doc[] =
+    "mac(length [uint64, length in bits, optional]) -> mac [4 bytes]\n\n"\
+    "length can only leave out the last bits of the last byte provided, the\n"\
+    "object can still be updated afterwards";
+
+static PyMethodDef KasumiF9State_methods[] =
+{
+    {"update", (PyCFunction)KasumiF9State_update, METH_VARARGS, KasumiF9State_update_doc},
+    {"mac", (PyCFunction)KasumiF9State_mac, METH_VARARGS, KasumiF9State_mac_doc},
+    { NULL, NULL, 0, NULL }
+};
+
+static PyTypeObject KasumiF9StateType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "pykasumi.KasumiF9State",   /* tp_name */
+    sizeof(KasumiF9StateObject), /* tp_basicsize */
+};
 
 static PyMethodDef pykasumi_methods[] = 
 {
@@ -76,6 +202,8 @@ static PyMethodDef pykasumi_methods[] =
     {"kasumi_kasumi", pykasumi_kasumi, METH_VARARGS, pykasumi_kasumi_doc},
     {"kasumi_f8", pykasumi_f8, METH_VARARGS, pykasumi_f8_doc},
     {"kasumi_f9", pykasumi_f9, METH_VARARGS, pykasumi_f9_doc},
+    {"kasumi_f8_into", pykasumi_f8_into, METH_VARARGS, pykasumi_f8_into_doc},
+    {"kasumi_f8_records", pykasumi_f8_records, METH_VARARGS, pykasumi_f8_records_doc},
     { NULL, NULL, 0, NULL }
 };
 
@@ -140,6 +268,42 @@ static PyMethodDef pykasumi_methods[] =
         Py_DECREF(module);
         INITERROR;
     }
+    
+    KasumiKeyType.tp_flags   = Py_TPFLAGS_DEFAULT;
+    KasumiKeyType.tp_doc     = KasumiKey_doc;
+    KasumiKeyType.tp_methods = KasumiKey_methods;
+    KasumiKeyType.tp_init    = (initproc)KasumiKey_init;
+    KasumiKeyType.tp_new     = PyType_GenericNew;
+    if (PyType_Ready(&KasumiKeyType) < 0) {
+        Py_DECREF(module);
+        INITERROR;
+    }
+    Py_INCREF(&KasumiKeyType);
+    PyModule_AddObject(module, "KasumiKey", (PyObject *)&KasumiKeyType);
+    
+    KasumiF8StateType.tp_flags   = Py_TPFLAGS_DEFAULT;
+    KasumiF8StateType.tp_doc     = KasumiF8State_doc;
+    KasumiF8StateType.tp_methods = KasumiF8State_methods;
+    KasumiF8StateType.tp_init    = (initproc)KasumiF8State_init;
+    KasumiF8StateType.tp_new     = PyType_GenericNew;
+    if (PyType_Ready(&KasumiF8StateType) < 0) {
+        Py_DECREF(module);
+        INITERROR;
+    }
+    Py_INCREF(&KasumiF8StateType);
+    PyModule_AddObject(module, "KasumiF8State", (PyObject *)&KasumiF8StateType);
+    
+    KasumiF9StateType.tp_flags   = Py_TPFLAGS_DEFAULT;
+    KasumiF9StateType.tp_doc     = KasumiF9State_doc;
+    KasumiF9StateType.tp_methods = KasumiF9State_methods;
+    KasumiF9StateType.tp_init    = (initproc)KasumiF9State_init;
+    KasumiF9StateType.tp_new     = PyType_GenericNew;
+    if (PyType_Ready(&KasumiF9StateType) < 0) {
+        Py_DECREF(module);
+        INITERROR;
+    }
+    Py_INCREF(&KasumiF9StateType);
+    PyModule_AddObject(module, "KasumiF9State", (PyObject *)&KasumiF9StateType);
 
     #if PY_MAJOR_VERSION >= 3
     
@@ -222,43 +386,171 @@ static PyObject* pykasumi_f8(PyObject* dummy, PyObject* args)
     if (length % 8)
         out_sz++;
     
-    if ((key.len != 16) || (dir > 1) || (out_sz > data_py.len))
+    if ((key.len != 16) || (dir > 1) || (length < 0) || (out_sz > data_py.len))
     {
+        PyBuffer_Release(&key);
+        PyBuffer_Release(&data_py);
         PyErr_SetString(PyExc_ValueError, "invalid args");
         return NULL;
     };
     
-    // duplicate the input buffer in order to not mutate it
-    data = (u8 *)malloc(out_sz);
-    if (data == NULL)
+    // duplicate the input buffer into the output bytes, in order to not mutate it
+    ret = PyBytes_FromStringAndSize(NULL, out_sz);
+    if (ret == NULL)
     {
-        PyErr_SetString(PyExc_RuntimeError, "malloc failed");
+        PyBuffer_Release(&key);
+        PyBuffer_Release(&data_py);
         return NULL;
     };
-    memcpy(data, data_py.buf, out_sz);
+    data = (u8 *)PyBytes_AS_STRING(ret);
     
+    Py_BEGIN_ALLOW_THREADS
+    memcpy(data, data_py.buf, out_sz);
     //void f8( u8 *key, u32 count, u32 bearer, u32 dir, u8 *data, int length );
     f8((u8 *)key.buf, count, bearer, dir, data, length);
+    Py_END_ALLOW_THREADS
     
-    ret = PyBytes_FromStringAndSize((char *)data, out_sz);
-    free(data);
-    data = NULL;
+    PyBuffer_Release(&key);
+    PyBuffer_Release(&data_py);
+    return ret;
+};
+
+
+static PyObject* pykasumi_f8_into(PyObject* dummy, PyObject* args)
+{
+    PyObject* ret = 0;
+    
+    // input: key (bytes buffer -> u8 *), count, bearer, dir (u32), data (buffer -> u8 *), 
+    //        length (int), optional out (writable buffer -> u8 *)
+    Py_buffer key;
+    PyObject* data_py;
+    PyObject* out_py = NULL;
+    Py_buffer data;
+    Py_buffer out;
+    u32 count, bearer, dir;
+    int length;
+    Py_ssize_t out_sz;
+    
+    if (! PyArg_ParseTuple(args, "z*IIIOi|O", &key, &count, &bearer, &dir, &data_py, &length, &out_py))
+        return NULL;
+    
+    if (into_buffers(data_py, out_py, &data, &out) < 0)
+    {
+        PyBuffer_Release(&key);
+        return NULL;
+    };
     
+    // transform length in bits to length in bytes
+    out_sz = length >> 3;
+    if (length % 8)
+        out_sz++;
+    
+    if ((key.len != 16) || (dir > 1) || (length < 0) || (out_sz > data.len) || (out_sz > out.len))
+    {
+        PyBuffer_Release(&key);
+        PyBuffer_Release(&data);
+        PyBuffer_Release(&out);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return NULL;
+    };
+    
+    Py_BEGIN_ALLOW_THREADS
+    if (out.buf != data.buf)
+        memmove(out.buf, data.buf, out_sz);
+    //void f8( u8 *key, u32 count, u32 bearer, u32 dir, u8 *data, int length );
+    f8((u8 *)key.buf, count, bearer, dir, (u8 *)out.buf, length);
+    Py_END_ALLOW_THREADS
+    
+    // return the buffer written
+    ret = out.obj;
+    Py_INCREF(ret);
+    
+    PyBuffer_Release(&key);
+    PyBuffer_Release(&data);
+    PyBuffer_Release(&out);
     return ret;
 };
 
 
-static PyObject* pykasumi_f9(PyObject* dummy, PyObject* args)
+static PyObject* pykasumi_f8_records(PyObject* dummy, PyObject* args)
 {
     PyObject* ret = 0;
     
+    // input: key (bytes buffer -> u8 *), data (buffer -> u8 *), records (sequence of tuples),
+    //        optional out (writable buffer -> u8 *)
+    Py_buffer key;
+    PyObject* data_py;
+    PyObject* seq;
+    PyObject* out_py = NULL;
+    Py_buffer data;
+    Py_buffer out;
+    buf_record* recs;
+    Py_ssize_t n, i;
+    Kasumi_Key ks, ks55;
+    u8 mod_key[16];
+    
+    if (! PyArg_ParseTuple(args, "z*OO|O", &key, &data_py, &seq, &out_py))
+        return NULL;
+    
+    if (key.len != 16)
+    {
+        PyBuffer_Release(&key);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return NULL;
+    };
+    
+    if (into_buffers(data_py, out_py, &data, &out) < 0)
+    {
+        PyBuffer_Release(&key);
+        return NULL;
+    };
+    
+    recs = records_parse(seq, (data.len < out.len) ? data.len : out.len, 0x0fffffff, &n);
+    if (recs == NULL)
+    {
+        PyBuffer_Release(&key);
+        PyBuffer_Release(&data);
+        PyBuffer_Release(&out);
+        return NULL;
+    };
+    
+    // the key schedules are computed once for all the records
+    Kasumi_KeySchedule(&ks, (u8 *)key.buf);
+    for (i=0; i<16; i++)
+        mod_key[i] = ((u8 *)key.buf)[i] ^ 0x55;
+    Kasumi_KeySchedule(&ks55, mod_key);
+    
+    Py_BEGIN_ALLOW_THREADS
+    for (i=0; i<n; i++)
+    {
+        if (out.buf != data.buf)
+            memmove((u8 *)out.buf + recs[i].offset, (u8 *)data.buf + recs[i].offset, recs[i].len);
+        Kasumi_f8_ks(&ks, &ks55, recs[i].count, recs[i].bearer, recs[i].dir,
+                     (u8 *)out.buf + recs[i].offset, 8 * (int)recs[i].len);
+    };
+    Py_END_ALLOW_THREADS
+    
+    // return the buffer written
+    ret = out.obj;
+    Py_INCREF(ret);
+    
+    free(recs);
+    PyBuffer_Release(&key);
+    PyBuffer_Release(&data);
+    PyBuffer_Release(&out);
+    return ret;
+};
+
+
+static PyObject* pykasumi_f9(PyObject* dummy, PyObject* args)
+{
     // input: key, data (bytes buffer -> u8 *), count, fresh, dir (u32), length (int, in bits)
     Py_buffer key;
     Py_buffer data;
     u32 count, fresh, dir;
     int length, out_sz;
     // output: mac (u8 * -> bytes buffer of size 4)
-    u8 * mac;
+    u8 mac[4];
     
     if (! PyArg_ParseTuple(args, "z*IIIz*i", &key, &count, &fresh, &dir, &data, &length))
         return NULL;
@@ -268,15 +560,330 @@ static PyObject* pykasumi_f9(PyObject* dummy, PyObject* args)
     if (length % 8)
         out_sz++;
     
-    if ((key.len != 16) || (dir > 1) || (out_sz > data.len))
+    if ((key.len != 16) || (dir > 1) || (length < 0) || (out_sz > data.len))
     {
+        PyBuffer_Release(&key);
+        PyBuffer_Release(&data);
         PyErr_SetString(PyExc_ValueError, "invalid args");
         return NULL;
     };
     
-    //u8 * f9( u8 *key, u32 count, u32 fresh, u32 dir, u8 *data, int length );
-    mac = f9((u8 *)key.buf, count, fresh, dir, (u8 *)data.buf, length);
+    Py_BEGIN_ALLOW_THREADS
+    //void Kasumi_f9( u8 *key, u32 count, u32 fresh, u32 dir, u8 *data, int length, u8 *mac_i );
+    Kasumi_f9((u8 *)key.buf, count, fresh, dir, (u8 *)data.buf, length, mac);
+    Py_END_ALLOW_THREADS
     
-    ret = PyBytes_FromStringAndSize((char *)mac, 4);
+    PyBuffer_Release(&key);
+    PyBuffer_Release(&data);
+    return PyBytes_FromStringAndSize((char *)mac, 4);
+};
+
+
+/* KasumiKey object methods */
+
+
+static int KasumiKey_init(KasumiKeyObject* self, PyObject* args, PyObject* kwds)
+{
+    // input: key (bytes buffer -> u8 *)
+    Py_buffer key;
+    u8 mod_key[16];
+    int i;
+    
+    self->initialized = 0;
+    if (! PyArg_ParseTuple(args, "z*", &key))
+        return -1;
+    
+    if (key.len != 16)
+    {
+        PyBuffer_Release(&key);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return -1;
+    };
+    
+    //void Kasumi_KeySchedule( Kasumi_Key *ks, u8 *key );
+    Kasumi_KeySchedule(&self->ks, (u8 *)key.buf);
+    for (i=0; i<16; i++)
+        mod_key[i] = ((u8 *)key.buf)[i] ^ 0x55;
+    Kasumi_KeySchedule(&self->ks55, mod_key);
+    for (i=0; i<16; i++)
+        mod_key[i] = ((u8 *)key.buf)[i] ^ 0xAA;
+    Kasumi_KeySchedule(&self->ksAA, mod_key);
+    self->initialized = 1;
+    
+    PyBuffer_Release(&key);
+    return 0;
+};
+
+
+// get the length in bits of a message, 8 times the length of the data buffer 
+// when not provided (or None), and check it against the data buffer
+static int message_length(PyObject* length_py, Py_buffer* data, int* length)
+{
+    if (length_py == NULL || length_py == Py_None)
+    {
+        if (data->len > 0x0fffffff)
+            return -1;
+        *length = 8 * (int)data->len;
+        return 0;
+    };
+    if (! PyArg_Parse(length_py, "i", length))
+    {
+        PyErr_Clear();
+        return -1;
+    };
+    if ((*length < 0) || (((Py_ssize_t)*length + 7) >> 3) > data->len)
+        return -1;
+    return 0;
+};
+
+
+static PyObject* KasumiKey_f8(KasumiKeyObject* self, PyObject* args)
+{
+    PyObject* ret = 0;
+    
+    // input: count, bearer, dir (u32), data (bytes buffer -> u8 *), optional length (int, in bits)
+    Py_buffer data_py;
+    PyObject* length_py = NULL;
+    long long count, bearer, dir;
+    int length, out_sz;
+    // output: data (u8 * -> bytes buffer of size length in bits
+    u8 * data;
+    
+    // count, bearer and dir are range-checked here, "I" silently wrapping them
+    if (! PyArg_ParseTuple(args, "LLLz*|O", &count, &bearer, &dir, &data_py, &length_py))
+        return NULL;
+    
+    if ((count < 0) || (count > 0xffffffffLL) || (bearer < 0) || (bearer > 0xffffffffLL) ||
+        (dir < 0) || (dir > 1) || (message_length(length_py, &data_py, &length) < 0))
+    {
+        PyBuffer_Release(&data_py);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return NULL;
+    };
+    
+    if (! self->initialized)
+    {
+        PyBuffer_Release(&data_py);
+        PyErr_SetString(PyExc_ValueError, "key not initialized");
+        return NULL;
+    };
+    
+    // transform length in bits to length in bytes
+    out_sz = length >> 3;
+    if (length % 8)
+        out_sz++;
+    
+    // duplicate the input buffer into the output bytes, in order to not mutate it
+    ret = PyBytes_FromStringAndSize(NULL, out_sz);
+    if (ret == NULL)
+    {
+        PyBuffer_Release(&data_py);
+        return NULL;
+    };
+    data = (u8 *)PyBytes_AS_STRING(ret);
+    
+    Py_BEGIN_ALLOW_THREADS
+    memcpy(data, data_py.buf, out_sz);
+    //void Kasumi_f8_ks( const Kasumi_Key *ks, const Kasumi_Key *ks_mod, u32 count, u32 bearer, u32 dir, u8 *data, int length );
+    Kasumi_f8_ks(&self->ks, &self->ks55, (u32)count, (u32)bearer, (u32)dir, data, length);
+    Py_END_ALLOW_THREADS
+    
+    PyBuffer_Release(&data_py);
+    return ret;
+};
+
+
+static PyObject* KasumiKey_f9(KasumiKeyObject* self, PyObject* args)
+{
+    // input: count, fresh, dir (u32), data (bytes buffer -> u8 *), optional length (int, in bits)
+    Py_buffer data;
+    PyObject* length_py = NULL;
+    long long count, fresh, dir;
+    int length;
+    // output: mac (u8 * -> bytes buffer of size 4)
+    u8 mac[4];
+    
+    // count, fresh and dir are range-checked here, "I" silently wrapping them
+    if (! PyArg_ParseTuple(args, "LLLz*|O", &count, &fresh, &dir, &data, &length_py))
+        return NULL;
+    
+    if ((count < 0) || (count > 0xffffffffLL) || (fresh < 0) || (fresh > 0xffffffffLL) ||
+        (dir < 0) || (dir > 1) || (message_length(length_py, &data, &length) < 0))
+    {
+        PyBuffer_Release(&data);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return NULL;
+    };
+    
+    if (! self->initialized)
+    {
+        PyBuffer_Release(&data);
+        PyErr_SetString(PyExc_ValueError, "key not initialized");
+        return NULL;
+    };
+    
+    Py_BEGIN_ALLOW_THREADS
+    //void Kasumi_f9_ks( const Kasumi_Key *ks, const Kasumi_Key *ks_mod, u32 count, u32 fresh, u32 dir, u8 *data, int length, u8 *mac_i );
+    Kasumi_f9_ks(&self->ks, &self->ksAA, (u32)count, (u32)fresh, (u32)dir, (u8 *)data.buf, length, mac);
+    Py_END_ALLOW_THREADS
+    
+    PyBuffer_Release(&data);
+    return PyBytes_FromStringAndSize((char *)mac, 4);
+};
+
+
+/* KasumiF8State object methods */
+
+
+static int KasumiF8State_init(KasumiF8StateObject* self, PyObject* args, PyObject* kwds)
+{
+    // input: key (bytes buffer -> u8 *), count, bearer, dir (u32)
+    Py_buffer key;
+    Kasumi_Key ks_mod;
+    u8 mod_key[16];
+    u32 count, bearer, dir;
+    int i;
+    
+    self->initialized = 0;
+    if (! PyArg_ParseTuple(args, "z*III", &key, &count, &bearer, &dir))
+        return -1;
+    
+    if ((key.len != 16) || (dir > 1))
+    {
+        PyBuffer_Release(&key);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return -1;
+    };
+    
+    //void Kasumi_KeySchedule( Kasumi_Key *ks, u8 *key );
+    Kasumi_KeySchedule(&self->ks, (u8 *)key.buf);
+    for (i=0; i<16; i++)
+        mod_key[i] = ((u8 *)key.buf)[i] ^ 0x55;
+    Kasumi_KeySchedule(&ks_mod, mod_key);
+    //void Kasumi_f8_modifier( const Kasumi_Key *ks_mod, u32 count, u32 bearer, u32 dir, u8 A[8] );
+    Kasumi_f8_modifier(&ks_mod, count, bearer, dir, self->A);
+    memset(self->KSB, 0, 8);
+    self->blkcnt = 0;
+    self->initialized = 1;
+    
+    PyBuffer_Release(&key);
+    return 0;
+};
+
+
+static PyObject* KasumiF8State_keystream_into(KasumiF8StateObject* self, PyObject* args)
+{
+    PyObject* ret = 0;
+    
+    // input: buf (writable buffer -> u8 *)
+    Py_buffer buf;
+    
+    if (! PyArg_ParseTuple(args, "w*", &buf))
+        return NULL;
+    
+    if ((buf.len % 8) || (buf.len >> 3 > 0xffffffff))
+    {
+        PyBuffer_Release(&buf);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return NULL;
+    };
+    
+    if (! self->initialized)
+    {
+        PyBuffer_Release(&buf);
+        PyErr_SetString(PyExc_ValueError, "generator not initialized");
+        return NULL;
+    };
+    
+    //void Kasumi_f8_keystream( const Kasumi_Key *ks, const u8 A[8], u8 KSB[8], u32 *blkcnt, u8 *out, u32 nblocks );
+    Kasumi_f8_keystream(&self->ks, self->A, self->KSB, &self->blkcnt, (u8 *)buf.buf, (u32)(buf.len >> 3));
+    
+    // return the buffer written
+    ret = buf.obj;
+    Py_INCREF(ret);
+    
+    PyBuffer_Release(&buf);
     return ret;
 };
+
+
+/* KasumiF9State object methods */
+
+
+static int KasumiF9State_init(KasumiF9StateObject* self, PyObject* args, PyObject* kwds)
+{
+    // input: key (bytes buffer -> u8 *), count, fresh, dir (u32)
+    Py_buffer key;
+    u32 count, fresh, dir;
+    
+    self->initialized = 0;
+    if (! PyArg_ParseTuple(args, "z*III", &key, &count, &fresh, &dir))
+        return -1;
+    
+    if ((key.len != 16) || (dir > 1))
+    {
+        PyBuffer_Release(&key);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return -1;
+    };
+    
+    Kasumi_f9_Init(&self->st, (u8 *)key.buf, count, fresh, dir);
+    self->initialized = 1;
+    
+    PyBuffer_Release(&key);
+    return 0;
+};
+
+
+static PyObject* KasumiF9State_update(KasumiF9StateObject* self, PyObject* args)
+{
+    // input: data (buffer -> u8 *)
+    Py_buffer data;
+    
+    if (! PyArg_ParseTuple(args, "z*", &data))
+        return NULL;
+    
+    if (! self->initialized)
+    {
+        PyBuffer_Release(&data);
+        PyErr_SetString(PyExc_ValueError, "f9 not initialized");
+        return NULL;
+    };
+    
+    Kasumi_f9_Update(&self->st, (const u8 *)data.buf, (u64)data.len);
+    
+    PyBuffer_Release(&data);
+    Py_RETURN_NONE;
+};
+
+
+static PyObject* KasumiF9State_mac(KasumiF9StateObject* self, PyObject* args)
+{
+    // input: optional length (u64, in bits)
+    PyObject* length_py = NULL;
+    unsigned long long length;
+    // output: mac (4 bytes buffer)
+    u8 mac[4];
+    
+    if (! PyArg_ParseTuple(args, "|O", &length_py))
+        return NULL;
+    
+    if (! self->initialized)
+    {
+        PyErr_SetString(PyExc_ValueError, "f9 not initialized");
+        return NULL;
+    };
+    
+    if (length_py == NULL || length_py == Py_None)
+        length = 8 * self->st.nbytes;
+    else if (! PyArg_Parse(length_py, "K", &length))
+        return NULL;
+    
+    if (Kasumi_f9_Final(&self->st, (u64)length, mac) < 0)
+    {
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return NULL;
+    };
+    
+    return PyBytes_FromStringAndSize((char *)mac, 4);
+};
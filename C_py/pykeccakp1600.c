@@ -26,6 +26,7 @@
 
 #include <Python.h>
 #include "../C_alg/KeccakP-1600-3gpp.h"
+#include "../C_alg/TUAK.h"
 
 
 /* Python 2 and 3 initialization mess */
@@ -53,15 +54,56 @@ static PyObject * error_out(PyObject *m) {
 }
 
 static PyObject* pykeccakp1600(PyObject* dummy, PyObject* args);
+static PyObject* keccakp1600_many(PyObject* dummy, PyObject* args);
+static PyObject* pytuak_topc(PyObject* dummy, PyObject* args);
+static PyObject* pytuak_f1(PyObject* dummy, PyObject* args);
+static PyObject* pytuak_f1star(PyObject* dummy, PyObject* args);
+static PyObject* pytuak_f2345(PyObject* dummy, PyObject* args);
+static PyObject* pytuak_f5star(PyObject* dummy, PyObject* args);
 //static PyObject* push_data(PyObject* dummy, PyObject* args);
 
 static char pykeccakp1600_doc[] =
     " pykeccakp1600(data_in [200 bytes]) -> data_out [200 bytes]";
 
+static char keccakp1600_many_doc[] =
+    " keccakp1600_many(buf [writable buffer], n [uint], iterations [int, default 1]) -> buf\n"
+    "   permutes in place the n consecutive 200 bytes states of buf, iterations times each";
+
+static char pytuak_topc_doc[] =
+    " tuak_topc(K [16 or 32 bytes], TOP [32 bytes], iterations [int, default 1], algoname [7 bytes, default b'TUAK1.0'])\n"
+    "   -> TOPc [32 bytes]";
+
+static char pytuak_f1_doc[] =
+    " tuak_f1(K [16 or 32 bytes], TOPc [32 bytes], RAND [16 bytes], SQN [6 bytes], AMF [2 bytes],\n"
+    "         len_mac [64, 128 or 256, default 64], iterations [int, default 1], algoname [7 bytes, default b'TUAK1.0'])\n"
+    "   -> MAC_A [len_mac bits]";
+
+static char pytuak_f1star_doc[] =
+    " tuak_f1star(K [16 or 32 bytes], TOPc [32 bytes], RAND [16 bytes], SQN [6 bytes], AMF [2 bytes],\n"
+    "             len_mac [64, 128 or 256, default 64], iterations [int, default 1], algoname [7 bytes, default b'TUAK1.0'])\n"
+    "   -> MAC_S [len_mac bits]";
+
+static char pytuak_f2345_doc[] =
+    " tuak_f2345(K [16 or 32 bytes], TOPc [32 bytes], RAND [16 bytes],\n"
+    "            len_res [32, 64, 128 or 256, default 64], len_ck [128 or 256, default 128], len_ik [128 or 256, default 128],\n"
+    "            iterations [int, default 1], algoname [7 bytes, default b'TUAK1.0'])\n"
+    "   -> (RES [len_res bits], CK [len_ck bits], IK [len_ik bits], AK [6 bytes])";
+
+static char pytuak_f5star_doc[] =
+    " tuak_f5star(K [16 or 32 bytes], TOPc [32 bytes], RAND [16 bytes],\n"
+    "             iterations [int, default 1], algoname [7 bytes, default b'TUAK1.0'])\n"
+    "   -> AK [6 bytes]";
+
 static PyMethodDef pykeccakp1600_methods[] = 
 {
     {"error_out", (PyCFunction)error_out, METH_NOARGS, NULL},
     {"pykeccakp1600", pykeccakp1600, METH_VARARGS, pykeccakp1600_doc},
+    {"keccakp1600_many", keccakp1600_many, METH_VARARGS, keccakp1600_many_doc},
+    {"tuak_topc", pytuak_topc, METH_VARARGS, pytuak_topc_doc},
+    {"tuak_f1", pytuak_f1, METH_VARARGS, pytuak_f1_doc},
+    {"tuak_f1star", pytuak_f1star, METH_VARARGS, pytuak_f1star_doc},
+    {"tuak_f2345", pytuak_f2345, METH_VARARGS, pytuak_f2345_doc},
+    {"tuak_f5star", pytuak_f5star, METH_VARARGS, pytuak_f5star_doc},
 //    {"push_data", push_data, METH_VARARGS, NULL},
     { NULL, NULL, 0, NULL }
 };
@@ -164,11 +206,13 @@ static PyObject* pykeccakp1600(PyObject* dummy, PyObject* args)
     
     if (data_in.len != 200)
     {
+        PyBuffer_Release(&data_in);
         PyErr_SetString(PyExc_ValueError, "invalid arg, must be 200 bytes");
         return NULL;
     };
     
     memcpy(state, data_in.buf, 200);
+    PyBuffer_Release(&data_in);
     /* no need to swap bytes actually... who knows !
     for (i=0; i < 25; i++) {
         state[i] = swap_uint64(state[i]);
@@ -176,7 +220,9 @@ static PyObject* pykeccakp1600(PyObject* dummy, PyObject* args)
     */
     
     //void Keccak_f_64(uint64 *s)
-    Keccak_f_64(state);
+    Py_BEGIN_ALLOW_THREADS
+    Keccak_f_64_fast(state);
+    Py_END_ALLOW_THREADS
     
     /*
     for (i=0; i < 25; i++) {
@@ -189,6 +235,206 @@ static PyObject* pykeccakp1600(PyObject* dummy, PyObject* args)
 };
 
 
+/*
+   keccakp1600_many binding to the Keccak_f_64_many() function
+   as defined in KeccakP-1600-3gpp.h
+*/
+
+static PyObject* keccakp1600_many(PyObject* dummy, PyObject* args)
+{
+    PyObject* buf_py;
+    Py_buffer buf;
+    Py_ssize_t n;
+    int iterations = 1;
+    
+    if (! PyArg_ParseTuple(args, "On|i", &buf_py, &n, &iterations))
+        return NULL;
+    
+    if (PyObject_GetBuffer(buf_py, &buf, PyBUF_WRITABLE | PyBUF_C_CONTIGUOUS) < 0)
+        return NULL;
+    
+    if (n < 0 || n > buf.len / 200 || iterations < 0)
+    {
+        PyBuffer_Release(&buf);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return NULL;
+    };
+    
+    Py_BEGIN_ALLOW_THREADS
+    Keccak_f_64_many((uint8_t *)buf.buf, (size_t)n, iterations);
+    Py_END_ALLOW_THREADS
+    
+    PyBuffer_Release(&buf);
+    Py_INCREF(buf_py);
+    return buf_py;
+};
+
+
+/*
+   TUAK functions bindings, as defined in TUAK.h
+   all Py_buffer arguments are released by tuak_release()
+*/
+
+static const uint8_t tuak_algoname[7] = {'T', 'U', 'A', 'K', '1', '.', '0'};
+
+static void tuak_release(Py_buffer *K, Py_buffer *TOPc, Py_buffer *RAND, Py_buffer *SQN,
+                         Py_buffer *AMF, Py_buffer *algoname)
+{
+    PyBuffer_Release(K);
+    PyBuffer_Release(TOPc);
+    if (RAND)
+        PyBuffer_Release(RAND);
+    if (SQN)
+        PyBuffer_Release(SQN);
+    if (AMF)
+        PyBuffer_Release(AMF);
+    PyBuffer_Release(algoname);
+}
+
+/* check K, TOP(c), algoname and iterations arguments */
+static int tuak_check_args(Py_buffer *K, Py_buffer *TOPc, Py_buffer *algoname, int iterations)
+{
+    return (K->len == 16 || K->len == 32) && TOPc->len == 32 &&
+           (algoname->obj == NULL || algoname->len == 7) && iterations >= 1;
+}
+
+static const uint8_t* tuak_get_algoname(Py_buffer *algoname)
+{
+    return (algoname->obj == NULL) ? tuak_algoname : (const uint8_t *)algoname->buf;
+}
+
+static PyObject* pytuak_topc(PyObject* dummy, PyObject* args)
+{
+    Py_buffer K, TOP, algoname;
+    int iterations = 1;
+    uint8_t TOPc[32];
+    
+    memset(&algoname, 0, sizeof(Py_buffer));
+    if (! PyArg_ParseTuple(args, "z*z*|iz*", &K, &TOP, &iterations, &algoname))
+        return NULL;
+    
+    if (! tuak_check_args(&K, &TOP, &algoname, iterations))
+    {
+        tuak_release(&K, &TOP, 0, 0, 0, &algoname);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return NULL;
+    };
+    
+    Py_BEGIN_ALLOW_THREADS
+    TUAK_TOPc((uint8_t *)K.buf, (int)K.len, (uint8_t *)TOP.buf, tuak_get_algoname(&algoname),
+              iterations, TOPc);
+    Py_END_ALLOW_THREADS
+    tuak_release(&K, &TOP, 0, 0, 0, &algoname);
+    
+    return PyBytes_FromStringAndSize((char *)TOPc, 32);
+};
+
+static PyObject* tuak_f1_generic(PyObject* args, int star)
+{
+    Py_buffer K, TOPc, RAND, SQN, AMF, algoname;
+    int len_mac = 64, iterations = 1, ret;
+    uint8_t MAC[32];
+    
+    memset(&algoname, 0, sizeof(Py_buffer));
+    if (! PyArg_ParseTuple(args, "z*z*z*z*z*|iiz*", &K, &TOPc, &RAND, &SQN, &AMF,
+                           &len_mac, &iterations, &algoname))
+        return NULL;
+    
+    if (! tuak_check_args(&K, &TOPc, &algoname, iterations) ||
+        RAND.len != 16 || SQN.len != 6 || AMF.len != 2)
+        ret = -1;
+    else
+    {
+        Py_BEGIN_ALLOW_THREADS
+        ret = TUAK_f1((uint8_t *)K.buf, (int)K.len, (uint8_t *)TOPc.buf, (uint8_t *)RAND.buf,
+                      (uint8_t *)SQN.buf, (uint8_t *)AMF.buf, tuak_get_algoname(&algoname),
+                      iterations, len_mac, star, MAC);
+        Py_END_ALLOW_THREADS
+    };
+    tuak_release(&K, &TOPc, &RAND, &SQN, &AMF, &algoname);
+    
+    if (ret)
+    {
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return NULL;
+    };
+    return PyBytes_FromStringAndSize((char *)MAC, len_mac>>3);
+};
+
+static PyObject* pytuak_f1(PyObject* dummy, PyObject* args)
+{
+    return tuak_f1_generic(args, 0);
+};
+
+static PyObject* pytuak_f1star(PyObject* dummy, PyObject* args)
+{
+    return tuak_f1_generic(args, 1);
+};
+
+static PyObject* pytuak_f2345(PyObject* dummy, PyObject* args)
+{
+    Py_buffer K, TOPc, RAND, algoname;
+    int len_res = 64, len_ck = 128, len_ik = 128, iterations = 1, ret;
+    uint8_t RES[32], CK[32], IK[32], AK[6];
+    
+    memset(&algoname, 0, sizeof(Py_buffer));
+    if (! PyArg_ParseTuple(args, "z*z*z*|iiiiz*", &K, &TOPc, &RAND,
+                           &len_res, &len_ck, &len_ik, &iterations, &algoname))
+        return NULL;
+    
+    if (! tuak_check_args(&K, &TOPc, &algoname, iterations) || RAND.len != 16)
+        ret = -1;
+    else
+    {
+        Py_BEGIN_ALLOW_THREADS
+        ret = TUAK_f2345((uint8_t *)K.buf, (int)K.len, (uint8_t *)TOPc.buf, (uint8_t *)RAND.buf,
+                         tuak_get_algoname(&algoname), iterations, len_res, len_ck, len_ik,
+                         RES, CK, IK, AK);
+        Py_END_ALLOW_THREADS
+    };
+    tuak_release(&K, &TOPc, &RAND, 0, 0, &algoname);
+    
+    if (ret)
+    {
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return NULL;
+    };
+    return Py_BuildValue("(NNNN)", PyBytes_FromStringAndSize((char *)RES, len_res>>3),
+                                   PyBytes_FromStringAndSize((char *)CK, len_ck>>3),
+                                   PyBytes_FromStringAndSize((char *)IK, len_ik>>3),
+                                   PyBytes_FromStringAndSize((char *)AK, 6));
+};
+
+static PyObject* pytuak_f5star(PyObject* dummy, PyObject* args)
+{
+    Py_buffer K, TOPc, RAND, algoname;
+    int iterations = 1, ret;
+    uint8_t AK[6];
+    
+    memset(&algoname, 0, sizeof(Py_buffer));
+    if (! PyArg_ParseTuple(args, "z*z*z*|iz*", &K, &TOPc, &RAND, &iterations, &algoname))
+        return NULL;
+    
+    if (! tuak_check_args(&K, &TOPc, &algoname, iterations) || RAND.len != 16)
+        ret = -1;
+    else
+    {
+        Py_BEGIN_ALLOW_THREADS
+        ret = TUAK_f5star((uint8_t *)K.buf, (int)K.len, (uint8_t *)TOPc.buf, (uint8_t *)RAND.buf,
+                          tuak_get_algoname(&algoname), iterations, AK);
+        Py_END_ALLOW_THREADS
+    };
+    tuak_release(&K, &TOPc, &RAND, 0, 0, &algoname);
+    
+    if (ret)
+    {
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return NULL;
+    };
+    return PyBytes_FromStringAndSize((char *)AK, 6);
+};
+
+
 /*
 void PUSH_DATA_64(uint64_t * INOUT, uint8_t * data, uint8_t n, uint8_t location)
 {
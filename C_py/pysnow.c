@@ -26,6 +26,7 @@
 
 #include <Python.h>
 #include "../C_alg/SNOW_3G.h"
+#include "pybuffers.h"
 
 
 /* Python 2 and 3 initialization mess */
@@ -56,6 +57,13 @@ static PyObject* pysnow_initialize(PyObject* dummy, PyObject* args);
 static PyObject* pysnow_generatekeystream(PyObject* dummy, PyObject* args);
 static PyObject* pysnow_f8(PyObject* dummy, PyObject* args);
 static PyObject* pysnow_f9(PyObject* dummy, PyObject* args);
+static PyObject* pysnow_f8_into(PyObject* dummy, PyObject* args);
+static PyObject* pysnow_f8_records(PyObject* dummy, PyObject* args);
+static PyObject* pysnow_f8_batch(PyObject* dummy, PyObject* args);
+static PyObject* pysnow_f9_batch(PyObject* dummy, PyObject* args);
+static PyObject* pysnow_f9_engines(PyObject* dummy, PyObject* args);
+static PyObject* pysnow_get_f9_engine(PyObject* dummy, PyObject* args);
+static PyObject* pysnow_set_f9_engine(PyObject* dummy, PyObject* args);
 
 static char pysnow_initialize_doc[] =
     "snow_initialize(key [16 bytes], iv [16 bytes]) -> None";
@@ -67,6 +75,114 @@ static char pysnow_f8_doc[] =
 static char pysnow_f9_doc[] =
     "snow_f9(ik [16 bytes], count [uint32], bearer [uint32], dir [0 or 1], "\
             "data_in [bytes], length [uint32, length in bits]) -> mac [4 bytes]";
+static char pysnow_f8_into_doc[] =
+    "snow_f8_into(ck [16 bytes], count [uint32], bearer [uint32], dir [0 or 1], "\
+                 "data_in [buffer], length [uint32, length in bits], data_out [writable buffer, optional]) "\
+                 "-> data_out\n\n"\
+    "data_in is processed in place when data_out is not provided";
+static char pysnow_f8_records_doc[] =
+    "snow_f8_records(ck [16 bytes], data_in [buffer], records [sequence of (offset [int], "\
+                    "length [int, length in bytes], count [uint32], bearer [uint5], dir [0 or 1])], "\
+                    "data_out [writable buffer, optional]) -> data_out\n\n"\
+    "ciphers each record of data_in, located at the same offset in data_out, with\n"\
+    "a single call for all the records of a key; data_in is processed in place when\n"\
+    "data_out is not provided";
+static char pysnow_f8_batch_doc[] =
+    "snow_f8_batch(ck [16 bytes], pdus [sequence of (count [uint32], bearer [uint32], "\
+                  "dir [0 or 1], data_in [bytes], length [uint32, length in bits, optional])]) "\
+                  "-> list of data_out [bytes]";
+static char pysnow_f9_batch_doc[] =
+    "snow_f9_batch(ik [16 bytes], pdus [sequence of (count [uint32], fresh [uint32], "\
+                  "dir [0 or 1], data_in [bytes], length [uint32, length in bits, optional])]) "\
+                  "-> list of mac [4 bytes]";
+static char pysnow_f9_engines_doc[] =
+    "snow_f9_engines() -> tuple of names of the f9 engines available "\
+    "(among 'ref', 'table' and 'clmul')";
+static char pysnow_get_f9_engine_doc[] =
+    "snow_get_f9_engine() -> name of the engine used by f9";
+static char pysnow_set_f9_engine_doc[] =
+    "snow_set_f9_engine(name ['ref', 'table' or 'clmul']) -> None\n\n"\
+    "selects the GF(2^64) multiplication engine used by the f9 computations started "\
+    "afterwards (the fastest available one is selected at import)";
+
+
+/* SNOW3GState object, holding its own SNOW 3G generator state */
+
+typedef struct {
+    PyObject_HEAD
+    SNOW3G_State st;
+    int initialized;
+} SNOW3GStateObject;
+
+static int SNOW3GState_init(SNOW3GStateObject* self, PyObject* args, PyObject* kwds);
+static PyObject* SNOW3GState_initialize(SNOW3GStateObject* self, PyObject* args);
+static PyObject* SNOW3GState_keystream(SNOW3GStateObject* self, PyObject* args);
+static PyObject* SNOW3GState_keystream_into(SNOW3GStateObject* self, PyObject* args);
+
+static char SNOW3GState_doc[] =
+    "SNOW3GState([key [16 bytes], iv [16 bytes]]) -> SNOW 3G generator object\n\n"\
+    "Each object holds its own LFSR and FSM registers, hence several keystreams\n"\
+    "can be generated concurrently";
+static char SNOW3GState_initialize_doc[] =
+    "initialize(key [16 bytes], iv [16 bytes]) -> None";
+static char SNOW3GState_keystream_doc[] =
+    "keystream(n [uint32, number of 32-bit words]) -> keystream [bytes]\n\n"\
+    "each call continues the keystream where the previous one stopped";
+static char SNOW3GState_keystream_into_doc[] =
+    "keystream_into(buf [writable buffer, length multiple of 4]) -> buf\n\n"\
+    "fills buf with the next len(buf)/4 32-bit words of keystream, without\n"\
+    "allocating any intermediate buffer";
+
+static PyMethodDef SNOW3GState_methods[] =
+{
+    {"initialize", (PyCFunction)SNOW3GState_initialize, METH_VARARGS, SNOW3GState_initialize_doc},
+    {"keystream", (PyCFunction)SNOW3GState_keystream, METH_VARARGS, SNOW3GState_keystream_doc},
+    {"keystream_into", (PyCFunction)SNOW3GState_keystream_into, METH_VARARGS, SNOW3GState_keystream_into_doc},
+    { NULL, NULL, 0, NULL }
+};
+
+static PyTypeObject SNOW3GStateType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "pysnow.SNOW3GState",       /* tp_name */
+    sizeof(SNOW3GStateObject),  /* tp_basicsize */
+};
+
+/* SNOW3GF9State object, holding the state of an incremental f9 computation */
+
+typedef struct {
+    PyObject_HEAD
+    SNOW3G_f9_State st;
+    int initialized;
+} SNOW3GF9StateObject;
+
+static int SNOW3GF9State_init(SNOW3GF9StateObject* self, PyObject* args, PyObject* kwds);
+static PyObject* SNOW3GF9State_update(SNOW3GF9StateObject* self, PyObject* args);
+static PyObject* SNOW3GF9State_mac(SNOW3GF9StateObject* self, PyObject* args);
+
+static char SNOW3GF9State_doc[] =
+    "SNOW3GF9State(ik [16 bytes], count [uint32], fresh [uint32], dir [0 or 1]) "\
+    "-> incremental f9 object\n\n"\
+    "the message is provided by parts with update(), mac() returning the MAC\n"\
+    "of the message provided so far";
+static char SNOW3GF9State_update_doc[] =
+    "update(data_in [buffer]) -> None";
+static char SNOW3GF9State_mac_doc[] =
+    "mac(length [uint64, length in bits, optional]) -> mac [4 bytes]\n\n"\
+    "length can only leave out the last bits of the last byte provided, the\n"\
+    "object can still be updated afterwards";
+
+static PyMethodDef SNOW3GF9State_methods[] =
+{
+    {"update", (PyCFunction)SNOW3GF9State_update, METH_VARARGS, SNOW3GF9State_update_doc},
+    {"mac", (PyCFunction)SNOW3GF9State_mac, METH_VARARGS, SNOW3GF9State_mac_doc},
+    { NULL, NULL, 0, NULL }
+};
+
+static PyTypeObject SNOW3GF9StateType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "pysnow.SNOW3GF9State",     /* tp_name */
+    sizeof(SNOW3GF9StateObject), /* tp_basicsize */
+};
 
 static PyMethodDef pysnow_methods[] = 
 {
@@ -76,6 +192,13 @@ static PyMethodDef pysnow_methods[] =
     {"snow_generatekeystream", pysnow_generatekeystream, METH_VARARGS, pysnow_generatekeystream_doc},
     {"snow_f8", pysnow_f8, METH_VARARGS, pysnow_f8_doc},
     {"snow_f9", pysnow_f9, METH_VARARGS, pysnow_f9_doc},
+    {"snow_f8_into", pysnow_f8_into, METH_VARARGS, pysnow_f8_into_doc},
+    {"snow_f8_records", pysnow_f8_records, METH_VARARGS, pysnow_f8_records_doc},
+    {"snow_f8_batch", pysnow_f8_batch, METH_VARARGS, pysnow_f8_batch_doc},
+    {"snow_f9_batch", pysnow_f9_batch, METH_VARARGS, pysnow_f9_batch_doc},
+    {"snow_f9_engines", pysnow_f9_engines, METH_NOARGS, pysnow_f9_engines_doc},
+    {"snow_get_f9_engine", pysnow_get_f9_engine, METH_NOARGS, pysnow_get_f9_engine_doc},
+    {"snow_set_f9_engine", pysnow_set_f9_engine, METH_VARARGS, pysnow_set_f9_engine_doc},
     { NULL, NULL, 0, NULL }
 };
 
@@ -140,6 +263,33 @@ static PyMethodDef pysnow_methods[] =
         Py_DECREF(module);
         INITERROR;
     }
+    
+    SNOW3GStateType.tp_flags   = Py_TPFLAGS_DEFAULT;
+    SNOW3GStateType.tp_doc     = SNOW3GState_doc;
+    SNOW3GStateType.tp_methods = SNOW3GState_methods;
+    SNOW3GStateType.tp_init    = (initproc)SNOW3GState_init;
+    SNOW3GStateType.tp_new     = PyType_GenericNew;
+    if (PyType_Ready(&SNOW3GStateType) < 0) {
+        Py_DECREF(module);
+        INITERROR;
+    }
+    Py_INCREF(&SNOW3GStateType);
+    PyModule_AddObject(module, "SNOW3GState", (PyObject *)&SNOW3GStateType);
+    
+    SNOW3GF9StateType.tp_flags   = Py_TPFLAGS_DEFAULT;
+    SNOW3GF9StateType.tp_doc     = SNOW3GF9State_doc;
+    SNOW3GF9StateType.tp_methods = SNOW3GF9State_methods;
+    SNOW3GF9StateType.tp_init    = (initproc)SNOW3GF9State_init;
+    SNOW3GF9StateType.tp_new     = PyType_GenericNew;
+    if (PyType_Ready(&SNOW3GF9StateType) < 0) {
+        Py_DECREF(module);
+        INITERROR;
+    }
+    Py_INCREF(&SNOW3GF9StateType);
+    PyModule_AddObject(module, "SNOW3GF9State", (PyObject *)&SNOW3GF9StateType);
+    
+    // f9 engine, selected once: the bindings then only read it with the GIL held
+    SNOW3G_f9_set_engine(SNOW3G_f9_best_engine());
 
     #if PY_MAJOR_VERSION >= 3
     
@@ -245,7 +395,7 @@ static PyObject* pysnow_f8(PyObject* dummy, PyObject* args)
     Py_buffer key;
     Py_buffer data_py;
     u32 count, bearer, dir, length;
-    int out_sz;
+    Py_ssize_t out_sz;
     // output: data (u8 * -> bytes buffer of size length in bits)
     u8 * data;
     
@@ -259,41 +409,163 @@ static PyObject* pysnow_f8(PyObject* dummy, PyObject* args)
     
     if ((key.len != 16) || (dir > 1) || (out_sz > data_py.len))
     {
+        PyBuffer_Release(&key);
+        PyBuffer_Release(&data_py);
         PyErr_SetString(PyExc_ValueError, "invalid args");
         return NULL;
     };
     
-    // duplicate the input buffer in order to not mutate it
-    data = (u8 *)malloc(out_sz);
-    if (data == NULL)
+    // duplicate the input buffer into the output bytes, in order to not mutate it
+    ret = PyBytes_FromStringAndSize(NULL, out_sz);
+    if (ret == NULL)
     {
-        PyErr_SetString(PyExc_RuntimeError, "malloc failed");
+        PyBuffer_Release(&key);
+        PyBuffer_Release(&data_py);
         return NULL;
     };
-    memcpy(data, data_py.buf, out_sz);
+    data = (u8 *)PyBytes_AS_STRING(ret);
     
+    Py_BEGIN_ALLOW_THREADS
+    memcpy(data, data_py.buf, out_sz);
     //void f8( u8 *key, u32 count, u32 bearer, u32 dir, u8 *data, u32 length );
     f8((u8 *)key.buf, count, bearer, dir, data, length);
+    Py_END_ALLOW_THREADS
+    
+    PyBuffer_Release(&key);
+    PyBuffer_Release(&data_py);
+    return ret;
+};
+
+
+static PyObject* pysnow_f8_into(PyObject* dummy, PyObject* args)
+{
+    PyObject* ret = 0;
     
-    ret = PyBytes_FromStringAndSize((char *)data, out_sz);
-    free(data);
-    data = NULL;
+    // input: key (bytes buffer -> u8 *), count, bearer, dir (u32), data (buffer -> u8 *), 
+    //        length (u32), optional out (writable buffer -> u8 *)
+    Py_buffer key;
+    PyObject* data_py;
+    PyObject* out_py = NULL;
+    Py_buffer data;
+    Py_buffer out;
+    u32 count, bearer, dir;
+    u32 length;
+    Py_ssize_t out_sz;
     
+    if (! PyArg_ParseTuple(args, "z*IIIOI|O", &key, &count, &bearer, &dir, &data_py, &length, &out_py))
+        return NULL;
+    
+    if (into_buffers(data_py, out_py, &data, &out) < 0)
+    {
+        PyBuffer_Release(&key);
+        return NULL;
+    };
+    
+    // transform length in bits to length in bytes
+    out_sz = length >> 3;
+    if (length % 8)
+        out_sz++;
+    
+    if ((key.len != 16) || (dir > 1) || (out_sz > data.len) || (out_sz > out.len))
+    {
+        PyBuffer_Release(&key);
+        PyBuffer_Release(&data);
+        PyBuffer_Release(&out);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return NULL;
+    };
+    
+    Py_BEGIN_ALLOW_THREADS
+    if (out.buf != data.buf)
+        memmove(out.buf, data.buf, out_sz);
+    //void f8( u8 *key, u32 count, u32 bearer, u32 dir, u8 *data, u32 length );
+    f8((u8 *)key.buf, count, bearer, dir, (u8 *)out.buf, length);
+    Py_END_ALLOW_THREADS
+    
+    // return the buffer written
+    ret = out.obj;
+    Py_INCREF(ret);
+    
+    PyBuffer_Release(&key);
+    PyBuffer_Release(&data);
+    PyBuffer_Release(&out);
     return ret;
 };
 
 
-static PyObject* pysnow_f9(PyObject* dummy, PyObject* args)
+static PyObject* pysnow_f8_records(PyObject* dummy, PyObject* args)
 {
     PyObject* ret = 0;
     
+    // input: key (bytes buffer -> u8 *), data (buffer -> u8 *), records (sequence of tuples),
+    //        optional out (writable buffer -> u8 *)
+    Py_buffer key;
+    PyObject* data_py;
+    PyObject* seq;
+    PyObject* out_py = NULL;
+    Py_buffer data;
+    Py_buffer out;
+    buf_record* recs;
+    Py_ssize_t n, i;
+    
+    if (! PyArg_ParseTuple(args, "z*OO|O", &key, &data_py, &seq, &out_py))
+        return NULL;
+    
+    if (key.len != 16)
+    {
+        PyBuffer_Release(&key);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return NULL;
+    };
+    
+    if (into_buffers(data_py, out_py, &data, &out) < 0)
+    {
+        PyBuffer_Release(&key);
+        return NULL;
+    };
+    
+    recs = records_parse(seq, (data.len < out.len) ? data.len : out.len, 0x1fffffff, &n);
+    if (recs == NULL)
+    {
+        PyBuffer_Release(&key);
+        PyBuffer_Release(&data);
+        PyBuffer_Release(&out);
+        return NULL;
+    };
+    
+    Py_BEGIN_ALLOW_THREADS
+    for (i=0; i<n; i++)
+    {
+        if (out.buf != data.buf)
+            memmove((u8 *)out.buf + recs[i].offset, (u8 *)data.buf + recs[i].offset, recs[i].len);
+        f8((u8 *)key.buf, recs[i].count, recs[i].bearer, recs[i].dir,
+           (u8 *)out.buf + recs[i].offset, 8 * (u32)recs[i].len);
+    };
+    Py_END_ALLOW_THREADS
+    
+    // return the buffer written
+    ret = out.obj;
+    Py_INCREF(ret);
+    
+    free(recs);
+    PyBuffer_Release(&key);
+    PyBuffer_Release(&data);
+    PyBuffer_Release(&out);
+    return ret;
+};
+
+
+static PyObject* pysnow_f9(PyObject* dummy, PyObject* args)
+{
     // input: key, data (bytes buffer -> u8 *), count, fresh, dir, length (u32)
     Py_buffer key;
     Py_buffer data;
     u32 count, fresh, dir, length;
-    int out_sz;
+    Py_ssize_t out_sz;
     // output: mac (u8 * -> bytes buffer of size 4)
-    u8 * mac;
+    u8 mac[4];
+    // engine read with the GIL held, as set by snow_set_f9_engine()
+    int engine = SNOW3G_f9_get_engine();
     
     if (! PyArg_ParseTuple(args, "z*IIIz*I", &key, &count, &fresh, &dir, &data, &length))
         return NULL;
@@ -305,13 +577,574 @@ static PyObject* pysnow_f9(PyObject* dummy, PyObject* args)
     
     if ((key.len != 16) || (dir > 1) || (out_sz > data.len))
     {
+        PyBuffer_Release(&key);
+        PyBuffer_Release(&data);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return NULL;
+    };
+    
+    Py_BEGIN_ALLOW_THREADS
+    //void SNOW3G_f9( u8* key, u32 count, u32 fresh, u32 dir, u8 *data, u64 length, u8 *MAC_I, int engine);
+    SNOW3G_f9((u8 *)key.buf, count, fresh, dir, (u8 *)data.buf, length, mac, engine);
+    Py_END_ALLOW_THREADS
+    
+    PyBuffer_Release(&key);
+    PyBuffer_Release(&data);
+    return PyBytes_FromStringAndSize((char *)mac, 4);
+};
+
+
+/* batch processing of PDUs, each PDU being a tuple 
+   (count [uint32], bearer [uint32], dir [0 or 1], data [bytes], bitlen [uint32, optional]) */
+
+typedef struct {
+    u32 count, bearer, dir, length;
+    Py_ssize_t len;
+    Py_buffer data;
+    u8 * out;
+    u8 mac[4];
+} batch_pdu;
+
+
+static void batch_release(batch_pdu* pdus, Py_ssize_t n)
+{
+    Py_ssize_t i;
+    
+    for (i=0; i<n; i++)
+        PyBuffer_Release(&pdus[i].data);
+    free(pdus);
+};
+
+
+static batch_pdu* batch_parse(PyObject* seq, Py_ssize_t* n)
+{
+    PyObject* fast;
+    PyObject* item;
+    PyObject* bitlen;
+    batch_pdu* pdus;
+    batch_pdu* p;
+    Py_ssize_t i;
+    long long count, bearer, dir;
+    
+    fast = PySequence_Fast(seq, "invalid args");
+    if (fast == NULL)
+        return NULL;
+    *n = PySequence_Fast_GET_SIZE(fast);
+    
+    pdus = (batch_pdu *)malloc((*n ? *n : 1) * sizeof(batch_pdu));
+    if (pdus == NULL)
+    {
+        Py_DECREF(fast);
+        PyErr_SetString(PyExc_RuntimeError, "malloc failed");
+        return NULL;
+    };
+    
+    for (i=0; i<*n; i++)
+    {
+        p = &pdus[i];
+        item = PySequence_Fast_GET_ITEM(fast, i);
+        bitlen = Py_None;
+        if (! PyTuple_Check(item))
+        {
+            PyErr_SetString(PyExc_ValueError, "invalid args");
+            goto error;
+        };
+        // count, bearer and dir are range-checked here, "I" silently wrapping them
+        if (! PyArg_ParseTuple(item, "LLLz*|O", &count, &bearer, &dir, &p->data, &bitlen))
+            goto error;
+        if ((count < 0) || (count > 0xffffffffLL) || (bearer < 0) || (bearer > 0xffffffffLL) ||
+            (dir < 0) || (dir > 1))
+        {
+            PyBuffer_Release(&p->data);
+            PyErr_SetString(PyExc_ValueError, "invalid args");
+            goto error;
+        };
+        p->count  = (u32)count;
+        p->bearer = (u32)bearer;
+        p->dir    = (u32)dir;
+        
+        if (bitlen == Py_None)
+        {
+            if (p->data.len > 0x1fffffff)
+            {
+                PyBuffer_Release(&p->data);
+                PyErr_SetString(PyExc_ValueError, "invalid args");
+                goto error;
+            };
+            p->length = 8 * (u32)p->data.len;
+        }
+        else if (! PyArg_Parse(bitlen, "I", &p->length))
+        {
+            PyBuffer_Release(&p->data);
+            goto error;
+        };
+        
+        // transform length in bits to length in bytes
+        p->len = p->length >> 3;
+        if (p->length % 8)
+            p->len++;
+        
+        if (p->len > p->data.len)
+        {
+            PyBuffer_Release(&p->data);
+            PyErr_SetString(PyExc_ValueError, "invalid args");
+            goto error;
+        };
+        p->out = NULL;
+    };
+    
+    Py_DECREF(fast);
+    return pdus;
+    
+error:
+    Py_DECREF(fast);
+    batch_release(pdus, i);
+    return NULL;
+};
+
+
+// allocate a list of bytes of the PDUs' length, to be filled in place by the batch function
+static PyObject* batch_alloc_out(batch_pdu* pdus, Py_ssize_t n)
+{
+    PyObject* ret;
+    PyObject* b;
+    Py_ssize_t i;
+    
+    ret = PyList_New(n);
+    if (ret == NULL)
+        return NULL;
+    for (i=0; i<n; i++)
+    {
+        b = PyBytes_FromStringAndSize(NULL, pdus[i].len);
+        if (b == NULL)
+        {
+            Py_DECREF(ret);
+            return NULL;
+        };
+        PyList_SET_ITEM(ret, i, b);
+        pdus[i].out = (u8 *)PyBytes_AS_STRING(b);
+    };
+    return ret;
+};
+
+
+// return the list of MACs computed by the batch function
+static PyObject* batch_macs(batch_pdu* pdus, Py_ssize_t n)
+{
+    PyObject* ret;
+    PyObject* b;
+    Py_ssize_t i;
+    
+    ret = PyList_New(n);
+    if (ret == NULL)
+        return NULL;
+    for (i=0; i<n; i++)
+    {
+        b = PyBytes_FromStringAndSize((char *)pdus[i].mac, 4);
+        if (b == NULL)
+        {
+            Py_DECREF(ret);
+            return NULL;
+        };
+        PyList_SET_ITEM(ret, i, b);
+    };
+    return ret;
+};
+
+
+static PyObject* pysnow_f8_batch(PyObject* dummy, PyObject* args)
+{
+    PyObject* ret = 0;
+    
+    // input: key (bytes buffer -> u8 *), pdus (sequence of tuples)
+    Py_buffer key;
+    PyObject* seq;
+    batch_pdu* pdus;
+    Py_ssize_t n, i;
+    
+    if (! PyArg_ParseTuple(args, "z*O", &key, &seq))
+        return NULL;
+    
+    if (key.len != 16)
+    {
+        PyBuffer_Release(&key);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return NULL;
+    };
+    
+    pdus = batch_parse(seq, &n);
+    if (pdus == NULL)
+    {
+        PyBuffer_Release(&key);
+        return NULL;
+    };
+    
+    // output: list of data (bytes buffers of size length in bits)
+    ret = batch_alloc_out(pdus, n);
+    if (ret != NULL)
+    {
+        Py_BEGIN_ALLOW_THREADS
+        for (i=0; i<n; i++)
+        {
+            memcpy(pdus[i].out, pdus[i].data.buf, pdus[i].len);
+            f8((u8 *)key.buf, pdus[i].count, pdus[i].bearer, pdus[i].dir, pdus[i].out, pdus[i].length);
+        };
+        Py_END_ALLOW_THREADS
+    };
+    
+    batch_release(pdus, n);
+    PyBuffer_Release(&key);
+    return ret;
+};
+
+
+static PyObject* pysnow_f9_batch(PyObject* dummy, PyObject* args)
+{
+    PyObject* ret = 0;
+    
+    // input: key (bytes buffer -> u8 *), pdus (sequence of tuples)
+    Py_buffer key;
+    PyObject* seq;
+    batch_pdu* pdus;
+    Py_ssize_t n, i;
+    // engine read with the GIL held, as set by snow_set_f9_engine()
+    int engine = SNOW3G_f9_get_engine();
+    
+    if (! PyArg_ParseTuple(args, "z*O", &key, &seq))
+        return NULL;
+    
+    if (key.len != 16)
+    {
+        PyBuffer_Release(&key);
         PyErr_SetString(PyExc_ValueError, "invalid args");
         return NULL;
     };
     
-    //u8 * f9( u8* key, u32 count, u32 fresh, u32 dir, u8 *data, u64 length);
-    mac = f9((u8 *)key.buf, count, fresh, dir, (u8 *)data.buf, length);
+    pdus = batch_parse(seq, &n);
+    if (pdus == NULL)
+    {
+        PyBuffer_Release(&key);
+        return NULL;
+    };
+    
+    Py_BEGIN_ALLOW_THREADS
+    for (i=0; i<n; i++)
+        SNOW3G_f9((u8 *)key.buf, pdus[i].count, pdus[i].bearer, pdus[i].dir, 
+                  (u8 *)pdus[i].data.buf, pdus[i].length, pdus[i].mac, engine);
+    Py_END_ALLOW_THREADS
+    
+    // output: list of mac (bytes buffers of size 4)
+    ret = batch_macs(pdus, n);
+    
+    batch_release(pdus, n);
+    PyBuffer_Release(&key);
+    return ret;
+};
+
+
+/* f9 engines selection */
+
+// names of the engines, indexed by SNOW3G_F9_ENGINE_* values
+static const char* f9_engine_names[3] = {"ref", "table", "clmul"};
+
+static PyObject* pysnow_f9_engines(PyObject* dummy, PyObject* args)
+{
+    PyObject* ret;
+    PyObject* name;
+    int engine;
+    
+    ret = PyList_New(0);
+    if (ret == NULL)
+        return NULL;
+    for (engine=0; engine<3; engine++)
+    {
+        if (SNOW3G_f9_engine_available(engine))
+        {
+            name = Py_BuildValue("s", f9_engine_names[engine]);
+            if (name == NULL || PyList_Append(ret, name) < 0)
+            {
+                Py_XDECREF(name);
+                Py_DECREF(ret);
+                return NULL;
+            };
+            Py_DECREF(name);
+        };
+    };
+    name = PyList_AsTuple(ret);
+    Py_DECREF(ret);
+    return name;
+};
+
+
+static PyObject* pysnow_get_f9_engine(PyObject* dummy, PyObject* args)
+{
+    return Py_BuildValue("s", f9_engine_names[SNOW3G_f9_get_engine()]);
+};
+
+
+static PyObject* pysnow_set_f9_engine(PyObject* dummy, PyObject* args)
+{
+    const char* name;
+    int engine;
+    
+    if (! PyArg_ParseTuple(args, "s", &name))
+        return NULL;
+    
+    for (engine=0; engine<3; engine++)
+    {
+        if (strcmp(name, f9_engine_names[engine]) == 0)
+            break;
+    };
+    
+    if (engine == 3 || SNOW3G_f9_set_engine(engine) < 0)
+    {
+        PyErr_SetString(PyExc_ValueError, "invalid or unavailable engine");
+        return NULL;
+    };
+    
+    Py_RETURN_NONE;
+};
+
+
+/* SNOW3GState object methods */
+
+
+static int SNOW3GState_init(SNOW3GStateObject* self, PyObject* args, PyObject* kwds)
+{
+    // optional input: key, IV (bytes buffer -> u8 *)
+    Py_buffer k_py;
+    Py_buffer IV_py;
+    u32 k[4];
+    u32 IV[4];
+    
+    self->initialized = 0;
+    if (PyTuple_Size(args) == 0)
+        return 0;
+    
+    if (! PyArg_ParseTuple(args, "z*z*", &k_py, &IV_py))
+        return -1;
+    
+    if ((k_py.len != 16) || (IV_py.len != 16))
+    {
+        PyBuffer_Release(&k_py);
+        PyBuffer_Release(&IV_py);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return -1;
+    };
+    
+    memcpy_bswap(k, (char *)k_py.buf, 4);
+    memcpy_bswap(IV, (char *)IV_py.buf, 4);
+    SNOW3G_Fast_Initialize(&self->st, k, IV);
+    self->initialized = 1;
+    
+    PyBuffer_Release(&k_py);
+    PyBuffer_Release(&IV_py);
+    return 0;
+};
+
+
+static PyObject* SNOW3GState_initialize(SNOW3GStateObject* self, PyObject* args)
+{
+    // input: key, IV (bytes buffer -> u8 *)
+    Py_buffer k_py;
+    Py_buffer IV_py;
+    u32 k[4];
+    u32 IV[4];
+    
+    if (! PyArg_ParseTuple(args, "z*z*", &k_py, &IV_py))
+        return NULL;
+    
+    if ((k_py.len != 16) || (IV_py.len != 16))
+    {
+        PyBuffer_Release(&k_py);
+        PyBuffer_Release(&IV_py);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return NULL;
+    };
+    
+    // swap u32 bytes from Python buffer into new array
+    memcpy_bswap(k, (char *)k_py.buf, 4);
+    memcpy_bswap(IV, (char *)IV_py.buf, 4);
+    
+    //void SNOW3G_Fast_Initialize(SNOW3G_State* st, u32 k[4], u32 IV[4]);
+    SNOW3G_Fast_Initialize(&self->st, k, IV);
+    self->initialized = 1;
+    
+    PyBuffer_Release(&k_py);
+    PyBuffer_Release(&IV_py);
+    Py_RETURN_NONE;
+};
+
+
+static PyObject* SNOW3GState_keystream(SNOW3GStateObject* self, PyObject* args)
+{
+    PyObject* ret = 0;
+    u32 i;
+    
+    // input: n (int -> u32, number of 32-bit words of keystream)
+    u32 n;
+    u32 * z;
+    
+    if (! PyArg_ParseTuple(args, "I", &n))
+        return NULL;
+    
+    if (! self->initialized)
+    {
+        PyErr_SetString(PyExc_ValueError, "generator not initialized");
+        return NULL;
+    };
+    
+    // output: z (u32 * -> bytes buffer)
+    ret = PyBytes_FromStringAndSize(NULL, 4*(Py_ssize_t)n);
+    if (ret == NULL)
+        return NULL;
+    z = (u32 *)PyBytes_AS_STRING(ret);
+    
+    //void SNOW3G_Fast_GenerateKeystream(SNOW3G_State* st, u32 n, u32 *z);
+    SNOW3G_Fast_GenerateKeystream(&self->st, n, z);
+    
+    // swap u32 bytes on place for z
+    for (i=0; i<n; i++)
+        z[i] = SWAP_BYTES(z[i]);
     
-    ret = PyBytes_FromStringAndSize((char *)mac, 4);
     return ret;
 };
+
+
+/* number of 32-bit words generated at once by keystream_into() */
+#define KS_BLOCK_WORDS 256
+
+static PyObject* SNOW3GState_keystream_into(SNOW3GStateObject* self, PyObject* args)
+{
+    PyObject* ret = 0;
+    
+    // input: buf (writable buffer -> u8 *)
+    Py_buffer buf;
+    u32 z[KS_BLOCK_WORDS];
+    u8 * out;
+    Py_ssize_t n;
+    u32 i, w;
+    
+    if (! PyArg_ParseTuple(args, "w*", &buf))
+        return NULL;
+    
+    if (buf.len % 4)
+    {
+        PyBuffer_Release(&buf);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return NULL;
+    };
+    
+    if (! self->initialized)
+    {
+        PyBuffer_Release(&buf);
+        PyErr_SetString(PyExc_ValueError, "generator not initialized");
+        return NULL;
+    };
+    
+    // generate words by blocks in z, and write them big endian into buf,
+    // which may not be aligned
+    out = (u8 *)buf.buf;
+    for (n = buf.len >> 2; n > 0; n -= w)
+    {
+        w = (n > KS_BLOCK_WORDS) ? KS_BLOCK_WORDS : (u32)n;
+        SNOW3G_Fast_GenerateKeystream(&self->st, w, z);
+        for (i=0; i<w; i++)
+        {
+            out[0] = (u8)(z[i] >> 24);
+            out[1] = (u8)(z[i] >> 16);
+            out[2] = (u8)(z[i] >> 8);
+            out[3] = (u8)z[i];
+            out += 4;
+        };
+    };
+    
+    // return the buffer written
+    ret = buf.obj;
+    Py_INCREF(ret);
+    
+    PyBuffer_Release(&buf);
+    return ret;
+};
+
+
+/* SNOW3GF9State object methods */
+
+
+static int SNOW3GF9State_init(SNOW3GF9StateObject* self, PyObject* args, PyObject* kwds)
+{
+    // input: key (bytes buffer -> u8 *), count, fresh, dir (u32)
+    Py_buffer key;
+    u32 count, fresh, dir;
+    
+    self->initialized = 0;
+    if (! PyArg_ParseTuple(args, "z*III", &key, &count, &fresh, &dir))
+        return -1;
+    
+    if ((key.len != 16) || (dir > 1))
+    {
+        PyBuffer_Release(&key);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return -1;
+    };
+    
+    SNOW3G_f9_Init(&self->st, (u8 *)key.buf, count, fresh, dir, SNOW3G_f9_get_engine());
+    self->initialized = 1;
+    
+    PyBuffer_Release(&key);
+    return 0;
+};
+
+
+static PyObject* SNOW3GF9State_update(SNOW3GF9StateObject* self, PyObject* args)
+{
+    // input: data (buffer -> u8 *)
+    Py_buffer data;
+    
+    if (! PyArg_ParseTuple(args, "z*", &data))
+        return NULL;
+    
+    if (! self->initialized)
+    {
+        PyBuffer_Release(&data);
+        PyErr_SetString(PyExc_ValueError, "f9 not initialized");
+        return NULL;
+    };
+    
+    SNOW3G_f9_Update(&self->st, (const u8 *)data.buf, (u64)data.len);
+    
+    PyBuffer_Release(&data);
+    Py_RETURN_NONE;
+};
+
+
+static PyObject* SNOW3GF9State_mac(SNOW3GF9StateObject* self, PyObject* args)
+{
+    // input: optional length (u64, in bits)
+    PyObject* length_py = NULL;
+    unsigned long long length;
+    // output: mac (4 bytes buffer)
+    u8 mac[4];
+    
+    if (! PyArg_ParseTuple(args, "|O", &length_py))
+        return NULL;
+    
+    if (! self->initialized)
+    {
+        PyErr_SetString(PyExc_ValueError, "f9 not initialized");
+        return NULL;
+    };
+    
+    if (length_py == NULL || length_py == Py_None)
+        length = 8 * self->st.nbytes;
+    else if (! PyArg_Parse(length_py, "K", &length))
+        return NULL;
+    
+    if (SNOW3G_f9_Final(&self->st, (u64)length, mac) < 0)
+    {
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return NULL;
+    };
+    
+    return PyBytes_FromStringAndSize((char *)mac, 4);
+};
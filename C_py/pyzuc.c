@@ -26,6 +26,7 @@
 
 #include <Python.h>
 #include "../C_alg/ZUC.h"
+#include "pybuffers.h"
 
 
 /* Python 2 and 3 initialization mess */
@@ -56,6 +57,11 @@ static PyObject* pyzuc_initialization(PyObject* dummy, PyObject* args);
 static PyObject* pyzuc_generatekeystream(PyObject* dummy, PyObject* args);
 static PyObject* pyzuc_eea3(PyObject* dummy, PyObject* args);
 static PyObject* pyzuc_eia3(PyObject* dummy, PyObject* args);
+static PyObject* pyzuc_eia3_ref(PyObject* dummy, PyObject* args);
+static PyObject* pyzuc_eea3_into(PyObject* dummy, PyObject* args);
+static PyObject* pyzuc_eea3_records(PyObject* dummy, PyObject* args);
+static PyObject* pyzuc_eea3_batch(PyObject* dummy, PyObject* args);
+static PyObject* pyzuc_eia3_batch(PyObject* dummy, PyObject* args);
 
 static char pyzuc_initialization_doc[] =
     "zuc_initialization(key [16 bytes], iv [16 bytes]) -> None";
@@ -67,6 +73,109 @@ static char pyzuc_eea3_doc[] =
 static char pyzuc_eia3_doc[] =
     "zuc_eia3(ik [16 bytes], count [uint32], bearer [uint32], dir [0 or 1], "\
              "length [uint32, length in bits], data_in [bytes]) -> mac [4 bytes]";
+static char pyzuc_eia3_ref_doc[] =
+    "zuc_eia3_ref(ik [16 bytes], count [uint32], bearer [uint32], dir [0 or 1], "\
+                 "length [uint32, length in bits], data_in [bytes]) -> mac [4 bytes]\n\n"\
+    "same as zuc_eia3, but running the bit-oriented reference implementation";
+static char pyzuc_eea3_into_doc[] =
+    "zuc_eea3_into(ck [16 bytes], count [uint32], bearer [uint32], dir [0 or 1], "\
+                  "length [uint32, length in bits], data_in [buffer], data_out [writable buffer, optional]) "\
+                  "-> data_out\n\n"\
+    "data_in is processed in place when data_out is not provided";
+static char pyzuc_eea3_records_doc[] =
+    "zuc_eea3_records(ck [16 bytes], data_in [buffer], records [sequence of (offset [int], "\
+                     "length [int, length in bytes], count [uint32], bearer [uint5], dir [0 or 1])], "\
+                     "data_out [writable buffer, optional]) -> data_out\n\n"\
+    "ciphers each record of data_in, located at the same offset in data_out, with\n"\
+    "a single call for all the records of a key; data_in is processed in place when\n"\
+    "data_out is not provided";
+static char pyzuc_eea3_batch_doc[] =
+    "zuc_eea3_batch(ck [16 bytes], pdus [sequence of (count [uint32], bearer [uint5], "\
+                   "dir [0 or 1], data_in [bytes], length [uint32, length in bits, optional])]) "\
+                   "-> list of data_out [bytes]";
+static char pyzuc_eia3_batch_doc[] =
+    "zuc_eia3_batch(ik [16 bytes], pdus [sequence of (count [uint32], bearer [uint5], "\
+                   "dir [0 or 1], data_in [bytes], length [uint32, length in bits, optional])]) "\
+                   "-> list of mac [4 bytes]";
+
+
+/* ZUCState object, holding its own ZUC generator state */
+
+typedef struct {
+    PyObject_HEAD
+    ZUC_State st;
+    int initialized;
+} ZUCStateObject;
+
+static int ZUCState_init(ZUCStateObject* self, PyObject* args, PyObject* kwds);
+static PyObject* ZUCState_initialize(ZUCStateObject* self, PyObject* args);
+static PyObject* ZUCState_keystream(ZUCStateObject* self, PyObject* args);
+static PyObject* ZUCState_keystream_into(ZUCStateObject* self, PyObject* args);
+
+static char ZUCState_doc[] =
+    "ZUCState([key [16 bytes], iv [16 bytes]]) -> ZUC generator object\n\n"\
+    "Each object holds its own LFSR and FSM registers, hence several keystreams\n"\
+    "can be generated concurrently";
+static char ZUCState_initialize_doc[] =
+    "initialize(key [16 bytes], iv [16 bytes]) -> None";
+static char ZUCState_keystream_doc[] =
+    "keystream(n [uint32, number of 32-bit words]) -> keystream [bytes]\n\n"\
+    "each call continues the keystream where the previous one stopped";
+static char ZUCState_keystream_into_doc[] =
+    "keystream_into(buf [writable buffer, length multiple of 4]) -> buf\n\n"\
+    "fills buf with the next len(buf)/4 32-bit words of keystream, without\n"\
+    "allocating any intermediate buffer";
+
+static PyMethodDef ZUCState_methods[] =
+{
+    {"initialize", (PyCFunction)ZUCState_initialize, METH_VARARGS, ZUCState_initialize_doc},
+    {"keystream", (PyCFunction)ZUCState_keystream, METH_VARARGS, ZUCState_keystream_doc},
+    {"keystream_into", (PyCFunction)ZUCState_keystream_into, METH_VARARGS, ZUCState_keystream_into_doc},
+    { NULL, NULL, 0, NULL }
+};
+
+static PyTypeObject ZUCStateType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "pyzuc.ZUCState",           /* tp_name */
+    sizeof(ZUCStateObject),     /* tp_basicsize */
+};
+
+/* ZUCEIA3State object, holding the state of an incremental EIA3 computation */
+
+typedef struct {
+    PyObject_HEAD
+    EIA3_State st;
+    int initialized;
+} ZUCEIA3StateObject;
+
+static int ZUCEIA3State_init(ZUCEIA3StateObject* self, PyObject* args, PyObject* kwds);
+static PyObject* ZUCEIA3State_update(ZUCEIA3StateObject* self, PyObject* args);
+static PyObject* ZUCEIA3State_mac(ZUCEIA3StateObject* self, PyObject* args);
+
+static char ZUCEIA3State_doc[] =
+    "ZUCEIA3State(ik [16 bytes], count [uint32], bearer [uint32], dir [0 or 1]) "\
+    "-> incremental EIA3 object\n\n"\
+    "the message is provided by parts with update(), mac() returning the MAC\n"\
+    "of the message provided so far";
+static char ZUCEIA3State_update_doc[] =
+    "update(data_in [buffer]) -> None";
+static char ZUCEIA3State_mac_doc[] =
+    "mac(length [uint64, length in bits, optional]) -> mac [4 bytes]\n\n"\
+    "length can only leave out the last bits of the last byte provided, the\n"\
+    "object can still be updated afterwards";
+
+static PyMethodDef ZUCEIA3State_methods[] =
+{
+    {"update", (PyCFunction)ZUCEIA3State_update, METH_VARARGS, ZUCEIA3State_update_doc},
+    {"mac", (PyCFunction)ZUCEIA3State_mac, METH_VARARGS, ZUCEIA3State_mac_doc},
+    { NULL, NULL, 0, NULL }
+};
+
+static PyTypeObject ZUCEIA3StateType = {
+    PyVarObject_HEAD_INIT(NULL, 0)
+    "pyzuc.ZUCEIA3State",       /* tp_name */
+    sizeof(ZUCEIA3StateObject), /* tp_basicsize */
+};
 
 static PyMethodDef pyzuc_methods[] = 
 {
@@ -75,6 +184,11 @@ static PyMethodDef pyzuc_methods[] =
     {"zuc_generatekeystream", pyzuc_generatekeystream, METH_VARARGS, pyzuc_generatekeystream_doc},
     {"zuc_eea3", pyzuc_eea3, METH_VARARGS, pyzuc_eea3_doc},
     {"zuc_eia3", pyzuc_eia3, METH_VARARGS, pyzuc_eia3_doc},
+    {"zuc_eia3_ref", pyzuc_eia3_ref, METH_VARARGS, pyzuc_eia3_ref_doc},
+    {"zuc_eea3_into", pyzuc_eea3_into, METH_VARARGS, pyzuc_eea3_into_doc},
+    {"zuc_eea3_records", pyzuc_eea3_records, METH_VARARGS, pyzuc_eea3_records_doc},
+    {"zuc_eea3_batch", pyzuc_eea3_batch, METH_VARARGS, pyzuc_eea3_batch_doc},
+    {"zuc_eia3_batch", pyzuc_eia3_batch, METH_VARARGS, pyzuc_eia3_batch_doc},
     { NULL, NULL, 0, NULL }
 };
 
@@ -139,6 +253,30 @@ static PyMethodDef pyzuc_methods[] =
         Py_DECREF(module);
         INITERROR;
     }
+    
+    ZUCStateType.tp_flags   = Py_TPFLAGS_DEFAULT;
+    ZUCStateType.tp_doc     = ZUCState_doc;
+    ZUCStateType.tp_methods = ZUCState_methods;
+    ZUCStateType.tp_init    = (initproc)ZUCState_init;
+    ZUCStateType.tp_new     = PyType_GenericNew;
+    if (PyType_Ready(&ZUCStateType) < 0) {
+        Py_DECREF(module);
+        INITERROR;
+    }
+    Py_INCREF(&ZUCStateType);
+    PyModule_AddObject(module, "ZUCState", (PyObject *)&ZUCStateType);
+    
+    ZUCEIA3StateType.tp_flags   = Py_TPFLAGS_DEFAULT;
+    ZUCEIA3StateType.tp_doc     = ZUCEIA3State_doc;
+    ZUCEIA3StateType.tp_methods = ZUCEIA3State_methods;
+    ZUCEIA3StateType.tp_init    = (initproc)ZUCEIA3State_init;
+    ZUCEIA3StateType.tp_new     = PyType_GenericNew;
+    if (PyType_Ready(&ZUCEIA3StateType) < 0) {
+        Py_DECREF(module);
+        INITERROR;
+    }
+    Py_INCREF(&ZUCEIA3StateType);
+    PyModule_AddObject(module, "ZUCEIA3State", (PyObject *)&ZUCEIA3StateType);
 
     #if PY_MAJOR_VERSION >= 3
     
@@ -233,15 +371,15 @@ static PyObject* pyzuc_eea3(PyObject* dummy, PyObject* args)
     PyObject* ret = 0;
     
     // input: CK (bytes buffer -> u8 *), COUNT, BEARER, DIRECTION, LENGTH (int -> u32),
-    //        M (bytes buffer -> u32 *)
+    //        M (bytes buffer -> u8 *)
     Py_buffer CK;
-    Py_buffer M_py;
-    u32 COUNT, BEARER, DIRECTION, LENGTH, out_wsz, i;
-    int out_sz;
-    u32 * M;
-    u32 * C;
+    Py_buffer M;
+    u32 COUNT, BEARER, DIRECTION, LENGTH;
+    Py_ssize_t out_sz;
+    // output: C (u8 * -> bytes buffer of size length in bits)
+    u8 * C;
     
-    if (! PyArg_ParseTuple(args, "z*IIIIz*", &CK, &COUNT, &BEARER, &DIRECTION, &LENGTH, &M_py))
+    if (! PyArg_ParseTuple(args, "z*IIIIz*", &CK, &COUNT, &BEARER, &DIRECTION, &LENGTH, &M))
         return NULL;
     
     // transform length in bits to length in bytes
@@ -249,61 +387,199 @@ static PyObject* pyzuc_eea3(PyObject* dummy, PyObject* args)
     if (LENGTH % 8)
         out_sz++;
     
-    // transform length in bits to length in 32-bits words
-    out_wsz = LENGTH >> 5;
-    if (LENGTH % 32)
-        out_wsz++;
+    if ((CK.len != 16) || (DIRECTION > 1) || (out_sz > M.len))
+    {
+        PyBuffer_Release(&CK);
+        PyBuffer_Release(&M);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return NULL;
+    };
     
-    if ((CK.len != 16) || (DIRECTION > 1) || (out_sz > M_py.len))
+    ret = PyBytes_FromStringAndSize(NULL, out_sz);
+    if (ret == NULL)
     {
+        PyBuffer_Release(&CK);
+        PyBuffer_Release(&M);
+        return NULL;
+    };
+    C = (u8 *)PyBytes_AS_STRING(ret);
+    
+    Py_BEGIN_ALLOW_THREADS
+    //void EEA3_Bytes(u8* CK, u32 COUNT, u32 BEARER, u32 DIRECTION, u32 LENGTH, u8* M, u8* C);
+    EEA3_Bytes((u8 *)CK.buf, COUNT, BEARER, DIRECTION, LENGTH, (u8 *)M.buf, C);
+    Py_END_ALLOW_THREADS
+    
+    PyBuffer_Release(&CK);
+    PyBuffer_Release(&M);
+    return ret;
+};
+
+
+static PyObject* pyzuc_eea3_into(PyObject* dummy, PyObject* args)
+{
+    PyObject* ret = 0;
+    
+    // input: CK (bytes buffer -> u8 *), COUNT, BEARER, DIRECTION, LENGTH (int -> u32),
+    //        M (buffer -> u8 *), optional C (writable buffer -> u8 *)
+    Py_buffer CK;
+    PyObject* M_py;
+    PyObject* C_py = NULL;
+    Py_buffer M;
+    Py_buffer C;
+    u32 COUNT, BEARER, DIRECTION, LENGTH;
+    Py_ssize_t out_sz;
+    
+    if (! PyArg_ParseTuple(args, "z*IIIIO|O", &CK, &COUNT, &BEARER, &DIRECTION, &LENGTH, &M_py, &C_py))
+        return NULL;
+    
+    if (into_buffers(M_py, C_py, &M, &C) < 0)
+    {
+        PyBuffer_Release(&CK);
+        return NULL;
+    };
+    
+    // transform length in bits to length in bytes
+    out_sz = LENGTH >> 3;
+    if (LENGTH % 8)
+        out_sz++;
+    
+    if ((CK.len != 16) || (DIRECTION > 1) || (out_sz > M.len) || (out_sz > C.len))
+    {
+        PyBuffer_Release(&CK);
+        PyBuffer_Release(&M);
+        PyBuffer_Release(&C);
         PyErr_SetString(PyExc_ValueError, "invalid args");
         return NULL;
     };
     
-    // swap u32 bytes from Python buffer M_py into new array M
-    M = (u32 *)malloc(4*out_wsz);
-    if (M == NULL)
+    Py_BEGIN_ALLOW_THREADS
+    //void EEA3_Bytes(u8* CK, u32 COUNT, u32 BEARER, u32 DIRECTION, u32 LENGTH, u8* M, u8* C);
+    EEA3_Bytes((u8 *)CK.buf, COUNT, BEARER, DIRECTION, LENGTH, (u8 *)M.buf, (u8 *)C.buf);
+    Py_END_ALLOW_THREADS
+    
+    // return the buffer written
+    ret = C.obj;
+    Py_INCREF(ret);
+    
+    PyBuffer_Release(&CK);
+    PyBuffer_Release(&M);
+    PyBuffer_Release(&C);
+    return ret;
+};
+
+
+static PyObject* pyzuc_eea3_records(PyObject* dummy, PyObject* args)
+{
+    PyObject* ret = 0;
+    
+    // input: key (bytes buffer -> u8 *), data (buffer -> u8 *), records (sequence of tuples),
+    //        optional out (writable buffer -> u8 *)
+    Py_buffer key;
+    PyObject* data_py;
+    PyObject* seq;
+    PyObject* out_py = NULL;
+    Py_buffer data;
+    Py_buffer out;
+    buf_record* recs;
+    Py_ssize_t n, i;
+    
+    if (! PyArg_ParseTuple(args, "z*OO|O", &key, &data_py, &seq, &out_py))
+        return NULL;
+    
+    if (key.len != 16)
     {
-        PyErr_SetString(PyExc_RuntimeError, "malloc failed");
+        PyBuffer_Release(&key);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
         return NULL;
     };
-    memcpy_bswap(M, (char *)M_py.buf, out_wsz);
     
-    // output: C (u32 * -> bytes buffer of size length in bits)
-    C = (u32 *)malloc(out_wsz<<2);
-    if (C == NULL)
+    if (into_buffers(data_py, out_py, &data, &out) < 0)
     {
-        PyErr_SetString(PyExc_RuntimeError, "malloc failed");
+        PyBuffer_Release(&key);
         return NULL;
     };
     
-    //void void EEA3(u8* CK, u32 COUNT, u32 BEARER, u32 DIRECTION, u32 LENGTH, u32* M, u32* C);
-    EEA3((u8 *)CK.buf, COUNT, BEARER, DIRECTION, LENGTH, M, C);
-    free(M);
-    M = NULL;
+    recs = records_parse(seq, (data.len < out.len) ? data.len : out.len, 0x1fffffff, &n);
+    if (recs == NULL)
+    {
+        PyBuffer_Release(&key);
+        PyBuffer_Release(&data);
+        PyBuffer_Release(&out);
+        return NULL;
+    };
     
-    // swap u32 bytes on place for C
-    for (i=0; i<out_wsz; i++)
-        C[i] = SWAP_BYTES(C[i]);
+    Py_BEGIN_ALLOW_THREADS
+    for (i=0; i<n; i++)
+    {
+        EEA3_Bytes((u8 *)key.buf, recs[i].count, recs[i].bearer, recs[i].dir, 8 * (u32)recs[i].len,
+                   (u8 *)data.buf + recs[i].offset, (u8 *)out.buf + recs[i].offset);
+    };
+    Py_END_ALLOW_THREADS
     
-    ret = PyBytes_FromStringAndSize((char *)C, out_sz);
-    free(C);
-    C = NULL;
+    // return the buffer written
+    ret = out.obj;
+    Py_INCREF(ret);
     
+    free(recs);
+    PyBuffer_Release(&key);
+    PyBuffer_Release(&data);
+    PyBuffer_Release(&out);
     return ret;
 };
 
 
 static PyObject* pyzuc_eia3(PyObject* dummy, PyObject* args)
 {
-    PyObject* ret = 0;
+    // input: IK (bytes buffer -> u8 *), COUNT, BEARER, DIRECTION, LENGTH (int -> u32),
+    //        M (bytes buffer -> u8 *)
+    Py_buffer IK;
+    Py_buffer M_py;
+    u32 COUNT, BEARER, DIRECTION, LENGTH;
+    Py_ssize_t m_sz;
+    // output: MAC (u32 -> bytes buffer of size 4)
+    u32 MAC;
+    u8 mac[4];
+    
+    if (! PyArg_ParseTuple(args, "z*IIIIz*", &IK, &COUNT, &BEARER, &DIRECTION, &LENGTH, &M_py))
+        return NULL;
+    
+    // transform length in bits to length in bytes
+    m_sz = LENGTH >> 3;
+    if (LENGTH % 8)
+        m_sz++;
+    
+    if ((IK.len != 16) || (DIRECTION > 1) || (m_sz > M_py.len))
+    {
+        PyBuffer_Release(&IK);
+        PyBuffer_Release(&M_py);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return NULL;
+    };
+    
+    Py_BEGIN_ALLOW_THREADS
+    //void EIA3_Fast(u8* IK, u32 COUNT, u32 BEARER, u32 DIRECTION, u32 LENGTH, u8* M, u32* MAC);
+    EIA3_Fast((u8 *)IK.buf, COUNT, BEARER, DIRECTION, LENGTH, (u8 *)M_py.buf, &MAC);
+    Py_END_ALLOW_THREADS
+    
+    PyBuffer_Release(&IK);
+    PyBuffer_Release(&M_py);
     
+    mac[0] = (u8)(MAC >> 24);
+    mac[1] = (u8)(MAC >> 16);
+    mac[2] = (u8)(MAC >> 8);
+    mac[3] = (u8)MAC;
+    return PyBytes_FromStringAndSize((char *)mac, 4);
+};
+
+
+static PyObject* pyzuc_eia3_ref(PyObject* dummy, PyObject* args)
+{
     // input: IK (bytes buffer -> u8 *), COUNT, BEARER, DIRECTION, LENGTH (int -> u32),
     //        M (bytes buffer -> u32 *)
     Py_buffer IK;
     Py_buffer M_py;
-    u32 COUNT, BEARER, DIRECTION, LENGTH, m_wsz;
-    int m_sz;
+    u32 COUNT, BEARER, DIRECTION, LENGTH, m_wsz, i;
+    Py_ssize_t m_sz;
     u32 * M;
     // output: MAC (u32 * -> bytes buffer of size 4)
     u32 MAC[1];
@@ -323,27 +599,533 @@ static PyObject* pyzuc_eia3(PyObject* dummy, PyObject* args)
     
     if ((IK.len != 16) || (DIRECTION > 1) || (m_sz > M_py.len))
     {
+        PyBuffer_Release(&IK);
+        PyBuffer_Release(&M_py);
         PyErr_SetString(PyExc_ValueError, "invalid args");
         return NULL;
     };
     
-    // swap u32 bytes from Python buffer M_py into new array M
-    M = (u32 *)malloc(4*m_wsz);
-    if (M == NULL)
+    // M working buffer of 32-bits words
+    M = (u32 *)malloc(4*(size_t)m_wsz);
+    if (M == NULL && m_wsz)
     {
+        PyBuffer_Release(&IK);
+        PyBuffer_Release(&M_py);
         PyErr_SetString(PyExc_RuntimeError, "malloc failed");
         return NULL;
     };
-    memcpy_bswap(M, (char *)M_py.buf, m_wsz);
+    
+    Py_BEGIN_ALLOW_THREADS
+    // copy the Python buffer M_py into M, without reading past its end, 
+    // and swap u32 bytes
+    if (m_wsz)
+        M[m_wsz-1] = 0;
+    memcpy(M, M_py.buf, m_sz);
+    for (i=0; i<m_wsz; i++)
+        M[i] = SWAP_BYTES(M[i]);
     
     //void EIA3(u8* IK, u32 COUNT, u32 BEARER, u32 DIRECTION, u32 LENGTH, u32* M, u32* MAC);
     EIA3((u8 *)IK.buf, COUNT, BEARER, DIRECTION, LENGTH, M, MAC);
+    Py_END_ALLOW_THREADS
+    
+    PyBuffer_Release(&IK);
+    PyBuffer_Release(&M_py);
     free(M);
     M = NULL;
     
     // swap bytes of the MAC on place
     *MAC = SWAP_BYTES(*MAC);
     
-    ret = PyBytes_FromStringAndSize((char *)MAC, 4);
+    return PyBytes_FromStringAndSize((char *)MAC, 4);
+};
+
+
+/* batch processing of PDUs, each PDU being a tuple 
+   (count [uint32], bearer [uint5], dir [0 or 1], data [bytes], bitlen [uint32, optional]) */
+
+typedef struct {
+    u32 count, bearer, dir, length;
+    Py_ssize_t len;
+    Py_buffer data;
+    u8 * out;
+    u8 mac[4];
+} batch_pdu;
+
+
+static void batch_release(batch_pdu* pdus, Py_ssize_t n)
+{
+    Py_ssize_t i;
+    
+    for (i=0; i<n; i++)
+        PyBuffer_Release(&pdus[i].data);
+    free(pdus);
+};
+
+
+static batch_pdu* batch_parse(PyObject* seq, Py_ssize_t* n)
+{
+    PyObject* fast;
+    PyObject* item;
+    PyObject* bitlen;
+    batch_pdu* pdus;
+    batch_pdu* p;
+    Py_ssize_t i;
+    long long count, bearer, dir;
+    
+    fast = PySequence_Fast(seq, "invalid args");
+    if (fast == NULL)
+        return NULL;
+    *n = PySequence_Fast_GET_SIZE(fast);
+    
+    pdus = (batch_pdu *)malloc((*n ? *n : 1) * sizeof(batch_pdu));
+    if (pdus == NULL)
+    {
+        Py_DECREF(fast);
+        PyErr_SetString(PyExc_RuntimeError, "malloc failed");
+        return NULL;
+    };
+    
+    for (i=0; i<*n; i++)
+    {
+        p = &pdus[i];
+        item = PySequence_Fast_GET_ITEM(fast, i);
+        bitlen = Py_None;
+        if (! PyTuple_Check(item))
+        {
+            PyErr_SetString(PyExc_ValueError, "invalid args");
+            goto error;
+        };
+        // count, bearer and dir are range-checked here, "I" silently wrapping them
+        if (! PyArg_ParseTuple(item, "LLLz*|O", &count, &bearer, &dir, &p->data, &bitlen))
+            goto error;
+        if ((count < 0) || (count > 0xffffffffLL) || (bearer < 0) || (bearer > 31) ||
+            (dir < 0) || (dir > 1))
+        {
+            PyBuffer_Release(&p->data);
+            PyErr_SetString(PyExc_ValueError, "invalid args");
+            goto error;
+        };
+        p->count  = (u32)count;
+        p->bearer = (u32)bearer;
+        p->dir    = (u32)dir;
+        
+        if (bitlen == Py_None)
+        {
+            if (p->data.len > 0x1fffffff)
+            {
+                PyBuffer_Release(&p->data);
+                PyErr_SetString(PyExc_ValueError, "invalid args");
+                goto error;
+            };
+            p->length = 8 * (u32)p->data.len;
+        }
+        else if (! PyArg_Parse(bitlen, "I", &p->length))
+        {
+            PyBuffer_Release(&p->data);
+            goto error;
+        };
+        
+        // transform length in bits to length in bytes
+        p->len = p->length >> 3;
+        if (p->length % 8)
+            p->len++;
+        
+        if (p->len > p->data.len)
+        {
+            PyBuffer_Release(&p->data);
+            PyErr_SetString(PyExc_ValueError, "invalid args");
+            goto error;
+        };
+        p->out = NULL;
+    };
+    
+    Py_DECREF(fast);
+    return pdus;
+    
+error:
+    Py_DECREF(fast);
+    batch_release(pdus, i);
+    return NULL;
+};
+
+
+// allocate a list of bytes of the PDUs' length, to be filled in place by the batch function
+static PyObject* batch_alloc_out(batch_pdu* pdus, Py_ssize_t n)
+{
+    PyObject* ret;
+    PyObject* b;
+    Py_ssize_t i;
+    
+    ret = PyList_New(n);
+    if (ret == NULL)
+        return NULL;
+    for (i=0; i<n; i++)
+    {
+        b = PyBytes_FromStringAndSize(NULL, pdus[i].len);
+        if (b == NULL)
+        {
+            Py_DECREF(ret);
+            return NULL;
+        };
+        PyList_SET_ITEM(ret, i, b);
+        pdus[i].out = (u8 *)PyBytes_AS_STRING(b);
+    };
+    return ret;
+};
+
+
+// return the list of MACs computed by the batch function
+static PyObject* batch_macs(batch_pdu* pdus, Py_ssize_t n)
+{
+    PyObject* ret;
+    PyObject* b;
+    Py_ssize_t i;
+    
+    ret = PyList_New(n);
+    if (ret == NULL)
+        return NULL;
+    for (i=0; i<n; i++)
+    {
+        b = PyBytes_FromStringAndSize((char *)pdus[i].mac, 4);
+        if (b == NULL)
+        {
+            Py_DECREF(ret);
+            return NULL;
+        };
+        PyList_SET_ITEM(ret, i, b);
+    };
     return ret;
 };
+
+
+static PyObject* pyzuc_eea3_batch(PyObject* dummy, PyObject* args)
+{
+    PyObject* ret = 0;
+    
+    // input: CK (bytes buffer -> u8 *), pdus (sequence of tuples)
+    Py_buffer CK;
+    PyObject* seq;
+    batch_pdu* pdus;
+    Py_ssize_t n, i;
+    
+    if (! PyArg_ParseTuple(args, "z*O", &CK, &seq))
+        return NULL;
+    
+    if (CK.len != 16)
+    {
+        PyBuffer_Release(&CK);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return NULL;
+    };
+    
+    pdus = batch_parse(seq, &n);
+    if (pdus == NULL)
+    {
+        PyBuffer_Release(&CK);
+        return NULL;
+    };
+    
+    // output: list of C (bytes buffers of size length in bits)
+    ret = batch_alloc_out(pdus, n);
+    if (ret != NULL)
+    {
+        Py_BEGIN_ALLOW_THREADS
+        for (i=0; i<n; i++)
+            EEA3_Bytes((u8 *)CK.buf, pdus[i].count, pdus[i].bearer, pdus[i].dir, pdus[i].length,
+                       (u8 *)pdus[i].data.buf, pdus[i].out);
+        Py_END_ALLOW_THREADS
+    };
+    
+    batch_release(pdus, n);
+    PyBuffer_Release(&CK);
+    return ret;
+};
+
+
+static PyObject* pyzuc_eia3_batch(PyObject* dummy, PyObject* args)
+{
+    PyObject* ret = 0;
+    
+    // input: IK (bytes buffer -> u8 *), pdus (sequence of tuples)
+    Py_buffer IK;
+    PyObject* seq;
+    batch_pdu* pdus;
+    Py_ssize_t n, i;
+    u32 MAC;
+    
+    if (! PyArg_ParseTuple(args, "z*O", &IK, &seq))
+        return NULL;
+    
+    if (IK.len != 16)
+    {
+        PyBuffer_Release(&IK);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return NULL;
+    };
+    
+    pdus = batch_parse(seq, &n);
+    if (pdus == NULL)
+    {
+        PyBuffer_Release(&IK);
+        return NULL;
+    };
+    
+    Py_BEGIN_ALLOW_THREADS
+    for (i=0; i<n; i++)
+    {
+        EIA3_Fast((u8 *)IK.buf, pdus[i].count, pdus[i].bearer, pdus[i].dir, pdus[i].length,
+                  (u8 *)pdus[i].data.buf, &MAC);
+        pdus[i].mac[0] = (u8)(MAC >> 24);
+        pdus[i].mac[1] = (u8)(MAC >> 16);
+        pdus[i].mac[2] = (u8)(MAC >> 8);
+        pdus[i].mac[3] = (u8)MAC;
+    };
+    Py_END_ALLOW_THREADS
+    
+    // output: list of mac (bytes buffers of size 4)
+    ret = batch_macs(pdus, n);
+    
+    batch_release(pdus, n);
+    PyBuffer_Release(&IK);
+    return ret;
+};
+
+
+/* ZUCState object methods */
+
+
+static int ZUCState_init(ZUCStateObject* self, PyObject* args, PyObject* kwds)
+{
+    // optional input: key, IV (bytes buffer -> u8 *)
+    Py_buffer k;
+    Py_buffer iv;
+    
+    self->initialized = 0;
+    if (PyTuple_Size(args) == 0)
+        return 0;
+    
+    if (! PyArg_ParseTuple(args, "z*z*", &k, &iv))
+        return -1;
+    
+    if ((k.len != 16) || (iv.len != 16))
+    {
+        PyBuffer_Release(&k);
+        PyBuffer_Release(&iv);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return -1;
+    };
+    
+    ZUC_Initialization(&self->st, (u8 *)k.buf, (u8 *)iv.buf);
+    self->initialized = 1;
+    
+    PyBuffer_Release(&k);
+    PyBuffer_Release(&iv);
+    return 0;
+};
+
+
+static PyObject* ZUCState_initialize(ZUCStateObject* self, PyObject* args)
+{
+    // input: key, IV (bytes buffer -> u8 *)
+    Py_buffer k;
+    Py_buffer iv;
+    
+    if (! PyArg_ParseTuple(args, "z*z*", &k, &iv))
+        return NULL;
+    
+    if ((k.len != 16) || (iv.len != 16))
+    {
+        PyBuffer_Release(&k);
+        PyBuffer_Release(&iv);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return NULL;
+    };
+    
+    //void ZUC_Initialization(ZUC_State* st, u8* k, u8* iv);
+    ZUC_Initialization(&self->st, (u8 *)k.buf, (u8 *)iv.buf);
+    self->initialized = 1;
+    
+    PyBuffer_Release(&k);
+    PyBuffer_Release(&iv);
+    Py_RETURN_NONE;
+};
+
+
+static PyObject* ZUCState_keystream(ZUCStateObject* self, PyObject* args)
+{
+    PyObject* ret = 0;
+    u32 i;
+    
+    // input: n (int -> u32, number of 32-bit words of keystream)
+    u32 KeystreamLen;
+    u32 * pKeystream;
+    
+    if (! PyArg_ParseTuple(args, "I", &KeystreamLen))
+        return NULL;
+    
+    if (! self->initialized)
+    {
+        PyErr_SetString(PyExc_ValueError, "generator not initialized");
+        return NULL;
+    };
+    
+    // output: pKeystream (u32 * -> bytes buffer)
+    ret = PyBytes_FromStringAndSize(NULL, 4*(Py_ssize_t)KeystreamLen);
+    if (ret == NULL)
+        return NULL;
+    pKeystream = (u32 *)PyBytes_AS_STRING(ret);
+    
+    //void ZUC_GenerateKeystream(ZUC_State* st, u32* pKeystream, u32 KeystreamLen);
+    ZUC_GenerateKeystream(&self->st, pKeystream, KeystreamLen);
+    
+    // swap u32 bytes on place for pKeystream
+    for (i=0; i<KeystreamLen; i++)
+        pKeystream[i] = SWAP_BYTES(pKeystream[i]);
+    
+    return ret;
+};
+
+
+/* number of 32-bit words generated at once by keystream_into() */
+#define KS_BLOCK_WORDS 256
+
+static PyObject* ZUCState_keystream_into(ZUCStateObject* self, PyObject* args)
+{
+    PyObject* ret = 0;
+    
+    // input: buf (writable buffer -> u8 *)
+    Py_buffer buf;
+    u32 z[KS_BLOCK_WORDS];
+    u8 * out;
+    Py_ssize_t n;
+    u32 i, w;
+    
+    if (! PyArg_ParseTuple(args, "w*", &buf))
+        return NULL;
+    
+    if (buf.len % 4)
+    {
+        PyBuffer_Release(&buf);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return NULL;
+    };
+    
+    if (! self->initialized)
+    {
+        PyBuffer_Release(&buf);
+        PyErr_SetString(PyExc_ValueError, "generator not initialized");
+        return NULL;
+    };
+    
+    // generate words by blocks in z, and write them big endian into buf,
+    // which may not be aligned
+    out = (u8 *)buf.buf;
+    for (n = buf.len >> 2; n > 0; n -= w)
+    {
+        w = (n > KS_BLOCK_WORDS) ? KS_BLOCK_WORDS : (u32)n;
+        ZUC_GenerateKeystream(&self->st, z, w);
+        for (i=0; i<w; i++)
+        {
+            out[0] = (u8)(z[i] >> 24);
+            out[1] = (u8)(z[i] >> 16);
+            out[2] = (u8)(z[i] >> 8);
+            out[3] = (u8)z[i];
+            out += 4;
+        };
+    };
+    
+    // return the buffer written
+    ret = buf.obj;
+    Py_INCREF(ret);
+    
+    PyBuffer_Release(&buf);
+    return ret;
+};
+
+
+/* ZUCEIA3State object methods */
+
+
+static int ZUCEIA3State_init(ZUCEIA3StateObject* self, PyObject* args, PyObject* kwds)
+{
+    // input: key (bytes buffer -> u8 *), count, bearer, dir (u32)
+    Py_buffer key;
+    u32 count, bearer, dir;
+    
+    self->initialized = 0;
+    if (! PyArg_ParseTuple(args, "z*III", &key, &count, &bearer, &dir))
+        return -1;
+    
+    if ((key.len != 16) || (dir > 1))
+    {
+        PyBuffer_Release(&key);
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return -1;
+    };
+    
+    EIA3_Init(&self->st, (u8 *)key.buf, count, bearer, dir);
+    self->initialized = 1;
+    
+    PyBuffer_Release(&key);
+    return 0;
+};
+
+
+static PyObject* ZUCEIA3State_update(ZUCEIA3StateObject* self, PyObject* args)
+{
+    // input: data (buffer -> u8 *)
+    Py_buffer data;
+    
+    if (! PyArg_ParseTuple(args, "z*", &data))
+        return NULL;
+    
+    if (! self->initialized)
+    {
+        PyBuffer_Release(&data);
+        PyErr_SetString(PyExc_ValueError, "EIA3 not initialized");
+        return NULL;
+    };
+    
+    EIA3_Update(&self->st, (const u8 *)data.buf, (u64)data.len);
+    
+    PyBuffer_Release(&data);
+    Py_RETURN_NONE;
+};
+
+
+static PyObject* ZUCEIA3State_mac(ZUCEIA3StateObject* self, PyObject* args)
+{
+    // input: optional length (u64, in bits)
+    PyObject* length_py = NULL;
+    unsigned long long length;
+    // output: mac (4 bytes buffer)
+    u32 MAC;
+    u8 mac[4];
+    
+    if (! PyArg_ParseTuple(args, "|O", &length_py))
+        return NULL;
+    
+    if (! self->initialized)
+    {
+        PyErr_SetString(PyExc_ValueError, "EIA3 not initialized");
+        return NULL;
+    };
+    
+    if (length_py == NULL || length_py == Py_None)
+        length = 8 * self->st.nbytes;
+    else if (! PyArg_Parse(length_py, "K", &length))
+        return NULL;
+    
+    if (EIA3_Final(&self->st, (u64)length, &MAC) < 0)
+    {
+        PyErr_SetString(PyExc_ValueError, "invalid args");
+        return NULL;
+    };
+    
+    mac[0] = (u8)(MAC >> 24);
+    mac[1] = (u8)(MAC >> 16);
+    mac[2] = (u8)(MAC >> 8);
+    mac[3] = (u8)MAC;
+    
+    return PyBytes_FromStringAndSize((char *)mac, 4);
+};
@@ -26,11 +26,12 @@
 # *--------------------------------------------------------
 #*/
 
-__all__ = ['AES_CTR', 'AES_ECB']
+__all__ = ['AES_CTR', 'AES_ECB', 'AES_CMAC']
 
 from struct import pack, unpack
 
 from .utils import *
+from .CMAC  import cmac_subkeys
 
 # this is a wrapper around few Python cryptographic libraries that support AES
 # pycrypto (which seems unmaintained since 2014 / 2015)
@@ -51,6 +52,7 @@ else:
 # try to load pycryptodome
 try:
     from Cryptodome.Cipher import AES as AES_pycryptodome
+    from Cryptodome.Hash   import CMAC as CMAC_pycryptodome
 except ImportError:
     _with_pycryptodome = False
 else:
@@ -60,6 +62,7 @@ else:
 # try to load cryptography
 try:
     from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    from cryptography.hazmat.primitives.cmac import CMAC as CMAC_cryptography
     from cryptography.hazmat.backends import default_backend
 except ImportError:
     _with_cryptography = False
@@ -148,6 +151,12 @@ class AES_CTR_pycrypto(object):
         return self.aes.encrypt(data)
     
     decrypt = encrypt
+    
+    def encrypt_into(self, data, out):
+        """encrypt / decrypt data into the writable buffer out, of the same 
+        length (pycrypto has no in-place CTR: the result is copied into out)
+        """
+        memoryview(out)[:] = self.aes.encrypt(bytes(data))
 
 
 class AES_CTR_pycryptodome(object):
@@ -175,6 +184,12 @@ class AES_CTR_pycryptodome(object):
         return self.aes.encrypt(data)
     
     decrypt = encrypt
+    
+    def encrypt_into(self, data, out):
+        """encrypt / decrypt data into the writable buffer out, of the same 
+        length (out can be data itself)
+        """
+        self.aes.encrypt(data, output=out)
 
 
 class AES_CTR_cryptography(object):
@@ -201,6 +216,133 @@ class AES_CTR_cryptography(object):
         return self.aes.update(data)
     
     decrypt = encrypt
+    
+    def encrypt_into(self, data, out):
+        """encrypt / decrypt data into the writable buffer out, of the same 
+        length (out can be data itself)
+        """
+        try:
+            self.aes.update_into(data, out)
+        except ValueError:
+            # older releases require block_size - 1 extra bytes in out, and
+            # raise before processing data
+            memoryview(out)[:] = self.aes.update(bytes(data))
+
+
+#------------------------------------------------------------------------------#
+# AES CMAC mode (for EIA2)
+#------------------------------------------------------------------------------#
+
+class _AES_CMAC(object):
+    """AES in CMAC mode, returning the 16 bytes MAC
+    
+    byte-aligned messages are processed with the CMAC of the backend, when it
+    provides one (_cmac_bytes()), other messages with a single AES-CBC pass
+    (_cbc()) over the padded message
+    
+    _cbc_encryptor() returns the encryption function of a new AES-CBC context
+    with a zero IV, continuing the CBC chain over successive calls
+    """
+    
+    block_size = 16
+    
+    _cmac_bytes = None
+    
+    def __init__(self, key):
+        """initialize AES in CMAC mode with the given key"""
+        self.key = key
+        # CMAC subkeys K1, K2, computed when required
+        self._K  = None
+    
+    def cmac(self, data_in, data_len=None):
+        """computes the CMAC over data_in
+        
+        data_in [bytes]
+        data_len [int, optional]: length in bits of data_in, over which the MAC
+            is computed
+        """
+        if data_len is None:
+            data_len = 8*len(data_in)
+        elif not 0 <= data_len <= 8*len(data_in):
+            raise(CMException('invalid args'))
+        if data_len % 8 == 0 and self._cmac_bytes is not None:
+            return self._cmac_bytes(data_in[:data_len>>3])
+        else:
+            return self._cmac_cbc(data_in, data_len)
+    
+    def _cbc(self, data):
+        return self._cbc_encryptor()(data)
+    
+    def subkeys(self):
+        """returns the 2 CMAC subkeys K1, K2 [16 bytes]
+        """
+        if self._K is None:
+            # encryption of a zero input block
+            self._K = cmac_subkeys(self._cbc(16*b'\0'))
+        return self._K
+    
+    def _cmac_cbc(self, data_in, data_len):
+        self.subkeys()
+        M = bytearray(data_in[:(data_len+7)>>3])
+        if data_len and data_len % 128 == 0:
+            # M is blocksize-aligned: xor its last block with K1
+            K = self._K[0]
+        else:
+            # pad M with a 1 bit and 0 bits, and xor its last block with K2
+            K = self._K[1]
+            lastbits = data_len % 8
+            if lastbits:
+                M[-1] = (M[-1] & (0xff00 >> lastbits) & 0xff) | (0x80 >> lastbits)
+            else:
+                M.append(0x80)
+            M.extend((-len(M) % 16) * b'\0')
+        M[-16:] = xor_buf(bytes(M[-16:]), K)
+        # the MAC is the last block of the CBC encryption, with a zero IV
+        return self._cbc(bytes(M))[-16:]
+
+
+class AES_CMAC_pycrypto(_AES_CMAC):
+    __doc__ = _AES_CMAC.__doc__
+    
+    def _cbc_encryptor(self):
+        return AES_pycrypto.new(self.key, AES_pycrypto.MODE_CBC, 16*b'\0').encrypt
+
+
+class AES_CMAC_pycryptodome(_AES_CMAC):
+    __doc__ = _AES_CMAC.__doc__
+    
+    def __init__(self, key):
+        """initialize AES in CMAC mode with the given key"""
+        _AES_CMAC.__init__(self, key)
+        self._mac = CMAC_pycryptodome.new(key, ciphermod=AES_pycryptodome)
+    
+    def _cmac_bytes(self, data):
+        mac = self._mac.copy()
+        mac.update(data)
+        return mac.digest()
+    
+    def _cbc_encryptor(self):
+        return AES_pycryptodome.new(self.key, AES_pycryptodome.MODE_CBC, iv=16*b'\0').encrypt
+
+
+class AES_CMAC_cryptography(_AES_CMAC):
+    __doc__ = _AES_CMAC.__doc__
+    
+    def __init__(self, key):
+        """initialize AES in CMAC mode with the given key"""
+        _AES_CMAC.__init__(self, key)
+        self._mac = CMAC_cryptography(algorithms.AES(key), backend=_backend)
+    
+    def _cmac_bytes(self, data):
+        mac = self._mac.copy()
+        mac.update(data)
+        return mac.finalize()
+    
+    def _cbc_encryptor(self):
+        return Cipher(
+            algorithms.AES(self.key),
+            modes.CBC(16*b'\0'),
+            backend=_backend).encryptor().update
 
 
 #------------------------------------------------------------------------------#
@@ -208,16 +350,19 @@ class AES_CTR_cryptography(object):
 #------------------------------------------------------------------------------#
 
 if _with_pycrypto:
-    AES_ECB = AES_ECB_pycrypto
-    AES_CTR = AES_CTR_pycrypto
+    AES_ECB  = AES_ECB_pycrypto
+    AES_CTR  = AES_CTR_pycrypto
+    AES_CMAC = AES_CMAC_pycrypto
 
 elif _with_pycryptodome:
-    AES_CTR = AES_CTR_pycryptodome
-    AES_ECB = AES_ECB_pycryptodome
+    AES_CTR  = AES_CTR_pycryptodome
+    AES_ECB  = AES_ECB_pycryptodome
+    AES_CMAC = AES_CMAC_pycryptodome
 
 elif _with_cryptography:
-    AES_CTR = AES_CTR_cryptography
-    AES_ECB = AES_ECB_cryptography
+    AES_CTR  = AES_CTR_cryptography
+    AES_ECB  = AES_ECB_cryptography
+    AES_CMAC = AES_CMAC_cryptography
 
 else:
     raise(ImportError('missing AES backend: requires cryptography, pycryptodome or pycrypto'))
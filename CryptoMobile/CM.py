@@ -27,19 +27,25 @@
 #*/
 
 from struct   import pack, unpack
+from binascii import hexlify
 #
 from pykasumi import *
 from pysnow   import *
 from pyzuc    import *
 from .utils   import *
-from .CMAC    import CMAC
+from .CMAC    import CMAC, cmac_cache
 
 try:
-    from .AES import AES_CTR, AES_ECB
+    from .AES import AES_CTR, AES_ECB, AES_CMAC
     # filter * export
     __all__ = ['KASUMI', 'SNOW3G', 'ZUC', 'AES_3GPP',
                'UEA1', 'UIA1', 'UEA2', 'UIA2',
-               'EEA1', 'EIA1', 'EEA2', 'EIA2', 'EEA3', 'EIA3']
+               'EEA1', 'EIA1', 'EEA2', 'EIA2', 'EEA3', 'EIA3',
+               'UEA1_into', 'UEA2_into', 'EEA1_into', 'EEA2_into', 'EEA3_into',
+               'EEA1_batch', 'EIA1_batch', 'EEA2_batch', 'EIA2_batch',
+               'EEA3_batch', 'EIA3_batch',
+               'UEA1Stream', 'UEA2Stream', 'EEA1Stream', 'EEA2Stream', 'EEA3Stream',
+               'UIA1MAC', 'UIA2MAC', 'EIA1MAC', 'EIA2MAC', 'EIA3MAC']
     _with_aes = True
 except ImportError as err:
     print(err)
@@ -47,7 +53,11 @@ except ImportError as err:
     # filter * export
     __all__ = ['KASUMI', 'SNOW3G', 'ZUC', 
                'UEA1', 'UIA1', 'UEA2', 'UIA2',
-               'EEA1', 'EIA1', 'EEA3', 'EIA3']
+               'EEA1', 'EIA1', 'EEA3', 'EIA3',
+               'UEA1_into', 'UEA2_into', 'EEA1_into', 'EEA3_into',
+               'EEA1_batch', 'EIA1_batch', 'EEA3_batch', 'EIA3_batch',
+               'UEA1Stream', 'UEA2Stream', 'EEA1Stream', 'EEA3Stream',
+               'UIA1MAC', 'UIA2MAC', 'EIA1MAC', 'EIA3MAC']
     _with_aes = False
 
 
@@ -80,6 +90,13 @@ class KASUMI(object):
         
         optional bitlen argument represents the length of data_in in bits
     
+    F8_into(key [16 bytes], count [uint32], bearer [uint32], dir [0 or 1], buf [buffer], bitlen [uint32], out [writable buffer])
+        -> out
+        
+        ciphers buf in place when out is not provided (buf must then be writable,
+        e.g. a bytearray or a memoryview), otherwise writes into out; returns the
+        buffer written
+    
     
     GSM / GPRS compatibility modes (A5/3, A5/4, GEA3, GEA4, GIA4) are not implemented
     """
@@ -130,6 +147,84 @@ class KASUMI(object):
         except ValueError as err:
             raise(CMException(err))
     
+    def F8_into(self, key, count, bearer, dir, buf, bitlen=None, out=None):
+        # avoid uint32 under/overflow
+        if not 0 <= count < MAX_UINT32 or \
+        not 0 <= bearer < MAX_UINT32:
+            raise(CMException('invalid args'))
+        #
+        if bitlen is None:
+            bitlen = 8*len(buf)
+        #
+        try:
+            return kasumi_f8_into(key, count, bearer, dir, buf, bitlen, out)
+        except (ValueError, TypeError, BufferError) as err:
+            raise(CMException(err))
+    
+
+def _generate_keystream(gen, length):
+    # return length bytes of keystream of gen (SNOW3G or ZUC instance): the bytes
+    # remaining from the last word generated by _keystream_into() are used first,
+    # then whole words are generated, the bytes of the last word exceeding length
+    # being dropped
+    if not 0 <= length < MAX_UINT32:
+        raise(CMException('invalid args'))
+    #
+    if gen._ks_rest:
+        ks = gen._ks_rest[:length]
+        gen._ks_rest = gen._ks_rest[len(ks):]
+        length -= len(ks)
+        if not length:
+            return ks
+    else:
+        ks = b''
+    #
+    try:
+        return ks + gen._state.keystream((length + 3) >> 2)[:length]
+    except ValueError as err:
+        raise(CMException(err))
+
+
+def _keystream_into(gen, buf, wsize=4):
+    # fill buf with the keystream of gen (SNOW3G, ZUC or stream cipher instance),
+    # continuing it at the byte level: the bytes remaining from the last word
+    # (of wsize bytes) generated for the previous call are used first
+    try:
+        mv = memoryview(buf).cast('B')
+    except (TypeError, ValueError) as err:
+        raise(CMException(err))
+    if mv.readonly:
+        raise(CMException('buffer not writable'))
+    n, off = len(mv), 0
+    if gen._ks_rest:
+        off = min(n, len(gen._ks_rest))
+        mv[:off] = gen._ks_rest[:off]
+        gen._ks_rest = gen._ks_rest[off:]
+    lw = (n - off) // wsize
+    try:
+        if lw:
+            gen._state.keystream_into(mv[off:off+wsize*lw])
+            off += wsize*lw
+        if off < n:
+            w = gen._state.keystream_into(bytearray(wsize))
+            mv[off:] = w[:n-off]
+            gen._ks_rest = bytes(w[n-off:])
+    except ValueError as err:
+        raise(CMException(err))
+    return n
+
+
+def _iter_keystream(gen, length, chunk):
+    if not 0 <= length or not 0 < chunk:
+        raise(CMException('invalid args'))
+    mv = memoryview(bytearray(min(chunk, length)))
+    while length > 0:
+        n = min(chunk, length)
+        _keystream_into(gen, mv[:n])
+        # the internal buffer is reused for the next chunk: a copy is yielded
+        yield bytes(mv[:n])
+        length -= n
+
 
 class SNOW3G(object):
     """UMTS secondary encryption / integrity protection algorithm
@@ -143,7 +238,21 @@ class SNOW3G(object):
     
     _initialize(key [16 bytes], iv [16 bytes]) -> None
     
-    _generate_keystream(length [uint32]) -> keystream
+    _generate_keystream(length [uint32]) -> keystream [bytes]
+    
+    _keystream_into(buf [writable buffer]) -> len(buf)
+    
+    _iter_keystream(length [int], chunk [int]) -> iterator of keystream [bytes]
+        
+        streams length bytes of keystream by chunks of at most chunk bytes,
+        each chunk being generated into the same internal buffer and yielded as
+        a copy, which the caller can keep; chunk should be a multiple of 4
+    
+    Each SNOW3G instance owns its generator state (see pysnow.SNOW3GState), 
+    hence several instances can be used concurrently, each successive call to
+    _generate_keystream() continuing the keystream of the instance (by 32-bit
+    words, while _keystream_into() continues it byte per byte, its remaining
+    bytes being used first by the next call to either method).
     
     
     For securing radio frames at UMTS RLC or MAC layer, UMTS modes of operation 
@@ -160,43 +269,59 @@ class SNOW3G(object):
         
         optional bitlen argument represents the length of data_in in bits
     
+    F8_into(key [16 bytes], count [uint32], bearer [uint32], dir [0 or 1], buf [buffer], bitlen [uint32], out [writable buffer])
+        -> out
+        
+        ciphers buf in place when out is not provided (buf must then be writable,
+        e.g. a bytearray or a memoryview), otherwise writes into out; returns the
+        buffer written
+    
     
     LTE modes of operation (EEA1, EIA1) is supported as well: the only difference 
     is for EIA1, `bearer' is replacing `fresh' and has a max value of 31.
     EEA1 and EIA1 methods are defined:
     
-    EEA1 aliases F8
+    EEA1 aliases F8, EEA1_into aliases F8_into
     
     EIA1(key [16 bytes], count [uint32], bearer [uint5], dir [0 or 1], data_in [bytes], bitlen [uint32])
         -> mac [4 bytes]
+    
+    
+    Batch versions process a list of PDUs with a single key in one C call:
+    
+    F8_batch(key [16 bytes], pdus [list of (count, bearer, dir, data_in[, bitlen])])
+        -> list of data_out [bytes]
+    
+    F9_batch(key [16 bytes], pdus [list of (count, fresh, dir, data_in[, bitlen])])
+        -> list of mac [4 bytes]
+    
+    EEA1_batch aliases F8_batch
+    
+    EIA1_batch(key [16 bytes], pdus [list of (count, bearer, dir, data_in[, bitlen])])
+        -> list of mac [4 bytes]
     """
     iv_size  = 16
     key_size = 16
     
+    def __init__(self):
+        self._state = SNOW3GState()
+        self._ks_rest = b''
+    
     def _initialize(self, key, iv):
         try:
-            return snow_initialize(key, iv)
+            self._state.initialize(key, iv)
         except ValueError as err:
             raise(CMException(err))
+        self._ks_rest = b''
     
     def _generate_keystream(self, length):
-        if not 0 <= length < MAX_UINT32:
-            raise(CMException('invalid args'))
-        #
-        lw = length >> 2
-        if length % 4:
-            lastbytes = True
-            lw += 1
-        else:
-            lastbytes = False
-        #
-        try:
-            if lastbytes:
-                return snow_generatekeystream(lw)[:length]
-            else:
-                return snow_generatekeystream(lw)
-        except ValueError as err:
-            raise(CMException(err))
+        return _generate_keystream(self, length)
+    
+    def _keystream_into(self, buf):
+        return _keystream_into(self, buf)
+    
+    def _iter_keystream(self, length, chunk=65536):
+        return _iter_keystream(self, length, chunk)
     
     def F8(self, key, count, bearer, dir, data_in, bitlen=None):
         # avoid uint32 under/overflow
@@ -226,7 +351,22 @@ class SNOW3G(object):
         except ValueError as err:
             raise(CMException(err))
     
+    def F8_into(self, key, count, bearer, dir, buf, bitlen=None, out=None):
+        # avoid uint32 under/overflow
+        if not 0 <= count < MAX_UINT32 or \
+        not 0 <= bearer < MAX_UINT32:
+            raise(CMException('invalid args'))
+        #
+        if bitlen is None:
+            bitlen = 8*len(buf)
+        #
+        try:
+            return snow_f8_into(key, count, bearer, dir, buf, bitlen, out)
+        except (ValueError, TypeError, BufferError) as err:
+            raise(CMException(err))
+    
     EEA1 = F8
+    EEA1_into = F8_into
     
     def EIA1(self, key, count, bearer, dir, data_in, bitlen=None):
         if not 0 <= bearer < 32:
@@ -236,6 +376,31 @@ class SNOW3G(object):
             return self.F9(key, count, bearer<<27, dir, data_in, bitlen)
         except (ValueError, CMException) as err:
             raise(CMException(err))
+    
+    def F8_batch(self, key, pdus):
+        try:
+            return snow_f8_batch(key, pdus)
+        except (ValueError, TypeError) as err:
+            raise(CMException(err))
+    
+    def F9_batch(self, key, pdus):
+        try:
+            return snow_f9_batch(key, pdus)
+        except (ValueError, TypeError) as err:
+            raise(CMException(err))
+    
+    EEA1_batch = F8_batch
+    
+    def EIA1_batch(self, key, pdus):
+        pdus_f9 = []
+        try:
+            for pdu in pdus:
+                if not 0 <= pdu[1] < 32:
+                    raise(CMException('invalid args'))
+                pdus_f9.append( (pdu[0], pdu[1]<<27) + tuple(pdu[2:]) )
+        except (IndexError, TypeError) as err:
+            raise(CMException(err))
+        return self.F9_batch(key, pdus_f9)
 
 
 class ZUC(object):
@@ -252,6 +417,20 @@ class ZUC(object):
     
     _generate_keystream(length [uint32]) -> keystream [bytes]
     
+    _keystream_into(buf [writable buffer]) -> len(buf)
+    
+    _iter_keystream(length [int], chunk [int]) -> iterator of keystream [bytes]
+        
+        streams length bytes of keystream by chunks of at most chunk bytes,
+        each chunk being generated into the same internal buffer and yielded as
+        a copy, which the caller can keep; chunk should be a multiple of 4
+    
+    Each ZUC instance owns its generator state (see pyzuc.ZUCState), hence 
+    several instances can be used concurrently, each successive call to
+    _generate_keystream() continuing the keystream of the instance (by 32-bit
+    words, while _keystream_into() continues it byte per byte, its remaining
+    bytes being used first by the next call to either method).
+    
     
     For securing packets at the LTE PDCP and NAS layers, LTE modes of operation
     are defined in EEA3 and EIA3 methods:
@@ -266,34 +445,45 @@ class ZUC(object):
         -> mac [4 bytes]
         
         optional bitlen argument represents the length of data_in in bits
+    
+    EEA3_into(key [16 bytes], count [uint32], bearer [uint32], dir [0 or 1], buf [buffer], bitlen [uint32], out [writable buffer])
+        -> out
+        
+        ciphers buf in place when out is not provided (buf must then be writable,
+        e.g. a bytearray or a memoryview), otherwise writes into out; returns the
+        buffer written
+    
+    
+    Batch versions process a list of PDUs with a single key in one C call:
+    
+    EEA3_batch(key [16 bytes], pdus [list of (count, bearer, dir, data_in[, bitlen])])
+        -> list of data_out [bytes]
+    
+    EIA3_batch(key [16 bytes], pdus [list of (count, bearer, dir, data_in[, bitlen])])
+        -> list of mac [4 bytes]
     """
     iv_size  = 16
     key_size = 16
     
+    def __init__(self):
+        self._state = ZUCState()
+        self._ks_rest = b''
+    
     def _initialize(self, key, iv):
         try:
-            zuc_initialization(key, iv)
+            self._state.initialize(key, iv)
         except ValueError as err:
             raise(CMException(err))
+        self._ks_rest = b''
     
     def _generate_keystream(self, length):
-        if not 0 <= length < MAX_UINT32:
-            raise(CMException('invalid args'))
-        #
-        lw = length >> 2
-        if length % 4:
-            lastbytes = True
-            lw += 1
-        else:
-            lastbytes = False
-        #
-        try:
-            if lastbytes:
-                return zuc_generatekeystream(lw)[:length]
-            else:
-                return zuc_generatekeystream(lw)
-        except ValueError as err:
-            raise(CMException(err))
+        return _generate_keystream(self, length)
+    
+    def _keystream_into(self, buf):
+        return _keystream_into(self, buf)
+    
+    def _iter_keystream(self, length, chunk=65536):
+        return _iter_keystream(self, length, chunk)
     
     def EEA3(self, key, count, bearer, dir, data_in, bitlen=None):
         # avoid uint32 under/overflow
@@ -322,6 +512,32 @@ class ZUC(object):
             return zuc_eia3(key, count, bearer, dir, bitlen, data_in)
         except ValueError as err:
             raise(CMException(err))
+    
+    def EEA3_into(self, key, count, bearer, dir, buf, bitlen=None, out=None):
+        # avoid uint32 under/overflow
+        if not 0 <= count < MAX_UINT32 or \
+        not 0 <= bearer < MAX_UINT32:
+            raise(CMException('invalid args'))
+        #
+        if bitlen is None:
+            bitlen = 8*len(buf)
+        #
+        try:
+            return zuc_eea3_into(key, count, bearer, dir, bitlen, buf, out)
+        except (ValueError, TypeError, BufferError) as err:
+            raise(CMException(err))
+    
+    def EEA3_batch(self, key, pdus):
+        try:
+            return zuc_eea3_batch(key, pdus)
+        except (ValueError, TypeError) as err:
+            raise(CMException(err))
+    
+    def EIA3_batch(self, key, pdus):
+        try:
+            return zuc_eia3_batch(key, pdus)
+        except (ValueError, TypeError) as err:
+            raise(CMException(err))
 
 
 class AES_3GPP(object):
@@ -342,6 +558,26 @@ class AES_3GPP(object):
         -> mac [4 bytes]
         
         optional bitlen argument represents the length of data_in in bits
+        the MAC is computed with the CMAC of the AES backend (AES.AES_CMAC), 
+        whose context is kept for each key in the shared CMAC.cmac_cache
+    
+    EEA2_into(key [16 bytes], count [uint32], bearer [uint32], dir [0 or 1], buf [buffer], bitlen [uint32], out [writable buffer])
+        -> out
+        
+        ciphers buf in place when out is not provided (buf must then be writable,
+        e.g. a bytearray or a memoryview), otherwise writes into out; returns the
+        buffer written
+    
+    
+    Batch versions process a list of PDUs with a single key:
+    
+    EEA2_batch(key [16 bytes], pdus [list of (count, bearer, dir, data_in[, bitlen])])
+        -> list of data_out [bytes]
+    
+    EIA2_batch(key [16 bytes], pdus [list of (count, bearer, dir, data_in[, bitlen])])
+        -> list of mac [4 bytes]
+        
+        the CMAC context is fetched once for the whole batch
     """
     
     def EEA2(self, key, count, bearer, dir, data_in, bitlen=None):
@@ -373,7 +609,41 @@ class AES_3GPP(object):
         else:
             return enc
     
+    def EEA2_into(self, key, count, bearer, dir, buf, bitlen=None, out=None):
+        # avoid uint32 under/overflow
+        if not 0 <= count < MAX_UINT32 or \
+        not 0 <= bearer <= 32:
+            raise(CMException('invalid args'))
+        #
+        if out is None:
+            out = buf
+        try:
+            mv_in  = memoryview(buf).cast('B')
+            mv_out = memoryview(out).cast('B')
+        except (ValueError, TypeError) as err:
+            raise(CMException(err))
+        if mv_out.readonly:
+            raise(CMException('buffer not writable'))
+        #
+        if bitlen is None:
+            blen, lastbits = len(mv_in), 0
+        else:
+            blen, lastbits = (bitlen+7)>>3, (8-(bitlen%8))%8
+        if not 0 <= blen <= min(len(mv_in), len(mv_out)):
+            raise(CMException('invalid args'))
+        #
+        # CTR processed by the backend directly from buf into out
+        nonce = pack('>II', count, (bearer<<27)+(dir<<26))
+        AES_CTR(key, nonce).encrypt_into(mv_in[:blen], mv_out[:blen])
+        if lastbits:
+            # zero last bits
+            mv_out[blen-1] &= 0x100 - (1<<lastbits)
+        return out
+    
     def EIA2(self, key, count, bearer, dir, data_in, bitlen=None):
+        return self._eia2(cmac_cache.get(key, AES_CMAC), count, bearer, dir, data_in, bitlen)
+    
+    def _eia2(self, cmac, count, bearer, dir, data_in, bitlen=None):
         # avoid uint32 under/overflow
         if not 0 <= count < MAX_UINT32 or \
         not 0 <= bearer <= 32:
@@ -390,8 +660,300 @@ class AES_3GPP(object):
                 data_in = data_in[:blen]
         #
         M = pack('>II', count, (bearer<<27)+(dir<<26)) + data_in
-        cmac = CMAC(key, AES_ECB, Tlen=32)
-        return cmac.cmac(M, 64+bitlen)
+        return cmac.cmac(M, 64+bitlen)[:4]
+    
+    def EEA2_batch(self, key, pdus):
+        return [self.EEA2(key, *pdu) for pdu in pdus]
+    
+    def EIA2_batch(self, key, pdus):
+        cmac = cmac_cache.get(key, AES_CMAC)
+        return [self._eia2(cmac, *pdu) for pdu in pdus]
+
+
+#------------------------------------------------------------------------------#
+# streaming encryption / decryption
+#------------------------------------------------------------------------------#
+
+class _F8Stream(object):
+    """base class for streaming UEA / EEA encryption and decryption, continuing
+    the keystream across successive chunks of the message:
+    
+    __init__(key [16 bytes], count [uint32], bearer [uint5], dir [0 or 1])
+    
+    update(data [bytes]) -> data_out [bytes]
+    
+    update_into(buf [writable buffer]) -> buf
+        
+        ciphers buf in place
+    
+    finalize(data [bytes], bitlen [uint32]) -> data_out [bytes]
+        
+        ciphers the last chunk of the message, optional bitlen representing
+        its length in bits (its last bits being zeroed, as with F8 / EEA);
+        update() and finalize() cannot be called anymore afterwards
+    
+    Subclasses set _state, a keystream generator with a keystream_into() method
+    producing words of _wsize bytes.
+    """
+    
+    _wsize = 4
+    
+    def __init__(self, key, count, bearer, dir):
+        # avoid uint32 under/overflow
+        if not 0 <= count < MAX_UINT32 or \
+        not 0 <= bearer < 32 or dir not in (0, 1):
+            raise(CMException('invalid args'))
+        self._ks_rest = b''
+        self._final = False
+        try:
+            self._init_state(key, count, bearer, dir)
+        except ValueError as err:
+            raise(CMException(err))
+    
+    def _keystream(self, length):
+        ks = bytearray(length)
+        _keystream_into(self, ks, self._wsize)
+        return ks
+    
+    def _cipher(self, data):
+        return xor_buf(data, self._keystream(len(data)))
+    
+    def update(self, data):
+        if self._final:
+            raise(CMException('stream finalized'))
+        return self._cipher(data)
+    
+    def update_into(self, buf):
+        if self._final:
+            raise(CMException('stream finalized'))
+        try:
+            mv = memoryview(buf).cast('B')
+            mv[:] = self._cipher(mv)
+        except (ValueError, TypeError) as err:
+            raise(CMException(err))
+        return buf
+    
+    def finalize(self, data=b'', bitlen=None):
+        if bitlen is None:
+            out = self.update(data)
+        else:
+            blen = (bitlen + 7) >> 3
+            if not 0 <= blen <= len(data):
+                raise(CMException('invalid args'))
+            out = self.update(data[:blen])
+            lastbits = (8-(bitlen%8))%8
+            if lastbits:
+                # zero last bits
+                out = bytearray(out)
+                out[-1] &= 0x100 - (1<<lastbits)
+                out = bytes(out)
+        self._final = True
+        return out
+
+
+class UEA1Stream(_F8Stream):
+    """streaming UEA1 (Kasumi F8), see _F8Stream
+    """
+    
+    _wsize = 8
+    
+    def _init_state(self, key, count, bearer, dir):
+        self._state = KasumiF8State(key, count, bearer, dir)
+
+
+class UEA2Stream(_F8Stream):
+    """streaming UEA2 / EEA1 (SNOW 3G F8), see _F8Stream
+    """
+    
+    def _init_state(self, key, count, bearer, dir):
+        if len(key) != 16:
+            raise(CMException('invalid args'))
+        # SNOW 3G key and IV words, as loaded by F8
+        iv = (bearer<<27) + (dir<<26)
+        self._state = SNOW3GState(key[12:16] + key[8:12] + key[4:8] + key[0:4],
+                                  pack('>IIII', iv, count, iv, count))
+
+EEA1Stream = UEA2Stream
+
+
+class EEA3Stream(_F8Stream):
+    """streaming EEA3 (ZUC), see _F8Stream
+    """
+    
+    def _init_state(self, key, count, bearer, dir):
+        self._state = ZUCState(key, pack('>II', count, (bearer<<27) + (dir<<26)) * 2)
+
+
+if _with_aes:
+    
+    class EEA2Stream(_F8Stream):
+        """streaming EEA2 (AES CTR), see _F8Stream
+        """
+        
+        def _init_state(self, key, count, bearer, dir):
+            if len(key) != 16:
+                raise(CMException('invalid args'))
+            # the CTR mode of the AES backend continues its keystream 
+            # across calls at the byte level
+            self._aes = AES_CTR(key, pack('>II', count, (bearer<<27) + (dir<<26)))
+        
+        def _cipher(self, data):
+            return self._aes.encrypt(bytes(data))
+
+
+#------------------------------------------------------------------------------#
+# incremental integrity protection
+#------------------------------------------------------------------------------#
+
+class _MAC(object):
+    """base class for incremental UIA / EIA integrity protection, in the way of
+    hashlib objects:
+    
+    __init__(key [16 bytes], count [uint32], fresh or bearer, dir [0 or 1])
+    
+    update(data [bytes]) -> None
+    
+    digest(bitlen [uint32]) -> mac [4 bytes]
+        
+        optional bitlen represents the length in bits of the whole message 
+        passed to update(), and can only drop bits of its last byte;
+        digest() does not alter the state, update() can be called afterwards
+    
+    hexdigest(bitlen [uint32]) -> mac [hex str]
+    
+    Subclasses set _state, with update() and mac() methods.
+    """
+    
+    digest_size = 4
+    
+    def __init__(self, key, count, fresh, dir):
+        # avoid uint32 under/overflow
+        if not 0 <= count < MAX_UINT32 or dir not in (0, 1):
+            raise(CMException('invalid args'))
+        try:
+            self._init_state(key, count, fresh, dir)
+        except ValueError as err:
+            raise(CMException(err))
+    
+    def update(self, data):
+        try:
+            self._state.update(data)
+        except (ValueError, TypeError) as err:
+            raise(CMException(err))
+    
+    def digest(self, bitlen=None):
+        try:
+            return self._state.mac(bitlen)
+        except ValueError as err:
+            raise(CMException(err))
+    
+    def hexdigest(self, bitlen=None):
+        return hexlify(self.digest(bitlen)).decode()
+
+
+class UIA1MAC(_MAC):
+    """incremental UIA1 (Kasumi F9), see _MAC
+    """
+    
+    def _init_state(self, key, count, fresh, dir):
+        if not 0 <= fresh < MAX_UINT32:
+            raise(CMException('invalid args'))
+        self._state = KasumiF9State(key, count, fresh, dir)
+
+
+class UIA2MAC(_MAC):
+    """incremental UIA2 (SNOW 3G F9), see _MAC
+    """
+    
+    def _init_state(self, key, count, fresh, dir):
+        if not 0 <= fresh < MAX_UINT32:
+            raise(CMException('invalid args'))
+        self._state = SNOW3GF9State(key, count, fresh, dir)
+
+
+class EIA1MAC(_MAC):
+    """incremental EIA1 (SNOW 3G F9), see _MAC
+    """
+    
+    def _init_state(self, key, count, bearer, dir):
+        if not 0 <= bearer < 32:
+            raise(CMException('invalid args'))
+        self._state = SNOW3GF9State(key, count, bearer<<27, dir)
+
+
+class EIA3MAC(_MAC):
+    """incremental EIA3 (ZUC), see _MAC
+    """
+    
+    def _init_state(self, key, count, bearer, dir):
+        if not 0 <= bearer < 32:
+            raise(CMException('invalid args'))
+        self._state = ZUCEIA3State(key, count, bearer, dir)
+
+
+if _with_aes:
+    
+    class _CMACState(object):
+        """incremental AES-CMAC, over the CBC encryption context of the AES 
+        backend: the last block of the message is kept pending until more data
+        is provided, or until mac() pads and xors it with a CMAC subkey
+        """
+        
+        def __init__(self, cmac, header):
+            self._K = cmac.subkeys()
+            self._cbc = cmac._cbc_encryptor()
+            self._ecb = cmac._cbc_encryptor
+            # last ciphertext block of the CBC chain
+            self._last = 16*b'\0'
+            self._buf = bytearray()
+            self._nbytes = 0
+            self.update(header)
+        
+        def update(self, data):
+            data = memoryview(data).cast('B')
+            self._nbytes += len(data)
+            self._buf.extend(data)
+            # encrypt all complete blocks, but the last one
+            blen = ((len(self._buf) - 1) >> 4) << 4
+            if blen > 0:
+                self._last = self._cbc(bytes(self._buf[:blen]))[-16:]
+                del self._buf[:blen]
+        
+        def mac(self, bitlen=None):
+            # bitlen is the length in bits of the message, header excluded
+            nbits = 8*(self._nbytes - 8)
+            if bitlen is None:
+                bitlen = nbits
+            elif not nbits - 8 < bitlen <= nbits:
+                raise(ValueError('invalid args'))
+            M = bytearray(self._buf)
+            if len(M) == 16 and bitlen % 8 == 0:
+                # complete last block: xor it with K1
+                K = self._K[0]
+            else:
+                # pad M with a 1 bit and 0 bits, and xor it with K2
+                K = self._K[1]
+                lastbits = bitlen % 8
+                if lastbits:
+                    M[-1] = (M[-1] & (0xff00 >> lastbits) & 0xff) | (0x80 >> lastbits)
+                else:
+                    M.append(0x80)
+                M.extend((16 - len(M)) * b'\0')
+            # a single block CBC with a zero IV is an ECB encryption
+            return self._ecb()(xor_buf(xor_buf(bytes(M), K), self._last))[:4]
+    
+    
+    class EIA2MAC(_MAC):
+        """incremental EIA2 (AES CMAC), see _MAC
+        """
+        
+        def _init_state(self, key, count, bearer, dir):
+            if not 0 <= bearer < 32 or len(key) != 16:
+                raise(CMException('invalid args'))
+            # a private CMAC context, the MAC object living longer than the
+            # contexts of the shared cmac_cache
+            self._state = _CMACState(AES_CMAC(key),
+                                     pack('>II', count, (bearer<<27) + (dir<<26)))
 
 
 ###################
@@ -418,3 +980,18 @@ EIA3 = _Z.EIA3
 if _with_aes:
     EEA2 = _A.EEA2
     EIA2 = _A.EIA2
+# In-place processing
+UEA1_into = _K.F8_into
+UEA2_into = _S.F8_into
+EEA1_into = _S.EEA1_into
+EEA3_into = _Z.EEA3_into
+if _with_aes:
+    EEA2_into = _A.EEA2_into
+# Batch processing for LTE
+EEA1_batch = _S.EEA1_batch
+EIA1_batch = _S.EIA1_batch
+EEA3_batch = _Z.EEA3_batch
+EIA3_batch = _Z.EIA3_batch
+if _with_aes:
+    EEA2_batch = _A.EEA2_batch
+    EIA2_batch = _A.EIA2_batch
@@ -26,11 +26,34 @@
 # *--------------------------------------------------------
 #*/
 
-from struct import pack, unpack
+from struct      import pack, unpack
+from collections import OrderedDict
+from threading   import Lock
 #
 from .utils import *
 
 
+def cmac_subkeys(L):
+    """returns the 2 CMAC subkeys K1, K2 [16 bytes] derived from L [16 bytes],
+    the encryption of a zero input block
+    """
+    # schedule depending of the MSB of L
+    # python-fu: unpack the 128 bits register as 2 BE uint64
+    Lh, Ll = unpack('>QQ', L)
+    # sum both uint64 as an uint128, left-shift and filter
+    K1 = (((Lh<<64)+Ll) << 1) & 0xffffffffffffffffffffffffffffffff
+    # XOR K1 depending of the MSB of L
+    if Lh & 0x8000000000000000:
+         K1 ^= 0x87
+    # re-shift K1 to make K2
+    K2 = (K1 << 1) & 0xffffffffffffffffffffffffffffffff
+    # XOR K2 depending of the MSB of K1
+    if K1 & 0x80000000000000000000000000000000:
+        K2 ^= 0x87
+    # return 2 corresponding 16-bytes strings K1, K2
+    return pack('>QQ', K1>>64, K1%MAX_UINT64), pack('>QQ', K2>>64, K2%MAX_UINT64)
+
+
 class CMAC(object):
     """CMAC mode of operation as defined by NIST
     to be used with a block cipher
@@ -84,22 +107,8 @@ class CMAC(object):
         # schedule the key for potential padding
         # encrypt a zero input block
         L = self._encrypt(b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0')
-        # schedule depending of the MSB of L
-        # python-fu: unpack the 128 bits register as 2 BE uint64
-        Lh, Ll = unpack('>QQ', L)
-        # sum both uint64 as an uint128, left-shift and filter
-        K1 = (((Lh<<64)+Ll) << 1) & 0xffffffffffffffffffffffffffffffff
-        # XOR K1 depending of the MSB of L
-        if Lh & 0x8000000000000000:
-             K1 ^= 0x87
-        # re-shift K1 to make K2
-        K2 = (K1 << 1) & 0xffffffffffffffffffffffffffffffff
-        # XOR K2 depending of the MSB of K1
-        if K1 & 0x80000000000000000000000000000000:
-            K2 ^= 0x87
         # set 2 corresponding 16-bytes strings K1, K2
-        self.K1 = pack('>QQ', K1>>64, K1%MAX_UINT64)
-        self.K2 = pack('>QQ', K2>>64, K2%MAX_UINT64)
+        self.K1, self.K2 = cmac_subkeys(L)
     
     def cmac(self, data_in, data_len=None):
         """Computes the CBC-MAC over data_in, according to initialization 
@@ -179,3 +188,90 @@ class CMAC(object):
                     return T + bytes([C[olen] & (0x100 - (1<<lastbits))])
             else:
                 return T
+
+
+class CMACCache(object):
+    """LRU-bounded cache of prepared CMAC contexts, keyed by (key, ciphermod, Tlen)
+    
+    Contexts are created on the first request for a given key and then shared
+    between all callers, so that the block-cipher initialization and the subkeys
+    schedule are done once per key, instead of once per MAC.
+    
+    ciphermod is either a block-cipher module, as expected by CMAC, or a complete
+    CMAC implementation providing a `cmac(data_in, data_len)' method (e.g. 
+    AES.AES_CMAC), in which case it is instantiated with the key only, and Tlen
+    must be None.
+    
+    When the cache is full, the least recently used context is evicted: the
+    cache only drops its reference to it, hence a context returned by get()
+    stays valid as long as the caller keeps it. The cache does not scrub key
+    material: the key is held as immutable bytes, shared by the index and the
+    context, and the block-cipher backends keep their own copy of the key
+    schedule; both are released, not overwritten, once the last reference to
+    the context goes away.
+    
+    e.g.
+    >>> cache = CMACCache(maxsize=16)
+    >>> cache.get(16*b'A', AES_ECB, Tlen=64).cmac(200*b'testing ')
+    b'\xe0*\xf5x\x14\xbc\x13\x96'
+    >>> cache.hits, cache.misses
+    (0, 1)
+    """
+    
+    def __init__(self, maxsize=64):
+        """
+        maxsize [int]: maximum number of contexts kept in the cache
+        """
+        if not maxsize > 0:
+            raise(CMException('invalid args'))
+        self.maxsize = maxsize
+        self.hits    = 0
+        self.misses  = 0
+        self._ctx    = OrderedDict()
+        self._lock   = Lock()
+    
+    def __len__(self):
+        return len(self._ctx)
+    
+    def get(self, key, ciphermod, Tlen=None):
+        """returns the CMAC context for the given key, ciphermod and Tlen, 
+        creating it if required
+        """
+        # the index and the context share the same key object
+        key = bytes(key)
+        idx = (key, ciphermod, Tlen)
+        with self._lock:
+            ctx = self._ctx.pop(idx, None)
+            if ctx is not None:
+                self.hits += 1
+                # move it to the most recently used end
+                self._ctx[idx] = ctx
+                return ctx
+            self.misses += 1
+        ctx = self._new(key, ciphermod, Tlen)
+        with self._lock:
+            # another thread may have inserted the same context meanwhile
+            if idx not in self._ctx:
+                self._ctx[idx] = ctx
+                while len(self._ctx) > self.maxsize:
+                    # other threads may still hold the evicted context
+                    self._ctx.popitem(last=False)
+        return ctx
+    
+    def _new(self, key, ciphermod, Tlen):
+        if hasattr(ciphermod, 'cmac'):
+            if Tlen is not None:
+                raise(CMException('invalid args'))
+            return ciphermod(key)
+        else:
+            return CMAC(key, ciphermod, Tlen)
+    
+    def clear(self):
+        """evicts all contexts and resets the counters"""
+        with self._lock:
+            self._ctx.clear()
+            self.hits, self.misses = 0, 0
+
+
+# cache shared by AES_3GPP.EIA2 and any direct CMAC user
+cmac_cache = CMACCache()
@@ -43,7 +43,7 @@ from .utils     import *
 from .AES       import AES_ECB
 
 
-__all__ = ['Milenage', 'make_OPc']
+__all__ = ['Milenage', 'MilenageSubscriber', 'make_OPc']
 
 
 if sys.version_info[0] > 2:
@@ -96,6 +96,52 @@ def make_OPc( K, OP ):
     return xor_buf( AES_ECB(K).encrypt(OP), OP )
 
 
+def _rot128(x, r):
+    """rotate 128-bit integer x by r bits
+    """
+    if r:
+        return ((x << r) & 0xffffffffffffffffffffffffffffffff) | (x >> (128-r))
+    else:
+        return x
+
+
+def _milenage_vectors(cipher, OPc, rands, sqns, amf, c, r):
+    """produce the authentication vectors for all RAND and SQN with a given
+    subscriber AES cipher and OPc, c and r being the lists of operator constants
+    
+    all blocks go through the cipher in 2 encrypt() calls, one for the 
+    E_K(RAND xor OPc) blocks, and one for the blocks of the output functions
+    """
+    n    = len(rands)
+    opc  = int_from_bytes(OPc)
+    c    = [int_from_bytes(ci) for ci in c]
+    temp = cipher.encrypt(xor_buf(b''.join(rands), n*OPc))
+    inp  = [[], [], [], [], []]
+    for i in range(n):
+        T, SA = int_from_bytes(temp[16*i:16*i+16]), sqns[i] + amf
+        T_OPc = T ^ opc
+        inp[0].append(_rot128(int_from_bytes(SA + SA) ^ opc, r[0]) ^ c[0] ^ T)
+        for k in range(1, 5):
+            inp[k].append(_rot128(T_OPc, r[k]) ^ c[k])
+    # output blocks are ordered by function, out1 for all vectors, then out2...
+    out  = xor_buf(cipher.encrypt(b''.join([bytes_from_int(x, 16) for col in inp for x in col])),
+                   5*n*OPc)
+    out  = [out[16*n*k:16*n*(k+1)] for k in range(5)]
+    return [out[0][16*i:16*i+8] for i in range(n)], \
+           [out[0][16*i+8:16*i+16] for i in range(n)], \
+           [out[1][16*i+8:16*i+16] for i in range(n)], \
+           [out[2][16*i:16*i+16] for i in range(n)], \
+           [out[3][16*i:16*i+16] for i in range(n)], \
+           [out[1][16*i:16*i+6] for i in range(n)], \
+           [out[4][16*i:16*i+6] for i in range(n)]
+
+
+def _vectors_args_ok(rands, sqns, amf):
+    return len(rands) == len(sqns) and len(amf) == 2 and \
+           all([len(RAND) == 16 for RAND in rands]) and \
+           all([len(SQN) == 6 for SQN in sqns])
+
+
 ###
 # 3GPP authentication algorithm
 ###
@@ -260,4 +306,172 @@ class Milenage:
                                self.c5)))
         #
         return out5[:6]
+    
+    ####################
+    # BULK GENERATION  #
+    ####################
+    
+    def generate_vectors(self, K, OPc, rands, sqns, amf):
+        """return authentication vectors for a subscriber, in a columnar form:
+        the lists of MAC_A [8], MAC_S [8], RES [8], CK [16], IK [16], AK [6] and
+        AK* [6] bytes buffers, the i-th vector corresponding to rands[i] and 
+        sqns[i], or None on error
+        
+        K [16 bytes]: subscriber key
+        OPc [16 bytes or None]: if None, the OPc set with set_opc() is used, 
+            or computed from OP
+        rands [list of 16 bytes], sqns [list of 6 bytes]: same length lists
+        amf [2 bytes]: AMF used for all vectors
+        
+        all AES blocks are processed by the backend in 2 encrypt() calls
+        """
+        if len(K) != 16 or (OPc is not None and len(OPc) != 16) or \
+        not _vectors_args_ok(rands, sqns, amf):
+            log('ERR', 'Milenage.generate_vectors: invalid args')
+            return None
+        #
+        if OPc is None:
+            if self.OPc is not None:
+                OPc = self.OPc
+            else:
+                OPc = make_OPc(K, self.OP)
+        #
+        return _milenage_vectors(AES_ECB(K), OPc, rands, sqns, amf,
+                                 (self.c1, self.c2, self.c3, self.c4, self.c5),
+                                 (self.r1, self.r2, self.r3, self.r4, self.r5))
+    
+    def generate_vectors_multi(self, subscribers):
+        """return the list of authentication vectors for several subscribers,
+        each one being in the columnar form returned by generate_vectors(), or 
+        None on error
+        
+        subscribers [iterable of (K, OPc, rands, sqns, amf)]: arguments of
+            generate_vectors() for each subscriber
+        """
+        ret = []
+        for sub in subscribers:
+            vecs = self.generate_vectors(*sub)
+            if vecs is None:
+                return None
+            ret.append(vecs)
+        return ret
+
 
+class MilenageSubscriber(object):
+    """Milenage cryptographic functions for a single subscriber
+    
+    The AES key schedule of K and OPc are computed once at initialization,
+    and generate_vector() produces all the outputs of an authentication vector
+    from a single encryption of RAND xor OPc, hence saving AES rounds when 
+    producing several vectors for a subscriber.
+    
+    Operator constants are those of the Milenage class.
+    
+    e.g.
+    >>> sub = MilenageSubscriber(K, OP=OP)
+    >>> MAC_A, MAC_S, RES, CK, IK, AK, AKstar = sub.generate_vector(RAND, SQN, AMF)
+    """
+    
+    c1, c2, c3, c4, c5 = Milenage.c1, Milenage.c2, Milenage.c3, Milenage.c4, Milenage.c5
+    r1, r2, r3, r4, r5 = Milenage.r1, Milenage.r2, Milenage.r3, Milenage.r4, Milenage.r5
+    
+    def __init__(self, K, OP=None, OPc=None):
+        """
+        K [16 bytes]: subscriber key
+        OP [16 bytes] or OPc [16 bytes]: operator variant, exactly one of both
+            must be provided
+        """
+        if len(K) != 16 or (OP is None) == (OPc is None) or \
+        len(OP if OPc is None else OPc) != 16:
+            raise(CMException('invalid args'))
+        self._cipher = AES_ECB(K)
+        if OPc is None:
+            OPc = xor_buf(self._cipher.encrypt(OP), OP)
+        self.OPc = OPc
+    
+    def _temp(self, RAND):
+        # the common E_K(RAND xor OPc) step
+        return self._cipher.encrypt(xor_buf(RAND, self.OPc))
+    
+    def _out1(self, TEMP, SQN, AMF):
+        OPc = self.OPc
+        inp = SQN + AMF + SQN + AMF
+        return xor_buf(self._cipher.encrypt(
+                       xor_buf(xor_buf(rot_buf16(xor_buf(inp, OPc),
+                                                 self.r1),
+                                       self.c1),
+                               TEMP)),
+                       OPc)
+    
+    def _outn(self, TEMP_OPc, r, c):
+        return xor_buf(self.OPc,
+                       self._cipher.encrypt(
+                       xor_buf(rot_buf16(TEMP_OPc, r), c)))
+    
+    def f1(self, RAND, SQN, AMF):
+        """return MAC_A [8 bytes buffer] or None on error
+        """
+        if len(RAND) != 16 or len(SQN) != 6 or len(AMF) != 2:
+            log('ERR', 'MilenageSubscriber.f1: invalid args')
+            return None
+        return self._out1(self._temp(RAND), SQN, AMF)[0:8]
+    
+    def f1star(self, RAND, SQN, AMF):
+        """return MAC_S [8 bytes buffer] or None on error
+        """
+        if len(RAND) != 16 or len(SQN) != 6 or len(AMF) != 2:
+            log('ERR', 'MilenageSubscriber.f1star: invalid args')
+            return None
+        return self._out1(self._temp(RAND), SQN, AMF)[8:16]
+    
+    def f2345(self, RAND):
+        """return RES [8], CK [16], IK [16] and AK [6] bytes buffers or None on error
+        """
+        if len(RAND) != 16:
+            log('ERR', 'MilenageSubscriber.f2345: invalid args')
+            return None
+        TEMP_OPc = xor_buf(self._temp(RAND), self.OPc)
+        out2 = self._outn(TEMP_OPc, self.r2, self.c2)
+        return out2[8:16], \
+               self._outn(TEMP_OPc, self.r3, self.c3), \
+               self._outn(TEMP_OPc, self.r4, self.c4), \
+               out2[:6]
+    
+    def f5star(self, RAND):
+        """return AK [6 bytes buffer] or None on error
+        """
+        if len(RAND) != 16:
+            log('ERR', 'MilenageSubscriber.f5star: invalid args')
+            return None
+        TEMP_OPc = xor_buf(self._temp(RAND), self.OPc)
+        return self._outn(TEMP_OPc, self.r5, self.c5)[:6]
+    
+    def generate_vector(self, RAND, SQN, AMF):
+        """return MAC_A [8], MAC_S [8], RES [8], CK [16], IK [16], AK [6] and
+        AK* [6] bytes buffers or None on error
+        """
+        if len(RAND) != 16 or len(SQN) != 6 or len(AMF) != 2:
+            log('ERR', 'MilenageSubscriber.generate_vector: invalid args')
+            return None
+        TEMP     = self._temp(RAND)
+        TEMP_OPc = xor_buf(TEMP, self.OPc)
+        out1     = self._out1(TEMP, SQN, AMF)
+        out2     = self._outn(TEMP_OPc, self.r2, self.c2)
+        return out1[0:8], \
+               out1[8:16], \
+               out2[8:16], \
+               self._outn(TEMP_OPc, self.r3, self.c3), \
+               self._outn(TEMP_OPc, self.r4, self.c4), \
+               out2[:6], \
+               self._outn(TEMP_OPc, self.r5, self.c5)[:6]
+    
+    def generate_vectors(self, rands, sqns, amf):
+        """return authentication vectors in a columnar form, see 
+        Milenage.generate_vectors(), or None on error
+        """
+        if not _vectors_args_ok(rands, sqns, amf):
+            log('ERR', 'MilenageSubscriber.generate_vectors: invalid args')
+            return None
+        return _milenage_vectors(self._cipher, self.OPc, rands, sqns, amf,
+                                 (self.c1, self.c2, self.c3, self.c4, self.c5),
+                                 (self.r1, self.r2, self.r3, self.r4, self.r5))
@@ -42,39 +42,20 @@ python_version = sys.version_info[0]
 
 import pykeccakp1600 as kec
 keccakp1600 = kec.pykeccakp1600
+# TUAK functions, with the KeccakP-1600 state assembly, iterations and 
+# output extraction done natively
+from pykeccakp1600 import tuak_topc, tuak_f1, tuak_f1star, tuak_f2345, tuak_f5star
 
 from .utils        import *
 
 
-__all__ = ['TUAK', 'make_TOPc']
+__all__ = ['TUAK', 'TUAKSubscriber', 'make_TOPc']
 
 
 def make_TOPc( K, TOP, ALGONAME, KeccakIterations ):
     """derives TOP with K to produce TOPc
     requires the TUAK global parameters ALGONAME and KeccakIterations"""
-    if len(K) == 16:
-        INSTANCE = b'\x00'
-    else:
-        #len(K) == 32
-        INSTANCE = b'\x01'
-    
-    INOUT = []
-    INOUT.append( TOP[::-1] )
-    INOUT.append( INSTANCE[::-1] )
-    INOUT.append( ALGONAME[::-1] )
-    INOUT.append( b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0' )
-    INOUT.append( K[::-1] )
-    if len(K) == 16:
-        INOUT.append( b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0' )
-    # add padding
-    INOUT.append( b'\x1f\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\x80' )
-    INOUT.append( b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0'\
-                  b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0' )
-    INOUT = b''.join(INOUT)
-    
-    for i in range(KeccakIterations):
-        INOUT = keccakp1600(INOUT)
-    return INOUT[:32][::-1]
+    return tuak_topc(K, TOP, KeccakIterations, ALGONAME)
 
 
 ###
@@ -101,6 +82,7 @@ class TUAK:
     LEN_IK   = 128 # can be 128 or 256 bit
     # input length for K: 128 or 256 bit
     # input length for TOP: 256 bit
+    # f1, f1star and f2345 log an error and return None with unsupported lengths
     
     
     def __init__(self, TOP):
@@ -125,169 +107,49 @@ class TUAK:
     def unset_opc(self):
         self.TOPc = None
     
+    def _get_topc(self, K, TOP):
+        if self.TOPc is not None:
+            return self.TOPc
+        else:
+            return self.make_topc(K, TOP)
+    
     ##################
     # TUAK FUNCTIONS #
     ##################
     
     def f1(self, K, RAND, SQN, AMF, TOP=None):
         """return MAC_A [8, 16 or 32 bytes buffer] or None on error
+        (including an unsupported LEN_MAC setting)
         """
-        if len(K) not in (16, 32) or len(RAND) != 16 or len(SQN) != 6 or len(AMF) != 2:
+        if len(K) not in (16, 32) or len(RAND) != 16 or len(SQN) != 6 or len(AMF) != 2 or \
+        self.LEN_MAC not in (64, 128, 256):
             log('ERR', 'TUAK.f1: invalid args')
             return None
-        
-        if self.LEN_MAC == 64:
-            INSTANCE = 0x08
-            off = 8
-        elif self.LEN_MAC == 128:
-            INSTANCE = 0x10
-            off = 16
-        else:
-            #self.LEN_MAC == 256
-            INSTANCE = 0x20
-            off = 32
-        if len(K) == 32:
-            INSTANCE += 1
-        if python_version > 2:
-            INSTANCE = bytes([INSTANCE])
-        else:
-            INSTANCE = chr(INSTANCE)
-        
-        if self.TOPc is not None:
-            TOPc = self.TOPc
-        else:
-            TOPc = self.make_topc(K, TOP)
-        
-        INOUT = []
-        INOUT.append( TOPc[::-1] )
-        INOUT.append( INSTANCE[::-1] )
-        INOUT.append( self.ALGONAME[::-1] )
-        INOUT.append( RAND[::-1] )
-        INOUT.append( AMF[::-1] )
-        INOUT.append( SQN[::-1] )
-        INOUT.append( K[::-1] )
-        if len(K) == 16:
-            INOUT.append( b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0' )
-        # add padding
-        INOUT.append( b'\x1f\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\x80' )
-        INOUT.append( b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0'\
-                      b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0' )
-        INOUT = b''.join(INOUT)
-        
-        for i in range(self.KeccakIterations):
-            INOUT = keccakp1600(INOUT)
-        return INOUT[:off][::-1]
+        return tuak_f1(K, self._get_topc(K, TOP), RAND, SQN, AMF,
+                       self.LEN_MAC, self.KeccakIterations, self.ALGONAME)
     
     def f1star(self, K, RAND, SQN, AMF, TOP=None):
         """return MAC_S [8, 16 or 32 bytes buffer] or None on error
+        (including an unsupported LEN_MAC setting)
         """
-        if len(K) not in (16, 32) or len(RAND) != 16 or len(SQN) != 6 or len(AMF) != 2:
+        if len(K) not in (16, 32) or len(RAND) != 16 or len(SQN) != 6 or len(AMF) != 2 or \
+        self.LEN_MAC not in (64, 128, 256):
             log('ERR', 'TUAK.f1star: invalid args')
             return None
-        
-        if self.LEN_MAC == 64:
-            INSTANCE = 0x88
-            off = 8
-        elif self.LEN_MAC == 128:
-            INSTANCE = 0x90
-            off = 16
-        else:
-            #self.LEN_MAC == 256
-            INSTANCE = 0xa0
-            off = 32
-        if len(K) == 32:
-            INSTANCE += 1
-        if python_version > 2:
-            INSTANCE = bytes([INSTANCE])
-        else:
-            INSTANCE = chr(INSTANCE)
-        
-        if self.TOPc is not None:
-            TOPc = self.TOPc
-        else:
-            TOPc = self.make_topc(K, TOP)
-        
-        INOUT = []
-        INOUT.append( TOPc[::-1] )
-        INOUT.append( INSTANCE[::-1] )
-        INOUT.append( self.ALGONAME[::-1] )
-        INOUT.append( RAND[::-1] )
-        INOUT.append( AMF[::-1] )
-        INOUT.append( SQN[::-1] )
-        INOUT.append( K[::-1] )
-        if len(K) == 16:
-            INOUT.append( b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0' )
-        # add padding
-        INOUT.append( b'\x1f\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\x80' )
-        INOUT.append( b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0'\
-                      b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0' )
-        INOUT = b''.join(INOUT)
-        
-        for i in range(self.KeccakIterations):
-            INOUT = keccakp1600(INOUT)
-        return INOUT[:off][::-1]
+        return tuak_f1star(K, self._get_topc(K, TOP), RAND, SQN, AMF,
+                           self.LEN_MAC, self.KeccakIterations, self.ALGONAME)
     
     def f2345(self, K, RAND, TOP=None):
         """return RES [4, 8, 16 or 32], CK [16 or 32], IK [16 or 32] and AK [6] bytes buffers or None on error
+        (including an unsupported LEN_RES, LEN_CK or LEN_IK setting)
         """
-        if len(K) not in (16, 32) or len(RAND) != 16:
+        if len(K) not in (16, 32) or len(RAND) != 16 or self.LEN_RES not in (32, 64, 128, 256) or \
+        self.LEN_CK not in (128, 256) or self.LEN_IK not in (128, 256):
             log('ERR', 'TUAK.f234: invalid args')
             return None
-        
-        if self.LEN_RES == 32:
-            INSTANCE = 0x40
-            offres = 4
-        elif self.LEN_RES == 64:
-            INSTANCE = 0x48
-            offres = 8
-        elif self.LEN_RES == 128:
-            INSTANCE = 0x50
-            offres = 16
-        else:
-            #self.LEN_RES == 256
-            INSTANCE = 0x60
-            offres = 32
-        if self.LEN_CK == 256:
-            INSTANCE += 4
-            offck = 32
-        else:
-            offck = 16
-        if self.LEN_IK == 256:
-            INSTANCE += 2
-            offik = 32
-        else:
-            offik = 16
-        if len(K) == 32:
-            INSTANCE += 1
-        
-        if python_version > 2:
-            INSTANCE = bytes([INSTANCE])
-        else:
-            INSTANCE = chr(INSTANCE)
-        
-        if self.TOPc is not None:
-            TOPc = self.TOPc
-        else:
-            TOPc = self.make_topc(K, TOP)
-        
-        INOUT = []
-        INOUT.append( TOPc[::-1] )
-        INOUT.append( INSTANCE[::-1] )
-        INOUT.append( self.ALGONAME[::-1] )
-        INOUT.append( RAND[::-1] )
-        INOUT.append( b'\0\0\0\0\0\0\0\0' )
-        INOUT.append( K[::-1] )
-        if len(K) == 16:
-            INOUT.append( b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0' )
-        # add padding
-        INOUT.append( b'\x1f\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\x80' )
-        INOUT.append( b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0'\
-                      b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0' )
-        INOUT = b''.join(INOUT)
-        
-        for i in range(self.KeccakIterations):
-            INOUT = keccakp1600(INOUT)
-        return INOUT[:offres][::-1], INOUT[32:32+offck][::-1], INOUT[64:64+offik][::-1], INOUT[96:102][::-1]
+        return tuak_f2345(K, self._get_topc(K, TOP), RAND,
+                          self.LEN_RES, self.LEN_CK, self.LEN_IK,
+                          self.KeccakIterations, self.ALGONAME)
     
     def f5star(self, K, RAND, TOP=None):
         """return AK [6 bytes buffer] or None on error
@@ -295,37 +157,86 @@ class TUAK:
         if len(K) not in (16, 32) or len(RAND) != 16:
             log('ERR', 'TUAK.f5star: invalid args')
             return None
-        
-        INSTANCE = 0xc0
-        if len(K) == 32:
-            INSTANCE += 1
-        
-        if python_version > 2:
-            INSTANCE = bytes([INSTANCE])
-        else:
-            INSTANCE = chr(INSTANCE)
-        
-        if self.TOPc is not None:
-            TOPc = self.TOPc
-        else:
-            TOPc = self.make_topc(K, TOP)
-        
-        INOUT = []
-        INOUT.append( TOPc[::-1] )
-        INOUT.append( INSTANCE[::-1] )
-        INOUT.append( self.ALGONAME[::-1] )
-        INOUT.append( RAND[::-1] )
-        INOUT.append( b'\0\0\0\0\0\0\0\0' )
-        INOUT.append( K[::-1] )
-        if len(K) == 16:
-            INOUT.append( b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0' )
-        # add padding
-        INOUT.append( b'\x1f\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\x80' )
-        INOUT.append( b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0'\
-                      b'\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0\0' )
-        INOUT = b''.join(INOUT)
-        
-        for i in range(self.KeccakIterations):
-            INOUT = keccakp1600(INOUT)
-        return INOUT[96:102][::-1]
+        return tuak_f5star(K, self._get_topc(K, TOP), RAND,
+                           self.KeccakIterations, self.ALGONAME)
+
 
+class TUAKSubscriber(object):
+    """TUAK cryptographic functions for a single subscriber
+    
+    TOPc is computed once at initialization, together with the operator
+    settings (ALGONAME, KeccakIterations, LEN_MAC, LEN_RES, LEN_CK and LEN_IK)
+    taken from the tuak argument. Each call then only passes RAND, SQN and AMF
+    to the native TUAK functions.
+    
+    e.g.
+    >>> sub = TUAKSubscriber(K, TOP=TOP)
+    >>> MAC_A, MAC_S, RES, CK, IK, AK, AKstar = sub.generate_vector(RAND, SQN, AMF)
+    """
+    
+    def __init__(self, K, TOP=None, TOPc=None, tuak=TUAK):
+        """
+        K [16 or 32 bytes]: subscriber key
+        TOP [32 bytes] or TOPc [32 bytes]: operator variant, exactly one of both
+            must be provided
+        tuak [TUAK class or instance]: operator settings
+        """
+        if len(K) not in (16, 32) or (TOP is None) == (TOPc is None) or \
+        len(TOP if TOPc is None else TOPc) != 32 or \
+        tuak.LEN_MAC not in (64, 128, 256) or tuak.LEN_RES not in (32, 64, 128, 256) or \
+        tuak.LEN_CK not in (128, 256) or tuak.LEN_IK not in (128, 256):
+            raise(CMException('invalid args'))
+        self.K = K
+        self._iter, self._algo = tuak.KeccakIterations, tuak.ALGONAME
+        if TOPc is None:
+            TOPc = make_TOPc(K, TOP, self._algo, self._iter)
+        self.TOPc = TOPc
+        self._len_mac = tuak.LEN_MAC
+        self._len_f2345 = (tuak.LEN_RES, tuak.LEN_CK, tuak.LEN_IK)
+    
+    def f1(self, RAND, SQN, AMF):
+        """return MAC_A [8, 16 or 32 bytes buffer] or None on error
+        """
+        if len(RAND) != 16 or len(SQN) != 6 or len(AMF) != 2:
+            log('ERR', 'TUAKSubscriber.f1: invalid args')
+            return None
+        return tuak_f1(self.K, self.TOPc, RAND, SQN, AMF, self._len_mac, self._iter, self._algo)
+    
+    def f1star(self, RAND, SQN, AMF):
+        """return MAC_S [8, 16 or 32 bytes buffer] or None on error
+        """
+        if len(RAND) != 16 or len(SQN) != 6 or len(AMF) != 2:
+            log('ERR', 'TUAKSubscriber.f1star: invalid args')
+            return None
+        return tuak_f1star(self.K, self.TOPc, RAND, SQN, AMF, self._len_mac, self._iter, self._algo)
+    
+    def f2345(self, RAND):
+        """return RES [4, 8, 16 or 32], CK [16 or 32], IK [16 or 32] and AK [6] bytes buffers or None on error
+        """
+        if len(RAND) != 16:
+            log('ERR', 'TUAKSubscriber.f2345: invalid args')
+            return None
+        return tuak_f2345(self.K, self.TOPc, RAND, self._len_f2345[0], self._len_f2345[1],
+                          self._len_f2345[2], self._iter, self._algo)
+    
+    def f5star(self, RAND):
+        """return AK [6 bytes buffer] or None on error
+        """
+        if len(RAND) != 16:
+            log('ERR', 'TUAKSubscriber.f5star: invalid args')
+            return None
+        return tuak_f5star(self.K, self.TOPc, RAND, self._iter, self._algo)
+    
+    def generate_vector(self, RAND, SQN, AMF):
+        """return MAC_A, MAC_S, RES, CK, IK, AK and AK* bytes buffers or None 
+        on error, with 4 KeccakP-1600 permutations (times KeccakIterations)
+        """
+        if len(RAND) != 16 or len(SQN) != 6 or len(AMF) != 2:
+            log('ERR', 'TUAKSubscriber.generate_vector: invalid args')
+            return None
+        K, TOPc, it, algo = self.K, self.TOPc, self._iter, self._algo
+        return (tuak_f1(K, TOPc, RAND, SQN, AMF, self._len_mac, it, algo),
+                tuak_f1star(K, TOPc, RAND, SQN, AMF, self._len_mac, it, algo)) + \
+                tuak_f2345(K, TOPc, RAND, self._len_f2345[0], self._len_f2345[1],
+                           self._len_f2345[2], it, algo) + \
+               (tuak_f5star(K, TOPc, RAND, it, algo), )
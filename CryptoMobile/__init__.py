@@ -1,2 +1,2 @@
-__all__ = ['utils', 'AES', 'CMAC', 'CM', 'Milenage', 'TUAK', 'conv']
+__all__ = ['utils', 'AES', 'CMAC', 'CM', 'Milenage', 'TUAK', 'conv', 'parallel', 'bench', 'pipeline', 'aio']
 __version__ = '0.3'
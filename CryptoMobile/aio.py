@@ -0,0 +1,344 @@
+# −*− coding: UTF−8 −*−
+#/**
+# * Software Name : CryptoMobile
+# * Version : 0.3
+# *
+# * This program is free software: you can redistribute it and/or modify
+# * it under the terms of the GNU General Public License version 2 as published
+# * by the Free Software Foundation.
+# *
+# * This program is distributed in the hope that it will be useful,
+# * but WITHOUT ANY WARRANTY; without even the implied warranty of
+# * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# * GNU General Public License for more details.
+# *
+# * You will find a copy of the terms and conditions of the GNU General Public
+# * License version 2 in the "license.txt" file or
+# * see http://www.gnu.org/licenses/ or write to the Free Software Foundation,
+# * Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+# *
+# *--------------------------------------------------------
+# * File Name : CryptoMobile/aio.py
+# * Created : 2026-10-17
+# *--------------------------------------------------------
+#*/
+
+########################################################
+# CryptoMobile python toolkit
+#
+# asyncio front-end, micro-batching concurrent requests and running them in an
+# executor, out of the event loop
+#######################################################
+
+import os
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+#
+from .utils     import *
+from .          import CM
+try:
+    from .Milenage import Milenage
+    from .parallel import _generate_chunk
+except ImportError as err:
+    # no AES backend
+    Milenage = None
+try:
+    from .ECIES import ECIES_HN
+except ImportError as err:
+    # no ECC backend
+    ECIES_HN = None
+
+
+__all__ = ['Offloader', 'configure', 'eea', 'eia', 'milenage', 'ecies_unprotect']
+
+
+#------------------------------------------------------------------------------#
+# batch processing, in the executors
+#------------------------------------------------------------------------------#
+
+def _call(func, args):
+    try:
+        return None, func(*args)
+    except Exception as err:
+        return err, None
+
+
+def _cipher_batch(reqs):
+    """process a batch of (name, key, count, bearer, dir, data, bitlen) requests,
+    name being the one of an EEA / EIA function of CM, and return the list of
+    (exception, result)
+
+    requests are grouped by function and key, each group being processed with
+    the *_batch function of CM
+    """
+    ret, groups = [None] * len(reqs), {}
+    for i, (name, key, count, bearer, dir, data, bitlen) in enumerate(reqs):
+        if bitlen is None:
+            pdu = (count, bearer, dir, data)
+        else:
+            pdu = (count, bearer, dir, data, bitlen)
+        groups.setdefault((name, key), []).append((i, pdu))
+    for (name, key), items in groups.items():
+        pdus = [pdu for i, pdu in items]
+        try:
+            res = [(None, r) for r in getattr(CM, name + '_batch')(key, pdus)]
+        except CMException:
+            # an invalid PDU in the group: PDUs are processed one by one, so that
+            # the error is only reported for the faulty one
+            func = getattr(CM, name)
+            res = [_call(func, (key, ) + pdu) for pdu in pdus]
+        for (i, pdu), r in zip(items, res):
+            ret[i] = r
+    return ret
+
+
+def _milenage_batch(reqs):
+    """process a batch of (K, OPc, SQN, AMF, RAND) requests, and return the list
+    of (exception, authentication vector)
+    """
+    ret = []
+    for rec in reqs:
+        err, vecs = _call(_generate_chunk, (Milenage, True, [rec]))
+        ret.append((err, vecs[0] if vecs else None))
+    return ret
+
+
+# ECIES_HN instances of a worker process, per (hn_priv_key, profile)
+_ECIES_HN = {}
+
+def _ecies_unprotect_batch(reqs):
+    """process a batch of (hn_priv_key, profile, ue_pubkey, ciphertext, mac)
+    requests, and return the list of (exception, cleartext or None)
+    """
+    ret = []
+    for hn_priv_key, profile, ue_pubkey, ciphertext, mac in reqs:
+        hn = _ECIES_HN.get((hn_priv_key, profile))
+        if hn is None:
+            err, hn = _call(ECIES_HN, (hn_priv_key, profile))
+            if err is not None:
+                ret.append((err, None))
+                continue
+            if len(_ECIES_HN) >= 16:
+                _ECIES_HN.clear()
+            _ECIES_HN[(hn_priv_key, profile)] = hn
+        ret.append(_call(hn.unprotect, (ue_pubkey, ciphertext, mac)))
+    return ret
+
+
+#------------------------------------------------------------------------------#
+# asyncio front-end
+#------------------------------------------------------------------------------#
+
+class _Batcher(object):
+    """collect the requests of an event loop into batches, each batch being run
+    in an executor when it reaches max_batch requests, or latency seconds after
+    its first request
+    
+    the batcher is bound to the loop of its last request: requests still
+    pending from a previous loop, and its timer, are dropped when the loop
+    changes
+    """
+    
+    def __init__(self, func, executor, max_batch, latency):
+        self._func      = func
+        self._executor  = executor
+        self._max_batch = max_batch
+        self._latency   = latency
+        self._pending   = []
+        self._timer     = None
+        self._loop      = None
+    
+    def submit(self, loop, req):
+        if loop is not self._loop:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._pending, self._timer, self._loop = [], None, loop
+        fut = loop.create_future()
+        self._pending.append((req, fut))
+        if len(self._pending) >= self._max_batch:
+            self._flush(loop)
+        elif self._timer is None:
+            self._timer = loop.call_later(self._latency, self._flush, loop)
+        return fut
+    
+    def _flush(self, loop):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        job = loop.run_in_executor(self._executor(), self._func, [req for req, fut in batch])
+        job.add_done_callback(lambda job: self._dispatch(batch, job))
+    
+    def _dispatch(self, batch, job):
+        if job.cancelled():
+            err = CMException('batch cancelled')
+        else:
+            err = job.exception()
+        res = job.result() if err is None else None
+        for i, (req, fut) in enumerate(batch):
+            if fut.done():
+                # request cancelled
+                continue
+            elif err is not None:
+                fut.set_exception(err)
+            elif res[i][0] is not None:
+                fut.set_exception(res[i][0])
+            else:
+                fut.set_result(res[i][1])
+
+
+class Offloader(object):
+    """asyncio front-end to CryptoMobile algorithms, running them out of the
+    event loop:
+    
+    eea / eia requests are run in a pool of threads, the C extensions (and AES
+    backends) releasing the GIL; milenage / ecies_unprotect requests, being
+    mostly Python code, are run in a pool of processes
+    
+    concurrent requests of a kind are micro-batched: a batch is sent to the
+    executor when it reaches max_batch requests, or latency seconds after its
+    first request (i.e. the latency added to each request, at most); at most
+    queue_depth requests are pending or running at the same time, further ones
+    waiting for a slot
+    
+    max_batch [int]: maximum number of requests per batch
+    latency [float]: latency target, in seconds
+    queue_depth [int]: maximum number of requests pending or running
+    threads [int or None]: number of worker threads, default of
+        ThreadPoolExecutor if None
+    processes [int or None]: number of worker processes, os.cpu_count() if None
+    
+    an Offloader serves one event loop at a time: when used from a new loop,
+    the requests still pending from the previous one are dropped; executors
+    are created on their first use, and shut down by close()
+    """
+    
+    def __init__(self, max_batch=64, latency=0.0005, queue_depth=4096, threads=None,
+                 processes=None):
+        if max_batch < 1 or latency < 0 or queue_depth < 1:
+            raise(CMException('invalid args'))
+        self.queue_depth = queue_depth
+        self._threads, self._processes = threads, processes
+        self._thread_pool, self._process_pool = None, None
+        self._sem, self._sem_loop = None, None
+        self._batchers = {
+            'cipher': _Batcher(_cipher_batch, self._get_thread_pool, max_batch, latency),
+            'milenage': _Batcher(_milenage_batch, self._get_process_pool, max_batch, latency),
+            'ecies': _Batcher(_ecies_unprotect_batch, self._get_process_pool, max_batch, latency)
+            }
+    
+    def _get_thread_pool(self):
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(max_workers=self._threads)
+        return self._thread_pool
+    
+    def _get_process_pool(self):
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(max_workers=self._processes)
+        return self._process_pool
+    
+    def close(self):
+        """shut down the executors, once all requests are completed
+        """
+        for pool in (self._thread_pool, self._process_pool):
+            if pool is not None:
+                pool.shutdown()
+        self._thread_pool, self._process_pool = None, None
+    
+    async def _submit(self, kind, req):
+        loop = asyncio.get_running_loop()
+        if self._sem_loop is not loop:
+            # a semaphore only works within a single event loop
+            self._sem, self._sem_loop = asyncio.Semaphore(self.queue_depth), loop
+        async with self._sem:
+            return await self._batchers[kind].submit(loop, req)
+    
+    async def _cipher(self, name, key, count, bearer, dir, data, bitlen):
+        if not hasattr(CM, name):
+            raise(CMException('%s not available' % name))
+        try:
+            key = bytes(key)
+        except TypeError as err:
+            raise(CMException(err))
+        return await self._submit('cipher', (name, key, count, bearer, dir, data, bitlen))
+    
+    async def eea(self, alg, key, count, bearer, dir, data, bitlen=None):
+        """cipher data with EEA1, EEA2 or EEA3 (alg being 1, 2 or 3), see CM
+        
+        returns data_out [bytes]
+        """
+        return await self._cipher('EEA%s' % alg, key, count, bearer, dir, data, bitlen)
+    
+    async def eia(self, alg, key, count, bearer, dir, data, bitlen=None):
+        """compute the MAC of data with EIA1, EIA2 or EIA3 (alg being 1, 2 or 3),
+        see CM
+        
+        returns mac [4 bytes]
+        """
+        return await self._cipher('EIA%s' % alg, key, count, bearer, dir, data, bitlen)
+    
+    async def milenage(self, K, OPc, SQN, AMF, RAND=None):
+        """generate a Milenage authentication vector, RAND being drawn from
+        os.urandom() when not provided
+        
+        returns (RAND, MAC_A, MAC_S, RES, CK, IK, AK, AK*), see parallel
+        """
+        if Milenage is None:
+            raise(CMException('Milenage not available, no AES backend'))
+        if RAND is None:
+            RAND = os.urandom(16)
+        return await self._submit('milenage', (K, OPc, SQN, AMF, RAND))
+    
+    async def ecies_unprotect(self, hn_priv_key, ue_pubkey, ciphertext, mac, profile='A'):
+        """unprotect a SUCI ciphertext with the Home Network private key, see
+        ECIES.ECIES_HN
+        
+        returns the cleartext, or None if the MAC verification failed
+        """
+        if ECIES_HN is None:
+            raise(CMException('ECIES not available, no ECC backend'))
+        return await self._submit('ecies', (bytes(hn_priv_key), profile, ue_pubkey,
+                                            ciphertext, mac))
+
+
+#------------------------------------------------------------------------------#
+# module functions, over a default Offloader
+#------------------------------------------------------------------------------#
+
+_offloader = None
+
+def _get_offloader():
+    global _offloader
+    if _offloader is None:
+        _offloader = Offloader()
+    return _offloader
+
+
+def configure(**kwargs):
+    """replace the default Offloader used by the module functions with a new
+    one, created with the given arguments (see Offloader), the previous one
+    being closed
+    """
+    global _offloader
+    if _offloader is not None:
+        _offloader.close()
+    _offloader = Offloader(**kwargs)
+    return _offloader
+
+
+async def eea(alg, key, count, bearer, dir, data, bitlen=None):
+    return await _get_offloader().eea(alg, key, count, bearer, dir, data, bitlen)
+
+async def eia(alg, key, count, bearer, dir, data, bitlen=None):
+    return await _get_offloader().eia(alg, key, count, bearer, dir, data, bitlen)
+
+async def milenage(K, OPc, SQN, AMF, RAND=None):
+    return await _get_offloader().milenage(K, OPc, SQN, AMF, RAND)
+
+async def ecies_unprotect(hn_priv_key, ue_pubkey, ciphertext, mac, profile='A'):
+    return await _get_offloader().ecies_unprotect(hn_priv_key, ue_pubkey, ciphertext, mac, profile)
+
+eea.__doc__             = Offloader.eea.__doc__
+eia.__doc__             = Offloader.eia.__doc__
+milenage.__doc__        = Offloader.milenage.__doc__
+ecies_unprotect.__doc__ = Offloader.ecies_unprotect.__doc__
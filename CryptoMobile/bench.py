@@ -0,0 +1,386 @@
+# −*− coding: UTF−8 −*−
+#/**
+# * Software Name : CryptoMobile
+# * Version : 0.3
+# *
+# * This program is free software: you can redistribute it and/or modify
+# * it under the terms of the GNU General Public License version 2 as published
+# * by the Free Software Foundation.
+# *
+# * This program is distributed in the hope that it will be useful,
+# * but WITHOUT ANY WARRANTY; without even the implied warranty of
+# * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# * GNU General Public License for more details.
+# *
+# * You will find a copy of the terms and conditions of the GNU General Public
+# * License version 2 in the "license.txt" file or
+# * see http://www.gnu.org/licenses/ or write to the Free Software Foundation,
+# * Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+# *
+# *--------------------------------------------------------
+# * File Name : CryptoMobile/bench.py
+# * Created : 2026-10-17
+# *--------------------------------------------------------
+#*/
+
+########################################################
+# CryptoMobile python toolkit
+#
+# benchmark of all algorithms, with JSON results and comparison against a
+# saved baseline
+#
+# usage: python -m CryptoMobile.bench [-h]
+#######################################################
+
+import os
+import sys
+import json
+import platform
+import argparse
+from time   import perf_counter, strftime, gmtime
+#
+from .      import __version__
+from .utils import *
+from .CM    import *
+from .TUAK  import TUAKSubscriber
+from .conv  import KDF, conv_401_A2, conv_501_A2, conv_501_A4
+try:
+    from .Milenage import MilenageSubscriber
+except ImportError:
+    # no AES backend
+    MilenageSubscriber = None
+try:
+    from .ECIES import ECIES_UE, ECIES_HN
+except ImportError:
+    # no ECC backend
+    ECIES_UE = None
+try:
+    import pycomp128
+except ImportError:
+    pycomp128 = None
+
+
+__all__ = ['BENCHMARKS', 'DEFAULT_SIZES', 'run', 'compare', 'load', 'save',
+           'main']
+
+
+DEFAULT_SIZES = (40, 1500, 9000)
+
+
+# BENCHMARKS: name -> (sized, factory)
+# factory(size) returns a callable without argument, running the algorithm
+# once over a payload of size bytes (or over its fixed-size inputs when the
+# benchmark is not sized)
+BENCHMARKS = {}
+
+
+def _bench(name, sized=True):
+    def register(factory):
+        BENCHMARKS[name] = (sized, factory)
+        return factory
+    return register
+
+
+#------------------------------------------------------------------------------#
+# 3G / LTE / 5G confidentiality and integrity protection
+#------------------------------------------------------------------------------#
+
+def _cipher(fn):
+    def factory(size):
+        key, data = os.urandom(16), os.urandom(size)
+        return lambda: fn(key, 0x12345678, 5, 1, data)
+    return factory
+
+
+def _mac_uia1(size):
+    key, data = os.urandom(16), os.urandom(size)
+    return lambda: UIA1(key, 0x12345678, 0x87654321, 1, data)
+
+def _mac_uia2(size):
+    key, data = os.urandom(16), os.urandom(size)
+    return lambda: UIA2(key, 0x12345678, 0x87654321, 1, data)
+
+
+_bench('UEA1')(_cipher(UEA1))
+_bench('UIA1')(_mac_uia1)
+_bench('UEA2')(_cipher(UEA2))
+_bench('UIA2')(_mac_uia2)
+_bench('EEA1')(_cipher(EEA1))
+_bench('EIA1')(_cipher(EIA1))
+_bench('EEA3')(_cipher(EEA3))
+_bench('EIA3')(_cipher(EIA3))
+if 'EEA2' in globals():
+    _bench('EEA2')(_cipher(EEA2))
+    _bench('EIA2')(_cipher(EIA2))
+
+
+#------------------------------------------------------------------------------#
+# authentication and key agreement
+#------------------------------------------------------------------------------#
+
+if MilenageSubscriber is not None:
+
+    @_bench('Milenage', sized=False)
+    def _milenage(size):
+        sub = MilenageSubscriber(os.urandom(16), OP=os.urandom(16))
+        RAND, SQN, AMF = os.urandom(16), os.urandom(6), b'\x80\x00'
+        return lambda: sub.generate_vector(RAND, SQN, AMF)
+
+
+@_bench('TUAK', sized=False)
+def _tuak(size):
+    sub = TUAKSubscriber(os.urandom(16), TOP=os.urandom(32))
+    RAND, SQN, AMF = os.urandom(16), os.urandom(6), b'\x80\x00'
+    return lambda: sub.generate_vector(RAND, SQN, AMF)
+
+
+if pycomp128 is not None:
+
+    def _comp128(fn):
+        def factory(size):
+            ki, rand = os.urandom(16), os.urandom(16)
+            return lambda: fn(ki, rand)
+        return factory
+
+    _bench('COMP128v1', sized=False)(_comp128(pycomp128.comp128v1))
+    _bench('COMP128v2', sized=False)(_comp128(pycomp128.comp128v2))
+    _bench('COMP128v3', sized=False)(_comp128(pycomp128.comp128v3))
+
+
+#------------------------------------------------------------------------------#
+# key derivation
+#------------------------------------------------------------------------------#
+
+@_bench('KDF')
+def _kdf(size):
+    key, S = os.urandom(32), os.urandom(size)
+    return lambda: KDF(key, S)
+
+
+@_bench('conv_401_A2', sized=False)
+def _conv_401_a2(size):
+    CK, IK, sqn_x_ak = os.urandom(16), os.urandom(16), os.urandom(6)
+    return lambda: conv_401_A2(CK, IK, b'\x00\xf1\x10', sqn_x_ak)
+
+
+@_bench('conv_501_A2', sized=False)
+def _conv_501_a2(size):
+    CK, IK, sqn_x_ak = os.urandom(16), os.urandom(16), os.urandom(6)
+    return lambda: conv_501_A2(CK, IK, b'5G:mnc001.mcc001.3gppnetwork.org', sqn_x_ak)
+
+
+@_bench('conv_501_A4', sized=False)
+def _conv_501_a4(size):
+    CK, IK, RAND, RES = os.urandom(16), os.urandom(16), os.urandom(16), os.urandom(8)
+    return lambda: conv_501_A4(CK, IK, b'5G:mnc001.mcc001.3gppnetwork.org', RAND, RES)
+
+
+#------------------------------------------------------------------------------#
+# SUCI protection
+#------------------------------------------------------------------------------#
+
+if ECIES_UE is not None:
+
+    def _ecies_keys(profile):
+        ue = ECIES_UE(profile=profile)
+        hn_privkey = ue.EC.get_privkey()
+        return hn_privkey, ue.EC.get_pubkey()
+
+    def _ecies_protect(profile):
+        def factory(size):
+            hn_privkey, hn_pubkey = _ecies_keys(profile)
+            ue, data = ECIES_UE(profile=profile), os.urandom(size)
+            def protect():
+                ue.generate_sharedkey(hn_pubkey)
+                return ue.protect(data)
+            return protect
+        return factory
+
+    def _ecies_unprotect(profile):
+        def factory(size):
+            hn_privkey, hn_pubkey = _ecies_keys(profile)
+            ue, hn = ECIES_UE(profile=profile), ECIES_HN(hn_privkey, profile=profile)
+            ue.generate_sharedkey(hn_pubkey)
+            ue_pubkey, ciphertext, mac = ue.protect(os.urandom(size))
+            return lambda: hn.unprotect(ue_pubkey, ciphertext, mac)
+        return factory
+
+    _bench('ECIES_A_protect')(_ecies_protect('A'))
+    _bench('ECIES_A_unprotect')(_ecies_unprotect('A'))
+    _bench('ECIES_B_protect')(_ecies_protect('B'))
+    _bench('ECIES_B_unprotect')(_ecies_unprotect('B'))
+
+
+#------------------------------------------------------------------------------#
+# measurement
+#------------------------------------------------------------------------------#
+
+def _percentile(lat, p):
+    # nearest-rank percentile over sorted latencies
+    return lat[min(len(lat)-1, max(0, int(round(p * len(lat) / 100.0)) - 1))]
+
+
+def _measure(fn, duration, min_iter, warmup):
+    for i in range(warmup):
+        fn()
+    lat, total = [], 0.0
+    while len(lat) < min_iter or total < duration:
+        T0 = perf_counter()
+        fn()
+        T1 = perf_counter() - T0
+        lat.append(T1)
+        total += T1
+    return lat
+
+
+def run(names=None, sizes=DEFAULT_SIZES, duration=0.2, min_iter=10, warmup=3):
+    """run the benchmarks and return a report, as a dict ready for JSON
+    serialization
+
+    names [iterable of str or None]: benchmarks to run, all if None
+    sizes [iterable of int]: payload sizes in bytes, for sized benchmarks
+    duration [float]: minimum time in seconds spent running each benchmark,
+        for each size
+    min_iter [int]: minimum number of runs of each benchmark, for each size
+    warmup [int]: number of untimed runs before timing
+
+    each result provides the number of runs, ops/s, MB/s (None for benchmarks
+    without payload) and the latency min, mean, p50, p90, p99 and max in
+    microseconds
+    """
+    if names is None:
+        names = sorted(BENCHMARKS)
+    else:
+        for name in names:
+            if name not in BENCHMARKS:
+                raise(CMException('unknown benchmark %s' % name))
+    results = []
+    for name in names:
+        sized, factory = BENCHMARKS[name]
+        for size in (sizes if sized else (None, )):
+            lat = _measure(factory(size), duration, min_iter, warmup)
+            total = sum(lat)
+            ops = len(lat) / total
+            lat.sort()
+            results.append({
+                'name'      : name,
+                'size'      : size,
+                'runs'      : len(lat),
+                'ops_s'     : ops,
+                'mb_s'      : ops * size / 1e6 if sized else None,
+                'latency_us': {
+                    'min' : 1e6 * lat[0],
+                    'mean': 1e6 * total / len(lat),
+                    'p50' : 1e6 * _percentile(lat, 50),
+                    'p90' : 1e6 * _percentile(lat, 90),
+                    'p99' : 1e6 * _percentile(lat, 99),
+                    'max' : 1e6 * lat[-1]
+                    }
+                })
+    return {
+        'meta': {
+            'cryptomobile'  : __version__,
+            'python'        : '%s %s' % (platform.python_implementation(),
+                                         platform.python_version()),
+            'platform'      : platform.platform(),
+            'machine'       : platform.machine(),
+            'date'          : strftime('%Y-%m-%dT%H:%M:%SZ', gmtime()),
+            'duration'      : duration
+            },
+        'results': results
+        }
+
+
+def compare(report, baseline, threshold=0.1):
+    """compare the ops/s of each result of report with the corresponding one
+    (same name and size) in baseline
+
+    returns the list of regressions, as (name, size, baseline ops/s, ops/s,
+    relative change) for results which ops/s dropped by more than threshold
+    """
+    ref = dict(((r['name'], r['size']), r['ops_s']) for r in baseline['results'])
+    regressions = []
+    for r in report['results']:
+        key = (r['name'], r['size'])
+        if key in ref:
+            change = r['ops_s'] / ref[key] - 1.0
+            if change < -threshold:
+                regressions.append((r['name'], r['size'], ref[key], r['ops_s'], change))
+    return regressions
+
+
+def load(path):
+    """load a report saved as JSON
+    """
+    with open(path) as fd:
+        return json.load(fd)
+
+
+def save(report, path):
+    """save a report as JSON
+    """
+    with open(path, 'w') as fd:
+        json.dump(report, fd, indent=1, sort_keys=True)
+
+
+def _format(report):
+    lines = ['%-20s %6s %12s %10s %10s %10s %10s'
+             % ('name', 'size', 'ops/s', 'MB/s', 'p50 us', 'p90 us', 'p99 us')]
+    for r in report['results']:
+        lines.append('%-20s %6s %12.1f %10s %10.2f %10.2f %10.2f' % (
+                     r['name'],
+                     '-' if r['size'] is None else r['size'],
+                     r['ops_s'],
+                     '-' if r['mb_s'] is None else '%.2f' % r['mb_s'],
+                     r['latency_us']['p50'],
+                     r['latency_us']['p90'],
+                     r['latency_us']['p99']))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m CryptoMobile.bench',
+        description='CryptoMobile benchmark, with JSON results')
+    parser.add_argument('-a', '--algs', default=None,
+        help='comma-separated list of benchmarks to run (default: all)')
+    parser.add_argument('-s', '--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+        help='comma-separated list of payload sizes in bytes (default: %(default)s)')
+    parser.add_argument('-d', '--duration', type=float, default=0.2,
+        help='seconds spent on each benchmark and size (default: %(default)s)')
+    parser.add_argument('-o', '--output', default=None,
+        help='write the JSON report to this file, instead of stdout')
+    parser.add_argument('-b', '--baseline', default=None,
+        help='JSON report to compare against, exits with 1 on regression')
+    parser.add_argument('-t', '--threshold', type=float, default=0.1,
+        help='relative ops/s drop considered as a regression (default: %(default)s)')
+    parser.add_argument('-l', '--list', action='store_true',
+        help='list available benchmarks and exit')
+    args = parser.parse_args(argv)
+    #
+    if args.list:
+        for name in sorted(BENCHMARKS):
+            print('%-20s %s' % (name, 'sized' if BENCHMARKS[name][0] else ''))
+        return 0
+    names = args.algs.split(',') if args.algs else None
+    try:
+        sizes = [int(s) for s in args.sizes.split(',')]
+        report = run(names, sizes, args.duration)
+    except (ValueError, CMException) as err:
+        parser.error(str(err))
+    if args.output:
+        save(report, args.output)
+        print(_format(report))
+    else:
+        print(json.dumps(report, indent=1, sort_keys=True))
+    if args.baseline:
+        regressions = compare(report, load(args.baseline), args.threshold)
+        for name, size, ops_ref, ops, change in regressions:
+            sys.stderr.write('regression: %s (size %s): %.1f ops/s -> %.1f ops/s (%+.1f%%)\n'
+                             % (name, '-' if size is None else size, ops_ref, ops, 100*change))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
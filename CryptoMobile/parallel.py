@@ -0,0 +1,132 @@
+# −*− coding: UTF−8 −*−
+#/**
+# * Software Name : CryptoMobile
+# * Version : 0.3
+# *
+# * This program is free software: you can redistribute it and/or modify
+# * it under the terms of the GNU General Public License version 2 as published
+# * by the Free Software Foundation.
+# *
+# * This program is distributed in the hope that it will be useful,
+# * but WITHOUT ANY WARRANTY; without even the implied warranty of
+# * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# * GNU General Public License for more details.
+# *
+# * You will find a copy of the terms and conditions of the GNU General Public
+# * License version 2 in the "license.txt" file or
+# * see http://www.gnu.org/licenses/ or write to the Free Software Foundation,
+# * Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+# *
+# *--------------------------------------------------------
+# * File Name : CryptoMobile/parallel.py
+# * Created : 2026-10-17
+# *--------------------------------------------------------
+#*/
+
+########################################################
+# CryptoMobile python toolkit
+#
+# parallel generation of authentication vectors, over a pool of processes
+#######################################################
+
+import os
+from collections        import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools          import islice
+#
+from .utils     import *
+from .TUAK      import TUAK, TUAKSubscriber
+try:
+    from .Milenage import Milenage, MilenageSubscriber
+except ImportError as err:
+    # no AES backend
+    Milenage = None
+
+
+__all__ = ['generate_vectors']
+
+
+_MILENAGE_CONSTANTS = ('c1', 'c2', 'c3', 'c4', 'c5', 'r1', 'r2', 'r3', 'r4', 'r5')
+
+
+def _vector_milenage(alg, opc, K, OP, SQN, AMF, RAND):
+    if opc:
+        sub = MilenageSubscriber(K, OPc=OP)
+    else:
+        sub = MilenageSubscriber(K, OP=OP)
+    if alg is not Milenage:
+        # subclass with its own operator constants
+        for attr in _MILENAGE_CONSTANTS:
+            setattr(sub, attr, getattr(alg, attr))
+    return sub.generate_vector(RAND, SQN, AMF)
+
+
+def _vector_tuak(alg, opc, K, TOP, SQN, AMF, RAND):
+    if opc:
+        sub = TUAKSubscriber(K, TOPc=TOP, tuak=alg)
+    else:
+        sub = TUAKSubscriber(K, TOP=TOP, tuak=alg)
+    return sub.generate_vector(RAND, SQN, AMF)
+
+
+def _generate_chunk(alg, opc, chunk):
+    """generate the authentication vectors for a chunk of records, in a worker
+    process
+    """
+    if Milenage is not None and issubclass(alg, Milenage):
+        vector = _vector_milenage
+    else:
+        vector = _vector_tuak
+    ret = []
+    for rec in chunk:
+        if len(rec) > 4:
+            RAND = rec[4]
+        else:
+            RAND = os.urandom(16)
+        vec = vector(alg, opc, rec[0], rec[1], rec[2], rec[3], RAND)
+        if vec is None:
+            raise(CMException('invalid subscriber record'))
+        ret.append((RAND, ) + tuple(vec))
+    return ret
+
+
+def generate_vectors(records, alg=None, opc=True, workers=None, chunksize=256):
+    """generate authentication vectors over a pool of processes, and yield them
+    in the order of the records
+
+    records [iterable of (K, OPc, SQN, AMF[, RAND])]: subscriber records,
+        OPc being OPc (Milenage) or TOPc (TUAK), or OP / TOP when opc is False,
+        RAND being drawn from os.urandom() when not provided
+    alg [class]: Milenage (default) or TUAK, or a subclass of them with its own
+        operator constants or settings
+    opc [bool]: whether records carry OPc / TOPc or OP / TOP
+    workers [int or None]: number of worker processes, os.cpu_count() if None
+    chunksize [int]: number of records sent to a worker at once
+
+    yields (RAND, MAC_A, MAC_S, RES, CK, IK, AK, AK*) for each record
+
+    records are consumed lazily, with at most 2 chunks per worker in flight,
+    hence an unbounded iterable of records can be used; a CMException is raised
+    on an invalid record
+    """
+    if alg is None:
+        if Milenage is None:
+            raise(CMException('Milenage not available, no AES backend'))
+        alg = Milenage
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers < 1 or chunksize < 1:
+        raise(CMException('invalid args'))
+    records = iter(records)
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            while len(pending) < 2*workers:
+                chunk = list(islice(records, chunksize))
+                if not chunk:
+                    break
+                pending.append(pool.submit(_generate_chunk, alg, opc, chunk))
+            if not pending:
+                break
+            for vec in pending.popleft().result():
+                yield vec
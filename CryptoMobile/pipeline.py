@@ -0,0 +1,180 @@
+# −*− coding: UTF−8 −*−
+#/**
+# * Software Name : CryptoMobile
+# * Version : 0.3
+# *
+# * This program is free software: you can redistribute it and/or modify
+# * it under the terms of the GNU General Public License version 2 as published
+# * by the Free Software Foundation.
+# *
+# * This program is distributed in the hope that it will be useful,
+# * but WITHOUT ANY WARRANTY; without even the implied warranty of
+# * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# * GNU General Public License for more details.
+# *
+# * You will find a copy of the terms and conditions of the GNU General Public
+# * License version 2 in the "license.txt" file or
+# * see http://www.gnu.org/licenses/ or write to the Free Software Foundation,
+# * Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+# *
+# *--------------------------------------------------------
+# * File Name : CryptoMobile/pipeline.py
+# * Created : 2026-10-17
+# *--------------------------------------------------------
+#*/
+
+########################################################
+# CryptoMobile python toolkit
+#
+# offline decryption of the PDUs recorded in a trace file, over memory-mapped
+# input and output files
+#######################################################
+
+import os
+import mmap
+import shutil
+from struct   import pack
+#
+from pykasumi import kasumi_f8_records
+from pysnow   import snow_f8_records
+from pyzuc    import zuc_eea3_records
+from .utils   import *
+try:
+    from .AES import AES_CTR
+except ImportError as err:
+    # no AES backend
+    AES_CTR = None
+
+
+__all__ = ['decrypt_records', 'RECORDS_ALGS']
+
+
+def _check_record(buf_len, offset, length, count, bearer, dir):
+    if not 0 <= offset <= buf_len - length or length < 0 or \
+    not 0 <= count < MAX_UINT32 or not 0 <= bearer < 32 or dir not in (0, 1):
+        raise(ValueError('invalid args'))
+
+
+def _null_records(key, data_in, records, data_out=None):
+    if data_out is None:
+        data_out = data_in
+    buf_len = min(len(data_in), len(data_out))
+    for rec in records:
+        _check_record(buf_len, *rec)
+        if data_out is not data_in:
+            data_out[rec[0]:rec[0]+rec[1]] = data_in[rec[0]:rec[0]+rec[1]]
+    return data_out
+
+
+def _eea2_records(key, data_in, records, data_out=None):
+    # the AES backends have no records function: each PDU is ciphered with its
+    # own CTR context, and copied into data_out
+    if len(key) != 16:
+        raise(ValueError('invalid args'))
+    if data_out is None:
+        data_out = data_in
+    buf_len = min(len(data_in), len(data_out))
+    for rec in records:
+        _check_record(buf_len, *rec)
+        offset, length, count, bearer, dir = rec
+        data_out[offset:offset+length] = AES_CTR(
+            key, pack('>II', count, (bearer<<27) + (dir<<26))).encrypt(
+            bytes(data_in[offset:offset+length]))
+    return data_out
+
+
+# records functions, for each algorithm
+RECORDS_ALGS = {
+    'UEA0': _null_records,
+    'EEA0': _null_records,
+    'UEA1': kasumi_f8_records,
+    'UEA2': snow_f8_records,
+    'EEA1': snow_f8_records,
+    'EEA3': zuc_eea3_records
+    }
+if AES_CTR is not None:
+    RECORDS_ALGS['EEA2'] = _eea2_records
+
+
+def _group_records(index, keys):
+    groups = {}
+    for rec in index:
+        try:
+            offset, length, count, bearer, dir, alg = rec[:6]
+            func = RECORDS_ALGS[alg]
+            if func is _null_records:
+                # no key required
+                key = b''
+            elif isinstance(keys, (bytes, bytearray)):
+                key = keys
+            elif len(rec) > 6:
+                key = keys[rec[6]]
+            else:
+                key = keys[alg]
+            group = (func, bytes(key))
+        except (ValueError, TypeError, KeyError) as err:
+            raise(CMException('invalid record %r' % (rec, )))
+        groups.setdefault(group, []).append((offset, length, count, bearer, dir))
+    return groups
+
+
+def _decrypt_groups(groups, data_in, data_out):
+    for (func, key), records in groups.items():
+        try:
+            func(key, data_in, records, data_out)
+        except (ValueError, TypeError, BufferError, OverflowError) as err:
+            raise(CMException(err))
+
+
+def decrypt_records(path, index, keys, out=None):
+    """decrypt the PDUs recorded in a trace file, the trace being memory-mapped
+    and each PDU being deciphered from it into the output, at the same offset
+
+    path [str]: trace file
+    index [iterable of (offset, length, count, bearer, dir, alg[, key_id])]:
+        PDUs to be deciphered, offset and length being in bytes, alg being one
+        of the RECORDS_ALGS names ('UEA1', 'UEA2', 'EEA1', 'EEA2', 'EEA3' or
+        'UEA0' / 'EEA0' for the null ciphering)
+    keys [16 bytes or dict]: the key of all the PDUs, or a dict of keys
+        indexed by key_id when provided in the record, by alg otherwise
+    out [str, writable buffer or None]: output file, being a copy of the trace
+        with all PDUs deciphered, path + '.dec' if None; or a writable buffer,
+        only the PDUs being written in it
+
+    returns out
+
+    PDUs are grouped by algorithm and key, and all PDUs of a group are
+    deciphered with a single call to the C extension, from the input mapping to
+    the output one (except for EEA2, done with a CTR context per PDU); a
+    CMException is raised on an invalid record
+    """
+    groups = _group_records(index, keys)
+    if out is None:
+        out = path + '.dec'
+    size = os.path.getsize(path)
+    with open(path, 'rb') as fd_in:
+        if size:
+            data_in = mmap.mmap(fd_in.fileno(), size, access=mmap.ACCESS_READ)
+        else:
+            # empty files cannot be mapped
+            data_in = b''
+        try:
+            if isinstance(out, str):
+                shutil.copyfile(path, out)
+                with open(out, 'r+b') as fd_out:
+                    if size:
+                        data_out = mmap.mmap(fd_out.fileno(), size, access=mmap.ACCESS_WRITE)
+                    else:
+                        data_out = bytearray()
+                    try:
+                        _decrypt_groups(groups, data_in, data_out)
+                    finally:
+                        if size:
+                            data_out.flush()
+                            data_out.close()
+            else:
+                _decrypt_groups(groups, data_in, out)
+        finally:
+            if size:
+                data_in.close()
+    return out
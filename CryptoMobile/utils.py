@@ -42,7 +42,14 @@ MAX_UINT64 = 1<<64
 if py_vers > 2:
     
     def xor_buf(b1, b2):
-        return bytes([b1[i]^b2[i] for i in range(0, min(len(b1), len(b2)))])
+        # XOR both buffers as big integers, which is much faster than a
+        # per-byte loop, from 16 bytes blocks up to whole packets
+        l1, l2 = len(b1), len(b2)
+        if l1 > l2:
+            b1, l1 = b1[:l2], l2
+        elif l2 > l1:
+            b2 = b2[:l1]
+        return (int.from_bytes(b1, 'big') ^ int.from_bytes(b2, 'big')).to_bytes(l1, 'big')
     
     def int_from_bytes(b):
         return int.from_bytes(b, 'big')
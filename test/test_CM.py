@@ -41,15 +41,30 @@
 # - AES (EEA2, EIA2) - from pycrypto
 #######################################################
 
+import os
+import shutil
 from time import time
-
-from CryptoMobile.CM import KASUMI, SNOW3G, ZUC
+from threading import Thread
+from random import Random
+from binascii import hexlify
+from tempfile import mkdtemp
+
+from CryptoMobile.CM import KASUMI, SNOW3G, ZUC, UEA1Stream, EEA1Stream, EEA3Stream, \
+    UIA1MAC, UIA2MAC, EIA1MAC, EIA3MAC
+from CryptoMobile.utils import xor_buf, CMException
+from CryptoMobile.pipeline import decrypt_records
+from pyzuc import zuc_eia3, zuc_eia3_ref
+from pykasumi import KasumiKey
+from pysnow import snow_f9, snow_f9_engines, snow_get_f9_engine, snow_set_f9_engine, \
+                   snow_initialize, snow_generatekeystream, SNOW3GState
 try:
     from CryptoMobile.CM import EEA2
 except ImportError:
     _with_aes = False
 else:
-    from CryptoMobile.CM import AES_3GPP
+    from CryptoMobile.CM   import AES_3GPP, EEA2Stream, EIA2MAC
+    from CryptoMobile.CMAC import CMAC, CMACCache, cmac_cache
+    from CryptoMobile      import AES
     _with_aes = True
 
 
@@ -201,6 +216,37 @@ def kasumi_F9_testset_5():
     mac     = b'\xc3\x83\x83\x9d'
     return kas.F9(key, count, fresh, direct, data, bitlen) == mac
     
+def kasumi_KasumiKey_testset():
+    # key schedules computed once, and reused for several messages
+    kas     = KASUMI()
+    key     = b'+\xd6E\x9f\x82\xc5\xb3\x00\x95,I\x10H\x81\xffH'
+    kkey    = KasumiKey(key)
+    data    = b'k"w7)o9<\x80y5>\xdc\x87\xe2\xe8\x05\xd2\xecI\xa4\xf2\xd8\xe0'
+    if kkey.f9(950464598, 97709129, 0, data, 189) != b'\xf6;\xd7,':
+        return False
+    rnd     = Random(0x55)
+    for bitlen in (0, 1, 63, 64, 65, 189, 1000):
+        count   = rnd.getrandbits(32)
+        bearer  = rnd.getrandbits(5)
+        direct  = rnd.getrandbits(1)
+        data    = bytes(bytearray(rnd.getrandbits(8) for i in range((bitlen+7)//8)))
+        if kkey.f8(count, bearer, direct, data, bitlen) != \
+        kas.F8(key, count, bearer, direct, data, bitlen) or \
+        kkey.f9(count, bearer, direct, data, bitlen) != \
+        kas.F9(key, count, bearer, direct, data, bitlen):
+            return False
+    # out of range count, bearer / fresh and dir are rejected
+    for args in ((-1, 1, 0), (1<<32, 1, 0), (0, -1, 0), (0, 1<<32, 0), (0, 1, -1), (0, 1, 2)):
+        for func in (kkey.f8, kkey.f9):
+            try:
+                func(*args + (data, ))
+            except ValueError:
+                pass
+            else:
+                return False
+    # length defaults to the whole data
+    return kkey.f9(1, 2, 0, data) == kas.F9(key, 1, 2, 0, data, 8*len(data))
+
 def kasumi_testsets():
     return kasumi_testset_1() & kasumi_testset_2() & \
             kasumi_testset_3() & kasumi_testset_4() & \
@@ -209,13 +255,55 @@ def kasumi_testsets():
             kasumi_F8_testset_5() & \
             kasumi_F9_testset_1() & kasumi_F9_testset_2() & \
             kasumi_F9_testset_3() & kasumi_F9_testset_4() & \
-            kasumi_F9_testset_5()
+            kasumi_F9_testset_5() & kasumi_KasumiKey_testset()
 
 
 ###
 # SNOW3G, F8, F9, EIA1: testsets from 3GPP TS 35.2XY Rel.10
 ###
     
+def _keystream_stream_check(gen, key, iv, length):
+    # keystream streamed by chunks and into odd-sized, unaligned buffers vs.
+    # keystream generated at once
+    gen._initialize(key, iv)
+    ks = gen._generate_keystream(length)
+    gen._initialize(key, iv)
+    # chunks stay valid once the next ones are generated
+    if b''.join(list(gen._iter_keystream(length, 1500))) != ks:
+        return False
+    gen._initialize(key, iv)
+    buf, off = bytearray(length+1), 1
+    for n in (7, 13, 4, 1, 3, 250):
+        gen._keystream_into(memoryview(buf)[off:off+n])
+        off += n
+    gen._keystream_into(memoryview(buf)[off:])
+    if bytes(buf[1:]) != ks:
+        return False
+    # _generate_keystream() using the bytes remaining from _keystream_into()
+    gen._initialize(key, iv)
+    out = []
+    for n in (7, 5, 6, 2, 3, length-23):
+        if len(out) % 2:
+            out.append(gen._generate_keystream(n))
+        else:
+            buf = bytearray(n)
+            gen._keystream_into(buf)
+            out.append(bytes(buf))
+    if b''.join(out) != ks:
+        return False
+    try:
+        gen._keystream_into(b'\0\0\0\0')
+    except CMException:
+        pass
+    else:
+        return False
+    try:
+        gen._state.keystream_into(bytearray(6))
+    except ValueError:
+        return True
+    else:
+        return False
+
 def snow3g_testset_1():
     snow    = SNOW3G()
     key     = b'+\xd6E\x9f\x82\xc5\xb3\x00\x95,I\x10H\x81\xffH'
@@ -248,6 +336,39 @@ def snow3g_testset_4():
     snow._initialize(key, iv)
     ks = snow._generate_keystream(10000)
     return ks[0:12] == output[0] and ks[9996:10000] == output[1]
+
+def snow3g_testset_5():
+    # several SNOW3G instances driven concurrently, each keystream being continued
+    snow1, snow2 = SNOW3G(), SNOW3G()
+    snow1._initialize(b'+\xd6E\x9f\x82\xc5\xb3\x00\x95,I\x10H\x81\xffH',
+                      b'\xea\x02G\x14\xad\\M\x84\xdf\x1f\x9b%\x1c\x0b\xf4_')
+    snow2._initialize(b'\x8c\xe3>,\xc3\xc0\xb5\xfc\x1f=\xe8\xa6\xdcf\xb1\xf3',
+                      b'\xd3\xc5\xd5\x922\x7f\xb1\x1c\xdeU\x19\x88\xce\xb2\xf9\xb7')
+    ks1 = snow1._generate_keystream(4)
+    ks2 = snow2._generate_keystream(4)
+    ks1 += snow1._generate_keystream(4)
+    ks2 += snow2._generate_keystream(4)
+    return ks1 == b'\xab\xee\x97\x04z\xc3\x13s' and ks2 == b'\xef\xf8\xa3B\xf7QH\x0f'
+
+def snow3g_testset_6():
+    # table-driven core (SNOW3GState) vs. reference core (global state),
+    # with pseudo-random keys and ivs, the fast keystream being produced in 2 parts
+    rnd     = Random(0x33)
+    for n in (1, 15, 16, 17, 31, 33, 48):
+        key     = bytes(bytearray(rnd.getrandbits(8) for i in range(16)))
+        iv      = bytes(bytearray(rnd.getrandbits(8) for i in range(16)))
+        snow_initialize(key, iv)
+        ks      = snow_generatekeystream(n+5)
+        snow    = SNOW3GState(key, iv)
+        if snow.keystream(n) + snow.keystream(5) != ks:
+            return False
+    return True
+
+def snow3g_testset_7():
+    return _keystream_stream_check(SNOW3G(),
+                                   b'\r\xedrc\x10\x9c\xf9.3R%Z\x14\x0e\x0fv',
+                                   b'kh\x07\x9aA\xa7\xc4\xc9\x1b\xef\xd7\x9f\x7f\xdc\xc23',
+                                   10000)
         
 def snow3g_F8_testset_1():
     snow    = SNOW3G()
@@ -436,9 +557,43 @@ def snow3g_EIA1_testset_6():
     output  = b'\x0f\xa2\xb1\xee'
     return snow.EIA1(key, count, bearer, direct, data, bitlen) == output
 
+def snow3g_F9_engines_testset():
+    # all f9 engines available vs. the test vectors, and vs. the reference engine
+    # over pseudo-random MACs
+    rnd     = Random(0x39)
+    pdus    = []
+    for bitlen in [0, 1, 63, 64, 65, 127, 200, 1024, 8*1500+3]:
+        pdus.append((bytes(bytearray(rnd.getrandbits(8) for i in range(16))),
+                     rnd.getrandbits(32), rnd.getrandbits(32), rnd.getrandbits(1),
+                     bytes(bytearray(rnd.getrandbits(8) for i in range((bitlen+7)//8))),
+                     bitlen))
+    engine  = snow_get_f9_engine()
+    # the fastest engine available is selected at import
+    if engine != snow_f9_engines()[-1]:
+        return False
+    try:
+        snow_set_f9_engine('ref')
+        macs = [snow_f9(*pdu) for pdu in pdus]
+        for eng in snow_f9_engines():
+            snow_set_f9_engine(eng)
+            if not snow3g_F9_testset_1() & snow3g_F9_testset_2() & \
+            snow3g_F9_testset_3() & snow3g_F9_testset_4() & \
+            snow3g_F9_testset_5() & snow3g_F9_testset_6() & \
+            snow3g_EIA1_testset_1() & snow3g_EIA1_testset_2() & \
+            snow3g_EIA1_testset_3() & snow3g_EIA1_testset_4() & \
+            snow3g_EIA1_testset_5() & snow3g_EIA1_testset_6():
+                return False
+            if [snow_f9(*pdu) for pdu in pdus] != macs:
+                return False
+    finally:
+        snow_set_f9_engine(engine)
+    return True
+
 def snow3g_testsets():
     return snow3g_testset_1() & snow3g_testset_2() & \
             snow3g_testset_3() & snow3g_testset_4() & \
+            snow3g_testset_5() & snow3g_testset_6() & \
+            snow3g_testset_7() & \
             snow3g_F8_testset_1() & snow3g_F8_testset_2() & \
             snow3g_F8_testset_3() & snow3g_F8_testset_4() & \
             snow3g_F8_testset_5() & \
@@ -447,7 +602,8 @@ def snow3g_testsets():
             snow3g_F9_testset_5() & snow3g_F9_testset_6() & \
             snow3g_EIA1_testset_1() & snow3g_EIA1_testset_2() & \
             snow3g_EIA1_testset_3() & snow3g_EIA1_testset_4() & \
-            snow3g_EIA1_testset_5() & snow3g_EIA1_testset_6()
+            snow3g_EIA1_testset_5() & snow3g_EIA1_testset_6() & \
+            snow3g_F9_engines_testset()
 
 ###
 # ZUC, EEA3, EIA3: testsets from GSMA
@@ -486,6 +642,23 @@ def zuc_testset_4():
     ks = zuc._generate_keystream(8000)
     return ks[0:8] == output[0] and ks[7996:8000] == output[1]
 
+def zuc_testset_5():
+    # several ZUC instances driven concurrently, each keystream being continued
+    zuc1, zuc2 = ZUC(), ZUC()
+    zuc1._initialize(16 * b'\0', 16 * b'\0')
+    zuc2._initialize(16 * b'\xff', 16 * b'\xff')
+    ks1 = zuc1._generate_keystream(4)
+    ks2 = zuc2._generate_keystream(4)
+    ks1 += zuc1._generate_keystream(4)
+    ks2 += zuc2._generate_keystream(4)
+    return ks1 == b"'\xbe\xdet\x01\x80\x82\xda" and ks2 == b'\x06W\xcf\xa0p\x969\x8b'
+
+def zuc_testset_6():
+    return _keystream_stream_check(ZUC(),
+                                   b'M2\x0b\xfa\xd4\xc2\x85\xbf\xd6\xb8\xbd\x00\xf3\x9d\x8bA',
+                                   b'R\x95\x9d\xab\xa0\xbf\x17n\xce-\xc3\x15\x04\x9e\xb5t',
+                                   8000)
+
 def zuc_EEA3_testset_1():
     zuc     = ZUC()
     key     = b'\x17=\x14\xbaP\x03s\x1dz`\x04\x94p\xf0\n)'
@@ -596,15 +769,32 @@ def zuc_EIA3_testset_5():
     output  = b"\x0c\xa1'\x92"
     return zuc.EIA3(key, count, bearer, direct, data, bitlen) == output
 
+def zuc_EIA3_testset_6():
+    # word-oriented EIA3 vs. bit-oriented reference, over all bit lengths up to 320
+    # and a few longer PDUs, with pseudo-random keys and data
+    zuc     = ZUC()
+    rnd     = Random(0x35)
+    for bitlen in list(range(321)) + [4095, 8*1500+7, 8*9000]:
+        key     = bytes(bytearray(rnd.getrandbits(8) for i in range(16)))
+        data    = bytes(bytearray(rnd.getrandbits(8) for i in range((bitlen+7)//8)))
+        count   = rnd.getrandbits(32)
+        bearer  = rnd.getrandbits(5)
+        direct  = rnd.getrandbits(1)
+        if zuc.EIA3(key, count, bearer, direct, data, bitlen) != \
+        zuc_eia3_ref(key, count, bearer, direct, bitlen, data):
+            return False
+    return True
+
 def zuc_testsets():
     return zuc_testset_1() & zuc_testset_2() & \
             zuc_testset_3() & zuc_testset_4() & \
+            zuc_testset_5() & zuc_testset_6() & \
             zuc_EEA3_testset_1() & zuc_EEA3_testset_2() & \
             zuc_EEA3_testset_3() & zuc_EEA3_testset_4() & \
             zuc_EEA3_testset_5() & \
             zuc_EIA3_testset_1() & zuc_EIA3_testset_2() & \
             zuc_EIA3_testset_3() & zuc_EIA3_testset_4() & \
-            zuc_EIA3_testset_5()
+            zuc_EIA3_testset_5() & zuc_EIA3_testset_6()
 
 ###
 # EEA2, EIA2: testsets from 3GPP TS 33.401
@@ -765,6 +955,90 @@ def aes_EIA2_testset_8():
     return aes3gpp.EIA2(key, count, bearer, direct, data, bitlen) == output
 
 
+def aes_CMAC_testset():
+    # CMAC of each AES backend available vs. the generic CMAC mode of operation,
+    # over byte-aligned and bit-granular lengths
+    backends = [getattr(AES, 'AES_CMAC_%s' % name) for name in \
+                ('pycrypto', 'pycryptodome', 'cryptography') if getattr(AES, '_with_%s' % name)]
+    rnd     = Random(0x32)
+    key     = bytes(bytearray(rnd.getrandbits(8) for i in range(16)))
+    data    = bytes(bytearray(rnd.getrandbits(8) for i in range(80)))
+    cmac    = CMAC(key, AES.AES_ECB)
+    for bitlen in (1, 7, 8, 9, 120, 127, 128, 129, 256, 300, 640):
+        mac = cmac.cmac(data, bitlen)
+        for aes_cmac in backends:
+            if aes_cmac(key).cmac(data, bitlen) != mac:
+                return False
+    return all([aes_cmac(key).cmac(b'') == cmac.cmac(b'') for aes_cmac in backends])
+
+def aes_CTR_into_testset():
+    # CTR of each AES backend available, in place and into a separate buffer
+    backends = [getattr(AES, 'AES_CTR_%s' % name) for name in \
+                ('pycrypto', 'pycryptodome', 'cryptography') if getattr(AES, '_with_%s' % name)]
+    rnd     = Random(0x05)
+    key     = bytes(bytearray(rnd.getrandbits(8) for i in range(16)))
+    nonce   = bytes(bytearray(rnd.getrandbits(8) for i in range(8)))
+    for datalen in (0, 1, 15, 16, 17, 100, 1500):
+        data = bytes(bytearray(rnd.getrandbits(8) for i in range(datalen)))
+        for aes_ctr in backends:
+            ref, buf, out = aes_ctr(key, nonce).encrypt(data), bytearray(data), bytearray(datalen)
+            aes_ctr(key, nonce).encrypt_into(memoryview(buf), memoryview(buf))
+            aes_ctr(key, nonce).encrypt_into(data, out)
+            if buf != ref or out != ref:
+                return False
+    return True
+
+def aes_CMAC_cache_testset():
+    # contexts are shared per (key, ciphermod, Tlen), and only dropped once evicted
+    cache = CMACCache(maxsize=2)
+    keys  = [bytes(bytearray([i])) * 16 for i in range(3)]
+    data  = 100*b'cache'
+    macs  = [CMAC(key, AES.AES_ECB, Tlen=32).cmac(data) for key in keys]
+    ctx0  = cache.get(keys[0], AES.AES_ECB, 32)
+    if ctx0.cmac(data) != macs[0] or cache.get(keys[0], AES.AES_ECB, 32) is not ctx0 or \
+    cache.get(keys[0], AES.AES_ECB) is ctx0 or (cache.hits, cache.misses) != (1, 2):
+        return False
+    # keys[0] with Tlen 32 is the least recently used and gets evicted, while
+    # still being usable by its holder
+    if cache.get(keys[1], AES.AES_ECB, 32).cmac(data) != macs[1] or \
+    len(cache) != 2 or ctx0.cmac(data) != macs[0] or \
+    cache.get(keys[0], AES.AES_ECB, 32) is ctx0:
+        return False
+    # the index and the context share a single copy of the key
+    ctx2 = cache.get(bytearray(keys[2]), AES.AES_CMAC)
+    if ctx2.cmac(data)[:4] != macs[2] or \
+    not any(idx[0] is ctx2.key for idx in cache._ctx):
+        return False
+    cache.clear()
+    return len(cache) == 0 and (cache.hits, cache.misses) == (0, 0)
+
+def aes_CMAC_cache_threads_testset():
+    # a batch using a shared context, while another thread evicts it
+    rnd   = Random(0x11)
+    aes   = AES_3GPP()
+    key   = bytes(bytearray(rnd.getrandbits(8) for i in range(16)))
+    pdus  = [(i, 3, 1, 64*b'\x5a') for i in range(200)]
+    ref   = [aes.EIA2(key, *pdu) for pdu in pdus]
+    keys  = [bytes(bytearray(rnd.getrandbits(8) for i in range(16))) for j in range(200)]
+    errs  = []
+    def evict():
+        try:
+            for i in range(5):
+                for k in keys:
+                    aes.EIA2(k, 0, 3, 1, b'evict')
+        except Exception as err:
+            errs.append(err)
+    thr = Thread(target=evict)
+    thr.start()
+    ret = True
+    try:
+        while thr.is_alive():
+            ret &= aes.EIA2_batch(key, pdus) == ref
+    except Exception as err:
+        errs.append(err)
+    thr.join()
+    return ret and not errs
+
 def aes_testsets():
     return aes_EEA2_testset_1() & aes_EEA2_testset_2() & \
             aes_EEA2_testset_3() & aes_EEA2_testset_4() & \
@@ -772,14 +1046,325 @@ def aes_testsets():
             aes_EIA2_testset_1() & aes_EIA2_testset_2() & \
             aes_EIA2_testset_3() & aes_EIA2_testset_4() & \
             aes_EIA2_testset_5() & aes_EIA2_testset_6() & \
-            aes_EIA2_testset_7() & aes_EIA2_testset_8()
+            aes_EIA2_testset_7() & aes_EIA2_testset_8() & \
+            aes_CMAC_testset() & aes_CMAC_cache_testset() & \
+            aes_CTR_into_testset()
+
+###
+# EEA1/2/3, EIA1/2/3 batch: each PDU must give the same result as a single call
+###
+
+_batch_key  = b'\x17=\x14\xbaP\x03s\x1dz`\x04\x94p\xf0\n)'
+_batch_pdus = [
+    (0x66035492, 0xf, 0, b'l\xf6S@sUR\xab\x0c\x97R\xfao\x90%\xfe\x0b\xd6u\xd9\x00Xu\xb2\x00\x00\x00\x00', 193),
+    (0, 0, 1, b''),
+    (1, 31, 0, b'\xff'),
+    (0xffffffff, 1, 1, 100*b'\xa5', 799),
+    (0x12345678, 2, 0, bytearray(b'abcdefgh'), 1),
+    (0x9abcdef0, 3, 1, 1500*b'\x5a'),
+    ]
+
+def batch_testset_1():
+    snow = SNOW3G()
+    return snow.EEA1_batch(_batch_key, _batch_pdus) == \
+            [snow.EEA1(_batch_key, *pdu) for pdu in _batch_pdus] and \
+           snow.EIA1_batch(_batch_key, _batch_pdus) == \
+            [snow.EIA1(_batch_key, *pdu) for pdu in _batch_pdus]
+
+def batch_testset_2():
+    zuc = ZUC()
+    ret = zuc.EEA3_batch(_batch_key, _batch_pdus)
+    return ret[0] == b'\xa6\xc8_\xc6j\xfb\x853\xaa\xfc%\x18\xdf\xe7\x84\x94\x0e\xe1\xe4\xb00#\x8c\xc8\x00' and \
+           ret == [zuc.EEA3(_batch_key, *pdu) for pdu in _batch_pdus] and \
+           zuc.EIA3_batch(_batch_key, _batch_pdus) == \
+            [zuc.EIA3(_batch_key, *pdu) for pdu in _batch_pdus]
+
+def batch_testset_3():
+    aes3gpp = AES_3GPP()
+    return aes3gpp.EEA2_batch(_batch_key, _batch_pdus) == \
+            [aes3gpp.EEA2(_batch_key, *pdu) for pdu in _batch_pdus] and \
+           aes3gpp.EIA2_batch(_batch_key, _batch_pdus) == \
+            [aes3gpp.EIA2(_batch_key, *pdu) for pdu in _batch_pdus]
+
+def batch_testset_4():
+    # out of range count, bearer and dir are rejected, as with single calls
+    invalid = [(-1, 1, 0, b'abcd'), (1<<32, 1, 0, b'abcd'), (0, -1, 0, b'abcd'),
+               (0, 1<<32, 0, b'abcd')]
+    funcs   = [(SNOW3G().EEA1_batch, True), (SNOW3G().F9_batch, True),
+               (ZUC().EEA3_batch, True), (ZUC().EIA3_batch, True)]
+    if _with_aes:
+        # dir is not checked by the AES functions
+        funcs.extend([(AES_3GPP().EEA2_batch, False), (AES_3GPP().EIA2_batch, False)])
+    ret = True
+    for func, with_dir in funcs:
+        for pdu in invalid + ([(0, 1, -1, b'abcd'), (0, 1, 2, b'abcd')] if with_dir else []):
+            try:
+                func(_batch_key, [_batch_pdus[0], pdu])
+            except CMException:
+                pass
+            else:
+                ret = False
+    # bearer is a 5-bit value with ZUC
+    for func in (ZUC().EEA3_batch, ZUC().EIA3_batch):
+        try:
+            func(_batch_key, [(0, 37, 1, b'abcd')])
+        except CMException:
+            pass
+        else:
+            ret = False
+    return ret
+
+def batch_testsets():
+    if _with_aes:
+        return batch_testset_1() & batch_testset_2() & batch_testset_3() & batch_testset_4()
+    else:
+        return batch_testset_1() & batch_testset_2() & batch_testset_4()
+
+
+###
+# UEA1/2, EEA1/2/3 in place: must give the same result as the bytes-returning methods
+###
+
+def _into_check(alg, alg_into):
+    ret = True
+    for pdu in _batch_pdus:
+        ref = alg(_batch_key, *pdu)
+        # in place, with a bytearray and a memoryview
+        buf = bytearray(pdu[3])
+        ret &= alg_into(_batch_key, *(pdu[:3] + (buf,) + pdu[4:])) is buf
+        ret &= bytes(buf[:len(ref)]) == ref and buf[len(ref):] == pdu[3][len(ref):]
+        buf = memoryview(bytearray(pdu[3]))
+        alg_into(_batch_key, *(pdu[:3] + (buf,) + pdu[4:]))
+        ret &= buf[:len(ref)].tobytes() == ref
+        # into a separate output buffer
+        out = bytearray(len(ref) + 4)
+        args = pdu[:3] + (bytes(pdu[3]), pdu[4] if len(pdu) > 4 else None, out)
+        ret &= alg_into(_batch_key, *args) is out and bytes(out[:len(ref)]) == ref
+    return ret
+
+def into_testset_1():
+    kas = KASUMI()
+    return _into_check(kas.F8, kas.F8_into)
+
+def into_testset_2():
+    snow = SNOW3G()
+    return _into_check(snow.EEA1, snow.EEA1_into)
+
+def into_testset_3():
+    zuc = ZUC()
+    return _into_check(zuc.EEA3, zuc.EEA3_into)
+
+def into_testset_4():
+    aes3gpp = AES_3GPP()
+    return _into_check(aes3gpp.EEA2, aes3gpp.EEA2_into)
+
+def into_testsets():
+    if _with_aes:
+        return into_testset_1() & into_testset_2() & into_testset_3() & into_testset_4()
+    else:
+        return into_testset_1() & into_testset_2() & into_testset_3()
+
+
+###
+# streaming UEA / EEA: messages ciphered by chunks vs. at once
+###
+
+def _stream_check(alg, stream):
+    ret = True
+    for pdu in _batch_pdus:
+        ref = alg(_batch_key, *pdu)
+        data = bytes(pdu[3])[:len(ref)]
+        # the last chunk always keeps the last byte, for bitlen
+        a, b, c = [min(i, max(len(ref)-1, 0)) for i in (1, 8, 21)]
+        st = stream(_batch_key, *pdu[:3])
+        out = st.update(data[:a]) + st.update(data[a:b])
+        buf = bytearray(data[b:c])
+        ret &= st.update_into(buf) is buf
+        out += bytes(buf) + st.finalize(data[c:], pdu[4]-8*c if len(pdu) > 4 else None)
+        ret &= out == ref
+        try:
+            st.update(b'\0')
+        except CMException:
+            pass
+        else:
+            ret = False
+    return ret
+
+def stream_testset_1():
+    return _stream_check(KASUMI().F8, UEA1Stream)
+
+def stream_testset_2():
+    return _stream_check(SNOW3G().EEA1, EEA1Stream)
+
+def stream_testset_3():
+    return _stream_check(ZUC().EEA3, EEA3Stream)
+
+def stream_testset_4():
+    return _stream_check(AES_3GPP().EEA2, EEA2Stream)
+
+def stream_testsets():
+    if _with_aes:
+        return stream_testset_1() & stream_testset_2() & stream_testset_3() & stream_testset_4()
+    else:
+        return stream_testset_1() & stream_testset_2() & stream_testset_3()
+
+
+###
+# incremental integrity protection: fragmented updates vs. one-shot calls
+###
+
+def _mac_check(alg, mac):
+    ret = True
+    for pdu in _batch_pdus:
+        ref  = alg(_batch_key, *pdu)
+        data = bytes(pdu[3])
+        bitlen = pdu[4] if len(pdu) > 4 else None
+        if bitlen is not None:
+            data = data[:(bitlen+7)>>3]
+        m = mac(_batch_key, *pdu[:3])
+        a, b = [min(i, len(data)) for i in (3, 20)]
+        m.update(data[:a])
+        # digest does not alter the state
+        m.digest()
+        m.update(memoryview(data)[a:b])
+        m.update(bytearray(data[b:]))
+        ret &= m.digest(bitlen) == ref and m.digest(bitlen) == ref
+        ret &= m.hexdigest(bitlen) == hexlify(ref).decode()
+    # bitlen dropping more than the bits of the last byte
+    m = mac(_batch_key, 0, 1, 0)
+    m.update(b'\0\0')
+    try:
+        m.digest(8)
+    except CMException:
+        pass
+    else:
+        ret = False
+    return ret
+
+def mac_testset_1():
+    return _mac_check(KASUMI().F9, UIA1MAC)
+
+def mac_testset_2():
+    return _mac_check(SNOW3G().F9, UIA2MAC)
+
+def mac_testset_3():
+    return _mac_check(SNOW3G().EIA1, EIA1MAC)
+
+def mac_testset_4():
+    return _mac_check(ZUC().EIA3, EIA3MAC)
+
+def mac_testset_5():
+    ret = _mac_check(AES_3GPP().EIA2, EIA2MAC)
+    # the MAC object outlives the contexts evicted from the shared CMAC cache
+    rnd, aes = Random(0x23), AES_3GPP()
+    m = EIA2MAC(_batch_key, 5, 3, 1)
+    m.update(40*b'\xab')
+    for i in range(cmac_cache.maxsize + 36):
+        aes.EIA2(bytes(bytearray(rnd.getrandbits(8) for j in range(16))), i, 3, 1, b'abc')
+    m.update(60*b'\xab')
+    return ret & (m.digest() == aes.EIA2(_batch_key, 5, 3, 1, 100*b'\xab'))
+
+def mac_testsets():
+    if _with_aes:
+        return mac_testset_1() & mac_testset_2() & mac_testset_3() & mac_testset_4() & \
+               mac_testset_5()
+    else:
+        return mac_testset_1() & mac_testset_2() & mac_testset_3() & mac_testset_4()
+
+
+###
+# pipeline: decryption of the records of a trace file, vs. one-shot calls
+###
+
+def pipeline_testset():
+    rnd   = Random(0x24)
+    trace = bytes(bytearray(rnd.getrandbits(8) for i in range(6000)))
+    keys  = {'UEA1': 16*b'\x01', 'EEA1': 16*b'\x02', 'EEA3': 16*b'\x03', 'nas': 16*b'\x04'}
+    algs  = [('UEA1', KASUMI().F8), ('UEA2', SNOW3G().F8), ('EEA1', SNOW3G().EEA1),
+             ('EEA3', ZUC().EEA3), ('EEA0', lambda key, count, bearer, dir, data: data)]
+    if _with_aes:
+        keys['EEA2'] = 16*b'\x05'
+        algs.append(('EEA2', AES_3GPP().EEA2))
+    index, ref, offset = [], bytearray(trace), 0
+    while offset < len(trace):
+        length = min(rnd.randint(0, 400), len(trace)-offset)
+        alg, func = algs[rnd.randint(0, len(algs)-1)]
+        rec = (offset, length, rnd.getrandbits(32), rnd.randint(0, 31), rnd.randint(0, 1), alg)
+        if alg == 'UEA2' or rnd.randint(0, 3) == 0:
+            rec += ('nas', )
+            key = keys['nas']
+        else:
+            key = keys.get(alg, 16*b'\0')
+        index.append(rec)
+        ref[offset:offset+length] = func(key, rec[2], rec[3], rec[4], trace[offset:offset+length])
+        # some bytes of the trace are not part of any PDU
+        offset += length + rnd.randint(0, 20)
+    #
+    tmpdir = mkdtemp()
+    try:
+        path = os.path.join(tmpdir, 'trace')
+        with open(path, 'wb') as fd:
+            fd.write(trace)
+        ret = decrypt_records(path, index, keys) == path + '.dec'
+        with open(path + '.dec', 'rb') as fd:
+            ret &= fd.read() == ref
+        # into a buffer
+        buf = bytearray(trace)
+        ret &= decrypt_records(path, iter(index), keys, buf) is buf and buf == ref
+        # a single key for all PDUs
+        ret &= decrypt_records(path, [(0, 16, 0, 1, 0, 'EEA3')], 16*b'\x03', buf) is buf
+        ret &= bytes(buf[:16]) == ZUC().EEA3(16*b'\x03', 0, 1, 0, trace[:16])
+        # empty trace
+        with open(path, 'wb') as fd:
+            pass
+        ret &= decrypt_records(path, [(0, 0, 0, 1, 0, 'EEA3')], keys) == path + '.dec'
+        # invalid records, over the whole trace
+        with open(path, 'wb') as fd:
+            fd.write(trace)
+        invalid = [(5990, 20, 0, 1, 0, 'EEA3'), (0, 1, 0, 1, 0, 'EEA4'), (0, 1, 0, 32, 0, 'UEA1'),
+                   (0, 1, 0, 1, 0, 'EEA1', 'unknown'), (0, 1, 0, 1)]
+        # count, bearer or dir out of range, for each algorithm
+        for alg, func in algs:
+            invalid.extend([(0, 10, -1, 1, 0, alg, 'nas'), (0, 10, 1<<32, 1, 0, alg, 'nas'),
+                            (0, 10, 0, (1<<32) + 1, 0, alg, 'nas'), (0, 10, 0, 1, -1, alg, 'nas')])
+        for rec in invalid:
+            try:
+                decrypt_records(path, [rec], keys, bytearray(6000))
+            except CMException:
+                pass
+            else:
+                ret = False
+    finally:
+        shutil.rmtree(tmpdir)
+    return ret
+
+
+###
+# xor_buf: buffers of any length, the result being truncated to the shortest one
+###
+
+def _xor_buf_ref(b1, b2):
+    return bytes(bytearray([x^y for x, y in zip(bytearray(b1), bytearray(b2))]))
+
+def utils_testset():
+    rnd = Random(0x0b)
+    ret = xor_buf(b'', b'') == b'' and xor_buf(b'\x00\xff', b'') == b''
+    for l1, l2 in ((1, 1), (16, 16), (16, 4), (7, 21), (1500, 1500), (1500, 16)):
+        b1 = bytes(bytearray(rnd.getrandbits(8) for i in range(l1)))
+        b2 = bytes(bytearray(rnd.getrandbits(8) for i in range(l2)))
+        ret &= xor_buf(b1, b2) == xor_buf(b2, b1) == _xor_buf_ref(b1, b2)
+        ret &= xor_buf(bytearray(b1), memoryview(b2)) == _xor_buf_ref(b1, b2)
+    return ret
 
 
 def testall():
     if _with_aes:
-        return kasumi_testsets() & snow3g_testsets() & zuc_testsets() & aes_testsets()
+        return kasumi_testsets() & snow3g_testsets() & zuc_testsets() & aes_testsets() & \
+               batch_testsets() & into_testsets() & stream_testsets() & mac_testsets() & \
+               utils_testset()
     else:
-        return kasumi_testsets() & snow3g_testsets() & zuc_testsets()
+        return kasumi_testsets() & snow3g_testsets() & zuc_testsets() & batch_testsets() & \
+               into_testsets() & stream_testsets() & mac_testsets() & utils_testset()
 
 
 def testperf():
@@ -791,9 +1376,154 @@ def testperf():
     print('300 full CM testsets in %.3f seconds' % (time()-T0, ))
 
 
+def testperf_threads(nthreads=(1, 2, 4), npkt=240, pktlen=1500):
+    # the C bindings release the GIL while ciphering, hence the throughput
+    # should scale with the number of threads (up to the number of cores)
+    key, data = 16*b'\x2b', pktlen*b'\xa5'
+    algs = [
+        ('EEA3', ZUC().EEA3),
+        ('EIA3', ZUC().EIA3),
+        ('UEA2', SNOW3G().F8)
+        ]
+    def run(alg, n):
+        for i in range(n):
+            alg(key, i, 5, 0, data)
+    #
+    for name, alg in algs:
+        res = []
+        for nt in nthreads:
+            threads = [Thread(target=run, args=(alg, npkt//nt)) for j in range(nt)]
+            T0 = time()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            res.append('%i thread(s): %.1f MB/s' % (nt, (npkt*pktlen) / (1e6*(time()-T0))))
+        print('%s, %i bytes packets, %s' % (name, pktlen, ', '.join(res)))
+
+
+def testperf_batch(npkt=1000, pktlen=64):
+    # a batch of small PDUs processed in a single call vs. one call per PDU
+    key  = 16*b'\x2b'
+    pdus = [(i, 5, 0, pktlen*b'\xa5') for i in range(npkt)]
+    algs = [
+        ('EEA1', SNOW3G().EEA1, SNOW3G().EEA1_batch),
+        ('EIA1', SNOW3G().EIA1, SNOW3G().EIA1_batch),
+        ('EEA3', ZUC().EEA3, ZUC().EEA3_batch),
+        ('EIA3', ZUC().EIA3, ZUC().EIA3_batch)
+        ]
+    if _with_aes:
+        algs.extend([
+            ('EEA2', AES_3GPP().EEA2, AES_3GPP().EEA2_batch),
+            ('EIA2', AES_3GPP().EIA2, AES_3GPP().EIA2_batch)
+            ])
+    for name, alg, alg_batch in algs:
+        T0 = time()
+        for pdu in pdus:
+            alg(key, *pdu)
+        T1 = time()
+        alg_batch(key, pdus)
+        T2 = time()
+        print('%s, %i PDUs of %i bytes: single calls %.3f sec, batch %.3f sec'\
+              % (name, npkt, pktlen, T1-T0, T2-T1))
+
+
+def testperf_eia3(sizes=(40, 100, 500, 1500, 9000), npkt=200):
+    # word-oriented EIA3 vs. bit-oriented reference
+    key = 16*b'\x2b'
+    for pktlen in sizes:
+        data = pktlen*b'\xa5'
+        res  = []
+        for name, alg in (('ref', zuc_eia3_ref), ('fast', zuc_eia3)):
+            T0 = time()
+            for i in range(npkt):
+                alg(key, i, 5, 0, 8*pktlen, data)
+            res.append('%s %.1f MB/s' % (name, (npkt*pktlen) / (1e6*(time()-T0))))
+        print('EIA3, %i bytes packets, %s' % (pktlen, ', '.join(res)))
+
+
+def testperf_snow3g(nwords=(16, 2250), npkt=20):
+    # reference core (global state) vs. table-driven core (SNOW3GState)
+    key, iv = 16*b'\x2b', 16*b'\xa5'
+    for n in nwords:
+        T0 = time()
+        for i in range(npkt):
+            snow_initialize(key, iv)
+            snow_generatekeystream(n)
+        T1 = time()
+        for i in range(npkt):
+            SNOW3GState(key, iv).keystream(n)
+        T2 = time()
+        print('SNOW 3G, %i bytes keystream, ref %.1f MB/s, fast %.1f MB/s'\
+              % (4*n, (4*n*npkt) / (1e6*(T1-T0)), (4*n*npkt) / (1e6*(T2-T1))))
+
+
+def testperf_f9(sizes=(40, 1500, 9000), npkt=100):
+    # UIA2 / EIA1 MAC with each GF(2^64) multiplication engine available
+    key    = 16*b'\x2b'
+    engine = snow_get_f9_engine()
+    for pktlen in sizes:
+        data = pktlen*b'\xa5'
+        res  = []
+        for eng in snow_f9_engines():
+            snow_set_f9_engine(eng)
+            T0 = time()
+            for i in range(npkt):
+                snow_f9(key, i, 5, 0, data, 8*pktlen)
+            res.append('%s %.1f MB/s' % (eng, (npkt*pktlen) / (1e6*(time()-T0))))
+        print('UIA2, %i bytes packets, %s' % (pktlen, ', '.join(res)))
+    snow_set_f9_engine(engine)
+
+
+def testperf_eia2(pktlen=1500, npkt=1000):
+    # EIA2 with the CMAC of the AES backend vs. the generic CMAC mode of operation
+    if not _with_aes:
+        return
+    key, data, aes3gpp = 16*b'\x2b', pktlen*b'\xa5', AES_3GPP()
+    for bitlen in (8*pktlen, 8*pktlen-3):
+        T0 = time()
+        for i in range(npkt):
+            aes3gpp._eia2(CMAC(key, AES.AES_ECB, Tlen=32), i, 5, 0, data, bitlen)
+        T1 = time()
+        for i in range(npkt):
+            aes3gpp.EIA2(key, i, 5, 0, data, bitlen)
+        T2 = time()
+        print('EIA2, %i bits messages, generic CMAC %.1f MB/s, AES backend CMAC %.1f MB/s'\
+              % (bitlen, (npkt*pktlen) / (1e6*(T1-T0)), (npkt*pktlen) / (1e6*(T2-T1))))
+
+
+def testperf_xor_buf(sizes=(16, 1500), nloop=20000):
+    # xor_buf vs. a per-byte loop
+    for size in sizes:
+        b1, b2 = size*b'\x5a', size*b'\xc3'
+        T0 = time()
+        for i in range(nloop):
+            _xor_buf_ref(b1, b2)
+        T1 = time()
+        for i in range(nloop):
+            xor_buf(b1, b2)
+        T2 = time()
+        print('xor_buf, %i bytes buffers, per-byte loop %.2f us, xor_buf %.2f us'\
+              % (size, 1e6*(T1-T0)/nloop, 1e6*(T2-T1)/nloop))
+
+
 def test_CM():
     assert( testall() )
+    if _with_aes:
+        # threaded, hence not part of testall() run by testperf()
+        assert( aes_CMAC_cache_threads_testset() )
+
+
+def test_pipeline():
+    assert( pipeline_testset() )
 
 
 if __name__ == '__main__':
     testperf()
+    testperf_threads()
+    testperf_batch()
+    testperf_eia3()
+    testperf_snow3g()
+    testperf_f9()
+    testperf_eia2()
+    testperf_xor_buf()
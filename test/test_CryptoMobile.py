@@ -29,17 +29,29 @@
 
 import unittest
 
+from CryptoMobile       import bench
+
 from test.test_CM       import (
     test_CM,
+    test_pipeline,
     testperf as testperf_CM
     )
 from test.test_TUAK     import (
     test_TUAK,
     testperf as testperf_TUAK
     )
+from test.test_comp128  import (
+    test_comp128,
+    testperf as testperf_comp128
+    )
+from test.test_aio      import (
+    test_aio,
+    testperf as testperf_aio
+    )
 try:
     from test.test_Milenage import (
         test_Milenage,
+        test_parallel,
         testperf as testperf_Milenage
         )
 except ImportError:
@@ -64,16 +76,43 @@ class TestCryptoMobile(unittest.TestCase):
         print('[<>] testing CryptoMobile.CM')
         test_CM()
     
+    def test_pipeline(self):
+        print('[<>] testing CryptoMobile.pipeline')
+        test_pipeline()
+    
     def test_tuak(self):
         print('[<>] testing CryptoMobile.TUAK')
         test_TUAK()
     
+    def test_comp128(self):
+        print('[<>] testing pycomp128')
+        test_comp128()
+    
+    def test_aio(self):
+        print('[<>] testing CryptoMobile.aio')
+        test_aio()
+    
+    def test_bench(self):
+        print('[<>] testing CryptoMobile.bench')
+        report = bench.run(['EEA3', 'TUAK'], sizes=(40, 1500), duration=0, min_iter=5)
+        self.assertEqual([(r['name'], r['size'], r['runs']) for r in report['results']],
+                         [('EEA3', 40, 5), ('EEA3', 1500, 5), ('TUAK', None, 5)])
+        self.assertEqual(bench.compare(report, report), [])
+        # a 2 times faster baseline makes all results regressions
+        baseline = {'results': [dict(r, ops_s=2*r['ops_s']) for r in report['results']]}
+        self.assertEqual(len(bench.compare(report, baseline, 0.4)), 3)
+        self.assertEqual(len(bench.compare(report, baseline, 0.6)), 0)
+    
     if _with_aes:
         
         def test_milenage(self):
             print('[<>] testing CryptoMobile.Milenage')
             test_Milenage()
         
+        def test_parallel(self):
+            print('[<>] testing CryptoMobile.parallel')
+            test_parallel()
+        
         if _with_ec:
             
             def test_ecies(self):
@@ -84,6 +123,8 @@ class TestCryptoMobile(unittest.TestCase):
 if __name__ == '__main__':
     testperf_CM()
     testperf_TUAK()
+    testperf_comp128()
+    testperf_aio()
     if _with_aes:
         testperf_Milenage()
         if _with_ec:
@@ -34,9 +34,13 @@
 # see 3GPP TS 35.205, 206 and 207
 #######################################################
 
+import os
 from time import time
+from random import Random
 
-from CryptoMobile.Milenage import Milenage, make_OPc
+from CryptoMobile.Milenage import Milenage, MilenageSubscriber, make_OPc
+from CryptoMobile.TUAK     import TUAK
+from CryptoMobile.parallel import generate_vectors
 
 
 OPnull = b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
@@ -131,8 +135,81 @@ def milenage_testsets():
     milenage_testset_4() and milenage_testset_5() and milenage_testset_6()
 
 
+###
+# MilenageSubscriber vs. Milenage
+###
+
+def milenage_subscriber_testset():
+    # testset 1 from 3GPP TS 35.207
+    K       = b'F[\\\xe8\xb1\x99\xb4\x9f\xaa_\n.\xe28\xa6\xbc'
+    RAND    = b'#U<\xbe\x967\xa8\x9d!\x8a\xe6M\xaeG\xbf5'
+    SQN     = b'\xff\x9b\xb4\xd0\xb6\x07'
+    AMF     = b'\xb9\xb9'
+    OP      = b'\xcd\xc2\x02\xd5\x12> \xf6+mgj\xc7,\xb3\x18'
+    vec     = MilenageSubscriber(K, OP=OP).generate_vector(RAND, SQN, AMF)
+    if vec != (b'J\x9f\xfa\xc3T\xdf\xaf\xb3', b'\x01\xcf\xaf\x9e\xc4\xe8q\xe9', 
+               b'\xa5B\x11\xd5\xe3\xbaP\xbf', b'\xb4\x0b\xa9\xa3\xc5\x8b*\x05\xbb\xf0\xd9\x87\xb2\x1b\xf8\xcb',
+               b'\xf7i\xbc\xd7Q\x04F\x04\x12vrq\x1cm4A', b'\xaah\x9cd\x83p', b'E\x1e\x8b\xec\xa4;') or \
+    MilenageSubscriber(K, OPc=make_OPc(K, OP)).generate_vector(RAND, SQN, AMF) != vec:
+        return False
+    # random subscribers, each function separately
+    rnd = Random(0x35)
+    for i in range(8):
+        K, OP, RAND = [bytes(bytearray(rnd.getrandbits(8) for j in range(16))) for k in range(3)]
+        SQN, AMF    = bytes(bytearray(rnd.getrandbits(8) for j in range(6))), b'\x80\x00'
+        mil, sub    = Milenage(OP), MilenageSubscriber(K, OP=OP)
+        if sub.f1(RAND, SQN, AMF) != mil.f1(K, RAND, SQN, AMF) or \
+        sub.f1star(RAND, SQN, AMF) != mil.f1star(K, RAND, SQN, AMF) or \
+        sub.f2345(RAND) != mil.f2345(K, RAND) or \
+        sub.f5star(RAND) != mil.f5star(K, RAND) or \
+        sub.generate_vector(RAND, SQN, AMF) != (mil.f1(K, RAND, SQN, AMF), mil.f1star(K, RAND, SQN, AMF)) + \
+                                               mil.f2345(K, RAND) + (mil.f5star(K, RAND), ):
+            return False
+    return True
+
+
+def milenage_vectors_testset():
+    # bulk generation vs. one vector at a time
+    rnd  = Random(0x36)
+    rb   = lambda l: bytes(bytearray(rnd.getrandbits(8) for j in range(l)))
+    subs = [(rb(16), rb(16), [rb(16) for i in range(n)], [rb(6) for i in range(n)], rb(2)) \
+            for n in (0, 1, 17)]
+    mil  = Milenage(OPnull)
+    vecs = mil.generate_vectors_multi(subs)
+    for (K, OPc, rands, sqns, amf), cols in zip(subs, vecs):
+        sub = MilenageSubscriber(K, OPc=OPc)
+        ref = [sub.generate_vector(RAND, SQN, amf) for RAND, SQN in zip(rands, sqns)]
+        if tuple(zip(*cols)) != tuple(ref) or len(cols) != 7 or \
+        sub.generate_vectors(rands, sqns, amf) != cols:
+            return False
+    # OPc computed from OP
+    K, OP, rands, sqns = subs[-1][0], subs[-1][1], subs[-1][2], subs[-1][3]
+    return Milenage(OP).generate_vectors(K, None, rands, sqns, b'\0\0') == \
+           MilenageSubscriber(K, OP=OP).generate_vectors(rands, sqns, b'\0\0') and \
+           mil.generate_vectors(K, None, rands, sqns[1:], b'\0\0') is None
+
+
+def parallel_testset():
+    # vectors generated over a pool of processes, in the order of the records
+    rnd  = Random(0x37)
+    rb   = lambda l: bytes(bytearray(rnd.getrandbits(8) for j in range(l)))
+    recs = [(rb(16), rb(16), rb(6), rb(2), rb(16)) for i in range(40)]
+    vecs = list(generate_vectors(recs, workers=2, chunksize=7))
+    if len(vecs) != len(recs) or \
+    any([vec != (RAND, ) + MilenageSubscriber(K, OPc=OPc).generate_vector(RAND, SQN, AMF) \
+         for vec, (K, OPc, SQN, AMF, RAND) in zip(vecs, recs)]):
+        return False
+    # TUAK with TOP, and random RAND
+    K, TOP, SQN, AMF = rb(32), rb(32), rb(6), rb(2)
+    RAND, MAC_A, MAC_S, RES, CK, IK, AK, AKstar = \
+        list(generate_vectors([(K, TOP, SQN, AMF)], alg=TUAK, opc=False, workers=1))[0]
+    tuak = TUAK(TOP)
+    return MAC_A == tuak.f1(K, RAND, SQN, AMF) and MAC_S == tuak.f1star(K, RAND, SQN, AMF) and \
+           (RES, CK, IK, AK) == tuak.f2345(K, RAND) and AKstar == tuak.f5star(K, RAND)
+
+
 def testall():
-    return milenage_testsets()
+    return milenage_testsets() and milenage_subscriber_testset() and milenage_vectors_testset()
 
 
 def testperf():
@@ -144,9 +221,60 @@ def testperf():
     print('1000 full Milenage testsets in %.3f seconds' % (time()-T0, ))
 
 
+def testperf_subscriber(nvec=2000):
+    # one authentication vector with Milenage vs. MilenageSubscriber
+    K, OP, RAND, SQN, AMF = 16*b'\x01', 16*b'\x02', 16*b'\x03', 6*b'\x04', b'\x80\x00'
+    mil, sub = Milenage(OP), MilenageSubscriber(K, OP=OP)
+    T0 = time()
+    for i in range(nvec):
+        mil.f1(K, RAND, SQN, AMF), mil.f1star(K, RAND, SQN, AMF), mil.f2345(K, RAND), mil.f5star(K, RAND)
+    T1 = time()
+    for i in range(nvec):
+        sub.generate_vector(RAND, SQN, AMF)
+    T2 = time()
+    print('%i authentication vectors, Milenage %.3f seconds, MilenageSubscriber %.3f seconds'\
+          % (nvec, T1-T0, T2-T1))
+
+
+def testperf_vectors(nvec=20000):
+    # authentication vectors per second, one at a time vs. bulk generation
+    K, OP, AMF = 16*b'\x01', 16*b'\x02', b'\x80\x00'
+    rands = [bytes(bytearray([i & 0xff])) * 16 for i in range(nvec)]
+    sqns  = [bytes(bytearray([0, 0, 0, 0, i >> 8 & 0xff, i & 0xff])) for i in range(nvec)]
+    sub   = MilenageSubscriber(K, OP=OP)
+    T0 = time()
+    for RAND, SQN in zip(rands, sqns):
+        sub.generate_vector(RAND, SQN, AMF)
+    T1 = time()
+    sub.generate_vectors(rands, sqns, AMF)
+    T2 = time()
+    print('Milenage authentication vectors, generate_vector %.0f / s, generate_vectors %.0f / s'\
+          % (nvec/(T1-T0), nvec/(T2-T1)))
+
+
+def testperf_parallel(nvec=4000, workers=None):
+    # authentication vectors per second, from 1 to N worker processes
+    if workers is None:
+        workers = sorted(set([1, 2, os.cpu_count() or 1]))
+    recs = [(16*b'\x01', 16*b'\x02', 6*b'\x03', b'\x80\x00')] * nvec
+    for n in workers:
+        T0 = time()
+        for vec in generate_vectors(recs, workers=n):
+            pass
+        print('Milenage authentication vectors over %i process(es), %.0f / s'\
+              % (n, nvec/(time()-T0)))
+
+
 def test_Milenage():
     assert( testall() )
 
 
+def test_parallel():
+    assert( parallel_testset() )
+
+
 if __name__ == '__main__':
     testperf()
+    testperf_subscriber()
+    testperf_vectors()
+    testperf_parallel()
@@ -36,8 +36,12 @@
 #######################################################
 
 from time import time
+from random import Random
 
-from CryptoMobile.TUAK import TUAK, keccakp1600
+from CryptoMobile.TUAK import TUAK, TUAKSubscriber, keccakp1600
+from CryptoMobile.utils import CMException
+from pykeccakp1600     import keccakp1600_many
+from pykeccakp1600     import tuak_topc, tuak_f1, tuak_f1star, tuak_f2345, tuak_f5star
 
 TUAK.KeccakIterations = 1
 
@@ -70,10 +74,32 @@ def keccak_testset_6():
     return keccakp1600(b'\x00\x00\x00\x00\x00\x00\x00\x00\x01\x00\x00\x00\x00\x00\x00\x00\x02\x00\x00\x00\x00\x00\x00\x00\x03\x00\x00\x00\x00\x00\x00\x00\x04\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x01\x00\x00\x00\x00\x00\x00\x00\x02\x00\x00\x00\x00\x00\x00\x00\x03\x00\x00\x00\x00\x00\x00\x00\x04\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x01\x00\x00\x00\x00\x00\x00\x00\x02\x00\x00\x00\x00\x00\x00\x00\x03\x00\x00\x00\x00\x00\x00\x00\x04\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x01\x00\x00\x00\x00\x00\x00\x00\x02\x00\x00\x00\x00\x00\x00\x00\x03\x00\x00\x00\x00\x00\x00\x00\x04\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x01\x00\x00\x00\x00\x00\x00\x00\x02\x00\x00\x00\x00\x00\x00\x00\x03\x00\x00\x00\x00\x00\x00\x00\x04\x00\x00\x00\x00\x00\x00\x00') == \
     b'V\r\xbeA\xf6\xa7Z}3\xe1]k\xfe\x0b\xdcd}\xe5T4\x1c\xe0\xd0a\xbb\xbd\xf1\xbeuvI\xde\xe7A\xb1\xfd7A\x8d\xa6\xf3Z\xb7\x0e\x15\x87\xcc6\x8c\x1b\x89\xad\xcc\xce\x1d\x07\xad\x92\rM\x9d\x08\xa0C\x94l/o\xe1\xa5\x17\xa2I\xce<\x8a_\x83N\xec\xfa/\xaa\xad\xde\xe82\xe6\xdb$\xd4*+\x04\xa7\x84c\xa9\xb2\xdfm/\x02\xfc\\)s*\x12e\x14\xfb\x15\xebz\xbe\x7f\xbfW\x18\x91f\x91\xc7\xc2\xf8CF\x00\xda~/\x9bve\xa5\x9caA\x11U\x05\xc9\xd9\xe9\xf8\x05\xafo\x9ek\xc4\xf1\x9ce\xc6\x0e\xa9r\xa6\xe4\xfa\x01\x85})\x8a\t&\x83\x90\xd5t\xf6=Ov\xfbmm\xfc\xd178\xc4\x98H\xac\xd5\x1eN\xd7\x83\xaf\xa1\xbaR\x0f\xa37'
 
+def keccak_many_testset():
+    # permutations of consecutive states in place vs. one state at a time
+    rnd    = Random(0x39)
+    states = [bytes(bytearray(rnd.getrandbits(8) for i in range(200))) for j in range(3)]
+    buf    = bytearray(b''.join(states) + b'\xff')
+    if keccakp1600_many(buf, 3, 2) is not buf or buf[-1:] != b'\xff' or \
+    bytes(buf[:600]) != b''.join([keccakp1600(keccakp1600(st)) for st in states]):
+        return False
+    # a memoryview over part of a buffer, n = 0, and too short buffers
+    view = memoryview(buf)[200:400]
+    keccakp1600_many(view, 1)
+    keccakp1600_many(buf, 0)
+    if bytes(buf[200:400]) != keccakp1600(keccakp1600(keccakp1600(states[1]))):
+        return False
+    try:
+        keccakp1600_many(bytearray(399), 2)
+    except ValueError:
+        return True
+    else:
+        return False
+
 def keccak_testsets():
     return keccak_testset_1() & keccak_testset_2() & \
             keccak_testset_3() & keccak_testset_4() & \
-            keccak_testset_5() & keccak_testset_6()
+            keccak_testset_5() & keccak_testset_6() & \
+            keccak_many_testset()
 
 
 def tuak_testset_61():
@@ -290,8 +316,108 @@ def tuak_testsets_7():
         tuak_testset_75() and tuak_testset_76()
 
 
+###
+# TUAKSubscriber vs. TUAK
+###
+
+class TUAK_256(TUAK):
+    LEN_MAC = 256
+    LEN_RES = 256
+    LEN_CK  = 256
+    LEN_IK  = 256
+    KeccakIterations = 2
+
+_rnd = Random(0x38)
+_rb  = lambda l: bytes(bytearray(_rnd.getrandbits(8) for j in range(l)))
+_tuak_subscriber_args = [(_rb(klen), _rb(32), _rb(16), _rb(6), _rb(2)) for klen in (16, 32)]
+
+def tuak_subscriber_testset():
+    # testset 1 from 3GPP TS 35.232
+    K    = b'\xab\xab\xab\xab\xab\xab\xab\xab\xab\xab\xab\xab\xab\xab\xab\xab'
+    RAND = b'BBBBBBBBBBBBBBBB'
+    SQN  = b'\x11\x11\x11\x11\x11\x11'
+    AMF  = b'\xff\xff'
+    TOP  = b'UUUUUUUUUUUUUUUUUUUUUUUUUUUUUUUU'
+    sub  = TUAKSubscriber(K, TOP=TOP)
+    if sub.TOPc != b'\xbd\x04\xd9S\x0e\x87Q<]\x83z\xc2\xad\x95F#\xa8\xe23\x0c\x11S\x05\xa7>\xb4]\x1f@\xcc\xcb\xff' or \
+    sub.f1(RAND, SQN, AMF) != b'\xf9\xa5Nj\xea\xa8a\x8d' or \
+    sub.f1star(RAND, SQN, AMF) != b'\xe9KM\xc6\xc7)}\xf3':
+        return False
+    # random subscribers, with default and custom settings
+    for conf, (K, TOP, RAND, SQN, AMF) in zip((TUAK, TUAK_256), _tuak_subscriber_args):
+        tuak = conf(TOP)
+        tuak.set_topc(tuak.make_topc(K))
+        sub  = TUAKSubscriber(K, TOPc=tuak.TOPc, tuak=conf)
+        if sub.generate_vector(RAND, SQN, AMF) != (tuak.f1(K, RAND, SQN, AMF), tuak.f1star(K, RAND, SQN, AMF)) + \
+                                                  tuak.f2345(K, RAND) + (tuak.f5star(K, RAND), ) or \
+        sub.f2345(RAND) != tuak.f2345(K, RAND) or sub.f5star(RAND) != tuak.f5star(K, RAND):
+            return False
+    return True
+
+def tuak_settings_testset():
+    # unsupported output lengths, errors being logged: out of testall()
+    K, TOP, RAND, SQN, AMF = _tuak_subscriber_args[0]
+    for attr, val in (('LEN_MAC', 100), ('LEN_MAC', 32), ('LEN_RES', 12), ('LEN_CK', 64),
+                      ('LEN_IK', 512)):
+        tuak = TUAK(TOP)
+        setattr(tuak, attr, val)
+        if attr == 'LEN_MAC':
+            if tuak.f1(K, RAND, SQN, AMF) is not None or tuak.f1star(K, RAND, SQN, AMF) is not None:
+                return False
+        elif tuak.f2345(K, RAND) is not None:
+            return False
+        try:
+            TUAKSubscriber(K, TOP=TOP, tuak=tuak)
+        except CMException:
+            pass
+        else:
+            return False
+    return True
+
+
+###
+# native TUAK functions vs. the KeccakP-1600 state assembled in Python
+###
+
+def _tuak_ref(TOPc, INSTANCE, RAND, AMF_SQN, K, iterations, algoname=b'TUAK1.0'):
+    INOUT = b''.join((TOPc[::-1], bytes(bytearray([INSTANCE])), algoname[::-1], RAND[::-1],
+                      AMF_SQN, K[::-1], (32-len(K))*b'\0', b'\x1f', 38*b'\0', b'\x80', 64*b'\0'))
+    for i in range(iterations):
+        INOUT = keccakp1600(INOUT)
+    return INOUT
+
+def tuak_native_testset():
+    ret = True
+    for (K, TOP, RAND, SQN, AMF), it in zip(_tuak_subscriber_args, (1, 2)):
+        k32  = len(K) == 32
+        TOPc = _tuak_ref(TOP, k32, 16*b'\0', 8*b'\0', K, it)[:32][::-1]
+        ret &= tuak_topc(K, TOP, it) == TOPc
+        # f1 and f1star with LEN_MAC 128
+        ret &= tuak_f1(K, TOPc, RAND, SQN, AMF, 128, it) == \
+               _tuak_ref(TOPc, 0x10+k32, RAND, AMF[::-1]+SQN[::-1], K, it)[:16][::-1]
+        ret &= tuak_f1star(K, TOPc, RAND, SQN, AMF, 128, it, b'TUAK1.0') == \
+               _tuak_ref(TOPc, 0x90+k32, RAND, AMF[::-1]+SQN[::-1], K, it)[:16][::-1]
+        # f2345 with LEN_RES 32, LEN_CK 256 and LEN_IK 128
+        INOUT = _tuak_ref(TOPc, 0x44+k32, RAND, 8*b'\0', K, it)
+        ret &= tuak_f2345(K, TOPc, RAND, 32, 256, 128, it) == \
+               (INOUT[:4][::-1], INOUT[32:64][::-1], INOUT[64:80][::-1], INOUT[96:102][::-1])
+        ret &= tuak_f5star(K, TOPc, RAND, it) == \
+               _tuak_ref(TOPc, 0xc0+k32, RAND, 8*b'\0', K, it)[96:102][::-1]
+    # invalid lengths
+    for args in ((15*b'\0', 32*b'\0', 16*b'\0', 6*b'\0', 2*b'\0'),
+                 (16*b'\0', 32*b'\0', 16*b'\0', 6*b'\0', 2*b'\0', 96)):
+        try:
+            tuak_f1(*args)
+        except ValueError:
+            pass
+        else:
+            ret = False
+    return ret
+
+
 def testall():
-    return keccak_testsets() and tuak_testsets_6() and tuak_testsets_7()
+    return keccak_testsets() and tuak_testsets_6() and tuak_testsets_7() and \
+           tuak_subscriber_testset() and tuak_native_testset()
 
 
 def testperf():
@@ -303,9 +429,41 @@ def testperf():
     print('10000 full TUAK testsets in %.3f seconds' % (time()-T0, ))
 
 
+def testperf_subscriber(nvec=2000):
+    # one authentication vector with TUAK vs. TUAKSubscriber
+    K, TOP, RAND, SQN, AMF = 16*b'\x01', 32*b'\x02', 16*b'\x03', 6*b'\x04', b'\x80\x00'
+    tuak, sub = TUAK(TOP), TUAKSubscriber(K, TOP=TOP)
+    T0 = time()
+    for i in range(nvec):
+        tuak.f1(K, RAND, SQN, AMF), tuak.f1star(K, RAND, SQN, AMF), tuak.f2345(K, RAND), tuak.f5star(K, RAND)
+    T1 = time()
+    for i in range(nvec):
+        sub.generate_vector(RAND, SQN, AMF)
+    T2 = time()
+    print('%i authentication vectors, TUAK %.3f seconds, TUAKSubscriber %.3f seconds'\
+          % (nvec, T1-T0, T2-T1))
+
+
+def testperf_keccak(nstates=20000):
+    # KeccakP-1600 permutations, one call per state vs. a single call
+    states = nstates*[200*b'\xa5']
+    buf    = bytearray(b''.join(states))
+    T0 = time()
+    for st in states:
+        keccakp1600(st)
+    T1 = time()
+    keccakp1600_many(buf, nstates)
+    T2 = time()
+    print('%i KeccakP-1600 permutations, pykeccakp1600 %.3f seconds, keccakp1600_many %.3f seconds'\
+          % (nstates, T1-T0, T2-T1))
+
+
 def test_TUAK():
     assert( testall() )
+    assert( tuak_settings_testset() )
 
 
 if __name__ == '__main__':
     testperf()
+    testperf_subscriber()
+    testperf_keccak()
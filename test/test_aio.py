@@ -0,0 +1,184 @@
+# −*− coding: UTF−8 −*−
+#/**
+# * Software Name : CryptoMobile
+# * Version : 0.3
+# *
+# * This program is free software: you can redistribute it and/or modify
+# * it under the terms of the GNU General Public License version 2 as published
+# * by the Free Software Foundation.
+# *
+# * This program is distributed in the hope that it will be useful,
+# * but WITHOUT ANY WARRANTY; without even the implied warranty of
+# * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# * GNU General Public License for more details.
+# *
+# * You will find a copy of the terms and conditions of the GNU General Public
+# * License version 2 in the "license.txt" file or
+# * see http://www.gnu.org/licenses/ or write to the Free Software Foundation,
+# * Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+# *
+# *--------------------------------------------------------
+# * File Name : test/test_aio.py
+# * Created : 2026-10-17
+# *--------------------------------------------------------
+#*/
+
+########################################################
+# CryptoMobile python toolkit
+#
+# asyncio front-end: results of the offloaded requests vs. direct calls
+#######################################################
+
+import asyncio
+from time import time
+from random import Random
+
+from CryptoMobile       import CM
+from CryptoMobile.aio   import Offloader
+from CryptoMobile.utils import CMException
+try:
+    from CryptoMobile.Milenage import MilenageSubscriber
+except ImportError:
+    _with_aes = False
+else:
+    _with_aes = True
+    try:
+        from CryptoMobile.ECIES import ECIES_UE
+    except ImportError:
+        _with_ec = False
+    else:
+        _with_ec = True
+
+
+def _rb(rnd, l):
+    return bytes(bytearray(rnd.getrandbits(8) for i in range(l)))
+
+
+async def _cipher_testset(off, rnd):
+    algs = (1, 2, 3) if _with_aes else (1, 3)
+    keys = [_rb(rnd, 16) for i in range(3)]
+    reqs = [(algs[i % len(algs)], keys[i % 3], rnd.getrandbits(32), rnd.randint(0, 31),
+             rnd.randint(0, 1), _rb(rnd, rnd.randint(0, 300))) for i in range(100)]
+    ret = True
+    for kind in ('EEA', 'EIA'):
+        func = getattr(off, kind.lower())
+        res  = await asyncio.gather(*[func(*req) for req in reqs])
+        ret &= res == [getattr(CM, '%s%i' % (kind, req[0]))(*req[1:]) for req in reqs]
+    # an invalid request within a batch only fails on its own
+    res = await asyncio.gather(off.eea(3, keys[0], 0, 1, 0, b'abc'),
+                               off.eea(3, keys[0], 0, 32, 0, b'abc'),
+                               off.eea(3, keys[0], 0, 1, 0, b'abc', 25),
+                               off.eia(1, keys[0], 0, 1, 0, b'abc'),
+                               return_exceptions=True)
+    ret &= res[0] == CM.EEA3(keys[0], 0, 1, 0, b'abc') and \
+           isinstance(res[1], CMException) and isinstance(res[2], CMException) and \
+           res[3] == CM.EIA1(keys[0], 0, 1, 0, b'abc')
+    try:
+        await off.eea(4, keys[0], 0, 1, 0, b'abc')
+    except CMException:
+        pass
+    else:
+        ret = False
+    return ret
+
+
+async def _milenage_testset(off, rnd):
+    recs = [(_rb(rnd, 16), _rb(rnd, 16), _rb(rnd, 6), _rb(rnd, 2), _rb(rnd, 16)) for i in range(20)]
+    vecs = await asyncio.gather(*[off.milenage(*rec) for rec in recs])
+    return vecs == [(RAND, ) + MilenageSubscriber(K, OPc=OPc).generate_vector(RAND, SQN, AMF) \
+                    for K, OPc, SQN, AMF, RAND in recs]
+
+
+async def _ecies_testset(off, rnd):
+    ret = True
+    for profile in ('A', 'B'):
+        hn = ECIES_UE(profile=profile)
+        hn_privkey, hn_pubkey = hn.EC.get_privkey(), hn.EC.get_pubkey()
+        msgs, sucis = [_rb(rnd, 8 + i) for i in range(4)], []
+        for msg in msgs:
+            ue = ECIES_UE(profile=profile)
+            ue.generate_sharedkey(hn_pubkey)
+            sucis.append(ue.protect(msg))
+        res = await asyncio.gather(*[off.ecies_unprotect(hn_privkey, *suci, profile=profile) \
+                                     for suci in sucis])
+        ret &= res == msgs
+        # MAC verification failure
+        ret &= await off.ecies_unprotect(hn_privkey, sucis[0][0], sucis[0][1], 8*b'\0',
+                                         profile=profile) is None
+    return ret
+
+
+async def _aio_testset():
+    rnd = Random(0x25)
+    off = Offloader(max_batch=8, latency=0.001, queue_depth=32, threads=2, processes=1)
+    try:
+        ret = await _cipher_testset(off, rnd)
+        if _with_aes:
+            ret &= await _milenage_testset(off, rnd)
+            if _with_ec:
+                ret &= await _ecies_testset(off, rnd)
+    finally:
+        off.close()
+    return ret
+
+
+async def _abandoned_testset(off):
+    return await asyncio.wait_for(off.eea(3, 16*b'\0', 0, 1, 0, b'abc'), 2) == \
+           CM.EEA3(16*b'\0', 0, 1, 0, b'abc')
+
+
+def aio_testset():
+    ret = asyncio.run(_aio_testset())
+    # a request abandoned in a closed loop does not block the next loops
+    off = Offloader(latency=0.2)
+    try:
+        try:
+            asyncio.run(asyncio.wait_for(off.eea(3, 16*b'\0', 0, 1, 0, b'abc'), 0.01))
+        except asyncio.TimeoutError:
+            pass
+        else:
+            ret = False
+        ret &= asyncio.run(_abandoned_testset(off))
+        ret &= asyncio.run(_abandoned_testset(off))
+    finally:
+        off.close()
+    return ret
+
+
+async def _testperf(npkt, pktlen, tick):
+    # maximum delay of a periodic timer of the event loop, while ciphering
+    key, data = 16*b'\x2b', pktlen*b'\xa5'
+    stall = [0]
+    async def ticker(stop):
+        while not stop.is_set():
+            T0 = time()
+            await asyncio.sleep(tick)
+            stall[0] = max(stall[0], time() - T0 - tick)
+    for name, offload in (('in the event loop', False), ('offloaded', True)):
+        off, stop, stall[0] = Offloader(), asyncio.Event(), 0
+        task = asyncio.ensure_future(ticker(stop))
+        await asyncio.sleep(0)
+        T0 = time()
+        if offload:
+            await asyncio.gather(*[off.eia(3, key, i, 5, 0, data) for i in range(npkt)])
+        else:
+            for i in range(npkt):
+                CM.EIA3(key, i, 5, 0, data)
+        T1 = time()
+        stop.set()
+        await task
+        off.close()
+        print('EIA3 %s, %i x %i bytes: %.1f MB/s, event loop stalled up to %.1f ms'\
+              % (name, npkt, pktlen, npkt*pktlen / (1e6*(T1-T0)), 1000*stall[0]))
+
+
+def testperf(npkt=200, pktlen=65536, tick=0.001):
+    asyncio.run(_testperf(npkt, pktlen, tick))
+
+
+def test_aio():
+    assert( aio_testset() )
+
+
+if __name__ == '__main__':
+    testperf()
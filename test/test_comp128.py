@@ -0,0 +1,117 @@
+# −*− coding: UTF−8 −*−
+#/**
+# * Software Name : CryptoMobile 
+# * Version : 0.3
+# *
+# * This program is free software: you can redistribute it and/or modify
+# * it under the terms of the GNU General Public License version 2 as published
+# * by the Free Software Foundation. 
+# *
+# * This program is distributed in the hope that it will be useful,
+# * but WITHOUT ANY WARRANTY; without even the implied warranty of
+# * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# * GNU General Public License for more details. 
+# *
+# * You will find a copy of the terms and conditions of the GNU General Public
+# * License version 2 in the "license.txt" file or
+# * see http://www.gnu.org/licenses/ or write to the Free Software Foundation,
+# * Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301 USA
+# *
+# *--------------------------------------------------------
+# * File Name : test/test_comp128.py
+# * Created : 2026-10-17
+# *--------------------------------------------------------
+#*/
+
+########################################################
+# CryptoMobile python toolkit
+#
+# COMP128 v1, v2 and v3 GSM authentication algorithms
+#######################################################
+
+from time import time
+from random import Random
+
+from pycomp128 import comp128v1, comp128v2, comp128v3, \
+                      comp128v1_batch, comp128v2_batch, comp128v3_batch
+
+
+###
+# single (Ki, RAND) pair
+###
+
+def comp128_testset_1():
+    Ki, RAND = 16*b'A', 16*b'B'
+    return comp128v1(Ki, RAND) == (b'#9\x0b^', b"\x08\xb6'\xf36\x80\xec\x00") and \
+    comp128v2(Ki, RAND) == (b'\x8a\x9b\xaaI', b']\xdcPs\xa6:\x04\x00') and \
+    comp128v3(Ki, RAND) == (b'\x8a\x9b\xaaI', b']\xdcPs\xa6:\x07\xf9')
+
+
+###
+# batch of (Ki, RAND) pairs vs. single pairs
+###
+
+_rnd   = Random(0x80)
+_kis   = [bytes(bytearray(_rnd.getrandbits(8) for i in range(16))) for j in range(20)]
+_rands = [bytes(bytearray(_rnd.getrandbits(8) for i in range(16))) for j in range(20)]
+
+def _batch_check(alg, alg_batch):
+    sres = b''.join([alg(Ki, RAND)[0] for Ki, RAND in zip(_kis, _rands)])
+    kc   = b''.join([alg(Ki, RAND)[1] for Ki, RAND in zip(_kis, _rands)])
+    # packed buffers, list of pairs, and a single Ki for all RANDs
+    return alg_batch(b''.join(_kis), b''.join(_rands)) == (sres, kc) and \
+    alg_batch(list(zip(_kis, _rands))) == (sres, kc) and \
+    alg_batch(bytearray(_kis[0]), memoryview(b''.join(_rands))) == \
+        tuple([b''.join(out) for out in zip(*[alg(_kis[0], RAND) for RAND in _rands])]) and \
+    alg_batch([]) == (b'', b'')
+
+def comp128_batch_testset():
+    ret = _batch_check(comp128v1, comp128v1_batch) and \
+    _batch_check(comp128v2, comp128v2_batch) and \
+    _batch_check(comp128v3, comp128v3_batch)
+    # invalid lengths
+    for args in ((32*b'\0', 48*b'\0'), (16*b'\0', 17*b'\0'), ([(15*b'\0', 16*b'\0')], )):
+        try:
+            comp128v1_batch(*args)
+        except ValueError:
+            pass
+        else:
+            ret = False
+    return ret
+
+
+def testall():
+    return comp128_testset_1() and comp128_batch_testset()
+
+
+def testperf():
+    T0 = time()
+    for i in range(1000):
+        if not testall():
+            print('testset failing... exiting')
+            return
+    print('1000 full COMP128 testsets in %.3f seconds' % (time()-T0, ))
+
+
+def testperf_batch(npairs=20000):
+    # triplets per second, one call per pair vs. a single batch call
+    kis, rands = npairs*[16*b'\x01'], npairs*[16*b'\x02']
+    Kis, RANDs = b''.join(kis), b''.join(rands)
+    for alg, alg_batch in ((comp128v1, comp128v1_batch), (comp128v3, comp128v3_batch)):
+        T0 = time()
+        for Ki, RAND in zip(kis, rands):
+            alg(Ki, RAND)
+        T1 = time()
+        alg_batch(Kis, RANDs)
+        T2 = time()
+        print('%s, %.0f triplets / s, %s, %.0f triplets / s'\
+              % (alg.__name__, npairs/(T1-T0), alg_batch.__name__, npairs/(T2-T1)))
+
+
+def test_comp128():
+    assert( testall() )
+
+
+if __name__ == '__main__':
+    testperf()
+    testperf_batch()